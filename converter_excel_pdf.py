@@ -14,12 +14,17 @@ A lógica está modularizada em src/.
 import sys
 import os
 import argparse
+import multiprocessing
 
 # Adicionar src ao path para imports funcionarem
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from src.config import load_config, load_profile, import_config
 
+# Espera máxima pelos hooks em segundo plano antes de a CLI terminar (s); o
+# que ficar por correr continua na fila (ver --hook-jobs / --retry-hooks)
+HOOKS_WAIT_SECONDS = 300
+
 
 def _open_file(path: str):
     """Abre um ficheiro com a aplicação padrão do sistema."""
@@ -32,11 +37,8 @@ def _open_file(path: str):
         subprocess.run(['xdg-open', path])
 
 
-def _run_cli(args):
-    """Executa em modo CLI com os argumentos fornecidos."""
-    from src.converter import ExcelToPDFConverter
-    from src.hooks import run_hooks
-
+def _load_cli_config(args) -> dict:
+    """Carrega a configuração (ficheiro ``--config`` ou a do utilizador, mais o perfil)."""
     # Carregar config base
     if args.config:
         try:
@@ -58,11 +60,38 @@ def _run_cli(args):
             print(f"Aviso: não foi possível carregar o perfil '{args.profile}': {e}",
                   file=sys.stderr)
 
+    # Conversão em processo isolado (ver src.isolation)
+    resources = config.setdefault('resources', {})
+    if getattr(args, 'isolate', False):
+        resources['isolate'] = True
+    if getattr(args, 'timeout', None) is not None:
+        resources['isolate'] = True
+        resources['timeout_seconds'] = args.timeout
+    if getattr(args, 'memory_limit', None) is not None:
+        resources['isolate'] = True
+        resources['memory_limit_mb'] = args.memory_limit
+    return config
+
+
+def _run_cli(args):
+    """Executa em modo CLI com os argumentos fornecidos."""
+    from src.converter import ExcelToPDFConverter
+    from src.database import init_db
+    from src.hooks import run_hooks
+    from src.timing import format_timings, timings_of
+
+    config = _load_cli_config(args)
+
     # Modo watch folder
     if args.watch:
         _run_watch(args.input, config)
         return
 
+    # Processamento em lote (pasta)
+    if os.path.isdir(args.input):
+        _run_batch(args.input, config, args.mode or 'individual', estimate=args.estimate)
+        return
+
     # Conversão normal
     excel_path = args.input
     if not os.path.exists(excel_path):
@@ -70,6 +99,8 @@ def _run_cli(args):
         sys.exit(1)
 
     print(f"A converter: {excel_path}")
+    # A cache de saída vive na base de dados, tal como nos lotes
+    init_db()
 
     try:
         output_pdf = args.output if args.output else None
@@ -80,17 +111,26 @@ def _run_cli(args):
             output_path = converter.generate_pdf()
             outputs = [output_path]
             print(f"PDF gerado: {output_path}")
+        elif mode == 'zip':
+            members = converter.generate_individual_pdfs(zip_output=args.output or True)
+            outputs = [converter.output_zip_path] if members else []
+            print(f"{len(members)} PDF(s) gerados em: {converter.output_zip_path or '—'}")
         else:
             outputs = converter.generate_individual_pdfs()
             print(f"{len(outputs)} PDF(s) gerados em: {os.path.dirname(outputs[0]) if outputs else '—'}")
 
+        cached = len(converter.cache_hits)
+        if cached:
+            print(f"{cached} PDF(s) inalterado(s) — renderização saltada")
+
         # Executar hooks
-        hook_results = run_hooks(config, excel_path, outputs)
-        for r in hook_results:
-            status = 'OK' if r['returncode'] == 0 else f"ERRO (código {r['returncode']})"
-            print(f"Hook '{r['hook']}': {status}")
-            if r['error']:
-                print(f"  {r['error']}", file=sys.stderr)
+        with converter.timings.phase('hooks'):
+            hook_results = run_hooks(config, excel_path, outputs)
+        _print_hook_results(hook_results)
+
+        timings_line = format_timings(timings_of(converter))
+        if timings_line:
+            print(f"Tempos: {timings_line}")
 
         # Abrir PDF se configurado
         if config['output'].get('auto_open', True) and outputs:
@@ -101,14 +141,266 @@ def _run_cli(args):
         sys.exit(1)
 
 
-def _run_watch(folder: str, config: dict):
-    """Inicia monitorização de pasta no modo CLI (bloqueia até Ctrl+C)."""
+def _print_batch_summary(results: list, run_id: str, cancelled: bool):
+    """Mostra o resumo de um lote e como o retomar, se necessário."""
+    ok = sum(1 for r in results if r['success'])
+    fail = len(results) - ok
+    for r in results:
+        if not r['success']:
+            print(f"  Erro em {r['filename']}: {r['error']}", file=sys.stderr)
+        elif r.get('duplicate_of'):
+            print(f"  Duplicado: {r['filename']} = {os.path.basename(r['duplicate_of'])}")
+    print(f"Lote {run_id}: {ok} com sucesso, {fail} com erro(s)")
+    if cancelled or fail:
+        print(f"Para retomar: --resume {run_id}")
+
+
+def _run_batch_job(run_id: str, runner):
+    """Executa um lote (novo ou retomado) com Ctrl+C a cancelar de forma limpa."""
     import signal
-    from src.watch_folder import WatchFolder
+    from src.progress import CancelToken
+
+    token = CancelToken()
+
+    def _cancel(sig, frame):
+        print("\nA cancelar... (o ficheiro em curso é interrompido)")
+        token.cancel()
+
+    previous = signal.signal(signal.SIGINT, _cancel)
+
+    def on_progress(current, total, filename):
+        if current < total:
+            print(f"[{current + 1}/{total}] {filename}")
 
+    try:
+        results = runner(progress_callback=on_progress, cancel_token=token)
+    finally:
+        signal.signal(signal.SIGINT, previous)
+    _print_batch_summary(results, run_id, token.is_cancelled)
+    if token.is_cancelled or not all(r['success'] for r in results):
+        sys.exit(1)
+
+
+def _print_hook_results(hook_results: list):
+    """Mostra o resultado de cada hook executado."""
+    for r in hook_results:
+        status = 'OK' if r['returncode'] == 0 else f"ERRO (código {r['returncode']})"
+        print(f"Hook '{r['hook']}': {status}")
+        if r['error']:
+            print(f"  {r['error']}", file=sys.stderr)
+
+
+def _wait_for_hooks():
+    """Espera pelos hooks em segundo plano (ver src.hook_queue) antes de terminar."""
+    from src import hook_queue
+
+    if not hook_queue.drain(HOOKS_WAIT_SECONDS):
+        print(f"Hooks ainda em curso após {HOOKS_WAIT_SECONDS} s: ficam na fila "
+              f"(ver --hook-jobs)", file=sys.stderr)
+        return
+    counts = hook_queue.counts()
+    if counts[hook_queue.PENDING]:
+        print(f"{counts[hook_queue.PENDING]} hook(s) falhado(s) a repetir mais tarde "
+              f"(ver --hook-jobs)")
+    if counts[hook_queue.FAILED]:
+        print(f"{counts[hook_queue.FAILED]} hook(s) sem sucesso após todas as tentativas "
+              f"(repetir com --retry-hooks)", file=sys.stderr)
+
+
+def _run_batch(folder: str, config: dict, mode: str, estimate: bool = False):
+    """Converte todos os ficheiros Excel de uma pasta, registando o lote no diário.
+
+    Com ``estimate`` a pasta é percorrida antes do lote para mostrar a
+    duração estimada; sem ele a conversão começa logo, à medida que os
+    ficheiros são descobertos.
+    """
+    from src import batch_journal
+    from src.batch_estimator import estimate_batch
+    from src.batch_processor import process_batch
+    from src.database import init_db
+    from src.hooks import HookRunner
+    from src.progress import format_eta
+
+    init_db()
+    run_id = batch_journal.start_run(folder, mode, config)
+    print(f"Lote {run_id}: {folder} (modo {mode})")
+    if estimate:
+        estimate = estimate_batch(folder, config, mode)
+        batch_journal.set_estimate(run_id, estimate['wall_seconds'])
+        print(f"Duração estimada: ~{format_eta(estimate['wall_seconds'])} "
+              f"({len(estimate['files'])} ficheiro(s), {estimate['rows']} linha(s))")
+    hooks = HookRunner(config)
+
+    def job(**kw):
+        results = process_batch(folder, config, mode, run_id=run_id, hook_runner=hooks, **kw)
+        _print_hook_results(hooks.finish(folder))
+        _wait_for_hooks()
+        return results
+
+    _run_batch_job(run_id, job)
+
+
+def _run_resume(run_id: str):
+    """Retoma um lote interrompido (``'last'`` = o mais recente por concluir)."""
+    from src import batch_journal
+    from src.batch_processor import resume_batch
+    from src.database import init_db
+    from src.hooks import HookRunner
+
+    init_db()
+    if run_id == 'last':
+        run = batch_journal.latest_incomplete_run()
+        if run is None:
+            print("Não há lotes por concluir.")
+            return
+        run_id = run['id']
+    else:
+        run = batch_journal.get_run(run_id)
+        if run is None:
+            print(f"Erro: Lote não encontrado: {run_id}", file=sys.stderr)
+            sys.exit(1)
+
+    print(f"A retomar lote {run_id}: {run['folder']} "
+          f"({run['done']} de {run['total']} ficheiro(s) já concluídos)")
+    hooks = HookRunner(run['config'])
+
+    def job(**kw):
+        results = resume_batch(run_id, hook_runner=hooks, **kw)
+        _print_hook_results(hooks.finish(run['folder']))
+        _wait_for_hooks()
+        return results
+
+    _run_batch_job(run_id, job)
+
+
+def _list_runs():
+    """Lista os lotes registados no diário."""
+    from src import batch_journal
+    from src.database import init_db
+
+    init_db()
+    runs = batch_journal.list_runs()
+    if not runs:
+        print("Sem lotes registados.")
+        return
+    for run in runs:
+        print(f"{run['id']}  {run['started_at'][:19]}  {run['status']:<9}  "
+              f"{run['done']}/{run['total']} ok, {run['failed']} erro(s)  {run['folder']}")
+
+
+def _list_schedule_runs(schedule_id: str = None, limit: int = 20):
+    """Lista as últimas execuções dos agendamentos (de todos ou de um)."""
+    from src import schedule_runs
+    from src.database import init_db
+
+    init_db()
+    runs = schedule_runs.recent_runs(None if schedule_id == 'all' else schedule_id, limit)
+    if not runs:
+        print("Sem execuções de agendamentos registadas.")
+        return
+    for run in runs:
+        duration = f"{run['duration']:.1f}s" if run['finished_at'] else '—'
+        print(f"{run['started_at'][:19]}  {run['schedule_id']:<12}  {run['status']:<8}  "
+              f"{duration:>8}  {run['files']} fich., {run['clients']} clientes, "
+              f"{run['failures']} falha(s)  {run['source']}")
+        if run['error']:
+            print(f"    {run['error']}")
+    if schedule_id and schedule_id != 'all':
+        stats = schedule_runs.duration_stats(schedule_id)
+        if stats['runs']:
+            print(f"Duração (últimas {stats['runs']}): média {stats['avg']:.1f}s, "
+                  f"mín {stats['min']:.1f}s, máx {stats['max']:.1f}s")
+
+
+def _list_hook_jobs(status: str = None, limit: int = 30):
+    """Lista os trabalhos da fila de hooks (de todos os estados ou de um)."""
+    from src import hook_queue
+    from src.database import init_db
+
+    init_db()
+    jobs = hook_queue.recent_jobs(None if status == 'all' else status, limit)
+    if not jobs:
+        print("Sem hooks na fila.")
+        return
+    for job in jobs:
+        print(f"{job['created_at'][:19]}  {job['status']:<8}  "
+              f"{job['attempts']}/{job['max_attempts']}  {job['hook_name'] or '—':<12}  "
+              f"{job['source']}")
+        if job['error']:
+            print(f"    {job['error']}")
+        if job['status'] == hook_queue.PENDING and job['attempts']:
+            print(f"    Próxima tentativa: {job['next_attempt_at'][:19]}")
+
+
+def _retry_hooks(config: dict):
+    """Repete os hooks falhados e executa os que estão na fila."""
+    from src import hook_queue
+    from src.database import init_db
+
+    init_db()
+    count = hook_queue.retry_failed()
+    print(f"{count} hook(s) falhado(s) de novo na fila.")
+    hook_queue.get_queue(config)
+    _wait_for_hooks()
+
+
+def _run_worker(args):
+    """Converte uma pasta partilhada em conjunto com outros workers (ver src.lease_worker)."""
+    import signal
+    from src.lease_worker import LeaseWorker
+    from src.progress import CancelToken
+
+    folder = args.input
     if not os.path.isdir(folder):
         print(f"Erro: Pasta não encontrada: {folder}", file=sys.stderr)
         sys.exit(1)
+    config = _load_cli_config(args)
+
+    def on_claimed(path):
+        print(f"[{worker.worker_id}] A converter: {os.path.relpath(path, folder)}")
+
+    def on_finished(result):
+        if result['success']:
+            print(f"[{worker.worker_id}] Convertido: {result['filename']}")
+        else:
+            print(f"[{worker.worker_id}] Erro em {result['filename']}: {result['error']}",
+                  file=sys.stderr)
+
+    worker = LeaseWorker(folder, config, args.mode or 'individual',
+                         worker_id=args.worker_id, lease_ttl=args.lease_ttl,
+                         on_claimed=on_claimed, on_finished=on_finished)
+    token = CancelToken()
+    signal.signal(signal.SIGINT, lambda sig, frame: token.cancel())
+    print(f"[{worker.worker_id}] Worker em {folder} (lease {worker.lease_ttl:.0f}s)")
+    results = worker.run(token)
+    ok = sum(1 for r in results if r['success'])
+    print(f"[{worker.worker_id}] Terminado: {ok} com sucesso, "
+          f"{len(results) - ok} com erro(s)")
+
+
+def _run_watch(folder: str, config: dict):
+    """Inicia monitorização de pastas no modo CLI (bloqueia até Ctrl+C).
+
+    Com ``folder`` monitoriza essa pasta; sem ela, as pastas configuradas em
+    ``automation.watch_folder`` / ``watch_folders`` (cada uma com o seu
+    perfil e modo), partilhando as mesmas threads de conversão.
+    """
+    import signal
+    from src.watch_manager import WatchManager, configured_folders, folder_config
+
+    if folder:
+        entries = [{'folder': folder, 'profile': '',
+                    'mode': config.get('automation', {}).get('watch_mode', 'individual')}]
+    else:
+        entries = configured_folders(config)
+        if not entries:
+            print("Erro: Nenhuma pasta configurada para monitorizar "
+                  "(automation.watch_folder / watch_folders)", file=sys.stderr)
+            sys.exit(1)
+    for entry in entries:
+        if not os.path.isdir(entry['folder']):
+            print(f"Erro: Pasta não encontrada: {entry['folder']}", file=sys.stderr)
+            sys.exit(1)
 
     def on_new(path):
         print(f"[watch] Novo ficheiro detectado: {os.path.basename(path)}")
@@ -119,15 +411,27 @@ def _run_watch(folder: str, config: dict):
     def on_error(path, msg):
         print(f"[watch] Erro em {os.path.basename(path)}: {msg}", file=sys.stderr)
 
-    interval = config.get('automation', {}).get('watch_interval', 5)
-    watcher = WatchFolder(folder, config, on_new_file=on_new,
-                          on_converted=on_converted, on_error=on_error,
-                          interval=interval)
-    watcher.start()
-    print(f"[watch] A monitorizar: {folder}  (Ctrl+C para parar)")
+    manager = WatchManager(config, on_new_file=on_new, on_converted=on_converted,
+                           on_error=on_error)
+    try:
+        for entry in entries:
+            manager.add_folder(entry['folder'], folder_config(config, entry))
+    except ValueError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        sys.exit(1)
+    manager.start()
+    for watcher in manager.watchers:
+        mode = watcher.config.get('automation', {}).get('watch_mode', 'individual')
+        print(f"[watch] A monitorizar: {watcher.folder_path}  [{watcher.backend}, {mode}]")
+    print("[watch] Ctrl+C para parar")
 
     def _stop(sig, frame):
-        watcher.stop()
+        manager.stop()
+        for path, metrics in manager.metrics()['folders'].items():
+            summary = f"{metrics['converted']} convertido(s), {metrics['failed']} com erro"
+            if metrics['time_to_pdf']:
+                summary += f", tempo médio até ao PDF {metrics['time_to_pdf']['avg']:.1f}s"
+            print(f"[watch] {path}: {summary}.")
         print("\n[watch] Monitorização terminada.")
         sys.exit(0)
 
@@ -136,7 +440,7 @@ def _run_watch(folder: str, config: dict):
 
     # Bloquear a thread principal
     import time
-    while watcher.is_running:
+    while manager.is_running:
         time.sleep(1)
 
 
@@ -147,23 +451,68 @@ def main():
         description='Conversor Excel → PDF',
     )
     parser.add_argument('input', nargs='?',
-                        help='Ficheiro Excel (.xlsx) ou pasta (com --watch)')
+                        help='Ficheiro Excel (.xlsx) ou pasta (lote, ou monitorização com --watch)')
     parser.add_argument('-o', '--output',
-                        help='Caminho de saída do PDF (modo aggregate)')
-    parser.add_argument('-m', '--mode', choices=['individual', 'aggregate'],
+                        help='Caminho de saída do PDF (modo aggregate) ou do .zip (modo zip)')
+    parser.add_argument('-m', '--mode', choices=['individual', 'zip', 'aggregate'],
                         default=None,
-                        help='Modo de geração: individual (default) ou aggregate')
+                        help='Modo de geração: individual (default), zip (PDFs individuais '
+                             'num arquivo .zip) ou aggregate')
     parser.add_argument('-p', '--profile',
                         help='Nome do perfil de configuração a usar')
     parser.add_argument('-c', '--config',
                         help='Caminho para ficheiro de configuração JSON')
     parser.add_argument('-w', '--watch', action='store_true',
-                        help='Monitorizar pasta e converter novos ficheiros automaticamente')
+                        help='Monitorizar pasta e converter novos ficheiros automaticamente '
+                             '(sem pasta: as pastas configuradas em automation.watch_folders)')
+    parser.add_argument('--estimate', action='store_true',
+                        help='Estimar a duração do lote antes de o converter '
+                             '(percorre a pasta primeiro)')
+    parser.add_argument('--resume', nargs='?', const='last', metavar='RUN_ID',
+                        help='Retomar um lote interrompido (sem RUN_ID: o mais recente)')
+    parser.add_argument('--runs', action='store_true',
+                        help='Listar os lotes registados')
+    parser.add_argument('--schedule-runs', nargs='?', const='all', metavar='ID',
+                        help='Listar as últimas execuções dos agendamentos '
+                             '(com ID: só desse agendamento, com estatísticas de duração)')
+    parser.add_argument('--hook-jobs', nargs='?', const='all', metavar='ESTADO',
+                        help='Listar a fila de hooks em segundo plano '
+                             '(ESTADO: pending, running, done ou failed)')
+    parser.add_argument('--retry-hooks', action='store_true',
+                        help='Repetir os hooks falhados e executar os que estão na fila')
+    parser.add_argument('--worker', action='store_true',
+                        help='Converter a pasta em conjunto com outros workers '
+                             '(pasta partilhada, ficheiros de lease)')
+    parser.add_argument('--worker-id',
+                        help='Identificador do worker (default: <máquina>-<pid>)')
+    parser.add_argument('--lease-ttl', type=float, default=None,
+                        help='Segundos sem renovação após os quais um lease é recuperado')
+    parser.add_argument('--isolate', action='store_true',
+                        help='Converter cada ficheiro num processo próprio')
+    parser.add_argument('--timeout', type=float, default=None, metavar='SEGUNDOS',
+                        help='Tempo máximo por ficheiro (implica --isolate)')
+    parser.add_argument('--memory-limit', type=int, default=None, metavar='MB',
+                        help='Memória máxima por ficheiro (implica --isolate)')
 
     args = parser.parse_args()
 
-    if args.input:
+    if args.resume:
+        _run_resume(args.resume)
+    elif args.runs:
+        _list_runs()
+    elif args.schedule_runs:
+        _list_schedule_runs(args.schedule_runs)
+    elif args.hook_jobs:
+        _list_hook_jobs(args.hook_jobs)
+    elif args.retry_hooks:
+        _retry_hooks(_load_cli_config(args))
+    elif args.input and args.worker:
+        _run_worker(args)
+    elif args.input:
         _run_cli(args)
+    elif args.watch:
+        # Sem pasta: monitorizar as pastas configuradas
+        _run_watch(None, _load_cli_config(args))
     else:
         # Modo GUI
         from src.gui.app import ConverterApp
@@ -172,4 +521,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # Num executável PyInstaller, os processos filhos (pool de conversão,
+    # conversão isolada) voltam a correr este ficheiro: freeze_support()
+    # executa o trabalho do filho em vez de abrir outra GUI/CLI
+    multiprocessing.freeze_support()
     main()
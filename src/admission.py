@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de controlo de admissão por memória.
+
+As conversões que correm ao mesmo tempo (lote, pasta monitorizada e
+agendamentos) partilham um orçamento de memória. Antes de começar, cada
+conversão estima o seu pico de memória e só arranca enquanto a soma das
+estimativas em curso couber no orçamento (``resources.memory_budget_mb``).
+Uma conversão sozinha é sempre admitida, mesmo que a estimativa exceda o
+orçamento, para que nenhum ficheiro fique bloqueado para sempre.
+
+A estimativa usa o tamanho do ficheiro (o openpyxl ocupa em memória cerca de
+50 vezes o tamanho do .xlsx) e o número de linhas — o registado no histórico
+da última conversão do mesmo ficheiro ou, na falta dele, a dimensão da folha.
+O número de linhas fica em cache por ficheiro (tamanho e mtime), e
+``convert_file`` regista nela as linhas efectivamente lidas. Uma conversão
+sem nenhuma outra em curso usa só o tamanho do ficheiro, sem consultar o
+histórico nem abrir o workbook: é sempre admitida.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from src import zip_input
+from src.progress import check_cancelled
+
+
+MB = 1024 * 1024
+
+# Memória fixa de uma conversão (workbook vazio, estilos, ReportLab)
+BASE_MEMORY = 40 * MB
+# Memória do workbook carregado por byte do ficheiro Excel
+WORKBOOK_FACTOR = 50
+# Memória por linha de dados (dicionário normalizado e elementos do PDF)
+ROW_MEMORY = 8 * 1024
+# Fracção da memória física usada quando o orçamento é automático
+AUTO_BUDGET_FRACTION = 0.5
+# Número máximo de ficheiros na cache de linhas
+_ROWS_CACHE_SIZE = 1024
+
+_rows_cache = {}
+_rows_lock = threading.Lock()
+
+
+def physical_memory() -> int:
+    """Memória física total da máquina em bytes (0 se não for possível saber)."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        pass
+    try:
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong),
+                        ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong),
+                        ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong),
+                        ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return int(status.ullTotalPhys)
+    except (AttributeError, OSError):
+        pass
+    return 0
+
+
+def memory_budget(config: dict) -> int:
+    """Orçamento de memória em bytes a partir de ``config['resources']``.
+
+    ``memory_budget_mb`` > 0 é usado tal como está; 0 usa metade da memória
+    física; < 0 desliga o controlo. Devolve 0 quando não há limite.
+    """
+    budget_mb = (config or {}).get('resources', {}).get('memory_budget_mb', 0)
+    try:
+        budget_mb = int(budget_mb)
+    except (TypeError, ValueError):
+        budget_mb = 0
+    if budget_mb < 0:
+        return 0
+    if budget_mb > 0:
+        return budget_mb * MB
+    return int(physical_memory() * AUTO_BUDGET_FRACTION)
+
+
+def _history_rows(excel_path: str) -> int:
+    """Número de linhas registado no histórico para ``excel_path`` (0 se não houver)."""
+    from src.database import _get_db_path, get_latest_timings
+    if not os.path.exists(_get_db_path()):
+        return 0
+    try:
+        timings = get_latest_timings(excel_path)
+    except sqlite3.Error:
+        return 0
+    return int(timings.get('counts', {}).get('rows', 0))
+
+
+def _sheet_rows(excel_path: str) -> int:
+    """Número de linhas declarado na dimensão das folhas (0 se não for legível)."""
+    if not excel_path.lower().endswith(('.xlsx', '.xlsm')):
+        return 0
+    try:
+        from openpyxl import load_workbook
+        wb = load_workbook(zip_input.workbook_source(excel_path), read_only=True)
+        try:
+            return sum(ws.max_row or 0 for ws in wb.worksheets)
+        finally:
+            wb.close()
+    except Exception:
+        return 0
+
+
+def _rows_key(excel_path: str):
+    try:
+        st = zip_input.source_stat(excel_path)
+    except OSError:
+        return None
+    return (excel_path, st.st_size, st.st_mtime_ns)
+
+
+def remember_rows(excel_path: str, rows: int):
+    """Guarda na cache o número de linhas de um Excel (ex: o lido na conversão)."""
+    key = _rows_key(excel_path)
+    if key is None:
+        return
+    with _rows_lock:
+        if len(_rows_cache) >= _ROWS_CACHE_SIZE:
+            _rows_cache.clear()
+        _rows_cache[key] = rows
+
+
+def estimate_rows(excel_path: str) -> int:
+    """Estima o número de linhas de um Excel (cache, histórico e depois a folha)."""
+    key = _rows_key(excel_path)
+    with _rows_lock:
+        rows = _rows_cache.get(key)
+    if rows is None:
+        rows = _history_rows(excel_path) or _sheet_rows(excel_path)
+        remember_rows(excel_path, rows)
+    return rows
+
+
+def estimate_peak_memory(excel_path: str, rows: int = None) -> int:
+    """Estima o pico de memória (bytes) da conversão de um ficheiro Excel.
+
+    Args:
+        excel_path: Caminho do ficheiro Excel.
+        rows: Número de linhas, se já for conhecido (senão é estimado).
+    """
+    size = zip_input.source_size(excel_path)
+    if rows is None:
+        rows = estimate_rows(excel_path)
+    return BASE_MEMORY + size * WORKBOOK_FACTOR + rows * ROW_MEMORY
+
+
+class AdmissionController:
+    """Admite conversões enquanto a memória estimada em curso cabe no orçamento.
+
+    Args:
+        budget: Orçamento em bytes (0 = sem limite).
+    """
+
+    def __init__(self, budget: int = 0):
+        self.budget = budget
+        self.in_use = 0
+        self.running = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def _fits(self, cost: int) -> bool:
+        return (not self.budget or self.running == 0
+                or self.in_use + cost <= self.budget)
+
+    def try_acquire(self, cost: int) -> bool:
+        """Reserva ``cost`` bytes se couberem no orçamento, sem esperar."""
+        with self._cond:
+            if not self._fits(cost):
+                return False
+            self.in_use += cost
+            self.running += 1
+            return True
+
+    def acquire(self, cost: int, cancel_token=None, poll: float = 0.2):
+        """Espera até ``cost`` bytes caberem no orçamento e reserva-os.
+
+        Raises:
+            ConversionCancelled: Se ``cancel_token`` for cancelado durante a espera.
+        """
+        with self._cond:
+            self.waiting += 1
+            try:
+                while not self._fits(cost):
+                    check_cancelled(cancel_token)
+                    self._cond.wait(poll)
+            finally:
+                self.waiting -= 1
+            self.in_use += cost
+            self.running += 1
+
+    def release(self, cost: int):
+        """Devolve ao orçamento uma reserva feita com acquire/try_acquire."""
+        with self._cond:
+            self.in_use = max(0, self.in_use - cost)
+            self.running = max(0, self.running - 1)
+            self._cond.notify_all()
+
+    def wait(self, timeout: float):
+        """Espera por uma libertação (ou ``timeout`` segundos)."""
+        with self._cond:
+            self._cond.wait(timeout)
+
+    @contextmanager
+    def admit(self, cost: int, cancel_token=None):
+        """Contexto que reserva ``cost`` bytes durante o bloco ``with``."""
+        self.acquire(cost, cancel_token)
+        try:
+            yield cost
+        finally:
+            self.release(cost)
+
+    def snapshot(self) -> dict:
+        """Estado actual: orçamento, memória reservada, conversões em curso e em espera."""
+        with self._cond:
+            return {'budget': self.budget, 'in_use': self.in_use,
+                    'running': self.running, 'waiting': self.waiting}
+
+
+# Controlador partilhado por lote, pasta monitorizada e agendamentos
+_controller = AdmissionController()
+
+
+def get_controller(config: dict = None) -> AdmissionController:
+    """Devolve o controlador partilhado, actualizando o orçamento a partir de ``config``."""
+    if config is not None:
+        budget = memory_budget(config)
+        with _controller._cond:
+            _controller.budget = budget
+            _controller._cond.notify_all()
+    return _controller
+
+
+@contextmanager
+def admitted(excel_path: str, config: dict, cancel_token=None):
+    """Contexto que só entra quando a conversão de ``excel_path`` cabe no orçamento.
+
+    Raises:
+        ConversionCancelled: Se ``cancel_token`` for cancelado durante a espera.
+    """
+    controller = get_controller(config)
+    cost = 0
+    if controller.budget:
+        # Sozinha é sempre admitida: basta a estimativa pelo tamanho, sem
+        # consultar o histórico nem abrir o workbook
+        rows = 0 if controller.running == 0 else None
+        cost = estimate_peak_memory(excel_path, rows)
+    with controller.admit(cost, cancel_token):
+        yield cost
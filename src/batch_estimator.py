@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de estimativa da duração de lotes.
+
+Antes de lançar um lote, percorre a pasta sem converter nada (dry-run),
+estima o número de linhas de cada ficheiro e calcula a duração a partir do
+débito registado na base de dados:
+
+- segundos por linha — leitura do workbook, cabeçalhos e normalização;
+- segundos por cliente — construção e escrita dos PDFs.
+
+Sem histórico para o modo pedido são usados débitos de referência. Cada
+lote lançado guarda a sua estimativa no diário, o que permite medir a
+precisão das estimativas ao longo do tempo (``estimate_accuracy``).
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+
+from src import admission, batch_journal, zip_input
+from src.batch_processor import discover_excel_files, resolve_workers
+
+
+# Fases que dependem do número de linhas e do número de clientes
+ROW_PHASES = ('load', 'header_detection', 'row_normalization')
+CLIENT_PHASES = ('flowables', 'pdf_build', 'encryption', 'archive')
+
+# Débitos de referência (segundos) quando não há histórico
+DEFAULT_RATES = {
+    'individual': {'row': 0.0005, 'client': 0.03},
+    'zip': {'row': 0.0005, 'client': 0.03},
+    'aggregate': {'row': 0.0005, 'client': 0.004},
+}
+
+# Bytes por linha de um .xlsx, para ficheiros cuja dimensão não é legível
+BYTES_PER_ROW = 60
+
+# Número de conversões recentes usadas para calcular o débito
+THROUGHPUT_SAMPLES = 200
+
+
+def _base_mode(mode: str) -> str:
+    """'batch_individual' -> 'individual' (modos gravados no histórico)."""
+    return mode[len('batch_'):] if mode.startswith('batch_') else mode
+
+
+def throughput(mode: str, limit: int = THROUGHPUT_SAMPLES) -> dict:
+    """Débito por linha e por cliente de um modo, a partir do histórico.
+
+    Returns:
+        ``{'row': s, 'client': s, 'samples': n, 'source': 'history'|'default'}``
+    """
+    from src.database import get_recent_timings
+    try:
+        entries = get_recent_timings(limit)
+    except sqlite3.Error:
+        entries = []
+
+    row_secs = client_secs = 0.0
+    rows = clients = samples = 0
+    for entry in entries:
+        if _base_mode(entry['mode']) != mode:
+            continue
+        phases = entry['timings'].get('phases', {})
+        counts = entry['timings'].get('counts', {})
+        if not counts.get('rows') or not counts.get('clients'):
+            continue
+        row_secs += sum(phases.get(p, 0) for p in ROW_PHASES)
+        client_secs += sum(phases.get(p, 0) for p in CLIENT_PHASES)
+        rows += counts['rows']
+        clients += counts['clients']
+        samples += 1
+
+    default = DEFAULT_RATES.get(mode, DEFAULT_RATES['individual'])
+    if not samples:
+        return {'row': default['row'], 'client': default['client'],
+                'samples': 0, 'source': 'default'}
+    return {'row': row_secs / rows, 'client': client_secs / clients,
+            'samples': samples, 'source': 'history'}
+
+
+def sample_rows(excel_path: str) -> int:
+    """Estima as linhas de dados de um ficheiro sem o carregar por completo.
+
+    Usa o histórico ou a dimensão da folha (ver ``admission.estimate_rows``)
+    e, em último caso, o tamanho do ficheiro.
+    """
+    rows = admission.estimate_rows(excel_path)
+    if rows:
+        return rows
+    size = zip_input.source_size(excel_path)
+    return max(1, size // BYTES_PER_ROW) if size else 0
+
+
+def estimate_batch(folder_path: str, config: dict, mode: str = 'individual',
+                   workers: int = None) -> dict:
+    """Estima a duração de um lote sem converter nenhum ficheiro.
+
+    Args:
+        folder_path: Pasta do lote (a descoberta segue ``config['batch']``).
+        config: Configurações da aplicação.
+        mode: 'individual', 'zip' ou 'aggregate'.
+        workers: Processos em paralelo (default: ``batch.workers``).
+
+    Returns:
+        ``{'files': [{file, filename, size, rows, seconds}], 'rows', 'seconds',
+        'wall_seconds', 'workers', 'rates'}``. ``seconds`` é o tempo de
+        conversão somado; ``wall_seconds`` conta com os processos em paralelo.
+    """
+    rates = throughput(mode)
+    files = []
+    for excel_path in discover_excel_files(folder_path, config):
+        rows = sample_rows(excel_path)
+        size = zip_input.source_size(excel_path)
+        files.append({
+            'file': excel_path,
+            'filename': os.path.relpath(excel_path, folder_path),
+            'size': size,
+            'rows': rows,
+            # Cada linha de dados corresponde a um cliente
+            'seconds': rows * (rates['row'] + rates['client']),
+        })
+
+    workers = min(resolve_workers(config, workers), max(len(files), 1))
+    seconds = sum(f['seconds'] for f in files)
+    longest = max((f['seconds'] for f in files), default=0)
+    return {
+        'files': files,
+        'rows': sum(f['rows'] for f in files),
+        'seconds': seconds,
+        'wall_seconds': max(seconds / workers, longest),
+        'workers': workers,
+        'rates': rates,
+    }
+
+
+def estimate_accuracy(limit: int = 20) -> dict:
+    """Compara as estimativas dos lotes concluídos com a duração real.
+
+    Returns:
+        ``{'runs': [{id, estimated, actual, error}], 'mean_error': float|None}``.
+        ``error`` é o erro relativo (0.25 = 25%); ``mean_error`` é a média
+        dos erros absolutos, ou None se ainda não houver lotes medidos.
+    """
+    runs = []
+    for run in batch_journal.list_runs(limit):
+        if (run['status'] != batch_journal.RUN_COMPLETED or not run['finished_at']
+                or not run['estimated_seconds']):
+            continue
+        actual = (datetime.fromisoformat(run['finished_at'])
+                  - datetime.fromisoformat(run['started_at'])).total_seconds()
+        if actual <= 0:
+            continue
+        runs.append({
+            'id': run['id'],
+            'estimated': run['estimated_seconds'],
+            'actual': actual,
+            'error': (run['estimated_seconds'] - actual) / actual,
+        })
+    mean_error = sum(abs(r['error']) for r in runs) / len(runs) if runs else None
+    return {'runs': runs, 'mean_error': mean_error}
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de diário (journal) de lotes.
+
+Regista cada execução de ``process_batch`` em SQLite para que um lote
+interrompido (ex: reinício da máquina a meio de 500 ficheiros) possa ser
+retomado sem reconverter o que já estava feito.
+
+Tabelas:
+- ``batch_runs`` — uma linha por execução (pasta, modo, configuração, estado).
+- ``batch_jobs`` — uma linha por ficheiro com o estado
+  (pending/running/done/failed), o hash SHA-256 do conteúdo de entrada
+  e os caminhos de saída.
+
+Ao retomar, um ficheiro é saltado se estiver ``done``, o hash actual
+coincidir com o registado e as saídas ainda existirem.
+
+A configuração é guardada sem segredos (chaves com ``password`` no nome,
+ex: ``security.pdf_password``); ao retomar, são lidos da configuração
+actual (ver ``restore_secrets``).
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+
+from src import zip_input
+from src.database import _get_connection
+
+
+# Estados de um ficheiro no diário
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Estados de uma execução
+RUN_RUNNING = 'running'
+RUN_COMPLETED = 'completed'
+RUN_CANCELLED = 'cancelled'
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Calcula o SHA-256 do conteúdo de um ficheiro.
+
+    Returns:
+        Hash em hexadecimal, ou '' se o ficheiro não puder ser lido.
+    """
+    digest = hashlib.sha256()
+    try:
+        with zip_input.open_source(path) as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    except OSError:
+        return ''
+    return digest.hexdigest()
+
+
+def _is_secret(key) -> bool:
+    return 'password' in str(key).lower()
+
+
+def strip_secrets(config: dict) -> dict:
+    """Cópia da configuração sem as chaves secretas (passwords), a qualquer nível."""
+    return {key: strip_secrets(value) if isinstance(value, dict) else value
+            for key, value in config.items() if not _is_secret(key)}
+
+
+def restore_secrets(stored: dict, live: dict) -> dict:
+    """Repõe numa configuração guardada os segredos da configuração actual.
+
+    Args:
+        stored: Configuração de uma execução (sem segredos, ver strip_secrets).
+        live:   Configuração actual da aplicação.
+    """
+    config = dict(stored)
+    for key, value in (live or {}).items():
+        if _is_secret(key):
+            config[key] = value
+        elif isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key] = restore_secrets(config[key], value)
+    return config
+
+
+# ============================================
+# EXECUÇÕES
+# ============================================
+
+def start_run(folder_path: str, mode: str, config: dict) -> str:
+    """Regista uma nova execução de lote (a configuração sem segredos).
+
+    Returns:
+        Identificador da execução (run id).
+    """
+    run_id = uuid.uuid4().hex[:12]
+    conn = _get_connection()
+    try:
+        conn.execute(
+            """INSERT INTO batch_runs (id, folder, mode, config, status, started_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (run_id, os.path.abspath(folder_path), mode,
+             json.dumps(strip_secrets(config), default=str, ensure_ascii=False),
+             RUN_RUNNING, datetime.now().isoformat()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return run_id
+
+
+def set_run_status(run_id: str, status: str):
+    """Actualiza o estado de uma execução.
+
+    ``completed``/``cancelled`` registam a hora de fim; ``running`` (ao retomar)
+    limpa-a.
+    """
+    finished_at = None if status == RUN_RUNNING else datetime.now().isoformat()
+    conn = _get_connection()
+    try:
+        conn.execute(
+            "UPDATE batch_runs SET status = ?, finished_at = ? WHERE id = ?",
+            (status, finished_at, run_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def set_estimate(run_id: str, seconds: float):
+    """Regista a duração estimada de uma execução (ver ``src.batch_estimator``)."""
+    conn = _get_connection()
+    try:
+        conn.execute("UPDATE batch_runs SET estimated_seconds = ? WHERE id = ?",
+                     (seconds, run_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _run_row_to_dict(row) -> dict:
+    return {
+        'id': row['id'],
+        'folder': row['folder'],
+        'mode': row['mode'],
+        'config': json.loads(row['config']),
+        'status': row['status'],
+        'started_at': row['started_at'],
+        'finished_at': row['finished_at'] or '',
+        'estimated_seconds': row['estimated_seconds'],
+        'total': row['total'],
+        'done': row['done'],
+        'failed': row['failed'],
+    }
+
+
+_RUN_SELECT = """
+    SELECT r.*,
+           COUNT(j.file) AS total,
+           COALESCE(SUM(j.state = 'done'), 0) AS done,
+           COALESCE(SUM(j.state = 'failed'), 0) AS failed
+    FROM batch_runs r LEFT JOIN batch_jobs j ON j.run_id = r.id
+"""
+
+
+def get_run(run_id: str) -> dict:
+    """Devolve uma execução (com contagens por estado), ou None se não existir."""
+    conn = _get_connection()
+    try:
+        row = conn.execute(_RUN_SELECT + " WHERE r.id = ? GROUP BY r.id", (run_id,)).fetchone()
+    finally:
+        conn.close()
+    return _run_row_to_dict(row) if row else None
+
+
+def list_runs(limit: int = 20) -> list:
+    """Devolve as execuções mais recentes, da mais recente para a mais antiga."""
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            _RUN_SELECT + " GROUP BY r.id ORDER BY r.started_at DESC, r.rowid DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [_run_row_to_dict(r) for r in rows]
+
+
+def latest_incomplete_run(folder_path: str = None) -> dict:
+    """Devolve a execução mais recente por concluir (opcionalmente por pasta).
+
+    Uma execução está por concluir se não terminou (interrompida ou cancelada)
+    ou se terminou com ficheiros falhados.
+    """
+    conn = _get_connection()
+    try:
+        sql = _RUN_SELECT
+        params = []
+        if folder_path:
+            sql += " WHERE r.folder = ?"
+            params.append(os.path.abspath(folder_path))
+        sql += (" GROUP BY r.id HAVING r.status != ? OR failed > 0"
+                " ORDER BY r.started_at DESC, r.rowid DESC LIMIT 1")
+        params.append(RUN_COMPLETED)
+        row = conn.execute(sql, params).fetchone()
+    finally:
+        conn.close()
+    return _run_row_to_dict(row) if row else None
+
+
+# ============================================
+# FICHEIROS
+# ============================================
+
+def add_pending(run_id: str, files: list):
+    """Regista ficheiros descobertos que ainda não foram convertidos.
+
+    Ficheiros já registados na execução mantêm o estado que tinham.
+    """
+    now = datetime.now().isoformat()
+    conn = _get_connection()
+    try:
+        conn.executemany(
+            """INSERT OR IGNORE INTO batch_jobs (run_id, file, state, updated_at)
+               VALUES (?, ?, ?, ?)""",
+            [(run_id, os.path.abspath(f), PENDING, now) for f in files],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def mark_running(run_id: str, excel_path: str, input_hash: str):
+    """Regista o início da conversão de um ficheiro."""
+    conn = _get_connection()
+    try:
+        conn.execute(
+            """INSERT INTO batch_jobs (run_id, file, state, input_hash, updated_at)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(run_id, file) DO UPDATE SET
+                   state = excluded.state, input_hash = excluded.input_hash,
+                   error = '', updated_at = excluded.updated_at""",
+            (run_id, os.path.abspath(excel_path), RUNNING, input_hash,
+             datetime.now().isoformat()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def mark_finished(run_id: str, result: dict, input_hash: str):
+    """Regista o resultado de um ficheiro (formato de ``process_batch``)."""
+    state = DONE if result['success'] else FAILED
+    outputs = result.get('outputs')
+    if outputs is None:
+        outputs = [result['output_path']] if result.get('output_path') else []
+    conn = _get_connection()
+    try:
+        conn.execute(
+            """INSERT INTO batch_jobs (run_id, file, state, input_hash, output_path,
+                   outputs, clients_count, cache_hits, error, duplicate_of, timings,
+                   updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(run_id, file) DO UPDATE SET
+                   state = excluded.state, input_hash = excluded.input_hash,
+                   output_path = excluded.output_path, outputs = excluded.outputs,
+                   clients_count = excluded.clients_count,
+                   cache_hits = excluded.cache_hits, error = excluded.error,
+                   duplicate_of = excluded.duplicate_of, timings = excluded.timings,
+                   updated_at = excluded.updated_at""",
+            (run_id, os.path.abspath(result['file']), state, input_hash,
+             result.get('output_path', ''),
+             json.dumps(outputs, ensure_ascii=False), result.get('clients_count', 0),
+             result.get('cache_hits', 0), result.get('error', ''),
+             result.get('duplicate_of', ''),
+             json.dumps(result.get('timings') or {}, ensure_ascii=False),
+             datetime.now().isoformat()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_jobs(run_id: str) -> list:
+    """Devolve os ficheiros registados numa execução."""
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT * FROM batch_jobs WHERE run_id = ? ORDER BY rowid", (run_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{
+        'file': r['file'],
+        'state': r['state'],
+        'input_hash': r['input_hash'],
+        'output_path': r['output_path'],
+        'outputs': json.loads(r['outputs']),
+        'clients_count': r['clients_count'],
+        'cache_hits': r['cache_hits'],
+        'error': r['error'],
+        'duplicate_of': r['duplicate_of'],
+        'timings': json.loads(r['timings']) if r['timings'] else {},
+        'updated_at': r['updated_at'],
+    } for r in rows]
+
+
+def completed_result(job: dict, input_hash: str) -> dict:
+    """Devolve o resultado guardado de um ficheiro que pode ser saltado.
+
+    Args:
+        job: Entrada de ``get_jobs``.
+        input_hash: Hash actual do ficheiro de entrada.
+
+    Returns:
+        Resultado no formato de ``process_batch``, ou None se o ficheiro tiver
+        de ser convertido de novo (não concluído, entrada alterada ou saídas
+        em falta).
+    """
+    if job.get('state') != DONE or not input_hash or job.get('input_hash') != input_hash:
+        return None
+    if not all(os.path.exists(p) for p in job['outputs']):
+        return None
+    return {
+        'file': job['file'],
+        'filename': zip_input.display_name(job['file']),
+        'success': True,
+        'output_path': job['output_path'],
+        'outputs': list(job['outputs']),
+        'clients_count': job['clients_count'],
+        'cache_hits': job['cache_hits'],
+        'error': '',
+        'duplicate_of': job['duplicate_of'],
+        'timings': job.get('timings', {}),
+    }
+
+
+def delete_run(run_id: str):
+    """Apaga uma execução e os respectivos ficheiros do diário."""
+    conn = _get_connection()
+    try:
+        conn.execute("DELETE FROM batch_jobs WHERE run_id = ?", (run_id,))
+        conn.execute("DELETE FROM batch_runs WHERE id = ?", (run_id,))
+        conn.commit()
+    finally:
+        conn.close()
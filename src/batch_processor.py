@@ -5,9 +5,20 @@ Módulo de processamento em lote de ficheiros Excel.
 Processa múltiplos ficheiros de uma pasta e gera PDFs para cada um.
 """
 
+import fnmatch
 import os
+import shutil
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime
 
+from src import admission, batch_journal, isolation, zip_input
 from src.converter import ExcelToPDFConverter
+from src.progress import ConversionCancelled
+from src.timing import timings_of
+
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xls', '.xlsm')
 
 
 def find_excel_files(folder_path: str) -> list:
@@ -25,77 +36,716 @@ def find_excel_files(folder_path: str) -> list:
     Raises:
         ValueError: Se a pasta não existir.
     """
+    return list(iter_excel_files(folder_path))
+
+
+def iter_excel_files(folder_path: str, recursive: bool = False, include=None,
+                     exclude=None, max_depth: int = None, min_size: int = None,
+                     max_size: int = None, modified_after: float = None,
+                     modified_before: float = None, archives: bool = False):
+    """Percorre uma pasta com ``os.scandir`` e produz os ficheiros Excel encontrados.
+
+    É um gerador: a conversão pode começar antes de a descoberta terminar.
+    Em cada pasta os ficheiros são produzidos por ordem de nome, antes das
+    subpastas. Os filtros de tamanho e data usam o ``stat`` guardado em cada
+    ``DirEntry``, pelo que só é feito um ``stat`` por ficheiro candidato (e
+    nenhum se não houver filtros desses).
+
+    Args:
+        folder_path: Pasta a percorrer.
+        recursive: Descer às subpastas.
+        include: Padrões glob (ex: ``'2024-*/*.xlsx'``); se indicados, só os
+                 ficheiros que coincidam com algum são incluídos.
+        exclude: Padrões glob a excluir. Pastas que coincidam não são percorridas.
+        max_depth: Profundidade máxima (0 = só a pasta indicada; None = sem limite).
+        min_size, max_size: Limites de tamanho em bytes.
+        modified_after, modified_before: Limites de data de modificação (timestamp).
+        archives: Tratar os arquivos .zip como pastas: cada workbook dentro
+                  de um arquivo é produzido como caminho de membro
+                  (``pacote.zip!contas.xlsx``, ver ``src.zip_input``).
+
+    Os padrões são comparados com o caminho relativo a ``folder_path``
+    (separador ``/``) e com o nome do ficheiro. Para membros de arquivos o
+    caminho relativo é ``pacote.zip!membro``, o tamanho é o descomprimido e
+    a data é a do arquivo.
+
+    Raises:
+        ValueError: Se a pasta não existir (lançado de imediato, não na iteração).
+    """
     if not os.path.isdir(folder_path):
         raise ValueError(f"Pasta não encontrada: {folder_path}")
+    if not recursive:
+        max_depth = 0
+    return _walk_excel_files(folder_path, '', 0, list(include or []), list(exclude or []),
+                             max_depth, min_size, max_size, modified_after, modified_before,
+                             archives)
+
+
+def _matches(rel_path: str, name: str, patterns: list) -> bool:
+    """Indica se o caminho relativo ou o nome coincidem com algum padrão glob."""
+    return any(fnmatch.fnmatch(rel_path, p) or fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def _walk_excel_files(root: str, rel_dir: str, depth: int, include: list, exclude: list,
+                      max_depth, min_size, max_size, modified_after, modified_before,
+                      archives=False):
+    """Gerador recursivo usado por iter_excel_files."""
+    try:
+        with os.scandir(os.path.join(root, rel_dir) if rel_dir else root) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except OSError:
+        return
+
+    need_stat = any(v is not None for v in (min_size, max_size, modified_after, modified_before))
+    subdirs = []
 
-    files = []
-    for name in sorted(os.listdir(folder_path)):
-        if name.startswith('~$'):
+    for entry in entries:
+        rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir:
+            if (max_depth is None or depth < max_depth) and not _matches(rel_path, entry.name, exclude):
+                subdirs.append(rel_path)
+            continue
+
+        name = entry.name
+        if archives and zip_input.is_archive(name):
+            if not _matches(rel_path, name, exclude):
+                yield from _archive_members(entry, rel_path, include, exclude, min_size,
+                                            max_size, modified_after, modified_before)
+            continue
+        if name.startswith('~$') or not name.lower().endswith(EXCEL_EXTENSIONS):
+            continue
+        if include and not _matches(rel_path, name, include):
+            continue
+        if exclude and _matches(rel_path, name, exclude):
+            continue
+        if need_stat:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if min_size is not None and st.st_size < min_size:
+                continue
+            if max_size is not None and st.st_size > max_size:
+                continue
+            if modified_after is not None and st.st_mtime < modified_after:
+                continue
+            if modified_before is not None and st.st_mtime > modified_before:
+                continue
+        yield os.path.join(root, rel_dir, name) if rel_dir else os.path.join(root, name)
+
+    for rel_path in subdirs:
+        yield from _walk_excel_files(root, rel_path, depth + 1, include, exclude, max_depth,
+                                     min_size, max_size, modified_after, modified_before,
+                                     archives)
+
+
+def _archive_members(entry, rel_path: str, include: list, exclude: list, min_size,
+                     max_size, modified_after, modified_before):
+    """Produz os caminhos de membro dos workbooks de um arquivo (ver iter_excel_files)."""
+    if modified_after is not None or modified_before is not None:
+        try:
+            mtime = entry.stat().st_mtime
+        except OSError:
+            return
+        if modified_after is not None and mtime < modified_after:
+            return
+        if modified_before is not None and mtime > modified_before:
+            return
+    for member, info in zip_input.iter_members(entry.path):
+        member_rel = zip_input.member_path(rel_path, member)
+        name = member.rsplit('/', 1)[-1]
+        if include and not _matches(member_rel, name, include):
             continue
-        if name.lower().endswith(('.xlsx', '.xls', '.xlsm')):
-            files.append(os.path.join(folder_path, name))
-    return files
+        if exclude and _matches(member_rel, name, exclude):
+            continue
+        if min_size is not None and info.file_size < min_size:
+            continue
+        if max_size is not None and info.file_size > max_size:
+            continue
+        yield zip_input.member_path(entry.path, member)
+
+
+def _parse_date(value: str, field: str):
+    """Converte uma data ISO (``AAAA-MM-DD``) da configuração para timestamp."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Data inválida em batch.{field}: {value}")
+
+
+def discover_excel_files(folder_path: str, config: dict):
+    """Aplica as opções de descoberta de ``config['batch']`` a iter_excel_files.
+
+    Opções: ``recursive``, ``include``, ``exclude``, ``max_depth`` (0 = sem
+    limite), ``min_size``/``max_size`` (bytes, 0 = sem limite),
+    ``modified_after``/``modified_before`` (datas ISO, '' = sem limite) e
+    ``archives`` (converter os workbooks dentro de arquivos .zip; desligado
+    por omissão, para não converter os ZIP gerados por lotes anteriores).
+    """
+    opts = config.get('batch', {})
+    return iter_excel_files(
+        folder_path,
+        recursive=opts.get('recursive', False),
+        include=opts.get('include') or None,
+        exclude=opts.get('exclude') or None,
+        max_depth=opts.get('max_depth') or None,
+        min_size=opts.get('min_size') or None,
+        max_size=opts.get('max_size') or None,
+        modified_after=_parse_date(opts.get('modified_after', ''), 'modified_after'),
+        modified_before=_parse_date(opts.get('modified_before', ''), 'modified_before'),
+        archives=opts.get('archives', False),
+    )
+
+
+def resolve_workers(config: dict, workers: int = None) -> int:
+    """Determina o número de processos a usar num lote.
+
+    Args:
+        config: Configurações da aplicação (``batch.workers``).
+        workers: Valor explícito que sobrepõe a configuração.
+
+    Returns:
+        Número de processos (>= 1). ``0`` na configuração significa um
+        processo por CPU.
+    """
+    if workers is None:
+        workers = config.get('batch', {}).get('workers', 1)
+    try:
+        workers = int(workers)
+    except (TypeError, ValueError):
+        workers = 1
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(workers, 1)
+
+
+def largest_first(files: list) -> list:
+    """Devolve os índices de ``files`` ordenados do maior para o menor ficheiro.
+
+    Agendar os ficheiros maiores primeiro reduz o tempo total de um lote
+    paralelo, evitando que um ficheiro grande fique sozinho no fim.
+    """
+    def size(i):
+        try:
+            return zip_input.source_size(files[i])
+        except OSError:
+            return 0
+    return sorted(range(len(files)), key=lambda i: (-size(i), i))
 
 
 def process_batch(folder_path: str, config: dict, mode: str = 'individual',
-                  progress_callback=None) -> list:
+                  progress_callback=None, client_progress_callback=None,
+                  cancel_token=None, workers: int = None, run_id: str = None,
+                  hook_runner=None) -> list:
     """Processa todos os ficheiros Excel de uma pasta.
 
     Args:
         folder_path: Pasta com os ficheiros Excel.
-        config: Configurações da aplicação.
-        mode: 'individual' (1 PDF por cliente) ou 'aggregate' (1 PDF por ficheiro).
+        config: Configurações da aplicação. As opções de descoberta (subpastas,
+                padrões, limites) vêm de ``config['batch']`` (ver
+                discover_excel_files).
+        mode: 'individual' (1 PDF por cliente), 'zip' (PDFs por cliente num arquivo
+              ``PDFs_<mes>.zip``, sem ficheiros intermédios) ou 'aggregate'
+              (1 PDF por ficheiro).
         progress_callback: Função chamada a cada ficheiro com (current, total, filename).
                            current=0..total-1 antes do ficheiro, current=total depois do último.
+                           Com ``batch.recursive`` (e um só processo) a conversão
+                           começa antes de a descoberta terminar e ``total`` é o
+                           número de ficheiros encontrados até ao momento.
+        client_progress_callback: Função chamada com (filename, info) durante a
+                                  conversão de cada ficheiro, com o dicionário de
+                                  progresso por cliente (ver ``src.progress``).
+        cancel_token: ``CancelToken`` para interromper o lote. O ficheiro em curso é
+                      registado como falhado e os restantes não são processados.
+        workers: Número de processos em paralelo (default: ``batch.workers``;
+                 0 = um por CPU). Com mais de um processo, os ficheiros são
+                 agendados do maior para o menor, ``progress_callback`` é
+                 chamado à medida que cada ficheiro termina e
+                 ``client_progress_callback`` não é usado.
+        run_id: Execução do diário de lotes (ver ``src.batch_journal``) onde
+                registar o estado de cada ficheiro. Ficheiros já concluídos
+                nessa execução, com a mesma entrada e saídas existentes, são
+                saltados e o resultado guardado é devolvido — é assim que um
+                lote interrompido é retomado (ver resume_batch).
+        hook_runner: ``HookRunner`` (ver ``src.hooks``) a que é entregue cada
+                     ficheiro convertido com sucesso, para correr os hooks de
+                     ficheiro enquanto o lote continua. Os ficheiros saltados
+                     por já estarem concluídos no diário não voltam a correr
+                     hooks. Os hooks de lote correm com ``hook_runner.finish()``.
+
+    Cada conversão só começa quando a sua memória estimada cabe no orçamento
+    partilhado com a pasta monitorizada e os agendamentos (ver
+    ``src.admission``). Com ``resources.isolate``, cada ficheiro é convertido
+    num processo próprio, com tempo e memória limitados (ver
+    ``src.isolation``); um ficheiro que exceda os limites fica como falhado.
 
     Returns:
         Lista de resultados, um por ficheiro:
-        [{file, filename, success, output_path, clients_count, error}]
+        [{file, filename, success, output_path, outputs, clients_count, cache_hits,
+          error, duplicate_of}]
+        ``outputs`` lista os ficheiros gerados. ``cache_hits`` conta os PDFs não
+        regenerados por estarem inalterados (ver ``output.skip_unchanged``).
+        Com ``batch.dedup``, ficheiros com conteúdo idêntico a outro do lote
+        não são convertidos: recebem cópias (ou hard links, com
+        ``batch.dedup_link = 'hardlink'``) das saídas do original, indicado
+        em ``duplicate_of`` ('' nos restantes).
     """
-    files = find_excel_files(folder_path)
-    if not files:
-        return []
+    files = discover_excel_files(folder_path, config)
+    if not config.get('batch', {}).get('recursive', False):
+        files = list(files)
+    return process_files(files, config, mode, progress_callback=progress_callback,
+                         client_progress_callback=client_progress_callback,
+                         cancel_token=cancel_token, workers=workers, run_id=run_id,
+                         hook_runner=hook_runner)
+
+
+def process_files(files, config: dict, mode: str = 'individual',
+                  progress_callback=None, client_progress_callback=None,
+                  cancel_token=None, workers: int = None, run_id: str = None,
+                  hook_runner=None) -> list:
+    """Converte uma lista de ficheiros Excel (ou membros de arquivos ZIP).
+
+    É o núcleo de process_batch: os argumentos e o formato dos resultados são
+    os mesmos. ``files`` pode ser um iterador — com um só processo a
+    conversão começa antes de o iterador terminar.
+    """
+    workers = resolve_workers(config, workers)
+    streaming = workers == 1 and not isinstance(files, (list, tuple))
+    journal = _Journal(run_id)
+    dedup = _Dedup(config, mode)
+    convert = isolation.convert_isolated if isolation.is_enabled(config) else convert_file
+    if not streaming:
+        # Pasta única (ou pool paralelo, que precisa dos tamanhos de todos)
+        files = list(files)
+        journal.add_pending(files)
+        workers = min(workers, len(files))
+        if workers > 1:
+            results = _process_parallel(files, config, mode, workers,
+                                        progress_callback, cancel_token, journal, dedup,
+                                        hook_runner)
+            journal.close(cancel_token)
+            return results
 
-    total = len(files)
     results = []
 
     for i, excel_path in enumerate(files):
-        filename = os.path.basename(excel_path)
+        if cancel_token is not None and cancel_token.is_cancelled:
+            break
+
+        filename = zip_input.display_name(excel_path)
+        # Em modo recursivo o total cresce à medida que a descoberta avança
+        total = i + 1 if streaming else len(files)
 
         if progress_callback:
             progress_callback(i, total, filename)
 
-        try:
-            converter = ExcelToPDFConverter(excel_path, None, config)
-            data = converter.read_excel_data()
-            clients_count = len(data.get('itens', []))
-
-            if mode == 'individual':
-                output_files = converter.generate_individual_pdfs()
-                output_path = os.path.dirname(output_files[0]) if output_files else folder_path
-            else:
-                output_path = converter.generate_pdf()
-
-            results.append({
-                'file': excel_path,
-                'filename': filename,
-                'success': True,
-                'output_path': output_path,
-                'clients_count': clients_count,
-                'error': '',
-            })
-
-        except Exception as e:
-            results.append({
-                'file': excel_path,
-                'filename': filename,
-                'success': False,
-                'output_path': '',
-                'clients_count': 0,
-                'error': str(e),
-            })
+        input_hash = _input_hash(excel_path, journal, dedup)
+        result = journal.check(excel_path, input_hash)
+        if result is None:
+            result = dedup.check(excel_path, input_hash)
+            if result is not None:
+                journal.mark_finished(result, input_hash)
+                _submit_hooks(hook_runner, result)
+        if result is None:
+            on_client = None
+            if client_progress_callback:
+                on_client = lambda info, f=filename: client_progress_callback(f, info)
+
+            try:
+                with admission.admitted(excel_path, config, cancel_token):
+                    journal.mark_running(excel_path, input_hash)
+                    result = convert(excel_path, config, mode,
+                                     progress_callback=on_client,
+                                     cancel_token=cancel_token)
+            except ConversionCancelled:
+                break  # cancelado à espera de memória: o ficheiro fica pendente
+            if convert is not convert_file:
+                _remember_rows(result)  # convertido noutro processo
+            journal.mark_finished(result, input_hash)
+            _submit_hooks(hook_runner, result)
+        dedup.add(result, input_hash)
+        results.append(result)
 
         if progress_callback:
             progress_callback(i + 1, total, filename)
 
+    journal.close(cancel_token)
     return results
+
+
+def resume_batch(run_id: str, progress_callback=None, client_progress_callback=None,
+                 cancel_token=None, workers: int = None, hook_runner=None,
+                 live_config: dict = None) -> list:
+    """Retoma um lote registado no diário, saltando os ficheiros já concluídos.
+
+    A pasta, o modo e a configuração são os da execução original; ficheiros
+    novos na pasta também são convertidos. ``hook_runner`` é como em
+    process_batch: recebe os ficheiros convertidos nesta retoma.
+
+    As passwords não ficam no diário: vêm de ``live_config`` (default: a
+    configuração guardada do utilizador).
+
+    Raises:
+        ValueError: Se a execução não existir.
+    """
+    run = batch_journal.get_run(run_id)
+    if run is None:
+        raise ValueError(f"Execução de lote não encontrada: {run_id}")
+    if live_config is None:
+        from src.config import load_config
+        live_config = load_config()
+    config = batch_journal.restore_secrets(run['config'], live_config)
+    batch_journal.set_run_status(run_id, batch_journal.RUN_RUNNING)
+    return process_batch(run['folder'], config, run['mode'],
+                         progress_callback=progress_callback,
+                         client_progress_callback=client_progress_callback,
+                         cancel_token=cancel_token, workers=workers, run_id=run_id,
+                         hook_runner=hook_runner)
+
+
+class _Journal:
+    """Adaptador do diário de lotes usado por process_batch (inactivo sem run_id)."""
+
+    def __init__(self, run_id: str = None):
+        self.run_id = run_id
+        self.jobs = {}
+        if run_id:
+            self.jobs = {j['file']: j for j in batch_journal.get_jobs(run_id)}
+
+    def add_pending(self, files: list):
+        if self.run_id:
+            batch_journal.add_pending(self.run_id, files)
+
+    def check(self, excel_path: str, input_hash: str):
+        """Devolve o resultado guardado se o ficheiro puder ser saltado, senão None."""
+        if not self.run_id:
+            return None
+        job = self.jobs.get(os.path.abspath(excel_path))
+        result = batch_journal.completed_result(job, input_hash) if job else None
+        if result is not None:
+            result['file'] = excel_path
+        return result
+
+    def mark_running(self, excel_path: str, input_hash: str):
+        if self.run_id:
+            batch_journal.mark_running(self.run_id, excel_path, input_hash)
+
+    def mark_finished(self, result: dict, input_hash: str):
+        if self.run_id:
+            batch_journal.mark_finished(self.run_id, result, input_hash)
+
+    def close(self, cancel_token=None):
+        if self.run_id:
+            cancelled = cancel_token is not None and cancel_token.is_cancelled
+            batch_journal.set_run_status(
+                self.run_id,
+                batch_journal.RUN_CANCELLED if cancelled else batch_journal.RUN_COMPLETED)
+
+
+class _Dedup:
+    """Detecção de entradas duplicadas por hash de conteúdo (``batch.dedup``)."""
+
+    def __init__(self, config: dict, mode: str):
+        opts = config.get('batch', {})
+        self.enabled = bool(opts.get('dedup', False))
+        self.hardlink = opts.get('dedup_link', 'copy') == 'hardlink'
+        self.config = config
+        self.mode = mode
+        self.seen = {}
+
+    def add(self, result: dict, input_hash: str):
+        """Regista o resultado de um ficheiro convertido (original)."""
+        if self.enabled and input_hash and not result.get('duplicate_of'):
+            self.seen.setdefault(input_hash, result)
+
+    def check(self, excel_path: str, input_hash: str):
+        """Se o ficheiro duplicar um já convertido, materializa as saídas e
+        devolve o resultado; senão None."""
+        source = self.seen.get(input_hash) if self.enabled and input_hash else None
+        if source is None:
+            return None
+        return duplicate_result(source, excel_path, self.mode, self.config, self.hardlink)
+
+
+def _input_hash(excel_path: str, journal, dedup) -> str:
+    """Hash do conteúdo de entrada, calculado só se o diário ou a deduplicação o usarem."""
+    if journal.run_id or dedup.enabled:
+        return batch_journal.file_hash(excel_path)
+    return ''
+
+
+def _duplicate_target(source_excel: str, dup_excel: str, output: str, rename: bool) -> str:
+    """Calcula onde a conversão de ``dup_excel`` teria escrito ``output``.
+
+    Saídas dentro da pasta do original são replicadas na pasta do duplicado;
+    saídas numa pasta de destino configurada ficam no mesmo sítio. Com
+    ``rename``, o nome do original no ficheiro de saída é trocado pelo do
+    duplicado (PDF agregado sem template de nome).
+    """
+    source_dir = zip_input.output_dir(os.path.abspath(source_excel))
+    dup_dir = zip_input.output_dir(os.path.abspath(dup_excel))
+    out_dir, name = os.path.split(os.path.abspath(output))
+
+    if rename:
+        source_stem = os.path.splitext(zip_input.source_name(source_excel))[0]
+        dup_stem = os.path.splitext(zip_input.source_name(dup_excel))[0]
+        if name.startswith(source_stem):
+            name = dup_stem + name[len(source_stem):]
+
+    rel = os.path.relpath(out_dir, source_dir)
+    if rel != os.pardir and not rel.startswith(os.pardir + os.sep):
+        out_dir = os.path.normpath(os.path.join(dup_dir, rel))
+    return os.path.join(out_dir, name)
+
+
+def _materialize(source: str, target: str, hardlink: bool):
+    """Copia (ou liga por hard link) ``source`` para ``target``.
+
+    Se o hard link não for possível (ex: outro disco), faz uma cópia.
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.lexists(target):
+        os.remove(target)
+    if hardlink:
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            pass
+    shutil.copy2(source, target)
+
+
+def duplicate_result(source: dict, dup_excel: str, mode: str, config: dict,
+                     hardlink: bool = False) -> dict:
+    """Constrói o resultado de um ficheiro idêntico a ``source``, sem o converter.
+
+    As saídas do original são copiadas (ou ligadas) para onde a conversão do
+    duplicado as teria escrito; se o destino coincidir com a origem (ex: PDFs
+    individuais na mesma pasta ``PDFs_<mes>``) nada é escrito.
+    """
+    result = dict(source)
+    result.update({
+        'file': dup_excel,
+        'filename': zip_input.display_name(dup_excel),
+        'cache_hits': 0,
+        'duplicate_of': source['file'],
+        'timings': {},
+    })
+    if not source['success']:
+        result['outputs'] = []
+        return result
+
+    rename = mode == 'aggregate' and not config.get('output', {}).get('filename_template')
+    try:
+        targets = []
+        for output in source.get('outputs', []):
+            target = _duplicate_target(source['file'], dup_excel, output, rename)
+            if os.path.abspath(target) != os.path.abspath(output):
+                _materialize(output, target, hardlink)
+            targets.append(target)
+    except OSError as e:
+        result.update(success=False, outputs=[], output_path='',
+                      error=f"Falha ao copiar saídas de {source['filename']}: {e}")
+        return result
+
+    result['outputs'] = targets
+    if source.get('output_path'):
+        result['output_path'] = _duplicate_target(source['file'], dup_excel,
+                                                  source['output_path'], rename)
+    return result
+
+
+def _process_parallel(files: list, config: dict, mode: str, workers: int,
+                      progress_callback=None, cancel_token=None, journal=None,
+                      dedup=None, hook_runner=None) -> list:
+    """Converte ``files`` num pool de processos, do maior para o menor.
+
+    Os resultados são devolvidos pela ordem original de ``files``. Se o
+    lote for cancelado, os ficheiros ainda não iniciados são descartados e
+    os que estão em curso terminam normalmente. O diário é actualizado
+    apenas pelo processo coordenador, quando cada ficheiro termina. Os
+    duplicados são resolvidos no fim, a partir dos resultados dos originais.
+
+    Cada ficheiro só é enviado para o pool quando a sua memória estimada
+    cabe no orçamento (ver ``src.admission``); se não couber, espera que
+    outra conversão termine, sem passar à frente dos ficheiros maiores.
+    """
+    journal = journal or _Journal()
+    dedup = dedup or _Dedup({}, mode)
+    total = len(files)
+    results = [None] * total
+    hashes = {}
+    to_run = []
+    duplicates = []
+    first_by_hash = {}
+    for i in largest_first(files):
+        hashes[i] = _input_hash(files[i], journal, dedup)
+        results[i] = journal.check(files[i], hashes[i])
+        if results[i] is not None:
+            dedup.add(results[i], hashes[i])
+        elif dedup.enabled and hashes[i] and hashes[i] in first_by_hash:
+            duplicates.append(i)
+        else:
+            first_by_hash.setdefault(hashes[i], i)
+            to_run.append(i)
+    done_count = total - len(to_run) - len(duplicates)
+
+    if progress_callback:
+        first = files[to_run[0]] if to_run else files[0]
+        progress_callback(done_count, total, zip_input.display_name(first))
+
+    controller = admission.get_controller(config)
+    costs = {}
+    waiting = deque(to_run)
+    pending = {}
+    try:
+        # Com isolamento cada conversão já corre no seu processo (com tempo
+        # limite): basta uma thread por conversão em curso
+        isolated = isolation.is_enabled(config)
+        pool = ThreadPoolExecutor if isolated else ProcessPoolExecutor
+        convert = isolation.convert_isolated if isolated else convert_file
+        with pool(max_workers=workers) as executor:
+            while waiting or pending:
+                if cancel_token is not None and cancel_token.is_cancelled:
+                    waiting.clear()
+                while waiting and len(pending) < workers:
+                    i = waiting[0]
+                    if i not in costs:
+                        costs[i] = (admission.estimate_peak_memory(files[i])
+                                    if controller.budget else 0)
+                    if not controller.try_acquire(costs[i]):
+                        break
+                    waiting.popleft()
+                    pending[executor.submit(convert, files[i], config, mode)] = i
+                if not pending:
+                    # Orçamento ocupado por conversões fora deste lote
+                    controller.wait(0.2)
+                    continue
+                done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = pending.pop(future)
+                    controller.release(costs[i])
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        results[i] = _failed_result(files[i], str(e))
+                    journal.mark_finished(results[i], hashes[i])
+                    dedup.add(results[i], hashes[i])
+                    _submit_hooks(hook_runner, results[i])
+                    # A conversão correu noutro processo: guardar aqui as linhas lidas
+                    _remember_rows(results[i])
+                    done_count += 1
+                    if progress_callback:
+                        progress_callback(done_count, total, results[i]['filename'])
+    finally:
+        for i in pending.values():
+            controller.release(costs[i])
+
+    for i in sorted(duplicates):
+        results[i] = dedup.check(files[i], hashes[i])
+        if results[i] is None:
+            continue  # original cancelado
+        journal.mark_finished(results[i], hashes[i])
+        _submit_hooks(hook_runner, results[i])
+        done_count += 1
+        if progress_callback:
+            progress_callback(done_count, total, results[i]['filename'])
+
+    return [r for r in results if r is not None]
+
+
+def _remember_rows(result: dict):
+    """Guarda as linhas lidas numa conversão para as próximas estimativas de memória."""
+    rows = (result.get('timings') or {}).get('counts', {}).get('rows', 0)
+    if result['success'] and rows:
+        admission.remember_rows(result['file'], rows)
+
+
+def _submit_hooks(hook_runner, result: dict):
+    """Entrega um ficheiro convertido com sucesso ao ``HookRunner`` do lote."""
+    if hook_runner is not None and result['success']:
+        hook_runner.submit(result['file'], result['outputs'])
+
+
+def _failed_result(excel_path: str, error: str, timings: dict = None) -> dict:
+    """Resultado de um ficheiro cuja conversão falhou.
+
+    ``timings`` guarda os tempos das fases concluídas antes da falha.
+    """
+    return {
+        'file': excel_path,
+        'filename': zip_input.display_name(excel_path),
+        'success': False,
+        'output_path': '',
+        'outputs': [],
+        'clients_count': 0,
+        'cache_hits': 0,
+        'error': error,
+        'duplicate_of': '',
+        'timings': timings or {},
+    }
+
+
+def convert_file(excel_path: str, config: dict, mode: str = 'individual',
+                 progress_callback=None, cancel_token=None) -> dict:
+    """Converte um ficheiro Excel e devolve o resultado no formato de process_batch.
+
+    Nunca lança excepções: erros (incluindo cancelamento) ficam em
+    ``success=False`` / ``error``. Os tempos por fase da geração ficam em
+    ``timings`` (ver ``src.timing``).
+
+    Args:
+        excel_path: Caminho do ficheiro Excel.
+        config: Configurações da aplicação.
+        mode: 'individual', 'zip' ou 'aggregate'.
+        progress_callback: Callback de progresso por cliente (ver ``src.progress``).
+        cancel_token: ``CancelToken`` opcional.
+    """
+    filename = zip_input.display_name(excel_path)
+    converter = None
+    try:
+        converter = ExcelToPDFConverter(excel_path, None, config)
+        data = converter.read_excel_data()
+        clients_count = len(data.get('itens', []))
+
+        if mode == 'individual':
+            outputs = converter.generate_individual_pdfs(
+                progress_callback=progress_callback, cancel_token=cancel_token)
+            output_path = (os.path.dirname(outputs[0]) if outputs
+                           else os.path.dirname(excel_path))
+        elif mode == 'zip':
+            converter.generate_individual_pdfs(
+                zip_output=True, progress_callback=progress_callback,
+                cancel_token=cancel_token)
+            outputs = [converter.output_zip_path] if converter.output_zip_path else []
+            output_path = converter.output_zip_path or os.path.dirname(excel_path)
+        else:
+            output_path = converter.generate_pdf(
+                progress_callback=progress_callback, cancel_token=cancel_token)
+            outputs = [output_path]
+
+        result = {
+            'file': excel_path,
+            'filename': filename,
+            'success': True,
+            'output_path': output_path,
+            'outputs': list(outputs),
+            'clients_count': clients_count,
+            'cache_hits': len(converter.cache_hits),
+            'error': '',
+            'duplicate_of': '',
+            'timings': timings_of(converter),
+        }
+        _remember_rows(result)
+        return result
+
+    except MemoryError:
+        return _failed_result(excel_path, "Memória esgotada", timings_of(converter))
+    except Exception as e:
+        return _failed_result(excel_path, str(e), timings_of(converter))
@@ -63,6 +63,7 @@ DEFAULT_CONFIG = {
         'add_timestamp': False,
         'output_folder': '',
         'filename_template': '',
+        'skip_unchanged': False,
     },
     'contabilidade': {
         'enabled': True,
@@ -106,8 +107,54 @@ DEFAULT_CONFIG = {
         'watch_enabled': False,
         'watch_mode': 'individual',
         'watch_interval': 5,
+        'watch_backend': 'auto',
+        'watch_settle_seconds': 1.0,
+        'watch_stable_checks': 2,
+        'watch_max_retries': 3,
+        'watch_workers': 1,
+        'watch_queue_size': 100,
+        'watch_persist': True,
+        # Pastas adicionais: [{'folder', 'profile', 'mode', 'enabled'}]
+        'watch_folders': [],
         'schedules': [],
+        # Execuções perdidas com a aplicação parada: 'skip', 'once' ou 'all'
+        'schedule_catch_up': 'once',
+        'schedule_workers': 2,
+        # Desvio máximo (s) para espalhar agendamentos do mesmo minuto
+        'schedule_jitter': 0,
+        # Hooks: [{'name', 'command' ou 'callable', 'enabled', 'timeout', 'scope', 'stdin'}]
+        # callable 'modulo:funcao' corre no processo; scope 'file' ou 'batch'
         'hooks': [],
+        # Ficheiros com hooks a correr em simultâneo num lote
+        'hooks_concurrency': 4,
+        # Hooks em segundo plano, numa fila persistente com repetições
+        'hooks_async': True,
+        'hooks_max_attempts': 5,
+        # Espera (s) antes da 1.ª repetição; duplica a cada tentativa
+        'hooks_retry_delay': 30,
+    },
+    'batch': {
+        'workers': 1,
+        'recursive': False,
+        'include': [],
+        'exclude': [],
+        'max_depth': 0,
+        'min_size': 0,
+        'max_size': 0,
+        'modified_after': '',
+        'modified_before': '',
+        'dedup': False,
+        'dedup_link': 'copy',
+        'lease_ttl': 60,
+        # Converter os workbooks dentro de arquivos .zip da pasta (ver src.zip_input)
+        'archives': False,
+    },
+    'resources': {
+        'memory_budget_mb': 0,
+        # Conversão em processo isolado (ver src.isolation)
+        'isolate': False,
+        'timeout_seconds': 600,
+        'memory_limit_mb': 0,
     },
     'recent': {
         'last_excel_dir': '',
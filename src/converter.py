@@ -5,7 +5,10 @@ Módulo conversor Excel → PDF.
 Classe principal para conversão de ficheiros Excel para PDF formatado.
 """
 
+import io
 import os
+import time
+import zipfile
 from datetime import datetime
 
 from openpyxl import load_workbook
@@ -16,9 +19,13 @@ from reportlab.lib.units import mm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.enums import TA_CENTER
 
+from src import output_cache
 from src.config import DEFAULT_CONFIG
 from src.filename_template import render_template, get_template_context
 from src.font_manager import load_fonts_from_config, get_body_font, get_header_font
+from src.progress import ProgressTracker, check_cancelled
+from src.timing import PhaseTimer
+from src import zip_input
 
 
 def _sanitize_text(value: str) -> str:
@@ -109,8 +116,12 @@ def _apply_watermark(canvas, doc, text: str, opacity: float = 0.1):
     canvas.restoreState()
 
 
-def _apply_pdf_encryption(output_path: str, user_password: str, owner_password: str = ''):
-    """Aplica encriptação ao PDF gerado."""
+def _apply_pdf_encryption(output_path, user_password: str, owner_password: str = ''):
+    """Aplica encriptação ao PDF gerado.
+
+    ``output_path`` pode ser um caminho ou um buffer em memória (``io.BytesIO``);
+    neste caso o conteúdo do buffer é substituído pela versão encriptada.
+    """
     try:
         from PyPDF2 import PdfReader, PdfWriter
     except ImportError:
@@ -128,8 +139,28 @@ def _apply_pdf_encryption(output_path: str, user_password: str, owner_password:
         owner_password=owner_password or user_password,
     )
 
-    with open(output_path, 'wb') as f:
-        writer.write(f)
+    if hasattr(output_path, 'write'):
+        encrypted = io.BytesIO()
+        writer.write(encrypted)
+        output_path.seek(0)
+        output_path.truncate()
+        output_path.write(encrypted.getvalue())
+    else:
+        with open(output_path, 'wb') as f:
+            writer.write(f)
+
+
+def _unique_member_name(name: str, used: set) -> str:
+    """Devolve um nome de entrada ZIP ainda não usado (acrescenta _2, _3, ...)."""
+    if name not in used:
+        return name
+    base, ext = os.path.splitext(name)
+    n = 2
+    while f"{base}_{n}{ext}" in used:
+        n += 1
+    return f"{base}_{n}{ext}"
+
+
 class ExcelToPDFConverter:
     """Classe para converter dados de Excel para PDF formatado."""
     
@@ -147,10 +178,10 @@ class ExcelToPDFConverter:
         if output_pdf_path:
             self.output_pdf_path = output_pdf_path
         else:
-            base_name = os.path.splitext(os.path.basename(excel_path))[0]
+            base_name = os.path.splitext(zip_input.source_name(excel_path))[0]
             output_folder = self.config['output'].get('output_folder', '')
             if not output_folder:
-                output_folder = os.path.dirname(excel_path)
+                output_folder = zip_input.output_dir(excel_path)
             
             if self.config['output'].get('add_timestamp', False):
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -159,6 +190,12 @@ class ExcelToPDFConverter:
                 self.output_pdf_path = os.path.join(output_folder, f"{base_name}.pdf")
         
         self._output_pdf_path_override = output_pdf_path
+        # PDFs não regenerados na última chamada por estarem inalterados
+        self.cache_hits = []
+        # Tempos por fase e contadores da última geração (ver src.timing)
+        self.timings = PhaseTimer()
+        # Arquivo ZIP criado pela última chamada a generate_individual_pdfs(zip_output=...)
+        self.output_zip_path = ''
         # Registar fontes personalizadas (.ttf) antes de criar estilos
         load_fonts_from_config(self.config)
         self._body_font = get_body_font(self.config)
@@ -186,7 +223,7 @@ class ExcelToPDFConverter:
 
         output_folder = self.config['output'].get('output_folder', '')
         if not output_folder:
-            output_folder = os.path.dirname(self.excel_path)
+            output_folder = zip_input.output_dir(self.excel_path)
 
         if self.config['output'].get('add_timestamp', False):
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -248,12 +285,17 @@ class ExcelToPDFConverter:
         ))
 
     def read_excel_data(self) -> dict:
-        """Lê os dados do ficheiro Excel."""
+        """Lê os dados do ficheiro Excel (ou do membro de um arquivo ZIP).
+
+        Os tempos de leitura, detecção de cabeçalhos e normalização das linhas
+        são somados a ``self.timings``.
+        """
+        started = time.perf_counter()
         # Tentar carregar com valores calculados primeiro, depois com fórmulas como fallback
         try:
-            wb = load_workbook(self.excel_path, data_only=True)
+            wb = load_workbook(zip_input.workbook_source(self.excel_path), data_only=True)
         except Exception:
-            wb = load_workbook(self.excel_path)
+            wb = load_workbook(zip_input.workbook_source(self.excel_path))
         
         data = {
             # Configurável
@@ -337,6 +379,9 @@ class ExcelToPDFConverter:
                        'Extras', 'Duodécimos', 'S.Social GER', 'S.Soc Emp', 
                        'Ret. IRS', 'Ret. IRS EXT', 'SbTx/Fcomp', 'Outro', 'TOTAL']
         
+        header_started = time.perf_counter()
+        self.timings.add('load', header_started - started)
+
         # Encontrar cabeçalhos - procurar linha com palavras-chave de contabilidade
         headers = []
         header_indices = {}  # mapeia nome normalizado -> índice da coluna
@@ -405,8 +450,12 @@ class ExcelToPDFConverter:
                 headers = ['Código', 'Designação', 'Quantidade', 'Preço Unit.', 'Total']
                 header_row = 1
         
+        rows_started = time.perf_counter()
+        self.timings.add('header_detection', rows_started - header_started)
+
         # Capturar mês de referência da primeira linha de dados
         mes_referencia = None
+        rows_read = 0
         
         # Ler dados
         for row in ws_itens.iter_rows(min_row=header_row + 1, values_only=True):
@@ -415,6 +464,7 @@ class ExcelToPDFConverter:
                 values_in_row = [cell for cell in row if cell is not None and str(cell).strip() != '']
                 if not values_in_row:
                     continue
+                rows_read += 1
                 
                 item = {}
                 
@@ -452,6 +502,9 @@ class ExcelToPDFConverter:
                         data['itens'].append(item)
         
         wb.close()
+        self.timings.add('row_normalization', time.perf_counter() - rows_started)
+        self.timings.count('rows', rows_read)
+        self.timings.count('clients', len(data['itens']))
         return data
 
     def create_header(self, data: dict) -> list:
@@ -876,14 +929,36 @@ class ExcelToPDFConverter:
         elements.append(Spacer(1, 4*mm))
         return elements
 
-    def generate_pdf(self, client_filter: set = None) -> str:
+    # Fases reportadas por generate_pdf ao progress_callback
+    _AGGREGATE_PHASES = 3
+
+    def generate_pdf(self, client_filter: set = None, progress_callback=None,
+                     cancel_token=None) -> str:
         """Gera o PDF.
 
         Args:
             client_filter: Conjunto de nomes de clientes a incluir (None = todos).
+            progress_callback: Função chamada com o dicionário de progresso
+                               (ver ``src.progress``) no fim de cada fase:
+                               leitura, renderização e pós-processamento.
+            cancel_token: ``CancelToken`` verificado entre fases e a cada página;
+                          se cancelado, lança ``ConversionCancelled`` sem escrever
+                          o PDF.
+
+        Com ``output.skip_unchanged`` activo, não regenera o PDF se o ficheiro
+        existente tiver sido gerado a partir dos mesmos dados; nesse caso o
+        caminho é registado em ``self.cache_hits``. Os tempos por fase ficam
+        em ``self.timings``.
         """
+        self.cache_hits = []
+        self.timings = PhaseTimer()
+        tracker = ProgressTracker(self._AGGREGATE_PHASES, progress_callback)
+        tracker.start()
+        check_cancelled(cancel_token)
         data = self.read_excel_data()
         self._resolve_output_path(data)
+        tracker.advance('Leitura do Excel')
+        check_cancelled(cancel_token)
 
         # Filtrar clientes se necessário
         if client_filter is not None:
@@ -891,6 +966,17 @@ class ExcelToPDFConverter:
                 item for item in data.get('itens', [])
                 if item.get('Cliente', '') in client_filter
             ]
+
+        # Saltar renderização se o PDF existente corresponde aos mesmos dados
+        input_hash = None
+        if output_cache.is_enabled(self.config):
+            input_hash = output_cache.compute_input_hash(data, self.config)
+            if output_cache.is_cached(self.output_pdf_path, input_hash):
+                self.cache_hits.append(self.output_pdf_path)
+                tracker.advance('PDF inalterado', step=self._AGGREGATE_PHASES)
+                return self.output_pdf_path
+
+        flowables_started = time.perf_counter()
         
         # Verificar se é formato de contabilidade
         primeiro_item = data.get('itens', [{}])[0] if data.get('itens') else {}
@@ -921,6 +1007,7 @@ class ExcelToPDFConverter:
             }
         
         empresa_nome_meta = data.get('empresa', {}).get('nome') or self.config['header'].get('company_name', '')
+        os.makedirs(os.path.dirname(os.path.abspath(self.output_pdf_path)), exist_ok=True)
         doc = SimpleDocTemplate(
             self.output_pdf_path,
             pagesize=page_size,
@@ -986,40 +1073,78 @@ class ExcelToPDFConverter:
 
         # Marca d'água
         watermark_cfg = self.config.get('watermark', {})
-        if watermark_cfg.get('enabled', False):
-            wm_text = watermark_cfg.get('text', 'RASCUNHO')
-            wm_opacity = watermark_cfg.get('opacity', 0.1)
+        wm_enabled = watermark_cfg.get('enabled', False)
+        wm_text = watermark_cfg.get('text', 'RASCUNHO')
+        wm_opacity = watermark_cfg.get('opacity', 0.1)
 
-            def on_page(canvas, doc):
+        def on_page(canvas, doc):
+            # Verificar cancelamento a cada página (o PDF só é escrito no fim)
+            check_cancelled(cancel_token)
+            self.timings.count('pages')
+            if wm_enabled:
                 _apply_watermark(canvas, doc, wm_text, wm_opacity)
 
-            doc.build(elements, onFirstPage=on_page, onLaterPages=on_page)
-        else:
-            doc.build(elements)
-
-        # Limpar ficheiro temporário do QR Code
-        if qr_temp_path and os.path.exists(qr_temp_path):
-            try:
-                os.remove(qr_temp_path)
-            except OSError:
-                pass
+        self.timings.add('flowables', time.perf_counter() - flowables_started)
+        try:
+            with self.timings.phase('pdf_build'):
+                doc.build(elements, onFirstPage=on_page, onLaterPages=on_page)
+        finally:
+            # Limpar ficheiro temporário do QR Code
+            if qr_temp_path and os.path.exists(qr_temp_path):
+                try:
+                    os.remove(qr_temp_path)
+                except OSError:
+                    pass
+        tracker.advance('Geração do PDF')
 
         # Encriptação com password
         security_cfg = self.config.get('security', {})
         pdf_password = security_cfg.get('pdf_password', '')
         if pdf_password:
             owner_pw = security_cfg.get('pdf_owner_password', '')
-            _apply_pdf_encryption(self.output_pdf_path, pdf_password, owner_pw)
+            with self.timings.phase('encryption'):
+                _apply_pdf_encryption(self.output_pdf_path, pdf_password, owner_pw)
 
+        self.timings.count('pdfs')
+        self.timings.count('bytes', os.path.getsize(self.output_pdf_path))
+
+        if input_hash:
+            output_cache.record_output(self.output_pdf_path, input_hash)
+
+        tracker.advance('Concluído')
         return self.output_pdf_path
 
-    def generate_individual_pdfs(self, output_folder: str = None, client_filter: set = None) -> list:
+    def generate_individual_pdfs(self, output_folder: str = None, client_filter: set = None,
+                                 zip_output=None, progress_callback=None,
+                                 cancel_token=None) -> list:
         """Gera um PDF individual para cada cliente/linha do Excel.
 
         Args:
             output_folder: Pasta de destino (None = auto).
             client_filter: Conjunto de nomes de clientes a incluir (None = todos).
+            zip_output: Se definido, os PDFs são renderizados em memória e escritos
+                        directamente como entradas de um arquivo ZIP, sem ficheiros
+                        intermédios. Aceita o caminho do ``.zip`` ou ``True`` para
+                        ``PDFs_<mes>.zip`` ao lado da pasta que seria criada.
+            progress_callback: Função chamada após cada cliente com o dicionário
+                               de progresso (ver ``src.progress``), incluindo
+                               débito e ETA.
+            cancel_token: ``CancelToken`` verificado antes de cada cliente; se
+                          cancelado, lança ``ConversionCancelled``. No modo ZIP
+                          o arquivo parcial é descartado.
+
+        Returns:
+            Lista de caminhos dos PDFs gerados. No modo ZIP, lista dos nomes das
+            entradas do arquivo; o caminho do arquivo fica em ``self.output_zip_path``.
+
+        Com ``output.skip_unchanged`` activo (apenas no modo pasta), os PDFs cujos
+        dados não mudaram não são regenerados; continuam na lista devolvida e são
+        também registados em ``self.cache_hits``. Os tempos por fase (somados
+        sobre todos os clientes) ficam em ``self.timings``.
         """
+        self.cache_hits = []
+        self.timings = PhaseTimer()
+        self.output_zip_path = ''
         data = self.read_excel_data()
         itens = data.get('itens', [])
 
@@ -1034,11 +1159,125 @@ class ExcelToPDFConverter:
         
         # Criar pasta de destino
         if output_folder is None:
-            base_folder = os.path.dirname(self.excel_path)
+            base_folder = zip_input.output_dir(self.excel_path)
             output_folder = os.path.join(base_folder, f'PDFs_{mes_ref}')
-        
+
+        tracker = ProgressTracker(len(itens), progress_callback)
+
+        if zip_output:
+            zip_path = zip_output if isinstance(zip_output, str) else f"{output_folder}.zip"
+            return self._generate_individual_zip(zip_path, itens, mes_ref, data,
+                                                 tracker, cancel_token)
+
         os.makedirs(output_folder, exist_ok=True)
         
+        campo_labels, campos_ordem = self._individual_fields()
+        generated_files = []
+        cache_enabled = output_cache.is_enabled(self.config)
+        if cache_enabled:
+            # Configuração e registos da cache lidos uma vez para todo o workbook
+            digest = output_cache.render_digest(self.config)
+            known = output_cache.cached_hashes([
+                os.path.join(output_folder, name)
+                for name in map(self._individual_filename, itens) if name])
+        recorded = []
+        tracker.start()
+        
+        try:
+            for item in itens:
+                check_cancelled(cancel_token)
+                filename = self._individual_filename(item)
+                if not filename:
+                    tracker.advance()
+                    continue
+                pdf_path = os.path.join(output_folder, filename)
+
+                input_hash = None
+                if cache_enabled:
+                    input_hash = output_cache.compute_input_hash(
+                        {'item': item, 'mes_ref': mes_ref, 'empresa': data.get('empresa', {})},
+                        self.config, digest,
+                    )
+                    if output_cache.is_cached(pdf_path, input_hash, known):
+                        self.cache_hits.append(pdf_path)
+                        generated_files.append(pdf_path)
+                        tracker.advance(filename)
+                        continue
+
+                # Gerar PDF individual
+                self._create_client_pdf(pdf_path, item, campo_labels, campos_ordem, mes_ref, data)
+                if input_hash:
+                    recorded.append((pdf_path, input_hash))
+                generated_files.append(pdf_path)
+                tracker.advance(filename)
+        finally:
+            # Também após cancelamento ou erro: os PDFs já escritos ficam na cache
+            output_cache.record_outputs(recorded)
+        
+        return generated_files
+
+    def _generate_individual_zip(self, zip_path: str, itens: list, mes_ref: str,
+                                 data: dict, tracker: ProgressTracker,
+                                 cancel_token=None) -> list:
+        """Renderiza cada PDF individual em memória e escreve-o no arquivo ZIP.
+
+        Returns:
+            Lista dos nomes das entradas escritas no arquivo.
+        """
+        zip_dir = os.path.dirname(zip_path)
+        if zip_dir:
+            os.makedirs(zip_dir, exist_ok=True)
+
+        campo_labels, campos_ordem = self._individual_fields()
+        members = []
+        used = set()
+
+        # Escrever para um ficheiro temporário e só substituir no fim, para
+        # não deixar um arquivo truncado se a geração falhar a meio
+        part_path = zip_path + '.part'
+        tracker.start()
+        try:
+            with zipfile.ZipFile(part_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                for item in itens:
+                    check_cancelled(cancel_token)
+                    filename = self._individual_filename(item)
+                    if not filename:
+                        tracker.advance()
+                        continue
+                    member = _unique_member_name(filename, used)
+                    used.add(member)
+
+                    buffer = io.BytesIO()
+                    self._create_client_pdf(buffer, item, campo_labels, campos_ordem,
+                                            mes_ref, data)
+                    with self.timings.phase('archive'):
+                        zf.writestr(member, buffer.getvalue())
+                    members.append(member)
+                    tracker.advance(member)
+            os.replace(part_path, zip_path)
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+        self.output_zip_path = zip_path
+        return members
+
+    @staticmethod
+    def _individual_filename(item: dict) -> str:
+        """Nome do PDF individual de um cliente ('' se a linha não tiver Nr. nem Cliente)."""
+        nr = item.get('Nr.', '')
+        sigla = item.get('SIGLA', '')
+        cliente = item.get('Cliente', '')
+
+        if not nr and not cliente:
+            return ''
+
+        filename = f"{nr}_{sigla}.pdf" if sigla else f"{nr}_{cliente[:20]}.pdf"
+        return filename.replace(' ', '_').replace('/', '-')
+
+    @staticmethod
+    def _individual_fields() -> tuple:
+        """Devolve (campo_labels, campos_ordem) usados nos PDFs individuais."""
         # Mapeamento de colunas Excel → nomes no PDF
         campo_labels = {
             'CONTAB': 'Serviços de Contabilidade',
@@ -1057,32 +1296,17 @@ class ExcelToPDFConverter:
         # Ordem dos campos
         campos_ordem = ['CONTAB', 'Iva', 'Extras', 'Duodécimos', 'S.Social GER', 
                        'S.Soc Emp', 'Ret. IRS', 'Ret. IRS EXT', 'SbTx/Fcomp', 'Outro', 'TOTAL']
-        
-        generated_files = []
-        
-        for item in itens:
-            nr = item.get('Nr.', '')
-            sigla = item.get('SIGLA', '')
-            cliente = item.get('Cliente', '')
-            
-            if not nr and not cliente:
-                continue
-            
-            # Nome do ficheiro
-            filename = f"{nr}_{sigla}.pdf" if sigla else f"{nr}_{cliente[:20]}.pdf"
-            filename = filename.replace(' ', '_').replace('/', '-')
-            pdf_path = os.path.join(output_folder, filename)
-            
-            # Gerar PDF individual
-            self._create_client_pdf(pdf_path, item, campo_labels, campos_ordem, mes_ref, data)
-            generated_files.append(pdf_path)
-        
-        return generated_files
+
+        return campo_labels, campos_ordem
     
-    def _create_client_pdf(self, pdf_path: str, item: dict, campo_labels: dict, 
+    def _create_client_pdf(self, pdf_path, item: dict, campo_labels: dict, 
                            campos_ordem: list, mes_ref: str, data: dict):
-        """Cria um PDF individual para um cliente."""
+        """Cria um PDF individual para um cliente.
+
+        ``pdf_path`` pode ser um caminho ou um buffer em memória (``io.BytesIO``).
+        """
         from reportlab.lib.pagesizes import A4
+        flowables_started = time.perf_counter()
         
         # Configurar página
         empresa_nome_meta = data.get('empresa', {}).get('nome') or self.config['header'].get('company_name', '')
@@ -1221,6 +1445,7 @@ class ExcelToPDFConverter:
         wm_opacity = watermark_cfg.get('opacity', 0.1)
 
         def add_page_footer(canvas, doc):
+            self.timings.count('pages')
             canvas.saveState()
 
             # Marca d'água
@@ -1272,14 +1497,23 @@ class ExcelToPDFConverter:
 
             canvas.restoreState()
 
-        doc.build(elements, onFirstPage=add_page_footer, onLaterPages=add_page_footer)
+        self.timings.add('flowables', time.perf_counter() - flowables_started)
+        with self.timings.phase('pdf_build'):
+            doc.build(elements, onFirstPage=add_page_footer, onLaterPages=add_page_footer)
 
         # Encriptação com password
         security_cfg = self.config.get('security', {})
         pdf_password = security_cfg.get('pdf_password', '')
         if pdf_password:
             owner_pw = security_cfg.get('pdf_owner_password', '')
-            _apply_pdf_encryption(pdf_path, pdf_password, owner_pw)
+            with self.timings.phase('encryption'):
+                _apply_pdf_encryption(pdf_path, pdf_password, owner_pw)
+
+        self.timings.count('pdfs')
+        if isinstance(pdf_path, str):
+            self.timings.count('bytes', os.path.getsize(pdf_path))
+        else:
+            self.timings.count('bytes', pdf_path.getbuffer().nbytes)
 
 
 # ============================================
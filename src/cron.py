@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de expressões cron para os agendamentos.
+
+Formato de cinco campos ``minuto hora dia-do-mês mês dia-da-semana``:
+
+- ``*``, valores (``5``), intervalos (``1-5``), listas (``1,15``) e passos
+  (``*/15``, ``8-18/2``);
+- meses ``jan``..``dec`` e dias da semana ``sun``..``sat`` (0 ou 7 = domingo);
+- no dia do mês, ``L`` é o último dia do mês e ``LW`` o último dia útil
+  (segunda a sexta);
+- atalhos ``@yearly``, ``@monthly``, ``@weekly``, ``@daily`` e ``@hourly``.
+
+Como no cron, quando o dia do mês e o dia da semana estão ambos
+restringidos, basta que um deles coincida.
+
+Exemplo — último dia útil de cada mês às 18:00::
+
+    CronExpression('0 18 LW * *').next_after(datetime.now())
+"""
+
+import calendar
+from datetime import datetime, timedelta
+
+
+MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *',
+}
+
+_MONTHS = {name: i for i, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], 1)}
+_WEEKDAYS = {name: i for i, name in enumerate(
+    ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+# Horizonte de procura da próxima execução (expressões como '0 0 30 2 *' nunca ocorrem)
+_MAX_YEARS = 5
+
+
+def _parse_value(text: str, names: dict) -> int:
+    text = text.strip().lower()
+    if text in names:
+        return names[text]
+    return int(text)
+
+
+def _parse_field(text: str, low: int, high: int, names: dict = None) -> set:
+    """Converte um campo cron no conjunto de valores permitidos.
+
+    Raises:
+        ValueError: Se o campo for inválido ou sair de ``low..high``.
+    """
+    names = names or {}
+    values = set()
+    for part in text.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Passo inválido: {step_text}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            a, b = part.split('-', 1)
+            start, end = _parse_value(a, names), _parse_value(b, names)
+        else:
+            start = _parse_value(part, names)
+            end = high if step > 1 else start
+        if not (low <= start <= high and low <= end <= high) or start > end:
+            raise ValueError(f"Valor fora do intervalo {low}-{high}: {part}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def last_business_day(year: int, month: int) -> int:
+    """Último dia útil (segunda a sexta) de um mês."""
+    day = calendar.monthrange(year, month)[1]
+    while calendar.weekday(year, month, day) >= 5:
+        day -= 1
+    return day
+
+
+class CronExpression:
+    """Expressão cron de cinco campos (ver docstring do módulo).
+
+    Args:
+        expression: Texto da expressão.
+
+    Raises:
+        ValueError: Se a expressão for inválida.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        text = MACROS.get(self.expression.lower(), self.expression)
+        fields = text.split()
+        if len(fields) != 5:
+            raise ValueError(f"Expressão cron deve ter 5 campos: {expression!r}")
+        minute, hour, dom, month, dow = fields
+        try:
+            self.minutes = sorted(_parse_field(minute, 0, 59))
+            self.hours = sorted(_parse_field(hour, 0, 23))
+            self.months = _parse_field(month, 1, 12, _MONTHS)
+            dom_upper = dom.upper()
+            self.last_day = dom_upper == 'L'
+            self.last_business_day = dom_upper == 'LW'
+            if self.last_day or self.last_business_day:
+                self.days = set()
+            else:
+                self.days = _parse_field(dom, 1, 31)
+            self.weekdays = {d % 7 for d in _parse_field(dow, 0, 7, _WEEKDAYS)}
+        except ValueError as e:
+            raise ValueError(f"Expressão cron inválida {expression!r}: {e}") from None
+        self._any_day = dom == '*'
+        self._any_weekday = dow == '*'
+
+    def __repr__(self):
+        return f"CronExpression({self.expression!r})"
+
+    def _day_matches(self, year: int, month: int, day: int) -> bool:
+        if month not in self.months:
+            return False
+        if self.last_day:
+            dom_ok = day == calendar.monthrange(year, month)[1]
+        elif self.last_business_day:
+            dom_ok = day == last_business_day(year, month)
+        else:
+            dom_ok = day in self.days
+        # Dia da semana no cron: 0 = domingo
+        dow_ok = (calendar.weekday(year, month, day) + 1) % 7 in self.weekdays
+        if self._any_day and self._any_weekday:
+            return True
+        if self._any_weekday:
+            return dom_ok
+        if self._any_day:
+            return dow_ok
+        return dom_ok or dow_ok
+
+    def matches(self, moment: datetime) -> bool:
+        """Indica se a expressão coincide com o minuto de ``moment``."""
+        return (moment.minute in self.minutes and moment.hour in self.hours
+                and self._day_matches(moment.year, moment.month, moment.day))
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Primeiro minuto estritamente depois de ``moment`` que coincide com a expressão.
+
+        Raises:
+            ValueError: Se não houver nenhum nos próximos anos (ex: 30 de Fevereiro).
+        """
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        for _ in range(366 * _MAX_YEARS):
+            if self._day_matches(day.year, day.month, day.day):
+                first_day = day == start.date()
+                for hour in self.hours:
+                    if first_day and hour < start.hour:
+                        continue
+                    for minute in self.minutes:
+                        if first_day and hour == start.hour and minute < start.minute:
+                            continue
+                        return datetime(day.year, day.month, day.day, hour, minute)
+            day += timedelta(days=1)
+        raise ValueError(f"A expressão {self.expression!r} não tem próximas execuções")
+
+    def last_until(self, moment: datetime, after: datetime = None):
+        """Último minuto até ``moment`` (inclusive) que coincide com a expressão.
+
+        Args:
+            after: Limite inferior (exclusive); a procura pára aí.
+
+        Returns:
+            O minuto encontrado, ou None se não houver nenhum depois de
+            ``after`` (nem nos últimos ``_MAX_YEARS`` anos).
+        """
+        end = moment.replace(second=0, microsecond=0)
+        day = end.date()
+        for _ in range(366 * _MAX_YEARS):
+            if after is not None and day < after.date():
+                return None
+            if self._day_matches(day.year, day.month, day.day):
+                last_day = day == end.date()
+                for hour in reversed(self.hours):
+                    if last_day and hour > end.hour:
+                        continue
+                    for minute in reversed(self.minutes):
+                        if last_day and hour == end.hour and minute > end.minute:
+                            continue
+                        found = datetime(day.year, day.month, day.day, hour, minute)
+                        return found if after is None or found > after else None
+            day -= timedelta(days=1)
+        return None
@@ -41,7 +41,9 @@ def init_db():
                 mode TEXT NOT NULL,
                 clients_count INTEGER NOT NULL DEFAULT 0,
                 success INTEGER NOT NULL DEFAULT 1,
-                error TEXT NOT NULL DEFAULT ''
+                error TEXT NOT NULL DEFAULT '',
+                cache_hits INTEGER NOT NULL DEFAULT 0,
+                timings TEXT NOT NULL DEFAULT ''
             );
 
             CREATE TABLE IF NOT EXISTS profiles (
@@ -70,29 +72,142 @@ def init_db():
                 reset_anual   INTEGER NOT NULL DEFAULT 1
             );
 
+            CREATE TABLE IF NOT EXISTS output_cache (
+                output_path TEXT PRIMARY KEY,
+                input_hash  TEXT NOT NULL,
+                updated_at  TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS batch_runs (
+                id          TEXT PRIMARY KEY,
+                folder      TEXT NOT NULL,
+                mode        TEXT NOT NULL,
+                config      TEXT NOT NULL DEFAULT '{}',
+                status      TEXT NOT NULL DEFAULT 'running',
+                started_at  TEXT NOT NULL,
+                finished_at TEXT,
+                estimated_seconds REAL NOT NULL DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS batch_jobs (
+                run_id        TEXT NOT NULL REFERENCES batch_runs(id) ON DELETE CASCADE,
+                file          TEXT NOT NULL,
+                state         TEXT NOT NULL DEFAULT 'pending',
+                input_hash    TEXT NOT NULL DEFAULT '',
+                outputs       TEXT NOT NULL DEFAULT '[]',
+                clients_count INTEGER NOT NULL DEFAULT 0,
+                cache_hits    INTEGER NOT NULL DEFAULT 0,
+                error         TEXT NOT NULL DEFAULT '',
+                updated_at    TEXT NOT NULL,
+                output_path   TEXT NOT NULL DEFAULT '',
+                duplicate_of  TEXT NOT NULL DEFAULT '',
+                timings       TEXT NOT NULL DEFAULT '',
+                PRIMARY KEY (run_id, file)
+            );
+
+            CREATE TABLE IF NOT EXISTS watch_files (
+                folder       TEXT NOT NULL,
+                path         TEXT NOT NULL,
+                size         INTEGER NOT NULL DEFAULT 0,
+                mtime_ns     INTEGER NOT NULL DEFAULT 0,
+                content_hash TEXT NOT NULL DEFAULT '',
+                outputs      TEXT NOT NULL DEFAULT '[]',
+                status       TEXT NOT NULL DEFAULT 'baseline',
+                updated_at   TEXT NOT NULL,
+                PRIMARY KEY (folder, path)
+            );
+
+            CREATE TABLE IF NOT EXISTS watch_folders (
+                folder     TEXT PRIMARY KEY,
+                started_at TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS schedule_state (
+                schedule_id TEXT PRIMARY KEY,
+                last_run    TEXT NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS schedule_runs (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                schedule_id TEXT NOT NULL,
+                source      TEXT NOT NULL DEFAULT '',
+                mode        TEXT NOT NULL DEFAULT '',
+                fired_at    TEXT NOT NULL,
+                started_at  TEXT NOT NULL,
+                finished_at TEXT NOT NULL DEFAULT '',
+                status      TEXT NOT NULL DEFAULT 'running',
+                files       INTEGER NOT NULL DEFAULT 0,
+                clients     INTEGER NOT NULL DEFAULT 0,
+                failures    INTEGER NOT NULL DEFAULT 0,
+                duration    REAL NOT NULL DEFAULT 0,
+                error       TEXT NOT NULL DEFAULT ''
+            );
+
+            CREATE TABLE IF NOT EXISTS hook_jobs (
+                id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                group_id        TEXT NOT NULL,
+                seq             INTEGER NOT NULL DEFAULT 0,
+                batch_id        TEXT NOT NULL DEFAULT '',
+                scope           TEXT NOT NULL DEFAULT 'file',
+                hook_name       TEXT NOT NULL DEFAULT '',
+                hook_json       TEXT NOT NULL,
+                source          TEXT NOT NULL,
+                outputs_json    TEXT NOT NULL DEFAULT '[]',
+                status          TEXT NOT NULL DEFAULT 'pending',
+                attempts        INTEGER NOT NULL DEFAULT 0,
+                max_attempts    INTEGER NOT NULL DEFAULT 5,
+                retry_delay     REAL NOT NULL DEFAULT 30,
+                next_attempt_at TEXT NOT NULL,
+                lease_until     TEXT NOT NULL DEFAULT '',
+                created_at      TEXT NOT NULL,
+                finished_at     TEXT NOT NULL DEFAULT '',
+                returncode      INTEGER,
+                error           TEXT NOT NULL DEFAULT ''
+            );
+
             CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_hook_jobs_due ON hook_jobs(status, next_attempt_at);
+            CREATE INDEX IF NOT EXISTS idx_hook_jobs_group ON hook_jobs(group_id, seq);
+            CREATE INDEX IF NOT EXISTS idx_hook_jobs_batch ON hook_jobs(batch_id);
+            CREATE INDEX IF NOT EXISTS idx_schedule_runs_schedule
+                ON schedule_runs(schedule_id, started_at);
+            CREATE INDEX IF NOT EXISTS idx_schedule_runs_started ON schedule_runs(started_at);
             CREATE INDEX IF NOT EXISTS idx_client_cache_source ON client_cache(source_file);
             CREATE UNIQUE INDEX IF NOT EXISTS idx_client_cache_unique
                 ON client_cache(source_file, client_name);
         """)
+        # Colunas acrescentadas em versões posteriores (bases de dados antigas)
+        _ensure_column(conn, 'history', 'cache_hits', "INTEGER NOT NULL DEFAULT 0")
+        _ensure_column(conn, 'history', 'timings', "TEXT NOT NULL DEFAULT ''")
         conn.commit()
     finally:
         conn.close()
 
 
+def _ensure_column(conn: sqlite3.Connection, table: str, column: str, ddl: str):
+    """Adiciona uma coluna a uma tabela existente, se ainda não existir."""
+    existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in existing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+
 # ============================================
 # HISTÓRICO
 # ============================================
 
 def add_history_entry(source_file: str, output_path: str, mode: str,
-                      clients_count: int, success: bool, error_msg: str = ''):
-    """Adiciona uma entrada ao histórico."""
+                      clients_count: int, success: bool, error_msg: str = '',
+                      cache_hits: int = 0, timings: dict = None):
+    """Adiciona uma entrada ao histórico.
+
+    ``timings`` (tempos por fase, ver ``src.timing``) é guardado em JSON.
+    """
     conn = _get_connection()
     try:
         conn.execute(
             """INSERT INTO history (timestamp, source_file, source_path, output_path,
-               mode, clients_count, success, error)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+               mode, clients_count, success, error, cache_hits, timings)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
             (
                 datetime.now().isoformat(),
                 os.path.basename(source_file),
@@ -102,12 +217,16 @@ def add_history_entry(source_file: str, output_path: str, mode: str,
                 clients_count,
                 1 if success else 0,
                 error_msg,
+                cache_hits,
+                json.dumps(timings, ensure_ascii=False) if timings else '',
             )
         )
-        # Manter apenas as últimas 500 entradas
-        conn.execute("""
-            DELETE FROM history WHERE id NOT IN (
-                SELECT id FROM history ORDER BY id DESC LIMIT 500
+        # Manter apenas as últimas 500 entradas, contadas à parte para as
+        # conversões e para os hooks, para que estes não afastem as conversões
+        kind = "mode LIKE 'hook:%'" if mode.startswith('hook:') else "mode NOT LIKE 'hook:%'"
+        conn.execute(f"""
+            DELETE FROM history WHERE {kind} AND id NOT IN (
+                SELECT id FROM history WHERE {kind} ORDER BY id DESC LIMIT 500
             )
         """)
         conn.commit()
@@ -115,6 +234,22 @@ def add_history_entry(source_file: str, output_path: str, mode: str,
         conn.close()
 
 
+def _history_row_to_dict(row: sqlite3.Row) -> dict:
+    """Converte uma linha da tabela history num dicionário."""
+    return {
+        'timestamp': row['timestamp'],
+        'source_file': row['source_file'],
+        'source_path': row['source_path'],
+        'output_path': row['output_path'],
+        'mode': row['mode'],
+        'clients_count': row['clients_count'],
+        'success': bool(row['success']),
+        'error': row['error'],
+        'cache_hits': row['cache_hits'],
+        'timings': json.loads(row['timings']) if row['timings'] else {},
+    }
+
+
 def get_history(limit: int = 50) -> list:
     """Retorna as últimas entradas do histórico (mais recentes primeiro)."""
     conn = _get_connection()
@@ -123,21 +258,62 @@ def get_history(limit: int = 50) -> list:
             "SELECT * FROM history ORDER BY id DESC LIMIT ?", (limit,)
         )
         rows = cursor.fetchall()
-        return [
-            {
-                'timestamp': row['timestamp'],
-                'source_file': row['source_file'],
-                'source_path': row['source_path'],
-                'output_path': row['output_path'],
-                'mode': row['mode'],
-                'clients_count': row['clients_count'],
-                'success': bool(row['success']),
-                'error': row['error'],
-            }
-            for row in rows
-        ]
+        return [_history_row_to_dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def get_latest_timings(source_path: str) -> dict:
+    """Tempos por fase da última conversão bem sucedida de um ficheiro.
+
+    Returns:
+        Dicionário de ``PhaseTimer.as_dict()``, ou {} se não houver registo.
+    """
+    conn = _get_connection()
+    try:
+        row = conn.execute(
+            """SELECT timings FROM history
+               WHERE source_path IN (?, ?) AND success = 1 AND timings != ''
+               ORDER BY id DESC LIMIT 1""",
+            (source_path, os.path.abspath(source_path)),
+        ).fetchone()
+    finally:
+        conn.close()
+    return json.loads(row['timings']) if row else {}
+
+
+def get_recent_timings(limit: int = 200) -> list:
+    """Tempos por fase das conversões bem sucedidas mais recentes.
+
+    Junta o histórico e os ficheiros do diário de lotes. Os ficheiros de um
+    lote da GUI ficam nos dois sítios e só contam uma vez; as conversões com
+    PDFs reaproveitados da cache ficam de fora, porque o seu tempo não mede
+    o débito real.
+
+    Returns:
+        Lista de ``{'mode', 'timings'}`` (mais recentes primeiro); nos lotes
+        ``mode`` é o modo da execução.
+    """
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            """SELECT mode, timings, timestamp FROM history
+                   WHERE success = 1 AND cache_hits = 0 AND timings != ''
+               UNION ALL
+               SELECT r.mode, j.timings, j.updated_at FROM batch_jobs j
+                   JOIN batch_runs r ON r.id = j.run_id
+                   WHERE j.state = 'done' AND j.cache_hits = 0
+                     AND j.timings NOT IN ('', '{}')
+                     AND NOT EXISTS (
+                         SELECT 1 FROM history h
+                         WHERE h.source_path = j.file AND h.mode = 'batch_' || r.mode
+                           AND h.timings = j.timings)
+               ORDER BY 3 DESC LIMIT ?""",
+            (limit,),
+        ).fetchall()
     finally:
         conn.close()
+    return [{'mode': r['mode'], 'timings': json.loads(r['timings'])} for r in rows]
 
 
 def get_history_filtered(
@@ -190,19 +366,7 @@ def get_history_filtered(
             params,
         )
         rows = cursor.fetchall()
-        return [
-            {
-                'timestamp': row['timestamp'],
-                'source_file': row['source_file'],
-                'source_path': row['source_path'],
-                'output_path': row['output_path'],
-                'mode': row['mode'],
-                'clients_count': row['clients_count'],
-                'success': bool(row['success']),
-                'error': row['error'],
-            }
-            for row in rows
-        ]
+        return [_history_row_to_dict(row) for row in rows]
     finally:
         conn.close()
 
@@ -259,9 +423,9 @@ def export_history_excel(output_path: str, limit: int = None) -> str:
     ws.title = "Histórico"
 
     headers = ['Data/Hora', 'Ficheiro', 'Caminho Origem', 'Saída', 'Modo',
-               'Clientes', 'Sucesso', 'Erro']
+               'Clientes', 'Sucesso', 'Erro', 'Em cache']
     keys = ['timestamp', 'source_file', 'source_path', 'output_path', 'mode',
-            'clients_count', 'success', 'error']
+            'clients_count', 'success', 'error', 'cache_hits']
 
     header_font = Font(bold=True, color='FFFFFF')
     header_fill = PatternFill(start_color='2D3748', end_color='2D3748', fill_type='solid')
@@ -278,7 +442,7 @@ def export_history_excel(output_path: str, limit: int = None) -> str:
             ws.cell(row=row_num, column=col, value=entry.get(key, ''))
 
     # Ajustar largura das colunas
-    col_widths = [18, 30, 45, 45, 12, 10, 8, 40]
+    col_widths = [18, 30, 45, 45, 12, 10, 8, 40, 10]
     for col, width in enumerate(col_widths, 1):
         ws.column_dimensions[ws.cell(row=1, column=col).column_letter].width = width
 
@@ -8,6 +8,7 @@ import os
 import sys
 import subprocess
 import threading
+import uuid
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
@@ -19,7 +20,11 @@ from src.excel_exporter import export_to_excel
 from src import history
 from src.database import init_db, migrate_from_json, update_client_cache, get_cached_clients
 from src.email_sender import open_email_client
-from src.batch_processor import find_excel_files, process_batch
+from src.batch_processor import discover_excel_files, process_batch, resume_batch
+from src import batch_journal
+from src.batch_estimator import estimate_accuracy, estimate_batch
+from src.progress import CancelToken, ConversionCancelled, format_eta
+from src.timing import timings_of
 from src import notifier
 from src.doc_sequence import (
     list_series, upsert_serie, reset_serie, delete_serie, peek_next_number
@@ -65,6 +70,10 @@ class ConverterApp:
 
         # Últimos PDFs gerados (para envio por email)
         self._last_generated_files = []
+        self._cancel_token = None
+        self._batch_cancel_token = None
+        # Última estimativa pedida com "Estimar duração": (pasta, modo, segundos)
+        self._batch_estimate = None
 
         # Variáveis
         self.excel_path = tk.StringVar()
@@ -494,6 +503,25 @@ class ConverterApp:
         ttk.Button(folder_frame, text="Procurar...",
                    command=self._browse_watch_folder).grid(row=0, column=1, padx=(6, 0), pady=4)
 
+        # Outras pastas (uma por equipa), com perfil e modo próprios
+        extra_frame = ttk.LabelFrame(frame, text="Outras pastas", padding=self._PAD_INNER)
+        extra_frame.pack(fill='x', pady=self._PAD_SECTION)
+        cols = ('pasta', 'perfil', 'modo')
+        self.watch_folders_tree = ttk.Treeview(extra_frame, columns=cols, show='headings',
+                                               height=4)
+        for col, heading, width in [('pasta', 'Pasta', 260), ('perfil', 'Perfil', 110),
+                                    ('modo', 'Modo', 80)]:
+            self.watch_folders_tree.heading(col, text=heading)
+            self.watch_folders_tree.column(col, width=width, minwidth=40)
+        self.watch_folders_tree.pack(fill='x', pady=(0, 6))
+        btn_row = ttk.Frame(extra_frame)
+        btn_row.pack(fill='x')
+        ttk.Button(btn_row, text="Adicionar...",
+                   command=self._add_watch_folder).pack(side='left', padx=(0, 4))
+        ttk.Button(btn_row, text="Remover",
+                   command=self._remove_watch_folder).pack(side='left')
+        self._reload_watch_folders_tree()
+
         # Opções
         opts_frame = ttk.LabelFrame(frame, text="Opções", padding=self._PAD_INNER)
         opts_frame.pack(fill='x', pady=self._PAD_SECTION)
@@ -504,7 +532,7 @@ class ConverterApp:
         self.watch_mode_var = tk.StringVar(
             value=self.config.get('automation', {}).get('watch_mode', 'individual'))
         ttk.Combobox(row, textvariable=self.watch_mode_var,
-                     values=['individual', 'aggregate'], width=14,
+                     values=['individual', 'zip', 'aggregate'], width=14,
                      state='readonly').pack(side='left', padx=(8, 0))
 
         row2 = ttk.Frame(opts_frame)
@@ -515,6 +543,20 @@ class ConverterApp:
         ttk.Spinbox(row2, textvariable=self.watch_interval_var,
                     from_=1, to=300, width=6).pack(side='left', padx=(8, 0))
 
+        row3 = ttk.Frame(opts_frame)
+        row3.pack(fill='x', pady=2)
+        ttk.Label(row3, text="Detecção:").pack(side='left')
+        self.watch_backend_var = tk.StringVar(
+            value=self.config.get('automation', {}).get('watch_backend', 'auto'))
+        ttk.Combobox(row3, textvariable=self.watch_backend_var,
+                     values=['auto', 'inotify', 'polling'], width=10,
+                     state='readonly').pack(side='left', padx=(8, 0))
+        ttk.Label(row3, text="Conversões em simultâneo:").pack(side='left', padx=(16, 0))
+        self.watch_workers_var = tk.IntVar(
+            value=self.config.get('automation', {}).get('watch_workers', 1))
+        ttk.Spinbox(row3, textvariable=self.watch_workers_var,
+                    from_=1, to=32, width=4).pack(side='left', padx=(8, 0))
+
         # Botões de controlo
         ctrl_frame = ttk.Frame(frame)
         ctrl_frame.pack(fill='x', pady=(12, 0))
@@ -537,16 +579,79 @@ class ConverterApp:
         if folder:
             self.watch_folder_var.set(folder)
 
+    def _reload_watch_folders_tree(self):
+        """Preenche a lista de outras pastas a partir da config."""
+        self.watch_folders_tree.delete(*self.watch_folders_tree.get_children())
+        for entry in self.config.get('automation', {}).get('watch_folders', []):
+            self.watch_folders_tree.insert('', 'end', values=(
+                entry.get('folder', ''), entry.get('profile', '') or '—',
+                entry.get('mode', 'individual')))
+
+    def _add_watch_folder(self):
+        """Abre diálogo para acrescentar uma pasta a monitorizar."""
+        dlg = tk.Toplevel(self.root)
+        dlg.title("Nova pasta a monitorizar")
+        dlg.resizable(False, False)
+        dlg.grab_set()
+
+        f = ttk.Frame(dlg, padding=14)
+        f.pack(fill='both', expand=True)
+
+        ttk.Label(f, text="Pasta:").grid(row=0, column=0, sticky='e', pady=4, padx=(0, 8))
+        folder_var = tk.StringVar()
+        folder_row = ttk.Frame(f)
+        folder_row.grid(row=0, column=1, sticky='ew')
+        ttk.Entry(folder_row, textvariable=folder_var, width=30).pack(side='left')
+        def _browse():
+            p = filedialog.askdirectory(title="Pasta a monitorizar")
+            if p:
+                folder_var.set(p)
+        ttk.Button(folder_row, text="...", command=_browse, width=3).pack(side='left', padx=(4, 0))
+
+        ttk.Label(f, text="Perfil:").grid(row=1, column=0, sticky='e', pady=4, padx=(0, 8))
+        profile_var = tk.StringVar(value='')
+        ttk.Combobox(f, textvariable=profile_var, values=[''] + list_profiles(),
+                     width=20, state='readonly').grid(row=1, column=1, sticky='w')
+
+        ttk.Label(f, text="Modo:").grid(row=2, column=0, sticky='e', pady=4, padx=(0, 8))
+        mode_var = tk.StringVar(value='individual')
+        ttk.Combobox(f, textvariable=mode_var, values=['individual', 'zip', 'aggregate'],
+                     width=14, state='readonly').grid(row=2, column=1, sticky='w')
+
+        def _confirm():
+            folder = folder_var.get()
+            if not folder or not os.path.isdir(folder):
+                messagebox.showerror("Erro", "Selecione uma pasta existente.", parent=dlg)
+                return
+            folders = self.config.setdefault('automation', {}).setdefault('watch_folders', [])
+            folders.append({'folder': folder, 'profile': profile_var.get(),
+                            'mode': mode_var.get(), 'enabled': True})
+            self._reload_watch_folders_tree()
+            dlg.destroy()
+
+        ttk.Button(f, text="Adicionar", command=_confirm).grid(
+            row=3, column=0, columnspan=2, pady=(12, 0))
+
+    def _remove_watch_folder(self):
+        sel = self.watch_folders_tree.selection()
+        if not sel:
+            return
+        idx = self.watch_folders_tree.index(sel[0])
+        folders = self.config.get('automation', {}).get('watch_folders', [])
+        if 0 <= idx < len(folders):
+            del folders[idx]
+        self._reload_watch_folders_tree()
+
     def _start_watch(self):
-        from src.watch_folder import WatchFolder
-        folder = self.watch_folder_var.get()
-        if not folder:
+        from src.watch_manager import WatchManager, configured_folders, folder_config
+        config = self._get_config_from_ui()
+        entries = configured_folders(config)
+        if not entries:
             messagebox.showerror("Erro", "Selecione uma pasta.")
             return
-        config = self._get_config_from_ui()
         try:
-            self._watcher = WatchFolder(
-                folder, config,
+            self._watcher = WatchManager(
+                config,
                 on_new_file=lambda p: self.root.after(
                     0, lambda: self.watch_status_var.set(f"Detectado: {os.path.basename(p)}")),
                 on_converted=lambda p, outs: self.root.after(
@@ -554,12 +659,23 @@ class ConverterApp:
                         f"Convertido: {os.path.basename(p)} ({len(outs)} PDF(s))")),
                 on_error=lambda p, e: self.root.after(
                     0, lambda: self.watch_status_var.set(f"Erro: {os.path.basename(p)}: {e}")),
+                on_progress=lambda p, info: self.root.after(
+                    0, lambda: self.watch_status_var.set(
+                        f"A converter: {os.path.basename(p)} "
+                        f"[{info['current']}/{info['total']}]")),
                 interval=self.watch_interval_var.get(),
             )
+            for entry in entries:
+                self._watcher.add_folder(entry['folder'], folder_config(config, entry))
             self._watcher.start()
             self.watch_start_btn.configure(state='disabled')
             self.watch_stop_btn.configure(state='normal')
-            self.watch_status_var.set(f"A monitorizar: {folder}")
+            if len(entries) == 1:
+                watcher = self._watcher.watchers[0]
+                self.watch_status_var.set(
+                    f"A monitorizar: {watcher.folder_path} ({watcher.backend})")
+            else:
+                self.watch_status_var.set(f"A monitorizar {len(entries)} pastas")
         except Exception as e:
             messagebox.showerror("Erro", str(e))
 
@@ -579,11 +695,12 @@ class ConverterApp:
         ttk.Label(frame, text="Agendamentos de conversão automática:").pack(anchor='w', pady=(0, 4))
 
         # Treeview de agendamentos
-        cols = ('hora', 'dias', 'origem', 'modo', 'ativo')
+        cols = ('hora', 'dias', 'origem', 'modo', 'ativo', 'proxima', 'estado')
         self.schedules_tree = ttk.Treeview(frame, columns=cols, show='headings', height=6)
         for col, heading, width in [
-            ('hora', 'Hora', 60), ('dias', 'Dias', 160), ('origem', 'Origem', 220),
-            ('modo', 'Modo', 80), ('ativo', 'Ativo', 50),
+            ('hora', 'Hora', 90), ('dias', 'Dias', 160), ('origem', 'Origem', 220),
+            ('modo', 'Modo', 80), ('ativo', 'Ativo', 50), ('proxima', 'Próxima', 120),
+            ('estado', 'Estado', 150),
         ]:
             self.schedules_tree.heading(col, text=heading)
             self.schedules_tree.column(col, width=width, minwidth=40)
@@ -593,25 +710,177 @@ class ConverterApp:
         btn_row.pack(fill='x')
         ttk.Button(btn_row, text="Adicionar...", command=self._add_schedule).pack(side='left', padx=(0, 4))
         ttk.Button(btn_row, text="Remover", command=self._remove_schedule).pack(side='left')
+        self.schedule_stop_btn = ttk.Button(btn_row, text="Parar", state='disabled',
+                                            command=self._stop_schedules)
+        self.schedule_stop_btn.pack(side='right')
+        self.schedule_start_btn = ttk.Button(btn_row, text="Iniciar",
+                                             command=self._start_schedules)
+        self.schedule_start_btn.pack(side='right', padx=(0, 6))
+
+        self.schedule_status_var = tk.StringVar(value="Inactivo")
+        ttk.Label(frame, textvariable=self.schedule_status_var,
+                  foreground='#888888', style='Status.TLabel').pack(anchor='w', pady=(6, 0))
 
+        # Histórico de execuções (do agendamento seleccionado, ou de todos)
+        runs_frame = ttk.LabelFrame(frame, text="Últimas execuções", padding=self._PAD_INNER)
+        runs_frame.pack(fill='both', expand=True, pady=self._PAD_SECTION)
+        run_cols = ('inicio', 'origem', 'estado', 'duracao', 'ficheiros', 'clientes', 'falhas')
+        self.schedule_runs_tree = ttk.Treeview(runs_frame, columns=run_cols, show='headings',
+                                               height=6)
+        for col, heading, width in [
+            ('inicio', 'Início', 130), ('origem', 'Origem', 200), ('estado', 'Estado', 80),
+            ('duracao', 'Duração', 70), ('ficheiros', 'Ficheiros', 65),
+            ('clientes', 'Clientes', 65), ('falhas', 'Falhas', 55),
+        ]:
+            self.schedule_runs_tree.heading(col, text=heading)
+            self.schedule_runs_tree.column(col, width=width, minwidth=40)
+        self.schedule_runs_tree.pack(fill='both', expand=True)
+        self.schedule_stats_var = tk.StringVar()
+        ttk.Label(runs_frame, textvariable=self.schedule_stats_var,
+                  style='Status.TLabel').pack(anchor='w', pady=(4, 0))
+        self.schedules_tree.bind('<<TreeviewSelect>>', lambda e: self._refresh_schedule_runs())
+
+        self._scheduler = None
         # Carregar agendamentos da config
         self._reload_schedules_tree()
 
     def _reload_schedules_tree(self):
         """Preenche a treeview de agendamentos a partir da config."""
-        from src.scheduler import DIAS_SEMANA
+        from src.scheduler import DIAS_SEMANA, next_run, schedule_id
         self.schedules_tree.delete(*self.schedules_tree.get_children())
+        now = datetime.now()
+        status = self._scheduler.status() if self._scheduler else {}
         for entry in self.config.get('automation', {}).get('schedules', []):
-            dias_idx = entry.get('dias', list(range(7)))
-            dias_str = ', '.join(DIAS_SEMANA[d] for d in dias_idx if 0 <= d <= 6)
+            if entry.get('cron'):
+                quando, dias_str = entry['cron'], 'cron'
+            else:
+                dias_idx = entry.get('dias', list(range(7)))
+                quando = entry.get('hora', '')
+                dias_str = ', '.join(DIAS_SEMANA[d] for d in dias_idx if 0 <= d <= 6)
             ativo = 'Sim' if entry.get('enabled', True) else 'Não'
+            proxima = next_run(entry, now) if entry.get('enabled', True) else None
             self.schedules_tree.insert('', 'end', values=(
-                entry.get('hora', ''),
+                quando,
                 dias_str,
                 entry.get('source', ''),
                 entry.get('mode', 'individual'),
                 ativo,
+                proxima.strftime('%d/%m/%Y %H:%M') if proxima else '—',
+                self._schedule_state_text(status.get(schedule_id(entry))),
             ))
+        self._refresh_schedule_runs()
+
+    def _update_schedule_states(self):
+        """Actualiza as colunas Próxima e Estado sem perder a selecção."""
+        from src.scheduler import next_run, schedule_id
+        now = datetime.now()
+        status = self._scheduler.status() if self._scheduler else {}
+        schedules = self.config.get('automation', {}).get('schedules', [])
+        for item, entry in zip(self.schedules_tree.get_children(), schedules):
+            proxima = next_run(entry, now) if entry.get('enabled', True) else None
+            self.schedules_tree.set(item, 'proxima',
+                                    proxima.strftime('%d/%m/%Y %H:%M') if proxima else '—')
+            self.schedules_tree.set(item, 'estado',
+                                    self._schedule_state_text(status.get(schedule_id(entry))))
+
+    def _selected_schedule(self):
+        """Agendamento seleccionado na lista (None se nenhum)."""
+        sel = self.schedules_tree.selection()
+        schedules = self.config.get('automation', {}).get('schedules', [])
+        if not sel:
+            return None
+        idx = self.schedules_tree.index(sel[0])
+        return schedules[idx] if 0 <= idx < len(schedules) else None
+
+    def _refresh_schedule_runs(self):
+        """Preenche as últimas execuções do agendamento seleccionado (ou de todos)."""
+        from src import schedule_runs
+        from src.scheduler import schedule_id
+        entry = self._selected_schedule()
+        sid = schedule_id(entry) if entry else None
+        try:
+            runs = schedule_runs.recent_runs(sid, limit=50)
+            stats = schedule_runs.duration_stats(sid) if sid else None
+        except Exception:
+            runs, stats = [], None
+        estados = {'running': 'Em curso', 'success': 'OK', 'failed': 'Erro', 'skipped': 'Saltada'}
+        self.schedule_runs_tree.delete(*self.schedule_runs_tree.get_children())
+        for run in runs:
+            self.schedule_runs_tree.insert('', 'end', values=(
+                run['started_at'][:19].replace('T', ' '),
+                run['source'],
+                estados.get(run['status'], run['status']),
+                f"{run['duration']:.1f}s" if run['finished_at'] else '—',
+                run['files'], run['clients'], run['failures'],
+            ))
+        if stats and stats['runs']:
+            self.schedule_stats_var.set(
+                f"Duração nas últimas {stats['runs']} execuções: média {stats['avg']:.1f}s, "
+                f"mín {stats['min']:.1f}s, máx {stats['max']:.1f}s (última {stats['last']:.1f}s)")
+        else:
+            self.schedule_stats_var.set('')
+
+    @staticmethod
+    def _schedule_state_text(state: dict) -> str:
+        """Texto da coluna Estado: em fila, a executar e execuções saltadas."""
+        if not state:
+            return ''
+        text = {'queued': 'Em fila', 'running': 'A executar'}.get(state['state'], '')
+        if state['skipped']:
+            saltadas = (f"{state['skipped']} saltada(s), "
+                        f"última {state['last_skipped'].strftime('%H:%M')}")
+            text = f"{text} — {saltadas}" if text else saltadas
+        return text
+
+    def _start_schedules(self):
+        """Inicia a execução dos agendamentos."""
+        from src.scheduler import Scheduler
+
+        def refresh(*_):
+            self.root.after(0, self._update_schedule_states)
+
+        def done(entry, results):
+            refresh()
+            self.root.after(0, lambda: self.schedule_status_var.set(
+                f"Concluído: {os.path.basename(entry.get('source', ''))}"))
+
+        def error(entry, msg):
+            refresh()
+            self.root.after(0, lambda: self.schedule_status_var.set(
+                f"Erro: {os.path.basename(entry.get('source', ''))}: {msg}"))
+
+        self._scheduler = Scheduler(self._get_config_from_ui(), on_run=refresh,
+                                    on_done=done, on_error=error, on_skip=refresh)
+        self._scheduler.start()
+        self.schedule_start_btn.configure(state='disabled')
+        self.schedule_stop_btn.configure(state='normal')
+        self.schedule_status_var.set("Agendamentos activos")
+        self._poll_schedules()
+
+    def _poll_schedules(self):
+        """Actualiza a lista de agendamentos enquanto estão activos."""
+        if self._scheduler is None:
+            return
+        self._update_schedule_states()
+        self._refresh_schedule_runs()
+        self.root.after(5000, self._poll_schedules)
+
+    def _stop_schedules(self):
+        if self._scheduler:
+            self._scheduler.stop()
+            self._scheduler = None
+        self.schedule_start_btn.configure(state='normal')
+        self.schedule_stop_btn.configure(state='disabled')
+        self.schedule_status_var.set("Inactivo")
+        self._reload_schedules_tree()
+
+    def _schedules_changed(self):
+        """Actualiza a lista e o scheduler activo depois de alterar os agendamentos."""
+        if self._scheduler:
+            schedules = self.config.get('automation', {}).get('schedules', [])
+            self._scheduler.config.setdefault('automation', {})['schedules'] = schedules
+            self._scheduler.reload()
+        self._reload_schedules_tree()
 
     def _add_schedule(self):
         """Abre diálogo para adicionar agendamento."""
@@ -652,29 +921,46 @@ class ConverterApp:
 
         ttk.Label(f, text="Modo:").grid(row=3, column=0, sticky='e', pady=4, padx=(0, 8))
         mode_var = tk.StringVar(value='individual')
-        ttk.Combobox(f, textvariable=mode_var, values=['individual', 'aggregate'],
+        ttk.Combobox(f, textvariable=mode_var, values=['individual', 'zip', 'aggregate'],
                      width=14, state='readonly').grid(row=3, column=1, sticky='w')
 
+        ttk.Label(f, text="Cron (opcional):").grid(row=4, column=0, sticky='e', pady=4, padx=(0, 8))
+        cron_var = tk.StringVar()
+        cron_row = ttk.Frame(f)
+        cron_row.grid(row=4, column=1, sticky='w')
+        ttk.Entry(cron_row, textvariable=cron_var, width=18).pack(side='left')
+        ttk.Label(cron_row, text="ex: 0 18 LW * * (substitui hora e dias)",
+                  foreground='gray').pack(side='left', padx=(6, 0))
+
+        ttk.Label(f, text="Execuções perdidas:").grid(row=5, column=0, sticky='e', pady=4, padx=(0, 8))
+        catch_up_labels = {'Executar uma vez': 'once', 'Executar todas': 'all', 'Ignorar': 'skip'}
+        catch_up_var = tk.StringVar(value='Executar uma vez')
+        ttk.Combobox(f, textvariable=catch_up_var, values=list(catch_up_labels),
+                     width=18, state='readonly').grid(row=5, column=1, sticky='w')
+
         enabled_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(f, text="Activo", variable=enabled_var).grid(
-            row=4, column=0, columnspan=2, pady=(8, 0))
+            row=6, column=0, columnspan=2, pady=(8, 0))
 
         def _confirm():
             dias = [i for i, v in enumerate(dias_vars) if v.get()]
-            entry = {'hora': hora_var.get(), 'dias': dias,
+            entry = {'id': uuid.uuid4().hex[:12], 'hora': hora_var.get(), 'dias': dias,
                      'source': source_var.get(), 'mode': mode_var.get(),
+                     'catch_up': catch_up_labels[catch_up_var.get()],
                      'enabled': enabled_var.get()}
+            if cron_var.get().strip():
+                entry['cron'] = cron_var.get().strip()
             erros = validate_schedule_entry(entry)
             if erros:
                 messagebox.showerror("Erro", '\n'.join(erros), parent=dlg)
                 return
             schedules = self.config.setdefault('automation', {}).setdefault('schedules', [])
             schedules.append(entry)
-            self._reload_schedules_tree()
+            self._schedules_changed()
             dlg.destroy()
 
         ttk.Button(f, text="Adicionar", command=_confirm).grid(
-            row=5, column=0, columnspan=2, pady=(12, 0))
+            row=7, column=0, columnspan=2, pady=(12, 0))
 
     def _remove_schedule(self):
         sel = self.schedules_tree.selection()
@@ -684,7 +970,7 @@ class ConverterApp:
         schedules = self.config.get('automation', {}).get('schedules', [])
         if 0 <= idx < len(schedules):
             del schedules[idx]
-        self._reload_schedules_tree()
+        self._schedules_changed()
 
     def _setup_hooks_tab(self):
         """Configuração de post-conversion hooks."""
@@ -692,14 +978,15 @@ class ConverterApp:
         frame.pack(fill='both', expand=True)
 
         ttk.Label(frame,
-                  text="Comandos executados após cada conversão.\n"
-                       "Variáveis: {source}, {output}, {outputs}, {folder}").pack(
+                  text="Comandos (ou funções Python 'modulo:funcao') executados após cada conversão.\n"
+                       "Variáveis: {source}, {output}, {outputs}, {folder}, {manifest} (JSON lines)\n"
+                       "Âmbito 'lote': uma vez por lote, com todas as saídas em {outputs}").pack(
             anchor='w', pady=(0, 6))
 
-        cols = ('name', 'command', 'timeout', 'enabled')
+        cols = ('name', 'command', 'scope', 'timeout', 'enabled')
         self.hooks_tree = ttk.Treeview(frame, columns=cols, show='headings', height=5)
         for col, heading, width in [
-            ('name', 'Nome', 100), ('command', 'Comando', 280),
+            ('name', 'Nome', 100), ('command', 'Comando', 280), ('scope', 'Âmbito', 70),
             ('timeout', 'Timeout', 60), ('enabled', 'Ativo', 50),
         ]:
             self.hooks_tree.heading(col, text=heading)
@@ -718,7 +1005,8 @@ class ConverterApp:
         for h in self.config.get('automation', {}).get('hooks', []):
             self.hooks_tree.insert('', 'end', values=(
                 h.get('name', ''),
-                h.get('command', ''),
+                h.get('command', '') or f"[Python] {h.get('callable', '')}",
+                'Lote' if h.get('scope', 'file') == 'batch' else 'Ficheiro',
                 h.get('timeout', 30),
                 'Sim' if h.get('enabled', True) else 'Não',
             ))
@@ -739,29 +1027,53 @@ class ConverterApp:
         ttk.Label(f, text="Comando:").grid(row=1, column=0, sticky='e', pady=4, padx=(0, 8))
         cmd_var = tk.StringVar()
         ttk.Entry(f, textvariable=cmd_var, width=40).grid(row=1, column=1, sticky='ew')
-
-        ttk.Label(f, text="Timeout (s):").grid(row=2, column=0, sticky='e', pady=4, padx=(0, 8))
+        kind_var = tk.StringVar(value='command')
+        kind_row = ttk.Frame(f)
+        kind_row.grid(row=2, column=1, sticky='w')
+        ttk.Radiobutton(kind_row, text="Comando shell", value='command',
+                        variable=kind_var).pack(side='left', padx=(0, 8))
+        ttk.Radiobutton(kind_row, text="Função Python (modulo:funcao)", value='callable',
+                        variable=kind_var).pack(side='left')
+
+        ttk.Label(f, text="Timeout (s):").grid(row=3, column=0, sticky='e', pady=4, padx=(0, 8))
         timeout_var = tk.IntVar(value=30)
         ttk.Spinbox(f, textvariable=timeout_var, from_=1, to=300, width=6).grid(
-            row=2, column=1, sticky='w')
+            row=3, column=1, sticky='w')
+
+        ttk.Label(f, text="Âmbito:").grid(row=4, column=0, sticky='e', pady=4, padx=(0, 8))
+        scope_var = tk.StringVar(value='file')
+        scope_row = ttk.Frame(f)
+        scope_row.grid(row=4, column=1, sticky='w')
+        ttk.Radiobutton(scope_row, text="Por ficheiro", value='file',
+                        variable=scope_var).pack(side='left', padx=(0, 8))
+        ttk.Radiobutton(scope_row, text="Por lote", value='batch',
+                        variable=scope_var).pack(side='left')
 
         enabled_var = tk.BooleanVar(value=True)
         ttk.Checkbutton(f, text="Activo", variable=enabled_var).grid(
-            row=3, column=0, columnspan=2, pady=(8, 0))
+            row=5, column=0, columnspan=2, pady=(8, 0))
 
         def _confirm():
             cmd = cmd_var.get().strip()
             if not cmd:
                 messagebox.showerror("Erro", "O comando não pode estar vazio.", parent=dlg)
                 return
-            hook = {'name': name_var.get().strip(), 'command': cmd,
-                    'timeout': timeout_var.get(), 'enabled': enabled_var.get()}
+            if kind_var.get() == 'callable':
+                from src.hooks import resolve_callable
+                try:
+                    resolve_callable(cmd)
+                except Exception as e:
+                    messagebox.showerror("Erro", f"Função inválida: {e}", parent=dlg)
+                    return
+            hook = {'name': name_var.get().strip(), kind_var.get(): cmd,
+                    'timeout': timeout_var.get(), 'enabled': enabled_var.get(),
+                    'scope': scope_var.get()}
             self.config.setdefault('automation', {}).setdefault('hooks', []).append(hook)
             self._reload_hooks_tree()
             dlg.destroy()
 
         ttk.Button(f, text="Adicionar", command=_confirm).grid(
-            row=4, column=0, columnspan=2, pady=(12, 0))
+            row=6, column=0, columnspan=2, pady=(12, 0))
 
     def _remove_hook(self):
         sel = self.hooks_tree.selection()
@@ -839,6 +1151,11 @@ class ConverterApp:
         ttk.Checkbutton(options_frame, text="Data/hora no nome do ficheiro",
                        variable=self.add_timestamp_var).pack(anchor='w', pady=2)
 
+        self.skip_unchanged_var = tk.BooleanVar(
+            value=self.config['output'].get('skip_unchanged', False))
+        ttk.Checkbutton(options_frame, text="Não regenerar PDFs inalterados",
+                       variable=self.skip_unchanged_var).pack(anchor='w', pady=2)
+
         security_frame = ttk.LabelFrame(opts_sec_frame, text="Segurança", padding=self._PAD_INNER)
         security_frame.pack(side='left', fill='both', expand=True, padx=(6, 0))
 
@@ -865,6 +1182,8 @@ class ConverterApp:
         self.generation_mode_var = tk.StringVar(value='individual')
         ttk.Radiobutton(mode_left, text="Por Linha (um PDF por cliente)",
                        variable=self.generation_mode_var, value='individual').pack(anchor='w', pady=1)
+        ttk.Radiobutton(mode_left, text="Por Linha em ZIP (um PDF por cliente, num único .zip)",
+                       variable=self.generation_mode_var, value='zip').pack(anchor='w', pady=1)
         ttk.Radiobutton(mode_left, text="Agregado (todos num único PDF)",
                        variable=self.generation_mode_var, value='aggregate').pack(anchor='w', pady=1)
 
@@ -888,6 +1207,10 @@ class ConverterApp:
                                  command=self._generate, style='Accent.TButton')
         generate_btn.pack(side='left', padx=(0, 6))
 
+        self.cancel_btn = ttk.Button(actions_frame, text="Cancelar",
+                                     command=self._cancel_conversion, state='disabled')
+        self.cancel_btn.pack(side='left', padx=6)
+
         ttk.Button(actions_frame, text="Exportar Excel",
                    command=self._export_excel).pack(side='left', padx=6)
 
@@ -1911,6 +2234,8 @@ class ConverterApp:
                 'output_folder': '',
                 'filename_template': self.filename_template_var.get()
                     if hasattr(self, 'filename_template_var') else '',
+                'skip_unchanged': self.skip_unchanged_var.get()
+                    if hasattr(self, 'skip_unchanged_var') else False,
             },
             'contabilidade': {
                 'enabled': True,
@@ -1936,6 +2261,8 @@ class ConverterApp:
             'fonts': self._get_fonts_from_ui(),
             'banking': self._get_banking_from_ui(),
             'automation': self._get_automation_from_ui(),
+            'batch': self._get_batch_from_ui(),
+            'resources': self._get_resources_from_ui(),
             'recent': self.config.get('recent', {'last_excel_dir': '', 'last_output_dir': ''}),
             'ui': {
                 'theme': self.config.get('ui', {}).get('theme', 'light'),
@@ -1944,6 +2271,45 @@ class ConverterApp:
             },
         }
     
+    def _get_batch_from_ui(self) -> dict:
+        """Lê a secção de lote da UI (as opções sem widget vêm da config)."""
+        batch = dict(DEFAULT_CONFIG['batch'])
+        batch.update(self.config.get('batch', {}))
+        batch['workers'] = self._get_int_var('batch_workers_var', batch['workers'])
+        if hasattr(self, 'batch_recursive_var'):
+            batch['recursive'] = self.batch_recursive_var.get()
+            batch['include'] = [p.strip() for p in self.batch_include_var.get().split(',')
+                                if p.strip()]
+            batch['exclude'] = [p.strip() for p in self.batch_exclude_var.get().split(',')
+                                if p.strip()]
+            batch['dedup'] = self.batch_dedup_var.get()
+            batch['dedup_link'] = self.batch_dedup_link_var.get()
+        return batch
+
+    def _get_resources_from_ui(self) -> dict:
+        """Lê o orçamento de memória e os limites de isolamento da UI."""
+        resources = dict(DEFAULT_CONFIG['resources'])
+        resources.update(self.config.get('resources', {}))
+        resources['memory_budget_mb'] = self._get_int_var(
+            'memory_budget_var', resources['memory_budget_mb'])
+        if hasattr(self, 'isolate_var'):
+            resources['isolate'] = self.isolate_var.get()
+        resources['timeout_seconds'] = self._get_int_var(
+            'timeout_seconds_var', resources['timeout_seconds'])
+        resources['memory_limit_mb'] = self._get_int_var(
+            'memory_limit_var', resources['memory_limit_mb'])
+        return resources
+
+    def _get_int_var(self, name: str, default: int) -> int:
+        """Lê uma IntVar da UI, devolvendo ``default`` se não existir ou for inválida."""
+        var = getattr(self, name, None)
+        if var is None:
+            return default
+        try:
+            return int(var.get())
+        except (tk.TclError, ValueError):
+            return default
+
     def _get_banking_from_ui(self) -> dict:
         """Lê as contas bancárias do Treeview."""
         accounts = []
@@ -1977,15 +2343,20 @@ class ConverterApp:
         }
 
     def _get_automation_from_ui(self) -> dict:
-        """Lê a secção de automação da UI."""
-        return {
+        """Lê a secção de automação da UI (as opções sem widget vêm da config)."""
+        automation = dict(DEFAULT_CONFIG['automation'])
+        automation.update(self.config.get('automation', {}))
+        automation.update({
             'watch_folder': self.watch_folder_var.get() if hasattr(self, 'watch_folder_var') else '',
             'watch_enabled': self.watch_enabled_var.get() if hasattr(self, 'watch_enabled_var') else False,
             'watch_mode': self.watch_mode_var.get() if hasattr(self, 'watch_mode_var') else 'individual',
             'watch_interval': self.watch_interval_var.get() if hasattr(self, 'watch_interval_var') else 5,
+            'watch_backend': self.watch_backend_var.get() if hasattr(self, 'watch_backend_var') else 'auto',
+            'watch_workers': self._get_int_var('watch_workers_var', automation['watch_workers']),
             'schedules': self.config.get('automation', {}).get('schedules', []),
             'hooks': self.config.get('automation', {}).get('hooks', []),
-        }
+        })
+        return automation
 
     def _save_config(self):
         """Guarda configurações."""
@@ -1999,9 +2370,45 @@ class ConverterApp:
         
         if mode == 'individual':
             self._convert_individual()
+        elif mode == 'zip':
+            self._convert_individual(as_zip=True)
         else:
             self._convert()
     
+    def _cancel_conversion(self):
+        """Pede o cancelamento da conversão em curso no tab Converter."""
+        if self._cancel_token is not None:
+            self._cancel_token.cancel()
+            self.status_var.set("A cancelar...")
+
+    def _begin_cancellable(self) -> CancelToken:
+        """Cria um token de cancelamento e activa o botão Cancelar."""
+        self._cancel_token = CancelToken()
+        self.cancel_btn.configure(state='normal')
+        return self._cancel_token
+
+    def _end_cancellable(self):
+        """Desactiva o botão Cancelar (chamar a partir da thread da UI)."""
+        self._cancel_token = None
+        self.cancel_btn.configure(state='disabled')
+
+    def _progress_reporter(self, start_pct: float, end_pct: float, unit: str):
+        """Devolve um callback que mapeia o progresso da conversão para a UI.
+
+        O progresso (ver ``src.progress``) é convertido para o intervalo
+        ``start_pct``–``end_pct`` da barra, e o estado mostra o item actual,
+        o débito e o tempo restante estimado.
+        """
+        def report(info):
+            total = info['total'] or 1
+            pct = start_pct + (end_pct - start_pct) * info['current'] / total
+            text = f"[{info['current']}/{info['total']}] {info['label']}"
+            if info['rate']:
+                text += f" — {info['rate']:.1f} {unit}/s, faltam {format_eta(info['eta'])}"
+            self.root.after(0, lambda: self.progress_var.set(pct))
+            self.root.after(0, lambda: self.status_var.set(text))
+        return report
+
     def _convert(self):
         """Executa a conversão (modo agregado)."""
         excel_path = self.excel_path.get()
@@ -2028,6 +2435,7 @@ class ConverterApp:
 
         self.progress_var.set(10)
         self.status_var.set("A ler dados do Excel...")
+        cancel_token = self._begin_cancellable()
         self.root.update()
 
         def task():
@@ -2041,13 +2449,19 @@ class ConverterApp:
 
                 self.root.after(0, lambda: self.status_var.set("A gerar PDF..."))
                 self.root.after(0, lambda: self.progress_var.set(60))
-                result_path = converter.generate_pdf(client_filter=self._client_filter)
+                result_path = converter.generate_pdf(
+                    client_filter=self._client_filter,
+                    progress_callback=self._progress_reporter(60, 100, 'fases'),
+                    cancel_token=cancel_token)
 
+                cache_hits = len(converter.cache_hits)
+                estado = "PDF inalterado" if cache_hits else "PDF gerado"
                 self.root.after(0, lambda: self.progress_var.set(100))
                 self.root.after(0, lambda: self.status_var.set(
-                    f"PDF gerado: {os.path.basename(result_path)} ({clients_count} clientes)"))
+                    f"{estado}: {os.path.basename(result_path)} ({clients_count} clientes)"))
 
-                history.add_entry(excel_path, result_path, 'aggregate', clients_count, True)
+                history.add_entry(excel_path, result_path, 'aggregate', clients_count, True,
+                                  cache_hits=cache_hits, timings=timings_of(converter))
                 self.root.after(0, lambda n=clients_count: notifier.notify(
                     "Conversão concluída",
                     f"{n} cliente(s) — {os.path.basename(result_path)}",
@@ -2070,17 +2484,27 @@ class ConverterApp:
 
                 self.root.after(1500, lambda: self.progress_var.set(0))
 
+            except ConversionCancelled as e:
+                self.root.after(0, lambda: self.progress_var.set(0))
+                self.root.after(0, lambda: self.status_var.set("Conversão cancelada"))
+                history.add_entry(excel_path, output_path or '', 'aggregate', 0, False, str(e))
             except Exception as e:
                 self.root.after(0, lambda: self.progress_var.set(0))
                 self.root.after(0, lambda: self.status_var.set("Erro na conversão"))
                 history.add_entry(excel_path, output_path or '', 'aggregate', 0, False, str(e))
                 self.root.after(0, lambda: messagebox.showerror("Erro",
                     f"Erro durante a conversão:\n\n{str(e)}"))
+            finally:
+                self.root.after(0, self._end_cancellable)
 
         threading.Thread(target=task, daemon=True).start()
     
-    def _convert_individual(self):
-        """Gera PDFs individuais para cada cliente."""
+    def _convert_individual(self, as_zip: bool = False):
+        """Gera PDFs individuais para cada cliente.
+
+        Args:
+            as_zip: Escrever os PDFs directamente num arquivo .zip em vez de numa pasta.
+        """
         excel_path = self.excel_path.get()
 
         if not excel_path:
@@ -2092,8 +2516,10 @@ class ConverterApp:
             return
 
         config = self._get_config_from_ui()
+        mode = 'zip' if as_zip else 'individual'
         self.progress_var.set(10)
         self.status_var.set("A gerar PDFs individuais...")
+        cancel_token = self._begin_cancellable()
         self.root.update()
 
         def task():
@@ -2105,28 +2531,41 @@ class ConverterApp:
                 self._cache_clients_from_data(excel_path, data)
 
                 self.root.after(0, lambda: self.progress_var.set(40))
-                result_files = converter.generate_individual_pdfs(client_filter=self._client_filter)
+                result_files = converter.generate_individual_pdfs(
+                    client_filter=self._client_filter, zip_output=as_zip or None,
+                    progress_callback=self._progress_reporter(40, 100, 'PDFs'),
+                    cancel_token=cancel_token)
 
                 self.root.after(0, lambda: self.progress_var.set(100))
 
                 if result_files:
-                    folder = os.path.dirname(result_files[0])
-                    self.root.after(0, lambda: self.status_var.set(
-                        f"{len(result_files)} PDFs gerados!"))
-
-                    history.add_entry(excel_path, folder, 'individual', len(result_files), True)
+                    if as_zip:
+                        zip_path = converter.output_zip_path
+                        folder = os.path.dirname(zip_path)
+                        output_path = zip_path
+                    else:
+                        folder = os.path.dirname(result_files[0])
+                        output_path = folder
+                    cache_hits = len(converter.cache_hits)
+                    status = f"{len(result_files)} PDFs gerados!"
+                    if cache_hits:
+                        status += f" ({cache_hits} inalterados)"
+                    self.root.after(0, lambda: self.status_var.set(status))
+
+                    history.add_entry(excel_path, output_path, mode, len(result_files), True,
+                                      cache_hits=cache_hits, timings=timings_of(converter))
                     self.root.after(0, lambda n=len(result_files): notifier.notify(
                         "Conversão concluída",
                         f"{n} PDF(s) gerado(s)",
                         self.config,
                     ))
 
-                    self._last_generated_files = list(result_files)
+                    self._last_generated_files = [zip_path] if as_zip else list(result_files)
                     self.root.after(0, lambda: self.email_btn.configure(state='normal'))
 
                     self.root.after(0, lambda: messagebox.showinfo("Sucesso",
                         f"Gerados {len(result_files)} PDFs individuais!\n\n"
-                        f"Pasta: {folder}"))
+                        f"{'Arquivo' if as_zip else 'Pasta'}: {output_path}"))
 
                     if config['output'].get('auto_open', True):
                         if sys.platform == 'linux':
@@ -2142,12 +2581,18 @@ class ConverterApp:
 
                 self.root.after(1500, lambda: self.progress_var.set(0))
 
+            except ConversionCancelled as e:
+                self.root.after(0, lambda: self.progress_var.set(0))
+                self.root.after(0, lambda: self.status_var.set("Conversão cancelada"))
+                history.add_entry(excel_path, '', mode, 0, False, str(e))
             except Exception as e:
                 self.root.after(0, lambda: self.progress_var.set(0))
                 self.root.after(0, lambda: self.status_var.set("Erro na conversão"))
-                history.add_entry(excel_path, '', 'individual', 0, False, str(e))
+                history.add_entry(excel_path, '', mode, 0, False, str(e))
                 self.root.after(0, lambda: messagebox.showerror("Erro",
                     f"Erro durante a geração:\n\n{str(e)}"))
+            finally:
+                self.root.after(0, self._end_cancellable)
 
         threading.Thread(target=task, daemon=True).start()
     
@@ -2231,7 +2676,10 @@ class ConverterApp:
                 all_cols.update(item.keys())
             
             mes_ref = data.get('mes_referencia', 'N/A')
-            mode_text = "Individual (1 PDF por linha)" if self.generation_mode_var.get() == 'individual' else "Agregado (1 único PDF)"
+            mode_text = {
+                'individual': "Individual (1 PDF por linha)",
+                'zip': "Individual em ZIP (1 PDF por linha)",
+            }.get(self.generation_mode_var.get(), "Agregado (1 único PDF)")
             
             # === VALIDAÇÃO DE DADOS ===
             warnings = []
@@ -2613,6 +3061,22 @@ class ConverterApp:
         self.add_timestamp_var.set(cfg['output']['add_timestamp'])
         if hasattr(self, 'filename_template_var'):
             self.filename_template_var.set(cfg.get('output', {}).get('filename_template', ''))
+        if hasattr(self, 'skip_unchanged_var'):
+            self.skip_unchanged_var.set(cfg.get('output', {}).get('skip_unchanged', False))
+        if hasattr(self, 'batch_workers_var'):
+            batch_cfg = cfg.get('batch', {})
+            self.batch_workers_var.set(batch_cfg.get('workers', 1))
+            self.batch_recursive_var.set(batch_cfg.get('recursive', False))
+            self.batch_include_var.set(', '.join(batch_cfg.get('include', [])))
+            self.batch_exclude_var.set(', '.join(batch_cfg.get('exclude', [])))
+            self.batch_dedup_var.set(batch_cfg.get('dedup', False))
+            self.batch_dedup_link_var.set(batch_cfg.get('dedup_link', 'copy'))
+        if hasattr(self, 'memory_budget_var'):
+            resources_cfg = cfg.get('resources', {})
+            self.memory_budget_var.set(resources_cfg.get('memory_budget_mb', 0))
+            self.isolate_var.set(resources_cfg.get('isolate', False))
+            self.timeout_seconds_var.set(resources_cfg.get('timeout_seconds', 600))
+            self.memory_limit_var.set(resources_cfg.get('memory_limit_mb', 0))
         # Colors
         for key, var in self.color_vars.items():
             if not key.endswith('_btn') and key in cfg.get('colors', {}):
@@ -2679,6 +3143,12 @@ class ConverterApp:
             self.watch_mode_var.set(auto_cfg.get('watch_mode', 'individual'))
         if hasattr(self, 'watch_interval_var'):
             self.watch_interval_var.set(auto_cfg.get('watch_interval', 5))
+        if hasattr(self, 'watch_backend_var'):
+            self.watch_backend_var.set(auto_cfg.get('watch_backend', 'auto'))
+        if hasattr(self, 'watch_workers_var'):
+            self.watch_workers_var.set(auto_cfg.get('watch_workers', 1))
+        if hasattr(self, 'watch_folders_tree'):
+            self._reload_watch_folders_tree()
         if hasattr(self, 'schedules_tree'):
             self._reload_schedules_tree()
         if hasattr(self, 'hooks_tree'):
@@ -2877,7 +3347,7 @@ class ConverterApp:
                 dt = '?'
 
             tag = 'success' if entry.get('success', False) else 'error'
-            mode_label = 'Individual' if entry.get('mode') == 'individual' else 'Agregado'
+            mode_label = {'individual': 'Individual', 'zip': 'ZIP'}.get(entry.get('mode'), 'Agregado')
             result_label = 'OK' if entry.get('success', False) else 'Erro'
 
             self.history_tree.insert('', 'end', values=(
@@ -2925,9 +3395,73 @@ class ConverterApp:
         self.batch_mode_var = tk.StringVar(value='individual')
         ttk.Radiobutton(mode_frame, text="Por Linha (um PDF por cliente)",
                         variable=self.batch_mode_var, value='individual').pack(anchor='w', pady=1)
+        ttk.Radiobutton(mode_frame, text="Por Linha em ZIP (um .zip por ficheiro Excel)",
+                        variable=self.batch_mode_var, value='zip').pack(anchor='w', pady=1)
         ttk.Radiobutton(mode_frame, text="Agregado (um PDF por ficheiro Excel)",
                         variable=self.batch_mode_var, value='aggregate').pack(anchor='w', pady=1)
 
+        workers_row = ttk.Frame(mode_frame)
+        workers_row.pack(anchor='w', pady=(6, 0))
+        ttk.Label(workers_row, text="Processos em paralelo (0 = um por CPU):").pack(side='left')
+        self.batch_workers_var = tk.IntVar(
+            value=self.config.get('batch', {}).get('workers', 1))
+        ttk.Spinbox(workers_row, textvariable=self.batch_workers_var,
+                    from_=0, to=64, width=5).pack(side='left', padx=(6, 0))
+
+        memory_row = ttk.Frame(mode_frame)
+        memory_row.pack(anchor='w', pady=(4, 0))
+        ttk.Label(memory_row, text="Memória máxima em MB (0 = automático, -1 = sem limite):").pack(side='left')
+        self.memory_budget_var = tk.IntVar(
+            value=self.config.get('resources', {}).get('memory_budget_mb', 0))
+        ttk.Spinbox(memory_row, textvariable=self.memory_budget_var,
+                    from_=-1, to=1048576, increment=256, width=8).pack(side='left', padx=(6, 0))
+
+        resources_cfg = self.config.get('resources', {})
+        isolate_row = ttk.Frame(mode_frame)
+        isolate_row.pack(anchor='w', pady=(4, 0))
+        self.isolate_var = tk.BooleanVar(value=resources_cfg.get('isolate', False))
+        ttk.Checkbutton(isolate_row, text="Converter cada ficheiro num processo isolado",
+                        variable=self.isolate_var).pack(side='left')
+        limits_row = ttk.Frame(mode_frame)
+        limits_row.pack(anchor='w', pady=(4, 0))
+        ttk.Label(limits_row, text="Tempo máximo (s):").pack(side='left')
+        self.timeout_seconds_var = tk.IntVar(value=resources_cfg.get('timeout_seconds', 600))
+        ttk.Spinbox(limits_row, textvariable=self.timeout_seconds_var,
+                    from_=0, to=86400, increment=60, width=7).pack(side='left', padx=(6, 12))
+        ttk.Label(limits_row, text="Memória por ficheiro (MB, 0 = sem limite):").pack(side='left')
+        self.memory_limit_var = tk.IntVar(value=resources_cfg.get('memory_limit_mb', 0))
+        ttk.Spinbox(limits_row, textvariable=self.memory_limit_var,
+                    from_=0, to=1048576, increment=256, width=8).pack(side='left', padx=(6, 0))
+
+        # Descoberta de ficheiros
+        discovery_frame = ttk.LabelFrame(frame, text="Pesquisa de ficheiros", padding=self._PAD_INNER)
+        discovery_frame.pack(fill='x', pady=self._PAD_SECTION)
+
+        batch_cfg = self.config.get('batch', {})
+        self.batch_recursive_var = tk.BooleanVar(value=batch_cfg.get('recursive', False))
+        ttk.Checkbutton(discovery_frame, text="Incluir subpastas",
+                        variable=self.batch_recursive_var).grid(row=0, column=0, columnspan=2, sticky='w')
+        self.batch_include_var = tk.StringVar(value=', '.join(batch_cfg.get('include', [])))
+        self.batch_exclude_var = tk.StringVar(value=', '.join(batch_cfg.get('exclude', [])))
+        for row, (label, var) in enumerate([
+                ("Incluir (padrões, ex: 2024-*/*.xlsx):", self.batch_include_var),
+                ("Excluir (padrões, ex: arquivo, *_old.xlsx):", self.batch_exclude_var)], start=1):
+            ttk.Label(discovery_frame, text=label).grid(row=row, column=0, sticky='w', pady=2)
+            ttk.Entry(discovery_frame, textvariable=var).grid(row=row, column=1, sticky='ew',
+                                                             padx=(8, 0), pady=2)
+        discovery_frame.columnconfigure(1, weight=1)
+
+        self.batch_dedup_var = tk.BooleanVar(value=batch_cfg.get('dedup', False))
+        ttk.Checkbutton(discovery_frame, text="Converter uma só vez ficheiros idênticos",
+                        variable=self.batch_dedup_var).grid(row=3, column=0, sticky='w', pady=(4, 0))
+        self.batch_dedup_link_var = tk.StringVar(value=batch_cfg.get('dedup_link', 'copy'))
+        link_row = ttk.Frame(discovery_frame)
+        link_row.grid(row=3, column=1, sticky='w', padx=(8, 0), pady=(4, 0))
+        ttk.Radiobutton(link_row, text="Copiar PDFs", variable=self.batch_dedup_link_var,
+                        value='copy').pack(side='left')
+        ttk.Radiobutton(link_row, text="Hard link", variable=self.batch_dedup_link_var,
+                        value='hardlink').pack(side='left', padx=(8, 0))
+
         # Lista de ficheiros encontrados
         files_frame = ttk.LabelFrame(frame, text="Ficheiros encontrados", padding=self._PAD_INNER)
         files_frame.pack(fill='both', expand=True, pady=self._PAD_SECTION)
@@ -2946,10 +3480,30 @@ class ConverterApp:
         ttk.Label(frame, textvariable=self.batch_status_var, foreground='#666666',
                   style='Status.TLabel').pack(pady=(0, 4))
 
-        # Botão
-        self.batch_run_btn = ttk.Button(frame, text="Processar Todos",
+        # Botões
+        buttons = ttk.Frame(frame)
+        buttons.pack(fill='x')
+        self.batch_run_btn = ttk.Button(buttons, text="Processar Todos",
                                         command=self._run_batch, style='Accent.TButton')
-        self.batch_run_btn.pack(anchor='e')
+        self.batch_run_btn.pack(side='right')
+
+        self.batch_cancel_btn = ttk.Button(buttons, text="Cancelar",
+                                           command=self._cancel_batch, state='disabled')
+        self.batch_cancel_btn.pack(side='right', padx=6)
+
+        self.batch_resume_btn = ttk.Button(buttons, text="Retomar lote interrompido",
+                                           command=self._resume_batch)
+        self.batch_resume_btn.pack(side='left')
+
+        self.batch_estimate_btn = ttk.Button(buttons, text="Estimar duração",
+                                             command=self._estimate_batch)
+        self.batch_estimate_btn.pack(side='left', padx=6)
+
+    def _cancel_batch(self):
+        """Pede o cancelamento do lote em curso."""
+        if self._batch_cancel_token is not None:
+            self._batch_cancel_token.cancel()
+            self.batch_status_var.set("A cancelar...")
 
     def _browse_batch_folder(self):
         """Seleciona pasta para processamento em lote."""
@@ -2958,15 +3512,63 @@ class ConverterApp:
             return
         self.batch_folder_var.set(folder)
         try:
-            files = find_excel_files(folder)
+            files = list(discover_excel_files(folder, self._get_config_from_ui()))
             if files:
-                names = [os.path.basename(f) for f in files]
+                names = [os.path.relpath(f, folder) for f in files]
                 self.batch_files_var.set(f"{len(files)} ficheiro(s):\n" + "\n".join(names))
             else:
                 self.batch_files_var.set("Nenhum ficheiro Excel encontrado.")
         except Exception as e:
             self.batch_files_var.set(f"Erro: {e}")
 
+    def _estimate_batch(self):
+        """Estima a duração do lote (sem converter) e mostra-a com a lista de ficheiros."""
+        folder = self.batch_folder_var.get()
+        if not folder:
+            messagebox.showerror("Erro", "Selecione uma pasta.")
+            return
+
+        config = self._get_config_from_ui()
+        mode = self.batch_mode_var.get()
+        self.batch_estimate_btn.configure(state='disabled')
+        self.batch_status_var.set("A estimar duração...")
+
+        def task():
+            try:
+                estimate = estimate_batch(folder, config, mode)
+                self._batch_estimate = (folder, mode, estimate['wall_seconds'])
+                accuracy = estimate_accuracy()
+                text = self._format_batch_estimate(estimate, accuracy)
+                status = f"Duração estimada: ~{format_eta(estimate['wall_seconds'])}"
+                self.root.after(0, lambda: self.batch_files_var.set(text))
+                self.root.after(0, lambda: self.batch_status_var.set(status))
+            except Exception as e:
+                self.root.after(0, lambda: self.batch_status_var.set(f"Erro: {e}"))
+            finally:
+                self.root.after(0, lambda: self.batch_estimate_btn.configure(state='normal'))
+
+        threading.Thread(target=task, daemon=True).start()
+
+    @staticmethod
+    def _format_batch_estimate(estimate: dict, accuracy: dict) -> str:
+        """Texto da lista de ficheiros com a estimativa de cada um e o total."""
+        files = estimate['files']
+        if not files:
+            return "Nenhum ficheiro Excel encontrado."
+        lines = [f"{len(files)} ficheiro(s), ~{estimate['rows']} linha(s):"]
+        lines += [f"{f['filename']} — {f['rows']} linha(s), ~{format_eta(f['seconds'])}"
+                  for f in files]
+        rates = estimate['rates']
+        origem = (f"débito de {rates['samples']} conversão(ões) anteriores"
+                  if rates['source'] == 'history' else "débito de referência (sem histórico)")
+        lines.append("")
+        lines.append(f"Total estimado: ~{format_eta(estimate['wall_seconds'])} "
+                     f"com {estimate['workers']} processo(s) — {origem}")
+        if accuracy['mean_error'] is not None:
+            lines.append(f"Erro médio das últimas {len(accuracy['runs'])} estimativa(s): "
+                         f"{accuracy['mean_error']:.0%}")
+        return "\n".join(lines)
+
     def _run_batch(self):
         """Executa o processamento em lote numa thread."""
         folder = self.batch_folder_var.get()
@@ -2977,40 +3579,108 @@ class ConverterApp:
         config = self._get_config_from_ui()
         mode = self.batch_mode_var.get()
 
+        # Registar o lote no diário para poder ser retomado se for interrompido
+        run_id = batch_journal.start_run(folder, mode, config)
+
+        # A estimativa pedida para esta pasta e modo fica no diário, para medir
+        # a precisão das seguintes; sem ela o lote não percorre a pasta antes
+        # de começar a converter
+        if self._batch_estimate and self._batch_estimate[:2] == (folder, mode):
+            batch_journal.set_estimate(run_id, self._batch_estimate[2])
+
+        def runner(**kw):
+            return process_batch(folder, config, mode=mode, run_id=run_id, **kw)
+
+        self._start_batch_task(mode, runner)
+
+    def _resume_batch(self):
+        """Retoma o lote interrompido mais recente (da pasta seleccionada, se houver)."""
+        folder = self.batch_folder_var.get() or None
+        run = batch_journal.latest_incomplete_run(folder)
+        if run is None:
+            messagebox.showinfo("Retomar lote", "Não há lotes por concluir.")
+            return
+        if not messagebox.askyesno(
+                "Retomar lote",
+                f"Retomar o lote de {run['started_at'][:16].replace('T', ' ')}?\n\n"
+                f"Pasta: {run['folder']}\n"
+                f"Concluídos: {run['done']} de {run['total']} ficheiro(s)"):
+            return
+        self.batch_folder_var.set(run['folder'])
+        # As passwords não ficam no diário: usar as que estão na interface
+        live_config = self._get_config_from_ui()
+        self._start_batch_task(run['mode'], lambda **kw: resume_batch(
+            run['id'], live_config=live_config, **kw))
+
+    def _start_batch_task(self, mode: str, runner):
+        """Executa um lote numa thread, com progresso e cancelamento.
+
+        Args:
+            mode: Modo de geração (para o histórico).
+            runner: Função que executa o lote, chamada com ``progress_callback``,
+                    ``client_progress_callback`` e ``cancel_token``.
+        """
         self.batch_run_btn.configure(state='disabled')
+        self.batch_resume_btn.configure(state='disabled')
         self.batch_progress_var.set(0)
+        cancel_token = self._batch_cancel_token = CancelToken()
+        self.batch_cancel_btn.configure(state='normal')
+        position = {'current': 0, 'total': 0}
 
         def on_progress(current, total, filename):
+            position.update(current=current, total=total)
             pct = (current / total) * 100 if total else 0
             self.root.after(0, lambda: self.batch_progress_var.set(pct))
             self.root.after(0, lambda: self.batch_status_var.set(
                 f"[{current}/{total}] {filename}"))
 
+        def on_client_progress(filename, info):
+            # Avanço fraccionário dentro do ficheiro em curso
+            total = position['total']
+            if not total or not info['total']:
+                return
+            frac = info['current'] / info['total']
+            pct = (position['current'] + frac) / total * 100
+            text = (f"[{position['current'] + 1}/{total}] {filename} — "
+                    f"{info['current']}/{info['total']}, "
+                    f"faltam {format_eta(info['eta'])}")
+            self.root.after(0, lambda: self.batch_progress_var.set(pct))
+            self.root.after(0, lambda: self.batch_status_var.set(text))
+
         def task():
             try:
-                results = process_batch(folder, config, mode=mode,
-                                        progress_callback=on_progress)
+                results = runner(progress_callback=on_progress,
+                                 client_progress_callback=on_client_progress,
+                                 cancel_token=cancel_token)
 
                 ok = sum(1 for r in results if r['success'])
                 fail = len(results) - ok
+                duplicates = [r for r in results if r.get('duplicate_of')]
 
                 # Registar no histórico
                 for r in results:
                     history.add_entry(r['file'], r['output_path'], f'batch_{mode}',
-                                      r['clients_count'], r['success'], r['error'])
+                                      r['clients_count'], r['success'], r['error'],
+                                      cache_hits=r.get('cache_hits', 0),
+                                      timings=r.get('timings'))
 
                 self.root.after(0, lambda: self.batch_progress_var.set(100))
+                estado = "Cancelado" if cancel_token.is_cancelled else "Concluído"
                 self.root.after(0, lambda: self.batch_status_var.set(
-                    f"Concluído: {ok} com sucesso, {fail} com erro(s)"))
+                    f"{estado}: {ok} com sucesso, {fail} com erro(s)"))
                 self.root.after(0, lambda o=ok, f=fail: notifier.notify(
                     "Batch concluído",
                     f"{o} ficheiro(s) com sucesso, {f} com erro(s)",
                     self.config,
                 ))
+                resumo = (f"Processados {len(results)} ficheiro(s).\n"
+                          f"Com sucesso: {ok}   Com erros: {fail}")
+                if duplicates:
+                    resumo += f"\n\nDuplicados (não convertidos): {len(duplicates)}\n" + "\n".join(
+                        f"{r['filename']} = {os.path.basename(r['duplicate_of'])}"
+                        for r in duplicates)
                 self.root.after(0, lambda: messagebox.showinfo(
-                    "Processamento concluído",
-                    f"Processados {len(results)} ficheiro(s).\n"
-                    f"Com sucesso: {ok}   Com erros: {fail}"))
+                    "Processamento concluído", resumo))
 
                 if fail > 0:
                     erros = "\n".join(
@@ -3024,7 +3694,10 @@ class ConverterApp:
                 self.root.after(0, lambda: self.batch_status_var.set(f"Erro: {e}"))
                 self.root.after(0, lambda: messagebox.showerror("Erro", str(e)))
             finally:
+                self._batch_cancel_token = None
                 self.root.after(0, lambda: self.batch_run_btn.configure(state='normal'))
+                self.root.after(0, lambda: self.batch_resume_btn.configure(state='normal'))
+                self.root.after(0, lambda: self.batch_cancel_btn.configure(state='disabled'))
                 self.root.after(1500, lambda: self.batch_progress_var.set(0))
 
         threading.Thread(target=task, daemon=True).start()
@@ -14,7 +14,8 @@ from src.database import (add_history_entry, get_history as _get_history,
 
 
 def add_entry(source_file: str, output_path: str, mode: str,
-              clients_count: int, success: bool, error_msg: str = ''):
+              clients_count: int, success: bool, error_msg: str = '',
+              cache_hits: int = 0, timings: dict = None):
     """Adiciona uma entrada ao histórico.
 
     Args:
@@ -24,8 +25,11 @@ def add_entry(source_file: str, output_path: str, mode: str,
         clients_count: Número de clientes/registos processados.
         success: Se a conversão foi bem sucedida.
         error_msg: Mensagem de erro (se aplicável).
+        cache_hits: Número de PDFs não regenerados por estarem inalterados.
+        timings: Tempos por fase da conversão (``PhaseTimer.as_dict()``).
     """
-    add_history_entry(source_file, output_path, mode, clients_count, success, error_msg)
+    add_history_entry(source_file, output_path, mode, clients_count, success, error_msg,
+                      cache_hits, timings)
 
 
 def get_history(limit: int = 50) -> list:
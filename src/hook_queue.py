@@ -0,0 +1,475 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo da fila persistente de hooks.
+
+Com ``automation.hooks_async`` (default), os hooks não correm no fim de cada
+conversão: ficam na tabela ``hook_jobs`` e são executados em segundo plano
+por ``automation.hooks_concurrency`` threads. Um hook lento (ex: um upload)
+deixa de atrasar a conversão seguinte.
+
+Um hook que falhe (código de saída diferente de zero, excepção ou timeout) é
+repetido até ``automation.hooks_max_attempts`` vezes, com espera exponencial
+a partir de ``automation.hooks_retry_delay`` segundos (30 s, 60 s, 120 s...,
+no máximo uma hora). Como a fila está na base de dados, as repetições
+sobrevivem a um reinício da aplicação.
+
+Ordem:
+- os hooks de uma mesma conversão correm pela ordem configurada (cada um
+  espera que o anterior termine, com ou sem sucesso);
+- os hooks de lote (``scope = 'batch'``) esperam pelos hooks de ficheiro do
+  mesmo lote.
+
+Cada tentativa fica registada na tabela ``hook_jobs`` (ver ``recent_jobs``
+e ``--hook-jobs`` na linha de comandos). O resultado final de cada hook
+(sucesso ou tentativas esgotadas) fica também no histórico, numa entrada
+no modo ``hook:<nome>``; o histórico limita as entradas dos hooks à parte
+das conversões, para que um lote com muitos hooks não as afaste.
+
+Estados de um trabalho: ``pending`` (à espera, possivelmente de uma
+repetição), ``running``, ``done`` e ``failed`` (tentativas esgotadas).
+"""
+
+import json
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from src.database import _get_connection
+from src.hooks import _enabled_hooks, _run_hook, hooks_concurrency
+
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Espera máxima entre repetições (s)
+_MAX_BACKOFF = 3600
+# Margem, além do timeout do hook, antes de um trabalho 'running' ser dado
+# como abandonado (processo terminado a meio) e voltar a ser executado
+_LEASE_MARGIN = 60
+# Intervalo máximo entre verificações da fila pelas threads paradas (s)
+_IDLE_WAIT = 1.0
+
+
+def is_async(config: dict) -> bool:
+    """Indica se os hooks correm em segundo plano (``automation.hooks_async``)."""
+    return bool(config.get('automation', {}).get('hooks_async', True))
+
+
+def retry_options(config: dict) -> tuple:
+    """Devolve ``(max_attempts, retry_delay)`` da configuração (valores válidos)."""
+    automation = config.get('automation', {})
+    try:
+        attempts = max(int(automation.get('hooks_max_attempts', 5)), 1)
+    except (TypeError, ValueError):
+        attempts = 5
+    try:
+        delay = max(float(automation.get('hooks_retry_delay', 30)), 0.0)
+    except (TypeError, ValueError):
+        delay = 30.0
+    return attempts, delay
+
+
+def backoff_delay(retry_delay: float, attempts: int) -> float:
+    """Espera antes da próxima tentativa, depois de ``attempts`` tentativas falhadas."""
+    return min(retry_delay * 2 ** max(attempts - 1, 0), _MAX_BACKOFF)
+
+
+# Condição de ordem de um trabalho ``j``: nenhum hook anterior da mesma
+# conversão e — num hook de lote — nenhum hook de ficheiro do lote por terminar.
+# Parâmetros: PENDING, RUNNING.
+_UNBLOCKED = """NOT EXISTS (
+    SELECT 1 FROM hook_jobs p
+    WHERE p.status IN (?, ?) AND p.id != j.id AND (
+        (p.group_id = j.group_id AND p.seq < j.seq)
+        OR (j.scope = 'batch' AND j.batch_id != ''
+            AND p.batch_id = j.batch_id AND p.scope = 'file')))"""
+
+
+def _row_to_dict(row) -> dict:
+    return {
+        'id': row['id'],
+        'group_id': row['group_id'],
+        'seq': row['seq'],
+        'batch_id': row['batch_id'],
+        'scope': row['scope'],
+        'hook_name': row['hook_name'],
+        'hook': json.loads(row['hook_json']),
+        'source': row['source'],
+        'outputs': json.loads(row['outputs_json']),
+        'status': row['status'],
+        'attempts': row['attempts'],
+        'max_attempts': row['max_attempts'],
+        'retry_delay': row['retry_delay'],
+        'next_attempt_at': row['next_attempt_at'],
+        'created_at': row['created_at'],
+        'finished_at': row['finished_at'],
+        'returncode': row['returncode'],
+        'error': row['error'],
+    }
+
+
+def enqueue(config: dict, source_path: str, output_paths: list, scope: str = None,
+            batch_id: str = '') -> list:
+    """Coloca na fila os hooks activos de uma conversão (ou de um lote).
+
+    Args:
+        config: Configuração da aplicação (hooks e opções de repetição).
+        source_path: Ficheiro de origem (ou pasta/arquivo do lote).
+        output_paths: Ficheiros gerados.
+        scope: 'file' ou 'batch' para só os hooks desse âmbito; default: todos.
+        batch_id: Identificador do lote, para os hooks de lote esperarem
+                  pelos hooks de ficheiro do mesmo lote.
+
+    Returns:
+        Ids dos trabalhos criados, pela ordem dos hooks.
+    """
+    hooks = _enabled_hooks(config, scope)
+    if not hooks:
+        return []
+    max_attempts, retry_delay = retry_options(config)
+    group_id = uuid.uuid4().hex
+    now = datetime.now().isoformat()
+    conn = _get_connection()
+    try:
+        ids = []
+        for seq, hook in enumerate(hooks):
+            cursor = conn.execute(
+                """INSERT INTO hook_jobs
+                   (group_id, seq, batch_id, scope, hook_name, hook_json, source,
+                    outputs_json, status, max_attempts, retry_delay, next_attempt_at,
+                    created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (group_id, seq, batch_id, hook.get('scope', 'file'), hook.get('name', ''),
+                 json.dumps(hook, ensure_ascii=False), source_path,
+                 json.dumps(list(output_paths), ensure_ascii=False), PENDING,
+                 max_attempts, retry_delay, now, now),
+            )
+            ids.append(cursor.lastrowid)
+        conn.commit()
+        return ids
+    finally:
+        conn.close()
+
+
+def claim() -> dict:
+    """Reserva o próximo trabalho pronto a correr (ou None).
+
+    Um trabalho está pronto quando a sua tentativa está na hora, os hooks
+    anteriores da mesma conversão já terminaram e — sendo um hook de lote —
+    os hooks de ficheiro do lote também. Trabalhos ``running`` cuja reserva
+    expirou (processo terminado a meio) voltam a ser reservados.
+    """
+    now = datetime.now()
+    conn = _get_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            f"""SELECT * FROM hook_jobs j
+               WHERE ((j.status = ? AND j.next_attempt_at <= ?)
+                      OR (j.status = ? AND j.lease_until < ?))
+                 AND {_UNBLOCKED}
+               ORDER BY j.next_attempt_at, j.id LIMIT 1""",
+            (PENDING, now.isoformat(), RUNNING, now.isoformat(), PENDING, RUNNING),
+        ).fetchone()
+        if row is None:
+            conn.rollback()
+            return None
+        timeout = json.loads(row['hook_json']).get('timeout', 30)
+        lease = now + timedelta(seconds=timeout + _LEASE_MARGIN)
+        conn.execute(
+            "UPDATE hook_jobs SET status = ?, attempts = attempts + 1, lease_until = ? WHERE id = ?",
+            (RUNNING, lease.isoformat(), row['id']),
+        )
+        conn.commit()
+        job = _row_to_dict(row)
+        job['status'] = RUNNING
+        job['attempts'] += 1
+        return job
+    finally:
+        conn.close()
+
+
+def hook_failed(result: dict) -> bool:
+    """Indica se o resultado de um hook (ver ``src.hooks.run_hooks``) é uma falha."""
+    return bool(result.get('error')) or result.get('returncode') != 0
+
+
+def _error_text(result: dict) -> str:
+    if result.get('error'):
+        return result['error']
+    detail = (result.get('stderr') or result.get('stdout') or '')[:500]
+    return f"Código {result.get('returncode')}" + (f": {detail}" if detail else '')
+
+
+def complete(job: dict, result: dict) -> str:
+    """Regista o resultado de uma tentativa. Devolve o novo estado do trabalho.
+
+    Uma falha com tentativas por esgotar volta a ``pending``, agendada para
+    depois da espera exponencial; o resultado definitivo vai para o histórico.
+    """
+    from src import history
+    now = datetime.now()
+    failed = hook_failed(result)
+    error = _error_text(result) if failed else ''
+    if not failed:
+        status = DONE
+    elif job['attempts'] >= job['max_attempts']:
+        status = FAILED
+    else:
+        status = PENDING
+    conn = _get_connection()
+    try:
+        if status == PENDING:
+            retry_at = now + timedelta(seconds=backoff_delay(job['retry_delay'], job['attempts']))
+            conn.execute(
+                """UPDATE hook_jobs SET status = ?, next_attempt_at = ?, lease_until = '',
+                   returncode = ?, error = ? WHERE id = ?""",
+                (PENDING, retry_at.isoformat(), result.get('returncode'), error, job['id']),
+            )
+        else:
+            conn.execute(
+                """UPDATE hook_jobs SET status = ?, finished_at = ?, lease_until = '',
+                   returncode = ?, error = ? WHERE id = ?""",
+                (status, now.isoformat(), result.get('returncode'), error, job['id']),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    if status != PENDING:
+        outputs = job['outputs']
+        name = job['hook_name'] or job['hook'].get('command') or job['hook'].get('callable', '')
+        if job['attempts'] > 1:
+            error = error or f"Concluído à {job['attempts']}.ª tentativa"
+        history.add_entry(job['source'], outputs[0] if outputs else '', f"hook:{name}",
+                          0, status == DONE, error)
+    return status
+
+
+def next_due_in() -> float:
+    """Segundos até à próxima tentativa que ``claim`` pode reservar.
+
+    Só contam os trabalhos pendentes não bloqueados (ver ``claim``): um hook
+    que espera por um anterior em repetição fica pronto depois dele, não
+    antes. None se não houver nenhum.
+    """
+    conn = _get_connection()
+    try:
+        row = conn.execute(
+            f"""SELECT MIN(j.next_attempt_at) AS due FROM hook_jobs j
+                WHERE j.status = ? AND {_UNBLOCKED}""",
+            (PENDING, PENDING, RUNNING)).fetchone()
+    finally:
+        conn.close()
+    if not row or not row['due']:
+        return None
+    return max((datetime.fromisoformat(row['due']) - datetime.now()).total_seconds(), 0.0)
+
+
+def counts() -> dict:
+    """Número de trabalhos por estado."""
+    conn = _get_connection()
+    try:
+        rows = conn.execute("SELECT status, COUNT(*) AS n FROM hook_jobs GROUP BY status").fetchall()
+    finally:
+        conn.close()
+    result = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+    result.update({row['status']: row['n'] for row in rows})
+    return result
+
+
+def get_jobs(job_ids: list) -> list:
+    """Trabalhos com os ids indicados, pela mesma ordem."""
+    if not job_ids:
+        return []
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            f"SELECT * FROM hook_jobs WHERE id IN ({','.join('?' * len(job_ids))})",
+            list(job_ids)).fetchall()
+    finally:
+        conn.close()
+    by_id = {row['id']: _row_to_dict(row) for row in rows}
+    return [by_id[i] for i in job_ids if i in by_id]
+
+
+def recent_jobs(status: str = None, limit: int = 50) -> list:
+    """Trabalhos mais recentes (primeiro os últimos), opcionalmente de um estado."""
+    conn = _get_connection()
+    try:
+        if status is None:
+            rows = conn.execute("SELECT * FROM hook_jobs ORDER BY id DESC LIMIT ?",
+                                (limit,)).fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM hook_jobs WHERE status = ? ORDER BY id DESC LIMIT ?",
+                                (status, limit)).fetchall()
+    finally:
+        conn.close()
+    return [_row_to_dict(row) for row in rows]
+
+
+def retry_failed() -> int:
+    """Volta a pôr na fila os trabalhos falhados (com novas tentativas). Devolve quantos."""
+    conn = _get_connection()
+    try:
+        cursor = conn.execute(
+            """UPDATE hook_jobs SET status = ?, attempts = 0, next_attempt_at = ?,
+               finished_at = '' WHERE status = ?""",
+            (PENDING, datetime.now().isoformat(), FAILED))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def clear_finished() -> int:
+    """Apaga os trabalhos concluídos ou falhados. Devolve o número apagado."""
+    conn = _get_connection()
+    try:
+        cursor = conn.execute("DELETE FROM hook_jobs WHERE status IN (?, ?)", (DONE, FAILED))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+class HookQueue:
+    """Threads que executam os trabalhos da fila de hooks.
+
+    Args:
+        config: Configuração da aplicação.
+        workers: Número de threads (default: ``automation.hooks_concurrency``).
+        on_result: Função chamada com (job, result, status) após cada tentativa.
+    """
+
+    def __init__(self, config: dict, workers: int = None, on_result=None):
+        self.config = config
+        self.workers = workers or hooks_concurrency(config)
+        self.on_result = on_result
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._threads = []
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._loop, name=f'hook-queue-{n}', daemon=True)
+                         for n in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Pára as threads (as que estão a meio de um hook terminam-no primeiro)."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Acorda as threads paradas (há trabalho novo na fila)."""
+        self._wake.set()
+
+    def submit(self, source_path: str, output_paths: list, scope: str = None,
+               batch_id: str = '') -> list:
+        """Coloca hooks na fila (ver ``enqueue``) e acorda as threads."""
+        ids = enqueue(self.config, source_path, output_paths, scope, batch_id)
+        if ids:
+            self.notify()
+        return ids
+
+    def drain(self, timeout: float = None) -> bool:
+        """Espera que não haja trabalhos prontos nem em curso nesta fila.
+
+        As repetições agendadas para mais tarde não são esperadas.
+        Devolve False se ``timeout`` expirar antes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                idle = self._active == 0
+            if idle:
+                due = next_due_in()
+                if due is None or due > 0:
+                    with self._lock:
+                        if self._active == 0:
+                            return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            self.notify()
+            time.sleep(0.05)
+
+    def _idle_wait(self) -> float:
+        due = next_due_in()
+        return _IDLE_WAIT if due is None else min(max(due, 0.05), _IDLE_WAIT)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                self._active += 1
+            job = None
+            try:
+                job = claim()
+                if job is not None:
+                    result = _run_hook(job['hook'], job['source'], job['outputs'])
+                    status = complete(job, result)
+                    if self.on_result:
+                        self.on_result(job, result, status)
+            except Exception:
+                # Base de dados ocupada ou indisponível: tenta de novo mais tarde
+                job = None
+            finally:
+                with self._lock:
+                    self._active -= 1
+            if job is None:
+                try:
+                    wait = self._idle_wait()
+                except Exception:
+                    wait = _IDLE_WAIT
+                self._wake.wait(wait)
+                self._wake.clear()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue(config: dict) -> HookQueue:
+    """Devolve a fila partilhada do processo, já iniciada, com a configuração actual."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = HookQueue(config)
+        _queue.config = config
+        _queue.start()
+        return _queue
+
+
+def resume(config: dict):
+    """Inicia a fila partilhada se houver hooks configurados em modo assíncrono.
+
+    Chamado ao arrancar a pasta monitorizada e os agendamentos, para retomar
+    os trabalhos (e repetições) deixados na fila por uma execução anterior.
+    """
+    if is_async(config) and _enabled_hooks(config):
+        get_queue(config)
+
+
+def drain(timeout: float = None) -> bool:
+    """Espera pelos trabalhos prontos da fila partilhada (ver ``HookQueue.drain``).
+
+    Usado pela linha de comandos antes de terminar o processo.
+    """
+    with _queue_lock:
+        shared = _queue
+    return True if shared is None else shared.drain(timeout)
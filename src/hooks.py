@@ -2,69 +2,328 @@
 # -*- coding: utf-8 -*-
 """
 Módulo de post-conversion hooks.
-Executa comandos shell configurados pelo utilizador após cada conversão.
+Executa comandos shell ou funções Python configurados pelo utilizador após
+cada conversão.
+
+Um hook com ``callable`` (``'pacote.modulo:funcao'``) em vez de ``command``
+é chamado no próprio processo como ``funcao(source_path, output_paths)``,
+sem o custo de arrancar um interpretador. Corre numa thread com o mesmo
+``timeout`` dos comandos; uma excepção fica registada no resultado do hook,
+sem afectar a conversão nem os restantes hooks.
+
+Cada hook tem um âmbito (``scope``):
+- ``'file'`` (default) — corre uma vez por ficheiro convertido;
+- ``'batch'`` — corre uma vez por lote, com todas as saídas do lote.
+
+Numa conversão isolada (um só ficheiro) correm todos os hooks, pela ordem
+configurada. Num lote, o ``HookRunner`` corre os hooks de ficheiro à medida
+que cada ficheiro termina, até ``automation.hooks_concurrency`` ficheiros em
+simultâneo — os hooks de um mesmo ficheiro correm sempre pela ordem
+configurada — e, no fim, os hooks de lote.
+
+Com ``automation.hooks_async`` (default), ``dispatch_hooks`` e o
+``HookRunner`` não esperam pelos hooks: colocam-nos na fila persistente de
+``src.hook_queue``, que os executa em segundo plano e repete os que falham.
 """
 
+import importlib
+import io
+import json
 import os
 import subprocess
-import sys
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _enabled_hooks(config: dict, scope: str = None) -> list:
+    """Hooks activos e com comando, opcionalmente só de um âmbito."""
+    hooks = config.get('automation', {}).get('hooks', [])
+    return [hook for hook in hooks
+            if hook.get('enabled', True)
+            and (hook.get('command', '').strip() or hook.get('callable', '').strip())
+            and (scope is None or hook.get('scope', 'file') == scope)]
+
+
+def hooks_concurrency(config: dict) -> int:
+    """Número máximo de ficheiros com hooks a correr em simultâneo (>= 1)."""
+    try:
+        value = int(config.get('automation', {}).get('hooks_concurrency', 4))
+    except (TypeError, ValueError):
+        value = 1
+    return max(value, 1)
+
+
+_callables = {}
+_callables_lock = threading.Lock()
+
+
+def resolve_callable(spec: str):
+    """Importa a função de um hook ``'modulo:funcao'`` (com cache).
+
+    Raises:
+        ValueError: Se ``spec`` não tiver o formato ``modulo:funcao``.
+        ImportError, AttributeError: Se o módulo ou a função não existirem.
+        TypeError: Se o objecto indicado não for invocável.
+    """
+    spec = spec.strip()
+    with _callables_lock:
+        func = _callables.get(spec)
+    if func is not None:
+        return func
+    module_name, sep, attr = spec.partition(':')
+    if not sep or not module_name or not attr:
+        raise ValueError(f"Hook Python inválido (esperado 'modulo:funcao'): {spec!r}")
+    func = importlib.import_module(module_name)
+    for part in attr.split('.'):
+        func = getattr(func, part)
+    if not callable(func):
+        raise TypeError(f"'{spec}' não é uma função")
+    with _callables_lock:
+        _callables[spec] = func
+    return func
+
+
+def _run_callable(hook: dict, source_path: str, output_paths: list) -> dict:
+    """Chama a função Python de um hook, com tempo limite."""
+    spec = hook.get('callable', '').strip()
+    result = {'hook': hook.get('name', ''), 'command': spec, 'source': source_path,
+              'returncode': None, 'stdout': '', 'stderr': '', 'error': ''}
+    try:
+        func = resolve_callable(spec)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result
+
+    outcome = {}
+
+    def call():
+        try:
+            outcome['value'] = func(source_path, list(output_paths))
+        except BaseException as e:
+            outcome['error'] = f"{type(e).__name__}: {e}"
+
+    # A thread não pode ser interrompida: num timeout fica a terminar em
+    # segundo plano (daemon) e o hook é dado como falhado
+    thread = threading.Thread(target=call, name=f"hook-{spec}", daemon=True)
+    thread.start()
+    thread.join(hook.get('timeout', 30))
+    if thread.is_alive():
+        result['error'] = 'Timeout expirado'
+    elif 'error' in outcome:
+        result['returncode'] = 1
+        result['error'] = outcome['error']
+    else:
+        result['returncode'] = 0
+        if outcome.get('value') is not None:
+            result['stdout'] = str(outcome['value'])
+    return result
+
+
+def manifest_entry(path: str) -> dict:
+    """Linha do manifesto de um ficheiro gerado: {path, client, size, hash}.
+
+    ``client`` é o nome do ficheiro sem extensão (o nome dado pelo modelo de
+    nomes ao PDF do cliente); ``size`` e ``hash`` (SHA-256) ficam a None e ''
+    se o ficheiro não existir.
+    """
+    from src.batch_journal import file_hash
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = None
+    return {'path': path, 'client': os.path.splitext(os.path.basename(path))[0],
+            'size': size, 'hash': file_hash(path) if size is not None else ''}
+
+
+def write_manifest(output_paths: list, stream):
+    """Escreve o manifesto (JSON lines, uma linha por ficheiro) em ``stream``."""
+    for path in output_paths:
+        stream.write(json.dumps(manifest_entry(path), ensure_ascii=False))
+        stream.write('\n')
+
+
+def _run_hook(hook: dict, source_path: str, output_paths: list) -> dict:
+    """Expande as variáveis do comando de um hook e executa-o.
 
+    Com ``{manifest}`` no comando, as saídas são escritas num manifesto
+    temporário (ver ``write_manifest``), apagado quando o hook termina; com
+    ``'stdin': True`` no hook, o manifesto é enviado pelo stdin do comando.
+    Ao contrário de ``{outputs}``, não há limite ao número de saídas.
+    """
+    if not hook.get('command', '').strip():
+        return _run_callable(hook, source_path, output_paths)
+    first_output = output_paths[0] if output_paths else ''
+    folder = os.path.dirname(first_output) if first_output else ''
+
+    cmd = hook.get('command', '').strip().replace('{source}', source_path)
+    cmd = cmd.replace('{output}', first_output)
+    if '{outputs}' in cmd:
+        cmd = cmd.replace('{outputs}', ','.join(output_paths))
+    cmd = cmd.replace('{folder}', folder)
 
-def run_hooks(config: dict, source_path: str, output_paths: list) -> list:
+    result = {'hook': hook.get('name', ''), 'command': cmd, 'source': source_path,
+              'returncode': None, 'stdout': '', 'stderr': '', 'error': ''}
+    manifest_path = None
+    try:
+        # Um só manifesto por hook (cada entrada calcula o hash do ficheiro),
+        # partilhado pelo stdin e por {manifest}
+        manifest = None
+        if hook.get('stdin') or '{manifest}' in cmd:
+            buffer = io.StringIO()
+            write_manifest(output_paths, buffer)
+            manifest = buffer.getvalue()
+        if '{manifest}' in cmd:
+            fd, manifest_path = tempfile.mkstemp(prefix='manifest_', suffix='.jsonl')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(manifest)
+            cmd = cmd.replace('{manifest}', manifest_path)
+            result['command'] = cmd
+        proc = subprocess.run(
+            cmd,
+            shell=True,
+            capture_output=True,
+            text=True,
+            input=manifest if hook.get('stdin') else None,
+            timeout=hook.get('timeout', 30),
+        )
+        result['returncode'] = proc.returncode
+        result['stdout'] = proc.stdout.strip()
+        result['stderr'] = proc.stderr.strip()
+    except subprocess.TimeoutExpired:
+        result['error'] = 'Timeout expirado'
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        if manifest_path:
+            try:
+                os.remove(manifest_path)
+            except OSError:
+                pass
+    return result
+
+
+def run_hooks(config: dict, source_path: str, output_paths: list, scope: str = None) -> list:
     """Executa os hooks configurados após uma conversão.
 
-    Cada hook é um comando shell com suporte a variáveis de substituição:
+    Cada hook é uma função Python (``callable``, ver docstring do módulo) ou
+    um comando shell com suporte a variáveis de substituição:
     - {source}   — caminho do ficheiro Excel de origem
     - {output}   — caminho do primeiro PDF gerado
     - {outputs}  — todos os PDFs separados por vírgula
     - {folder}   — pasta onde os PDFs foram gerados
+    - {manifest} — ficheiro JSON lines com uma linha por PDF
+                   ({path, client, size, hash}), para milhares de saídas
+
+    Com ``'stdin': True`` no hook, o mesmo manifesto é enviado pelo stdin.
 
     Args:
         config: Configuração da aplicação.
         source_path: Caminho do ficheiro Excel de origem.
         output_paths: Lista de ficheiros PDF gerados.
+        scope: 'file' ou 'batch' para correr só os hooks desse âmbito;
+               default: todos (conversão de um só ficheiro).
 
     Returns:
-        Lista de resultados [{hook, command, returncode, stdout, stderr, error}].
+        Lista de resultados [{hook, command, source, returncode, stdout, stderr, error}].
     """
-    hooks = config.get('automation', {}).get('hooks', [])
-    if not hooks:
+    return [_run_hook(hook, source_path, output_paths)
+            for hook in _enabled_hooks(config, scope)]
+
+
+def dispatch_hooks(config: dict, source_path: str, output_paths: list,
+                   scope: str = None) -> list:
+    """Executa os hooks de uma conversão, ou coloca-os na fila de segundo plano.
+
+    Com ``automation.hooks_async`` os hooks vão para a fila persistente (ver
+    ``src.hook_queue``) e a função regressa de imediato com uma lista vazia;
+    sem, equivale a ``run_hooks``.
+    """
+    if not _enabled_hooks(config, scope):
         return []
+    from src import hook_queue
+    if hook_queue.is_async(config):
+        hook_queue.get_queue(config).submit(source_path, output_paths, scope)
+        return []
+    return run_hooks(config, source_path, output_paths, scope)
 
-    results = []
-    first_output = output_paths[0] if output_paths else ''
-    folder = os.path.dirname(first_output) if first_output else ''
-    outputs_str = ','.join(output_paths)
-
-    for hook in hooks:
-        if not hook.get('enabled', True):
-            continue
-        cmd_template = hook.get('command', '').strip()
-        if not cmd_template:
-            continue
-
-        cmd = cmd_template.replace('{source}', source_path)
-        cmd = cmd.replace('{output}', first_output)
-        cmd = cmd.replace('{outputs}', outputs_str)
-        cmd = cmd.replace('{folder}', folder)
-
-        result = {'hook': hook.get('name', ''), 'command': cmd,
-                  'returncode': None, 'stdout': '', 'stderr': '', 'error': ''}
-        try:
-            proc = subprocess.run(
-                cmd,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=hook.get('timeout', 30),
-            )
-            result['returncode'] = proc.returncode
-            result['stdout'] = proc.stdout.strip()
-            result['stderr'] = proc.stderr.strip()
-        except subprocess.TimeoutExpired:
-            result['error'] = 'Timeout expirado'
-        except Exception as e:
-            result['error'] = str(e)
-        results.append(result)
-
-    return results
+
+class HookRunner:
+    """Corre os hooks de um lote.
+
+    ``submit()`` agenda os hooks de ficheiro de cada ficheiro convertido (em
+    threads, até ``automation.hooks_concurrency`` ficheiros ao mesmo tempo);
+    ``finish()`` espera por eles e corre os hooks de lote com todas as saídas.
+
+    Com ``automation.hooks_async``, ``submit()`` e ``finish()`` apenas colocam
+    os hooks na fila de segundo plano (``src.hook_queue``), onde os hooks de
+    lote esperam pelos hooks de ficheiro do mesmo lote; ``finish()`` devolve
+    então uma lista vazia.
+
+    Args:
+        config: Configuração da aplicação.
+        max_workers: Limite de ficheiros em simultâneo (default: ``hooks_concurrency``).
+    """
+
+    def __init__(self, config: dict, max_workers: int = None):
+        self.config = config
+        self.max_workers = max_workers or hooks_concurrency(config)
+        self._file_hooks = _enabled_hooks(config, 'file')
+        self._batch_hooks = _enabled_hooks(config, 'batch')
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = []
+        self._outputs = []
+        self._queue = None
+        self._batch_id = ''
+        if self._file_hooks or self._batch_hooks:
+            from src import hook_queue
+            if hook_queue.is_async(config):
+                self._queue = hook_queue.get_queue(config)
+                self._batch_id = uuid.uuid4().hex
+
+    def submit(self, source_path: str, output_paths: list):
+        """Agenda os hooks de ficheiro de uma conversão concluída."""
+        with self._lock:
+            self._outputs.extend(output_paths)
+            if not self._file_hooks:
+                return
+            if self._queue is not None:
+                self._queue.submit(source_path, output_paths, 'file', self._batch_id)
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='hooks')
+            self._futures.append(self._executor.submit(
+                self._run_file, source_path, list(output_paths)))
+
+    def _run_file(self, source_path: str, output_paths: list) -> list:
+        return [_run_hook(hook, source_path, output_paths) for hook in self._file_hooks]
+
+    def finish(self, source_path: str) -> list:
+        """Espera pelos hooks de ficheiro e corre os hooks de lote.
+
+        Args:
+            source_path: Origem do lote (pasta ou arquivo), para ``{source}``.
+
+        Returns:
+            Resultados dos hooks de ficheiro (pela ordem de ``submit``) seguidos
+            dos hooks de lote, no formato de ``run_hooks``.
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+            outputs = list(self._outputs)
+            executor, self._executor = self._executor, None
+        if self._queue is not None:
+            if self._batch_hooks and outputs:
+                self._queue.submit(source_path, outputs, 'batch', self._batch_id)
+            return []
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        if executor is not None:
+            executor.shutdown(wait=True)
+        if self._batch_hooks and outputs:
+            results.extend(_run_hook(hook, source_path, outputs) for hook in self._batch_hooks)
+        return results
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de eventos de ficheiros via inotify (Linux), sem dependências.
+
+Usa a libc por ctypes. Só são pedidos os eventos que indicam um ficheiro
+completo: ``IN_CLOSE_WRITE`` (escrito e fechado) e ``IN_MOVED_TO``
+(renomeado para dentro da pasta). Noutros sistemas ``is_available()``
+devolve False e quem usa o módulo deve recorrer a polling.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event: wd, mask, cookie, len (seguido do nome)
+_EVENT = struct.Struct('iIII')
+_BUFFER_SIZE = 64 * 1024
+
+_libc = None
+
+
+def _load_libc():
+    """Carrega a libc (uma vez). Devolve None se não tiver inotify."""
+    global _libc
+    if _libc is None:
+        try:
+            lib = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            lib.inotify_init1.argtypes = [ctypes.c_int]
+            lib.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            _libc = lib
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc or None
+
+
+def is_available() -> bool:
+    """Indica se o inotify pode ser usado neste sistema."""
+    return sys.platform.startswith('linux') and _load_libc() is not None
+
+
+class Inotify:
+    """Observa uma pasta (não recursivo) e devolve os ficheiros concluídos.
+
+    Raises:
+        OSError: Se o inotify não estiver disponível ou a pasta não puder
+                 ser observada (ex: limite ``max_user_watches`` atingido).
+    """
+
+    def __init__(self, folder_path: str, mask: int = IN_CLOSE_WRITE | IN_MOVED_TO):
+        libc = _load_libc()
+        if libc is None or not sys.platform.startswith('linux'):
+            raise OSError(errno.ENOSYS, "inotify não disponível")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        wd = libc.inotify_add_watch(self.fd, os.fsencode(folder_path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, os.strerror(err), folder_path)
+
+    def read(self, timeout: float = None) -> tuple:
+        """Espera por eventos até ``timeout`` segundos.
+
+        Returns:
+            ``(nomes, overflow)`` — nomes dos ficheiros concluídos e se foram
+            perdidos eventos (fila cheia ou pasta removida), caso em que quem
+            chama deve voltar a listar a pasta.
+        """
+        names, overflow = [], False
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return names, overflow
+        while True:
+            try:
+                data = os.read(self.fd, _BUFFER_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & (IN_Q_OVERFLOW | IN_IGNORED):
+                    overflow = True
+                elif name and not mask & IN_ISDIR:
+                    names.append(os.fsdecode(name))
+        return names, overflow
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de conversão em processo isolado.
+
+Um workbook patológico (folha enorme, ZIP corrompido) pode bloquear ou
+esgotar a memória do processo que o converte. Com ``resources.isolate``
+activo, cada conversão corre num processo filho próprio:
+
+- ``resources.timeout_seconds`` — tempo máximo (relógio) de uma conversão;
+  ao fim desse tempo o processo filho é terminado (0 = sem limite);
+- ``resources.memory_limit_mb`` — limite de espaço de endereçamento do
+  processo filho (``RLIMIT_AS``, só em sistemas POSIX; 0 = sem limite).
+
+O processo filho envia o progresso por cliente e, no fim, o resultado no
+formato de ``batch_processor.convert_file``. Se for terminado (tempo
+limite, cancelamento) ou morrer sem resultado, a conversão é dada como
+falhada com o motivo em ``error``.
+"""
+
+import multiprocessing
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from src import zip_input
+
+
+MB = 1024 * 1024
+
+# Intervalo de verificação do cancelamento enquanto se espera pelo filho
+_POLL = 0.2
+
+
+def isolation_options(config: dict) -> dict:
+    """Opções de isolamento a partir de ``config['resources']``.
+
+    Returns:
+        ``{'enabled': bool, 'timeout': segundos ou None, 'memory_mb': int}``.
+    """
+    resources = (config or {}).get('resources', {})
+
+    def number(key, cast):
+        try:
+            return max(cast(resources.get(key, 0) or 0), 0)
+        except (TypeError, ValueError):
+            return 0
+
+    timeout = number('timeout_seconds', float)
+    return {
+        'enabled': bool(resources.get('isolate', False)),
+        'timeout': timeout or None,
+        'memory_mb': number('memory_limit_mb', int),
+    }
+
+
+def is_enabled(config: dict) -> bool:
+    """Indica se as conversões devem correr em processo isolado."""
+    return isolation_options(config)['enabled']
+
+
+def _limit_memory(memory_mb: int):
+    """Aplica ``RLIMIT_AS`` ao processo actual (sem efeito fora de POSIX)."""
+    if not memory_mb or resource is None:
+        return
+    limit = memory_mb * MB
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _child(conn, excel_path: str, config: dict, mode: str, memory_mb: int,
+           progress: bool):
+    """Ponto de entrada do processo filho."""
+    from src.batch_processor import _failed_result, convert_file
+    try:
+        _limit_memory(memory_mb)
+        on_progress = (lambda info: conn.send(('progress', info))) if progress else None
+        result = convert_file(excel_path, config, mode, progress_callback=on_progress)
+    except MemoryError:
+        result = _failed_result(excel_path, "Memória esgotada")
+    except Exception as e:
+        result = _failed_result(excel_path, str(e))
+    conn.send(('result', result))
+    conn.close()
+
+
+def convert_isolated(excel_path: str, config: dict, mode: str = 'individual',
+                     progress_callback=None, cancel_token=None, timeout: float = None,
+                     memory_mb: int = None) -> dict:
+    """Converte um ficheiro num processo filho e devolve o resultado de ``convert_file``.
+
+    Nunca lança excepções: tempo limite, cancelamento, falta de memória e
+    morte do processo filho ficam em ``success=False`` / ``error``.
+
+    Args:
+        excel_path: Caminho do ficheiro Excel (ou membro de arquivo ZIP).
+        config: Configurações da aplicação.
+        mode: 'individual', 'zip' ou 'aggregate'.
+        progress_callback: Callback de progresso por cliente (ver ``src.progress``),
+                           chamado neste processo.
+        cancel_token: ``CancelToken`` opcional; o cancelamento termina o filho.
+        timeout: Tempo máximo em segundos (default: ``resources.timeout_seconds``).
+        memory_mb: Limite de memória do filho (default: ``resources.memory_limit_mb``).
+    """
+    from src.batch_processor import _failed_result
+    options = isolation_options(config)
+    if timeout is None:
+        timeout = options['timeout']
+    if memory_mb is None:
+        memory_mb = options['memory_mb']
+
+    # 'spawn': o filho não herda as threads nem os locks do processo pai
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_child,
+        args=(sender, excel_path, config, mode, memory_mb, progress_callback is not None),
+        name=f"conversao-{zip_input.display_name(excel_path)}",
+        daemon=True,
+    )
+    try:
+        process.start()
+    except Exception as e:
+        receiver.close()
+        sender.close()
+        return _failed_result(excel_path, f"Não foi possível iniciar a conversão: {e}")
+    sender.close()
+
+    deadline = time.monotonic() + timeout if timeout else None
+    result = None
+    error = None
+    try:
+        while result is None and error is None:
+            if cancel_token is not None and cancel_token.is_cancelled:
+                error = "Conversão cancelada"
+                break
+            wait = _POLL
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    error = f"Tempo limite excedido ({timeout:g} s)"
+                    break
+                wait = min(wait, remaining)
+            if not receiver.poll(wait):
+                if not process.is_alive() and not receiver.poll():
+                    error = _exit_message(process.exitcode)
+                continue
+            try:
+                kind, payload = receiver.recv()
+            except (EOFError, OSError):
+                process.join(1)
+                error = _exit_message(process.exitcode)
+                continue
+            if kind == 'progress':
+                if progress_callback:
+                    progress_callback(payload)
+            else:
+                result = payload
+    finally:
+        receiver.close()
+        if result is None:
+            _kill(process)
+        else:
+            process.join(5)
+            if process.is_alive():
+                _kill(process)
+
+    return result if result is not None else _failed_result(excel_path, error)
+
+
+def _kill(process):
+    """Termina o processo filho e espera que saia."""
+    if process.is_alive():
+        process.kill()
+    process.join(5)
+
+
+def _exit_message(exitcode) -> str:
+    """Motivo de um processo filho que terminou sem enviar resultado."""
+    if exitcode is not None and exitcode < 0:
+        return f"O processo de conversão terminou com o sinal {-exitcode}"
+    return f"O processo de conversão terminou inesperadamente (código {exitcode})"
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de lote distribuído por ficheiros de lease.
+
+Vários processos (na mesma máquina ou em máquinas que montam a mesma
+partilha) convertem em conjunto a mesma pasta. Cada ficheiro Excel é
+reclamado criando, de forma atómica, um ficheiro de lease em
+``<pasta>/.leases/``:
+
+- ``<nome>.lease`` — reclamado; o dono renova-o (mtime) enquanto converte;
+- ``<nome>.done`` / ``<nome>.failed`` — resultado final (JSON).
+
+A criação usa ``O_CREAT | O_EXCL``, pelo que só um worker ganha cada
+ficheiro. Um lease cujo mtime tem mais de ``lease_ttl`` segundos pertence a
+um worker que morreu: é renomeado (operação atómica, só um worker o
+consegue) e o ficheiro volta a poder ser reclamado.
+
+Um worker termina quando todos os ficheiros da pasta têm resultado; enquanto
+houver leases de outros workers continua a verificar, para recuperar os que
+expirarem.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+from urllib.parse import quote
+
+from src import zip_input
+from src.admission import admitted
+from src.batch_processor import _failed_result, convert_file, discover_excel_files
+from src.progress import ConversionCancelled
+
+
+LEASE_DIR = '.leases'
+DEFAULT_LEASE_TTL = 60
+
+
+def default_worker_id() -> str:
+    """Identificador do worker: ``<máquina>-<pid>``."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def _lease_base(folder_path: str, excel_path: str) -> str:
+    """Caminho base (sem extensão) dos ficheiros de lease de um Excel."""
+    rel = os.path.relpath(excel_path, folder_path)
+    return os.path.join(folder_path, LEASE_DIR, quote(rel.replace(os.sep, '/'), safe=''))
+
+
+def _input_stamp(excel_path: str) -> list:
+    """Tamanho e mtime do ficheiro de entrada (para detectar alterações).
+
+    Para membros de arquivos ZIP conta o arquivo.
+    """
+    st = zip_input.source_stat(excel_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def finished_result(folder_path: str, excel_path: str) -> dict:
+    """Resultado registado de um ficheiro, ou None se ainda não tiver sido convertido.
+
+    Um resultado deixa de contar se o ficheiro de entrada mudou desde então.
+    """
+    base = _lease_base(folder_path, excel_path)
+    for suffix in ('.done', '.failed'):
+        data = _read_json(base + suffix)
+        if not data:
+            continue
+        try:
+            if data.get('input') == _input_stamp(excel_path):
+                return data.get('result')
+        except OSError:
+            return None
+    return None
+
+
+class Lease:
+    """Lease reclamado por um worker sobre um ficheiro Excel.
+
+    ``input_stamp`` é o tamanho/mtime da entrada no momento da reclamação: é
+    o que fica no resultado, para que uma alteração durante a conversão
+    obrigue a converter de novo.
+    """
+
+    def __init__(self, folder_path: str, excel_path: str, worker_id: str, token: str,
+                 input_stamp: list = None):
+        self.folder_path = folder_path
+        self.excel_path = excel_path
+        self.worker_id = worker_id
+        self.token = token
+        self.input_stamp = input_stamp
+        self.base = _lease_base(folder_path, excel_path)
+        self.path = self.base + '.lease'
+
+    @property
+    def is_owned(self) -> bool:
+        """Se o lease ainda é deste worker (não foi recuperado por outro)."""
+        return _read_json(self.path).get('token') == self.token
+
+    def renew(self) -> bool:
+        """Renova o lease (actualiza o mtime). Devolve False se já não for nosso."""
+        if not self.is_owned:
+            return False
+        try:
+            os.utime(self.path)
+        except OSError:
+            return False
+        return True
+
+    def finish(self, result: dict):
+        """Regista o resultado (``.done``/``.failed``) e liberta o lease."""
+        suffix = '.done' if result['success'] else '.failed'
+        payload = {'worker': self.worker_id, 'finished_at': datetime.now().isoformat(),
+                   'input': self.input_stamp, 'result': result}
+        tmp = f"{self.base}{suffix}.{self.token}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, default=str)
+        os.replace(tmp, self.base + suffix)
+        other = self.base + ('.failed' if suffix == '.done' else '.done')
+        if os.path.exists(other):
+            os.remove(other)
+        self.release()
+
+    def release(self):
+        """Apaga o lease, se ainda for nosso."""
+        if self.is_owned:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def _reclaim_stale(path: str, ttl: float) -> bool:
+    """Remove um lease expirado. Devolve True se o lease deixou de existir."""
+    try:
+        age = time.time() - os.stat(path).st_mtime
+    except FileNotFoundError:
+        return True
+    if age <= ttl:
+        return False
+    stale = f"{path}.stale-{uuid.uuid4().hex[:8]}"
+    try:
+        os.rename(path, stale)
+    except FileNotFoundError:
+        return True  # outro worker recuperou-o primeiro
+    try:
+        if time.time() - os.stat(stale).st_mtime <= ttl:
+            # Entretanto o lease foi recuperado e renovado por outro worker: repor
+            try:
+                os.link(stale, path)
+            except OSError:
+                pass
+            return False
+    finally:
+        os.remove(stale)
+    return True
+
+
+def claim(folder_path: str, excel_path: str, worker_id: str,
+          lease_ttl: float = DEFAULT_LEASE_TTL):
+    """Tenta reclamar um ficheiro Excel.
+
+    Returns:
+        ``Lease`` se o ficheiro ficou com este worker, ou None se já tiver
+        resultado ou estiver reclamado por outro worker (com lease válido).
+    """
+    if finished_result(folder_path, excel_path) is not None:
+        return None
+    try:
+        stamp = _input_stamp(excel_path)
+    except OSError:
+        return None  # ficheiro removido entretanto
+    lease = Lease(folder_path, excel_path, worker_id, uuid.uuid4().hex, stamp)
+    os.makedirs(os.path.dirname(lease.path), exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(lease.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not _reclaim_stale(lease.path, lease_ttl):
+                return None
+            continue
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'worker': worker_id, 'token': lease.token,
+                       'claimed_at': datetime.now().isoformat()}, f)
+        return lease
+    return None
+
+
+class _Heartbeat:
+    """Thread que renova um lease a cada ``interval`` segundos."""
+
+    def __init__(self, lease: Lease, interval: float):
+        self.lease = lease
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if not self.lease.renew():
+                self.lost = True
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class LeaseWorker:
+    """Worker que converte, em conjunto com outros, os ficheiros de uma pasta partilhada.
+
+    Args:
+        folder_path: Pasta partilhada com os ficheiros Excel.
+        config: Configuração da aplicação (descoberta segue ``config['batch']``).
+        mode: 'individual', 'zip' ou 'aggregate'.
+        worker_id: Identificador do worker (default: ``<máquina>-<pid>``).
+        lease_ttl: Segundos sem renovação após os quais um lease é recuperado
+                   (default: ``batch.lease_ttl``).
+        poll_interval: Intervalo entre verificações enquanto há ficheiros
+                       reclamados por outros workers.
+        on_claimed: Callback chamado com (excel_path) ao reclamar um ficheiro.
+        on_finished: Callback chamado com (result) após cada conversão.
+    """
+
+    def __init__(self, folder_path: str, config: dict, mode: str = 'individual',
+                 worker_id: str = None, lease_ttl: float = None,
+                 poll_interval: float = None, on_claimed=None, on_finished=None):
+        self.folder_path = os.path.abspath(folder_path)
+        self.config = config
+        self.mode = mode
+        self.worker_id = worker_id or default_worker_id()
+        if lease_ttl is None:
+            lease_ttl = config.get('batch', {}).get('lease_ttl', DEFAULT_LEASE_TTL)
+        self.lease_ttl = float(lease_ttl)
+        self.poll_interval = poll_interval if poll_interval is not None else min(
+            5.0, self.lease_ttl / 3)
+        self.on_claimed = on_claimed
+        self.on_finished = on_finished
+
+    def run(self, cancel_token=None) -> list:
+        """Converte ficheiros até a pasta estar toda concluída (ou cancelamento).
+
+        Returns:
+            Resultados (formato de ``process_batch``) dos ficheiros convertidos
+            por este worker.
+        """
+        results = []
+        while cancel_token is None or not cancel_token.is_cancelled:
+            files = list(discover_excel_files(self.folder_path, self.config))
+            remaining = [f for f in files
+                         if finished_result(self.folder_path, f) is None]
+            if not remaining:
+                break
+            claimed = False
+            for excel_path in remaining:
+                if cancel_token is not None and cancel_token.is_cancelled:
+                    break
+                lease = claim(self.folder_path, excel_path, self.worker_id, self.lease_ttl)
+                if lease is None:
+                    continue
+                claimed = True
+                result = self._convert(lease, cancel_token)
+                if result is not None:
+                    results.append(result)
+            if not claimed and (cancel_token is None or not cancel_token.is_cancelled):
+                # Restantes reclamados por outros workers: esperar e recuperar os que expirarem
+                time.sleep(self.poll_interval)
+        return results
+
+    def _convert(self, lease: Lease, cancel_token=None) -> dict:
+        """Converte um ficheiro reclamado, renovando o lease durante a conversão.
+
+        Se o lease se perder durante a conversão (não renovado a tempo e
+        recuperado por outro worker), o resultado é descartado — o ficheiro
+        pertence agora ao outro worker — e é devolvido None.
+        """
+        if self.on_claimed:
+            self.on_claimed(lease.excel_path)
+        with _Heartbeat(lease, self.lease_ttl / 3) as heartbeat:
+            try:
+                with admitted(lease.excel_path, self.config, cancel_token):
+                    result = convert_file(lease.excel_path, self.config, self.mode,
+                                          cancel_token=cancel_token)
+            except ConversionCancelled as e:
+                result = _failed_result(lease.excel_path, str(e))
+        if heartbeat.lost or not lease.is_owned:
+            return None
+        if cancel_token is not None and cancel_token.is_cancelled:
+            # Cancelado: devolver o ficheiro para outro worker
+            lease.release()
+        else:
+            lease.finish(result)
+        if self.on_finished:
+            self.on_finished(result)
+        return result
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de cache de saída (saltar PDFs inalterados).
+
+Para cada PDF gerado regista um hash dos dados que o originaram: a linha
+do cliente (ou os dados agregados), as secções da configuração que afetam
+a renderização, os mtimes do logo e das fontes registadas e a versão do
+template. Numa nova execução, se o ficheiro de destino existir e o hash
+coincidir, a renderização é saltada.
+
+Activado com ``output.skip_unchanged = True``.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+
+from src.database import _get_connection
+
+
+# Incrementar sempre que o layout dos PDFs mudar, para invalidar a cache.
+TEMPLATE_VERSION = 1
+
+# Secções da configuração que influenciam o conteúdo do PDF.
+RENDER_CONFIG_SECTIONS = (
+    'pdf', 'header', 'colors', 'table', 'footer', 'contabilidade',
+    'qrcode', 'fonts', 'security', 'watermark', 'banking',
+)
+
+# Caminhos por consulta em ``cached_hashes`` (limite de parâmetros do SQLite)
+_QUERY_CHUNK = 500
+
+
+def is_enabled(config: dict) -> bool:
+    """Indica se a cache de saída está activa na configuração."""
+    return bool(config.get('output', {}).get('skip_unchanged', False))
+
+
+def _file_mtime(path: str) -> float:
+    """Devolve o mtime de um ficheiro, ou 0 se não existir."""
+    try:
+        return os.path.getmtime(path) if path else 0
+    except OSError:
+        return 0
+
+
+def render_digest(config: dict) -> str:
+    """Hash da parte da configuração que afeta a renderização.
+
+    Inclui a versão do template, as secções relevantes da configuração e os
+    mtimes do logo e das fontes. Calcula-se uma vez por workbook e passa-se
+    a ``compute_input_hash`` de cada cliente.
+    """
+    sections = {name: config.get(name) for name in RENDER_CONFIG_SECTIONS}
+    logo_path = config.get('header', {}).get('logo_path', '')
+    fonts = config.get('fonts', {}).get('registered', [])
+
+    material = {
+        'template_version': TEMPLATE_VERSION,
+        'config': sections,
+        'logo_mtime': _file_mtime(logo_path),
+        'font_mtimes': [_file_mtime(f.get('path', '')) for f in fonts],
+    }
+    encoded = json.dumps(material, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def compute_input_hash(payload, config: dict, digest: str = None) -> str:
+    """Calcula o hash dos dados de entrada de uma renderização.
+
+    Args:
+        payload: Dados renderizados (linha do cliente ou dados agregados).
+                 Valores não serializáveis em JSON (ex: datas) são convertidos
+                 para texto.
+        config:  Configuração da aplicação.
+        digest:  ``render_digest(config)`` já calculado (opcional).
+
+    Returns:
+        Hash SHA-256 em hexadecimal.
+    """
+    material = {
+        'render': digest or render_digest(config),
+        'payload': payload,
+    }
+    encoded = json.dumps(material, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def cached_hashes(output_paths: list) -> dict:
+    """Hashes registados de vários PDFs, numa só ligação à base de dados.
+
+    Returns:
+        ``{caminho absoluto: input_hash}`` dos caminhos com registo. Qualquer
+        erro de acesso à base de dados é tratado como ausência de cache.
+    """
+    paths = sorted({os.path.abspath(p) for p in output_paths})
+    hashes = {}
+    try:
+        conn = _get_connection()
+        try:
+            for start in range(0, len(paths), _QUERY_CHUNK):
+                chunk = paths[start:start + _QUERY_CHUNK]
+                rows = conn.execute(
+                    f"""SELECT output_path, input_hash FROM output_cache
+                        WHERE output_path IN ({','.join('?' * len(chunk))})""",
+                    chunk,
+                ).fetchall()
+                hashes.update((row['output_path'], row['input_hash']) for row in rows)
+        finally:
+            conn.close()
+    except Exception:
+        return {}
+    return hashes
+
+
+def is_cached(output_path: str, input_hash: str, known: dict = None) -> bool:
+    """Verifica se ``output_path`` existe e foi gerado com ``input_hash``.
+
+    Args:
+        known: Resultado de ``cached_hashes`` para evitar uma consulta por PDF;
+               sem ele a base de dados é consultada.
+
+    Qualquer erro de acesso à base de dados é tratado como ausência de cache.
+    """
+    if not os.path.exists(output_path):
+        return False
+    if known is None:
+        known = cached_hashes([output_path])
+    return known.get(os.path.abspath(output_path)) == input_hash
+
+
+def record_outputs(entries: list):
+    """Regista os hashes de entrada de vários PDFs numa só transação.
+
+    Args:
+        entries: Lista de ``(output_path, input_hash)``.
+
+    Falhas de escrita são ignoradas — a cache é apenas uma optimização.
+    """
+    if not entries:
+        return
+    try:
+        conn = _get_connection()
+        try:
+            now = datetime.now().isoformat()
+            conn.executemany(
+                """INSERT INTO output_cache (output_path, input_hash, updated_at)
+                   VALUES (?, ?, ?)
+                   ON CONFLICT(output_path) DO UPDATE SET input_hash=?, updated_at=?""",
+                [(os.path.abspath(path), input_hash, now, input_hash, now)
+                 for path, input_hash in entries],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+    except Exception:
+        pass
+
+
+def record_output(output_path: str, input_hash: str):
+    """Regista o hash de entrada de um PDF acabado de gerar."""
+    record_outputs([(output_path, input_hash)])
+
+
+def clear_output_cache():
+    """Apaga todos os registos da cache de saída."""
+    conn = _get_connection()
+    try:
+        conn.execute("DELETE FROM output_cache")
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de progresso e cancelamento de conversões.
+
+Fornece:
+- ``CancelToken`` — sinal de cancelamento cooperativo, partilhado entre a
+  thread que pede o cancelamento (GUI, Ctrl+C, stop do watcher) e a que
+  executa a conversão, que o verifica entre clientes/fases.
+- ``ProgressTracker`` — conta itens concluídos e calcula débito e ETA,
+  notificando um callback com um dicionário de progresso.
+
+Formato do dicionário entregue ao callback::
+
+    {'current': 12, 'total': 300, 'label': '12_ABC.pdf',
+     'elapsed': 3.1, 'rate': 3.9, 'eta': 74.2}
+
+``rate`` é em itens por segundo; ``eta`` em segundos (None enquanto não
+houver dados suficientes).
+"""
+
+import threading
+import time
+
+
+class ConversionCancelled(Exception):
+    """Lançada quando uma conversão é interrompida por um ``CancelToken``."""
+
+    def __init__(self, message: str = 'Conversão cancelada'):
+        super().__init__(message)
+
+
+class CancelToken:
+    """Sinal de cancelamento cooperativo (thread-safe)."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        """Pede o cancelamento das operações que usam este token."""
+        self._event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        """Lança ``ConversionCancelled`` se o cancelamento tiver sido pedido."""
+        if self._event.is_set():
+            raise ConversionCancelled()
+
+
+def check_cancelled(cancel_token):
+    """Atalho que aceita ``cancel_token=None``."""
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+
+class ProgressTracker:
+    """Acompanha o progresso de ``total`` itens e calcula débito e ETA.
+
+    Args:
+        total:    Número total de itens.
+        callback: Função chamada com o dicionário de progresso (pode ser None).
+    """
+
+    def __init__(self, total: int, callback=None):
+        self.total = total
+        self.callback = callback
+        self.current = 0
+        self._start = time.monotonic()
+
+    def snapshot(self, label: str = '') -> dict:
+        """Devolve o estado actual sem avançar."""
+        elapsed = time.monotonic() - self._start
+        rate = self.current / elapsed if elapsed > 0 and self.current else 0.0
+        remaining = max(self.total - self.current, 0)
+        eta = remaining / rate if rate > 0 else None
+        return {
+            'current': self.current,
+            'total': self.total,
+            'label': label,
+            'elapsed': elapsed,
+            'rate': rate,
+            'eta': eta,
+        }
+
+    def start(self, label: str = ''):
+        """Notifica o estado inicial (0 de ``total``)."""
+        self._start = time.monotonic()
+        self._emit(label)
+
+    def advance(self, label: str = '', step: int = 1):
+        """Marca ``step`` itens como concluídos e notifica o callback."""
+        self.current = min(self.current + step, self.total)
+        self._emit(label)
+
+    def _emit(self, label: str):
+        if self.callback:
+            self.callback(self.snapshot(label))
+
+
+def format_eta(seconds) -> str:
+    """Formata um ETA em segundos como ``'1m 05s'`` (ou ``'—'`` se desconhecido)."""
+    if seconds is None:
+        return '—'
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes, secs = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {secs:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
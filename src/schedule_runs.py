@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de histórico de execuções dos agendamentos.
+
+Cada execução de um agendamento fica na tabela ``schedule_runs``: hora
+prevista, início e fim, ficheiros processados, clientes, falhas e duração.
+Permite ver quanto demora cada execução nocturna e se está a ficar mais
+lenta ao longo do tempo.
+
+Estados de uma execução:
+- ``running`` — em curso (ou interrompida sem chegar a terminar);
+- ``success`` — terminou sem falhas;
+- ``failed`` — terminou com erro ou com algum ficheiro falhado;
+- ``skipped`` — não foi executada por haver outra da mesma origem em curso.
+"""
+
+from datetime import datetime
+
+from src.database import _get_connection
+
+
+RUNNING = 'running'
+SUCCESS = 'success'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+def _row_to_dict(row) -> dict:
+    return {
+        'id': row['id'],
+        'schedule_id': row['schedule_id'],
+        'source': row['source'],
+        'mode': row['mode'],
+        'fired_at': row['fired_at'],
+        'started_at': row['started_at'],
+        'finished_at': row['finished_at'],
+        'status': row['status'],
+        'files': row['files'],
+        'clients': row['clients'],
+        'failures': row['failures'],
+        'duration': row['duration'],
+        'error': row['error'],
+    }
+
+
+def start_run(schedule_id: str, entry: dict, fired_at: datetime) -> int:
+    """Regista o início de uma execução. Devolve o id da execução."""
+    conn = _get_connection()
+    try:
+        cursor = conn.execute(
+            """INSERT INTO schedule_runs
+               (schedule_id, source, mode, fired_at, started_at, status)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (schedule_id, entry.get('source', ''), entry.get('mode', 'individual'),
+             fired_at.isoformat(), datetime.now().isoformat(), RUNNING),
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def finish_run(run_id: int, files: int = 0, clients: int = 0, failures: int = 0,
+               error: str = ''):
+    """Regista o fim de uma execução e a sua duração."""
+    finished = datetime.now()
+    conn = _get_connection()
+    try:
+        row = conn.execute("SELECT started_at FROM schedule_runs WHERE id = ?",
+                           (run_id,)).fetchone()
+        if row is None:
+            return
+        duration = (finished - datetime.fromisoformat(row['started_at'])).total_seconds()
+        status = FAILED if error or failures else SUCCESS
+        conn.execute(
+            """UPDATE schedule_runs SET finished_at = ?, status = ?, files = ?, clients = ?,
+               failures = ?, duration = ?, error = ? WHERE id = ?""",
+            (finished.isoformat(), status, files, clients, failures, duration, error, run_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def record_skipped(schedule_id: str, entry: dict, fired_at: datetime, reason: str) -> int:
+    """Regista uma execução saltada por sobreposição."""
+    now = datetime.now().isoformat()
+    conn = _get_connection()
+    try:
+        cursor = conn.execute(
+            """INSERT INTO schedule_runs
+               (schedule_id, source, mode, fired_at, started_at, finished_at, status, error)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (schedule_id, entry.get('source', ''), entry.get('mode', 'individual'),
+             fired_at.isoformat(), now, now, SKIPPED, reason),
+        )
+        conn.commit()
+        return cursor.lastrowid
+    finally:
+        conn.close()
+
+
+def recent_runs(schedule_id: str = None, limit: int = 50) -> list:
+    """Execuções mais recentes (primeiro as últimas), de um agendamento ou de todos."""
+    conn = _get_connection()
+    try:
+        if schedule_id is None:
+            rows = conn.execute(
+                "SELECT * FROM schedule_runs ORDER BY started_at DESC, id DESC LIMIT ?",
+                (limit,)).fetchall()
+        else:
+            rows = conn.execute(
+                """SELECT * FROM schedule_runs WHERE schedule_id = ?
+                   ORDER BY started_at DESC, id DESC LIMIT ?""",
+                (schedule_id, limit)).fetchall()
+    finally:
+        conn.close()
+    return [_row_to_dict(row) for row in rows]
+
+
+def duration_stats(schedule_id: str, limit: int = 30) -> dict:
+    """Duração das últimas execuções concluídas de um agendamento.
+
+    Returns:
+        ``{'runs', 'avg', 'min', 'max', 'last'}`` em segundos (``runs`` = 0 e
+        restantes None se não houver execuções concluídas).
+    """
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            """SELECT duration FROM schedule_runs
+               WHERE schedule_id = ? AND status IN (?, ?)
+               ORDER BY started_at DESC, id DESC LIMIT ?""",
+            (schedule_id, SUCCESS, FAILED, limit)).fetchall()
+    finally:
+        conn.close()
+    durations = [row['duration'] for row in rows]
+    if not durations:
+        return {'runs': 0, 'avg': None, 'min': None, 'max': None, 'last': None}
+    return {'runs': len(durations), 'avg': sum(durations) / len(durations),
+            'min': min(durations), 'max': max(durations), 'last': durations[0]}
+
+
+def clear(schedule_id: str = None) -> int:
+    """Apaga as execuções de um agendamento (ou de todos). Devolve o número apagado."""
+    conn = _get_connection()
+    try:
+        if schedule_id is None:
+            cursor = conn.execute("DELETE FROM schedule_runs")
+        else:
+            cursor = conn.execute("DELETE FROM schedule_runs WHERE schedule_id = ?",
+                                  (schedule_id,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
@@ -2,158 +2,503 @@
 # -*- coding: utf-8 -*-
 """
 Módulo de agendamento de conversões.
-Permite agendar conversões automáticas por hora e dia da semana.
+Permite agendar conversões automáticas por hora e dia da semana, ou por uma
+expressão cron (ver ``src.cron``), ex: ``0 18 LW * *`` para o último dia útil
+de cada mês às 18:00.
+
+O Scheduler mantém uma fila de prioridade com a próxima execução de cada
+agendamento e dorme até à mais próxima. Cada agendamento é identificado por
+um id estável (``entry['id']`` ou, na falta dele, um hash da sua definição),
+pelo que recarregar a configuração não repete nem perde execuções.
+
+A última execução de cada agendamento fica na base de dados (tabela
+``schedule_state``). Ao arrancar, as execuções perdidas enquanto a aplicação
+esteve parada são recuperadas segundo ``automation.schedule_catch_up`` (ou
+``entry['catch_up']``):
+- ``'skip'`` — não recupera;
+- ``'once'`` — executa uma vez, se houver alguma perdida (default);
+- ``'all'`` — executa cada execução perdida (até ``MAX_CATCH_UP``).
+
+As execuções são feitas por ``automation.schedule_workers`` threads. Uma
+execução não começa enquanto houver outra da mesma origem em fila ou em
+curso: é saltada e registada como tal (ver ``Scheduler.status``).
+Com ``automation.schedule_jitter`` (ou ``entry['jitter']``) > 0, cada
+agendamento é desviado de um número fixo de segundos entre 0 e esse valor
+(derivado do seu id), para espalhar agendamentos do mesmo minuto.
 """
 
+import hashlib
+import heapq
+import itertools
+import json
 import os
+import queue
+import sqlite3
 import threading
-import time
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from src import hook_queue, schedule_runs
+from src.cron import CronExpression
+from src.database import _get_connection, init_db
+from src.isolation import convert_isolated, is_enabled
 
 
 # Nomes dos dias da semana em português (0=Segunda, 6=Domingo)
 DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
 
+CATCH_UP_POLICIES = ('skip', 'once', 'all')
+
+# Máximo de execuções perdidas recuperadas por agendamento (política 'all')
+MAX_CATCH_UP = 100
+
+# Tempo máximo a dormir: as alterações aos agendamentos e mudanças do relógio
+# são detectadas pelo menos a este ritmo
+_MAX_SLEEP = 60.0
+
+
+def schedule_id(entry: dict) -> str:
+    """Id estável de um agendamento: ``entry['id']`` ou um hash da sua definição."""
+    if entry.get('id'):
+        return str(entry['id'])
+    definition = {key: entry.get(key) for key in ('cron', 'hora', 'dias', 'source', 'mode')}
+    digest = hashlib.sha1(json.dumps(definition, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()[:12]
+
+
+def trigger(entry: dict) -> CronExpression:
+    """Expressão cron de um agendamento (``cron`` ou ``hora``/``dias``).
+
+    Raises:
+        ValueError: Se a definição for inválida.
+    """
+    if entry.get('cron'):
+        return CronExpression(entry['cron'])
+    hora = entry.get('hora', '')
+    try:
+        h, m = (int(part) for part in hora.split(':'))
+    except (ValueError, AttributeError):
+        raise ValueError(f"Hora inválida: {hora!r}") from None
+    # dias: 0=Segunda; no cron 0=Domingo
+    dias = entry.get('dias', list(range(7)))
+    if not dias:
+        raise ValueError("Agendamento sem dias da semana")
+    weekdays = ','.join(str((d + 1) % 7) for d in sorted(dias))
+    return CronExpression(f"{m} {h} * * {weekdays}")
+
+
+def jitter_offset(entry: dict, jitter: float) -> float:
+    """Desvio fixo em segundos (0..jitter) de um agendamento, derivado do seu id."""
+    if not jitter or jitter <= 0:
+        return 0.0
+    digest = hashlib.sha1(schedule_id(entry).encode('utf-8')).digest()
+    return jitter * int.from_bytes(digest[:4], 'big') / 0xFFFFFFFF
+
+
+def _source_key(entry: dict) -> str:
+    """Chave de exclusão: execuções da mesma origem não se sobrepõem."""
+    source = entry.get('source', '')
+    return os.path.normcase(os.path.abspath(source)) if source else schedule_id(entry)
+
+
+def next_run(entry: dict, after: datetime):
+    """Próxima execução de um agendamento depois de ``after`` (None se inválido)."""
+    try:
+        return trigger(entry).next_after(after)
+    except ValueError:
+        return None
+
+
+def _load_last_runs() -> dict:
+    """Última execução de cada agendamento: ``{schedule_id: datetime}``."""
+    conn = _get_connection()
+    try:
+        rows = conn.execute("SELECT schedule_id, last_run FROM schedule_state").fetchall()
+    finally:
+        conn.close()
+    return {row['schedule_id']: datetime.fromisoformat(row['last_run']) for row in rows}
+
+
+def _save_last_run(sid: str, when: datetime):
+    conn = _get_connection()
+    try:
+        conn.execute("INSERT OR REPLACE INTO schedule_state (schedule_id, last_run) VALUES (?, ?)",
+                     (sid, when.isoformat()))
+        conn.commit()
+    finally:
+        conn.close()
+
 
 class Scheduler:
     """Executa conversões agendadas num horário configurável.
 
     O agendamento define:
-    - Hora de execução (HH:MM)
-    - Dias da semana em que executa (lista de 0..6)
+    - Hora de execução (HH:MM) e dias da semana (lista de 0..6), ou uma
+      expressão cron (``cron``)
     - Pasta de origem ou ficheiro Excel único
-    - Modo de conversão ('individual' ou 'aggregate')
+    - Modo de conversão ('individual', 'zip' ou 'aggregate')
+    - Opcionalmente ``id`` (estável), ``catch_up`` ('skip', 'once' ou 'all')
+      e ``jitter`` (segundos)
 
     Args:
         config: Configuração da aplicação.
         on_run: Callback chamado antes de cada execução com (schedule_entry).
         on_done: Callback chamado após execução com (schedule_entry, results).
         on_error: Callback chamado em caso de erro com (schedule_entry, error_msg).
+        on_skip: Callback chamado com (schedule_entry, motivo) quando uma execução
+                 é saltada por haver outra da mesma origem em curso.
     """
 
-    def __init__(self, config: dict, on_run=None, on_done=None, on_error=None):
+    def __init__(self, config: dict, on_run=None, on_done=None, on_error=None,
+                 on_skip=None):
+        automation = config.get('automation', {})
         self.config = config
         self.on_run = on_run
         self.on_done = on_done
         self.on_error = on_error
+        self.on_skip = on_skip
+        self.workers = max(1, int(automation.get('schedule_workers', 2)))
 
         self._running = False
         self._thread = None
-        # Registo de última execução por entrada: {entry_id: datetime}
+        self._threads = []
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # Origens com execução em fila ou em curso: {origem: schedule_id}
+        self._busy = {}
+        # Estado por agendamento (ver status())
+        self._state = {}
+        self._wake = threading.Event()
+        # Registo de última execução por agendamento: {schedule_id: datetime}
         self._last_run: dict = {}
+        # Fila de prioridade: (disparo, seq, schedule_id, recuperação, hora nominal)
+        self._heap = []
+        self._seq = itertools.count()
+        self._entries = {}
+        self._signature = None
 
     def start(self):
         """Inicia o loop de agendamento em thread de fundo."""
         if self._running:
             return
+        hook_queue.resume(self.config)
         self._running = True
+        self._wake.clear()
         self._thread = threading.Thread(target=self._loop, daemon=True)
         self._thread.start()
+        self._threads = [threading.Thread(target=self._serve, daemon=True)
+                         for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
 
     def stop(self):
-        """Para o loop de agendamento."""
+        """Para o loop de agendamento. As execuções em fila são descartadas."""
         self._running = False
+        self._wake.set()
         if self._thread:
-            self._thread.join(timeout=70)
+            self._thread.join(timeout=5)
             self._thread = None
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+        with self._lock:
+            while True:
+                try:
+                    sid, entry, _ = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                self._release(sid, entry)
+
+    def reload(self):
+        """Relê os agendamentos da configuração (sem esperar pelo próximo acordar)."""
+        self._wake.set()
 
     @property
     def is_running(self) -> bool:
         return self._running
 
+    def upcoming(self) -> list:
+        """Próximas execuções agendadas, por ordem: ``[(datetime, entry)]``."""
+        items = sorted(self._heap)
+        return [(fire_at, self._entries[sid]) for fire_at, _, sid, _, _ in items
+                if sid in self._entries]
+
+    def status(self) -> dict:
+        """Estado de cada agendamento já disparado.
+
+        Returns:
+            ``{schedule_id: {'state': 'queued'|'running'|'idle', 'queued_at',
+            'started_at', 'finished_at', 'skipped', 'last_skipped'}}``
+            (datas como ``datetime`` ou None; ``skipped`` conta as execuções
+            saltadas por sobreposição).
+        """
+        with self._lock:
+            return {sid: dict(state) for sid, state in self._state.items()}
+
     # ------------------------------------------------------------------
     # Internals
     # ------------------------------------------------------------------
 
+    def _active_entries(self) -> dict:
+        """Agendamentos activos da configuração, por id."""
+        schedules = self.config.get('automation', {}).get('schedules', [])
+        return {schedule_id(e): e for e in schedules if e.get('enabled', True)}
+
+    def _catch_up_policy(self, entry: dict) -> str:
+        policy = (entry.get('catch_up') or
+                  self.config.get('automation', {}).get('schedule_catch_up', 'once'))
+        return policy if policy in CATCH_UP_POLICIES else 'once'
+
+    def _missed_runs(self, entry: dict, last: datetime, now: datetime,
+                     limit: int = MAX_CATCH_UP) -> list:
+        """As ``limit`` execuções mais recentes entre ``last`` (exclusive) e ``now``
+        (inclusive), por ordem cronológica.
+
+        A procura parte de ``now`` para trás, para que um agendamento parado há
+        meses (ex: ``* * * * *``) não percorra todas as execuções perdidas.
+        """
+        try:
+            expression = trigger(entry)
+        except ValueError:
+            return []
+        missed = []
+        when = expression.last_until(now, after=last)
+        while when is not None and len(missed) < limit:
+            missed.append(when)
+            when = expression.last_until(when - timedelta(minutes=1), after=last)
+        missed.reverse()
+        return missed
+
+    def _push(self, when: datetime, sid: str, catch_up: bool = False):
+        jitter = self._entries[sid].get(
+            'jitter', self.config.get('automation', {}).get('schedule_jitter', 0))
+        try:
+            offset = jitter_offset(self._entries[sid], float(jitter or 0))
+        except (TypeError, ValueError):
+            offset = 0.0
+        fire_at = when + timedelta(seconds=offset)
+        heapq.heappush(self._heap, (fire_at, next(self._seq), sid, catch_up, when))
+
+    def _rebuild(self, now: datetime, catch_up: bool):
+        """Recalcula a fila a partir da configuração.
+
+        Args:
+            catch_up: Se True (arranque), agenda as execuções perdidas desde a
+                      última registada de cada agendamento. Se False (recarga),
+                      os agendamentos inalterados mantêm as execuções já em
+                      fila, incluindo as que ainda esperam pelo seu jitter.
+        """
+        entries = self._active_entries()
+        kept = []
+        if not catch_up:
+            kept = [item for item in self._heap
+                    if item[2] in entries and self._entries.get(item[2]) == entries[item[2]]]
+        self._entries = entries
+        self._signature = json.dumps(entries, sort_keys=True, default=str)
+        self._heap = kept
+        heapq.heapify(self._heap)
+        kept_ids = {item[2] for item in kept}
+        for sid, entry in entries.items():
+            if sid in kept_ids:
+                continue
+            last = self._last_run.get(sid)
+            policy = self._catch_up_policy(entry)
+            if catch_up and last is not None and policy != 'skip':
+                limit = 1 if policy == 'once' else MAX_CATCH_UP
+                for when in self._missed_runs(entry, last, now, limit):
+                    self._push(when, sid, catch_up=True)
+            when = next_run(entry, now)
+            if when is not None:
+                self._push(when, sid)
+
+    def _changed(self) -> bool:
+        """Indica se os agendamentos da configuração mudaram desde o último cálculo."""
+        entries = self._active_entries()
+        return json.dumps(entries, sort_keys=True, default=str) != self._signature
+
+    def _load_state(self):
+        """Carrega a última execução de cada agendamento (sem base de dados: vazio)."""
+        try:
+            init_db()
+            self._last_run.update(_load_last_runs())
+        except sqlite3.Error:
+            pass
+
     def _loop(self):
-        """Verifica minuto a minuto se há algum agendamento para executar."""
+        """Dorme até à próxima execução agendada e lança-a."""
+        self._load_state()
+        self._rebuild(datetime.now(), catch_up=True)
         while self._running:
             now = datetime.now()
-            schedules = self.config.get('automation', {}).get('schedules', [])
-            for entry in schedules:
-                if not entry.get('enabled', True):
+            if self._changed():
+                self._rebuild(now, catch_up=False)
+            while self._heap and self._heap[0][0] <= now:
+                _, _, sid, catch_up, when = heapq.heappop(self._heap)
+                entry = self._entries.get(sid)
+                if entry is None:
                     continue
-                if self._should_run(entry, now):
-                    entry_id = id(entry)
-                    self._last_run[entry_id] = now
-                    threading.Thread(
-                        target=self._execute,
-                        args=(entry,),
-                        daemon=True,
-                    ).start()
-            # Esperar até ao próximo minuto
-            time.sleep(60 - datetime.now().second)
-
-    def _should_run(self, entry: dict, now: datetime) -> bool:
-        """Verifica se um agendamento deve ser executado agora."""
-        hora = entry.get('hora', '')
-        if not hora:
-            return False
+                self._fire(sid, entry, when)
+                if not catch_up:
+                    # Se o loop se atrasou (ex: suspensão), não repete as execuções saltadas
+                    following = next_run(entry, max(when, now))
+                    if following is not None:
+                        self._push(following, sid)
+            timeout = _MAX_SLEEP
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - datetime.now()).total_seconds())
+            self._wake.wait(max(timeout, 0))
+            self._wake.clear()
+
+    def _fire(self, sid: str, entry: dict, when: datetime):
+        """Regista a execução e põe-na na fila, ou salta-a se a origem estiver ocupada."""
+        self._last_run[sid] = when
         try:
-            h, m = hora.split(':')
-            if int(h) != now.hour or int(m) != now.minute:
-                return False
-        except (ValueError, AttributeError):
-            return False
+            _save_last_run(sid, when)
+        except sqlite3.Error:
+            pass
+        key = _source_key(entry)
+        with self._lock:
+            state = self._state.setdefault(sid, {
+                'state': 'idle', 'queued_at': None, 'started_at': None,
+                'finished_at': None, 'skipped': 0, 'last_skipped': None})
+            busy = self._busy.get(key)
+            if busy is None:
+                self._busy[key] = sid
+                state.update(state='queued', queued_at=datetime.now())
+        if busy is not None:
+            reason = ("A execução anterior ainda não terminou" if busy == sid
+                      else "Outro agendamento da mesma origem está em curso")
+            with self._lock:
+                state['skipped'] += 1
+                state['last_skipped'] = datetime.now()
+            try:
+                schedule_runs.record_skipped(sid, entry, when, reason)
+            except sqlite3.Error:
+                pass
+            if self.on_skip:
+                self.on_skip(entry, reason)
+            return
+        self._queue.put((sid, entry, when))
 
-        # Verificar dia da semana (0=Segunda, 6=Domingo como weekday())
-        dias = entry.get('dias', list(range(7)))
-        if now.weekday() not in dias:
-            return False
+    def _release(self, sid: str, entry: dict):
+        """Liberta a origem de uma execução terminada ou descartada (com ``_lock``)."""
+        self._busy.pop(_source_key(entry), None)
+        state = self._state.get(sid)
+        if state is not None:
+            state['state'] = 'idle'
 
-        # Evitar executar duas vezes no mesmo minuto
-        entry_id = id(entry)
-        last = self._last_run.get(entry_id)
-        if last and last.hour == now.hour and last.minute == now.minute and last.date() == now.date():
-            return False
+    def _serve(self):
+        """Thread do pool de execução."""
+        while self._running:
+            try:
+                sid, entry, when = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._state[sid].update(state='running', started_at=datetime.now())
+            try:
+                self._run(sid, entry, when)
+            finally:
+                with self._lock:
+                    self._release(sid, entry)
+                    self._state[sid]['finished_at'] = datetime.now()
 
-        return True
+    def _run(self, sid: str, entry: dict, when: datetime):
+        """Executa um agendamento e regista a execução em ``schedule_runs``."""
+        try:
+            run_id = schedule_runs.start_run(sid, entry, when)
+        except sqlite3.Error:
+            run_id = None
+        summary = {}
+        try:
+            summary = self._execute(entry) or {}
+        finally:
+            if run_id is not None:
+                try:
+                    schedule_runs.finish_run(
+                        run_id, summary.get('files', 0), summary.get('clients', 0),
+                        summary.get('failures', 0), summary.get('error', ''))
+                except sqlite3.Error:
+                    pass
 
-    def _execute(self, entry: dict):
-        """Executa a conversão para um agendamento."""
+    def _execute(self, entry: dict) -> dict:
+        """Executa a conversão para um agendamento.
+
+        Returns:
+            Resumo da execução: ``{'files', 'clients', 'failures', 'error'}``.
+        """
         if self.on_run:
             self.on_run(entry)
+        summary = {'files': 0, 'clients': 0, 'failures': 0, 'error': ''}
         try:
             source = entry.get('source', '')
             mode = entry.get('mode', 'individual')
             if not source or not os.path.exists(source):
                 raise FileNotFoundError(f"Origem não encontrada: {source}")
 
-            from src.hooks import run_hooks
+            from src.hooks import HookRunner, dispatch_hooks
 
             if os.path.isdir(source):
                 from src.batch_processor import process_batch
-                results = process_batch(source, self.config, mode=mode)
-                output_paths = [r['output_path'] for r in results if r['success']]
-                run_hooks(self.config, source, output_paths)
+                hooks = HookRunner(self.config)
+                results = process_batch(source, self.config, mode=mode, hook_runner=hooks)
+                summary.update(files=len(results),
+                               clients=sum(r['clients_count'] for r in results),
+                               failures=sum(1 for r in results if not r['success']))
+                hooks.finish(source)
                 if self.on_done:
                     self.on_done(entry, results)
             else:
-                from src.converter import ExcelToPDFConverter
-                converter = ExcelToPDFConverter(source, None, self.config)
-                if mode == 'aggregate':
-                    output = converter.generate_pdf()
-                    outputs = [output]
-                else:
-                    outputs = converter.generate_individual_pdfs()
-                run_hooks(self.config, source, outputs)
+                summary['files'] = 1
+                result = self._execute_file(source, mode)
+                summary['clients'] = result['clients_count']
+                if not result['success']:
+                    raise RuntimeError(result['error'])
+                dispatch_hooks(self.config, source, result['outputs'])
                 if self.on_done:
-                    self.on_done(entry, outputs)
+                    self.on_done(entry, result['outputs'])
 
         except Exception as e:
+            summary['error'] = str(e)
+            summary['failures'] = max(summary['failures'], 1)
             if self.on_error:
                 self.on_error(entry, str(e))
+        return summary
+
+    def _execute_file(self, source: str, mode: str) -> dict:
+        """Converte um ficheiro e devolve o resultado de ``convert_file``.
+
+        Com ``resources.isolate`` a conversão corre num processo filho com
+        tempo e memória limitados e o resultado, incluindo o motivo de uma
+        falha, fica no histórico.
+        """
+        from src.admission import admitted
+        from src.batch_processor import convert_file
+        if not is_enabled(self.config):
+            with admitted(source, self.config):
+                return convert_file(source, self.config, mode)
+        from src import history
+        with admitted(source, self.config):
+            result = convert_isolated(source, self.config, mode)
+        history.add_entry(source, result['output_path'], f'schedule_{mode}',
+                          result['clients_count'], result['success'], result['error'],
+                          cache_hits=result['cache_hits'], timings=result['timings'])
+        return result
 
 
 def validate_schedule_entry(entry: dict) -> list:
-    """Valida uma entrada de agendamento.
+    """Valida uma entrada de agendamento (``hora``/``dias`` ou ``cron``).
 
     Returns:
         Lista de erros encontrados (vazia se válida).
     """
     errors = []
     hora = entry.get('hora', '')
-    if not hora:
+    if entry.get('cron'):
+        try:
+            CronExpression(entry['cron']).next_after(datetime.now())
+        except ValueError as e:
+            errors.append(f"{e}.")
+    elif not hora:
         errors.append("Hora é obrigatória.")
     else:
         try:
@@ -164,9 +509,12 @@ def validate_schedule_entry(entry: dict) -> list:
             errors.append("Formato de hora inválido (use HH:MM).")
 
     dias = entry.get('dias', [])
-    if not dias:
+    if not dias and not entry.get('cron'):
         errors.append("Selecione pelo menos um dia da semana.")
 
+    if entry.get('catch_up') and entry['catch_up'] not in CATCH_UP_POLICIES:
+        errors.append("Recuperação inválida (skip, once ou all).")
+
     source = entry.get('source', '')
     if not source:
         errors.append("Origem (pasta ou ficheiro) é obrigatória.")
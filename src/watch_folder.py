@@ -6,39 +6,142 @@ Detecta novos ficheiros Excel e converte-os automaticamente para PDF.
 """
 
 import os
+import queue
+import sqlite3
 import threading
 import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src import batch_journal, hook_queue, inotify, isolation, watch_state, zip_input
+from src.progress import CancelToken
+from src.admission import admitted
+
+
+def _signature(path: str):
+    """(tamanho, mtime) de um ficheiro, ou None se não existir."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _is_locked(path: str) -> bool:
+    """Indica se o Excel tem o ficheiro aberto (ficheiro de bloqueio ``~$``).
+
+    O Excel substitui os dois primeiros caracteres do nome quando este é
+    longo, pelo que ambas as formas são procuradas.
+    """
+    folder, name = os.path.split(path)
+    return any(os.path.exists(os.path.join(folder, '~$' + candidate))
+               for candidate in (name, name[2:]))
 
 
 class WatchFolder:
     """Monitoriza uma pasta e converte automaticamente novos ficheiros Excel.
 
-    Utiliza polling simples (sem dependência watchdog) para máxima compatibilidade.
-    A cada intervalo verifica se há novos ficheiros .xlsx/.xls/.xlsm que não estejam
-    já em processamento.
+    Em Linux é notificada pelo kernel (inotify, ver ``src.inotify``) assim que
+    um ficheiro é fechado após escrita ou movido para a pasta. Nos restantes
+    sistemas — ou com ``automation.watch_backend = 'polling'`` — lista a pasta
+    a cada intervalo à procura de novos ficheiros .xlsx/.xls/.xlsm. Arquivos
+    .zip novos são tratados como pastas: os workbooks que contêm são
+    convertidos sem extracção, em paralelo (ver ``batch.workers`` e
+    ``src.zip_input``), e os callbacks são chamados por membro
+    (``pacote.zip!contas.xlsx``).
+
+    Um ficheiro detectado só é convertido quando estiver estável: tamanho e
+    mtime iguais em ``automation.watch_stable_checks`` verificações seguidas,
+    espaçadas de ``watch_settle_seconds``, e sem ficheiro de bloqueio do
+    Excel (``~$nome``). Novos eventos sobre um ficheiro pendente recomeçam a
+    contagem (debounce). Se a conversão falhar e o ficheiro tiver mudado
+    entretanto (ainda estava a ser copiado), volta a aguardar estabilidade e
+    é convertido de novo, até ``watch_max_retries`` vezes; um ficheiro que
+    falhou é também reconvertido se for alterado mais tarde.
+
+    Um ficheiro já convertido que seja alterado (tamanho ou mtime) é
+    reconvertido, excepto se o hash do conteúdo for igual ao da última
+    conversão. Com ``automation.watch_persist`` este estado fica em SQLite
+    (ver ``src.watch_state``): ao arrancar, os ficheiros que chegaram ou
+    mudaram enquanto o watcher estava parado são convertidos. O arranque faz
+    só uma listagem, um ``stat`` por ficheiro e uma consulta; os hashes são
+    calculados pelas threads de conversão. Na primeira monitorização de uma
+    pasta os ficheiros existentes são registados sem serem convertidos.
+
+    A detecção e a conversão correm em threads separadas: os ficheiros
+    estáveis entram numa fila limitada (``automation.watch_queue_size``)
+    servida por ``watch_workers`` conversões em simultâneo — em processos
+    próprios quando há mais de uma, caso em que ``on_progress`` não é usado.
+    Com a fila cheia a detecção pára até haver lugar (os eventos ficam no
+    kernel ou são apanhados na listagem seguinte). ``metrics()`` devolve a
+    profundidade da fila e o tempo entre a detecção e o PDF.
 
     Args:
         folder_path: Pasta a monitorizar.
         config: Configuração da aplicação.
-        on_new_file: Callback chamado com (excel_path) quando um novo ficheiro é detectado.
+        on_new_file: Callback chamado com (excel_path) quando um novo ficheiro é
+                     detectado (antes de estar estável).
         on_converted: Callback chamado com (excel_path, output_paths) após conversão.
         on_error: Callback chamado com (excel_path, error_msg) em caso de erro.
-        interval: Intervalo entre verificações em segundos (default 5).
+        on_progress: Callback chamado com (excel_path, info) durante a conversão,
+                     com o dicionário de progresso por cliente (ver ``src.progress``).
+        interval: Intervalo entre verificações em segundos (default 5). Com
+                  inotify só limita o tempo de resposta a ``stop()``.
+        backend: 'auto' (inotify se disponível), 'inotify' ou 'polling'
+                 (default: ``automation.watch_backend``). Se o inotify não
+                 puder ser usado é sempre feito polling; ``self.backend``
+                 indica o que está em uso.
+        manager: ``WatchManager`` que faz a detecção e as conversões desta
+                 pasta, em conjunto com outras (ver ``src.watch_manager``).
+                 Nesse caso o watcher não cria threads próprias.
     """
 
     def __init__(self, folder_path: str, config: dict,
                  on_new_file=None, on_converted=None, on_error=None,
-                 interval: int = 5):
+                 interval: int = 5, on_progress=None, backend: str = None,
+                 manager=None):
         self.folder_path = folder_path
         self.config = config
         self.on_new_file = on_new_file
         self.on_converted = on_converted
         self.on_error = on_error
+        self.on_progress = on_progress
         self.interval = interval
+        if backend is None:
+            backend = config.get('automation', {}).get('watch_backend', 'auto')
+        self.requested_backend = backend
+        self.backend = None
+        auto = config.get('automation', {})
+        self.settle = float(auto.get('watch_settle_seconds', 1.0))
+        self.stable_checks = max(1, int(auto.get('watch_stable_checks', 2)))
+        self.max_retries = int(auto.get('watch_max_retries', 3))
+        self.workers = max(1, int(auto.get('watch_workers', 1)))
+        self.queue_size = max(1, int(auto.get('watch_queue_size', 100)))
+        self.persist = bool(auto.get('watch_persist', True))
 
         self._running = False
         self._thread = None
+        self._workers = []
+        self._executor = None
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        # Protege o estado partilhado entre a detecção e as conversões
+        self._lock = threading.RLock()
         self._seen: set = set()
+        # Ficheiros à espera de estabilidade: path -> {signature, stable, checked}
+        self._pending: dict = {}
+        # Ficheiros já tratados: path -> assinatura (tamanho, mtime) nessa altura
+        self._known: dict = {}
+        # Estado persistido (ver src.watch_state): caminho absoluto -> registo
+        self._state: dict = {}
+        self._retries: dict = {}
+        # Instante da detecção de cada ficheiro, para medir o tempo até ao PDF
+        self._detected: dict = {}
+        self._stats = _Metrics()
+        self._cancel = CancelToken()
+        self._events = None
+        self._archives = config.get('batch', {}).get('archives', False)
+        self.manager = manager
 
     def start(self):
         """Inicia a monitorização em thread de fundo."""
@@ -47,69 +150,488 @@ class WatchFolder:
         if not os.path.isdir(self.folder_path):
             raise ValueError(f"Pasta não encontrada: {self.folder_path}")
 
-        # Registar os ficheiros já existentes para não os reprocessar
-        self._seen = set(self._scan())
+        # Hooks deixados na fila por uma execução anterior
+        hook_queue.resume(self.config)
+
+        # Observar antes de listar, para não perder ficheiros criados entretanto
+        self._events = self._open_events()
+        self.backend = 'inotify' if self._events is not None else 'polling'
+        self._pending = {}
+        catch_up = self._load_state()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._cancel = CancelToken()
         self._running = True
+        for path in catch_up:
+            self._track(path)
+        if self.manager is not None:
+            # Detecção e conversões feitas pelas threads do gestor
+            self._executor = self.manager.executor
+            return
+        if self.workers > 1:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
         self._thread = threading.Thread(target=self._loop, daemon=True)
         self._thread.start()
+        self._workers = [threading.Thread(target=self._serve, daemon=True)
+                         for _ in range(self.workers)]
+        for worker in self._workers:
+            worker.start()
 
     def stop(self):
-        """Para a monitorização."""
+        """Para a monitorização, interrompendo a conversão em curso."""
         self._running = False
+        self._cancel.cancel()
         if self._thread:
             self._thread.join(timeout=self.interval + 1)
             self._thread = None
+        for worker in self._workers:
+            worker.join(timeout=self.interval + 1)
+        self._workers = []
+        if self.manager is not None:
+            self._executor = None  # o pool é do gestor
+            self._close_events()
+        elif self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
 
     @property
     def is_running(self) -> bool:
         return self._running
 
+    def metrics(self) -> dict:
+        """Métricas da fila de conversão.
+
+        Returns:
+            ``{queue_depth, queue_size, pending, in_progress, converted,
+            failed, backpressure, time_to_pdf: {avg, p95, max} | None}``.
+            ``pending`` são os ficheiros ainda à espera de estabilidade;
+            ``backpressure`` conta as vezes que a detecção esperou por lugar
+            na fila; ``time_to_pdf`` (segundos desde a detecção) cobre as
+            últimas conversões bem-sucedidas.
+        """
+        with self._lock:
+            pending = len(self._pending)
+        return dict(self._stats.snapshot(), queue_depth=self._queue.qsize(),
+                    queue_size=self.queue_size, pending=pending)
+
     # ------------------------------------------------------------------
     # Internals
     # ------------------------------------------------------------------
 
+    def _load_state(self) -> list:
+        """Regista os ficheiros já existentes e devolve os que têm de ser
+        convertidos (novos ou alterados desde a última execução)."""
+        files = {path: _signature(path) for path in self._scan()}
+        self._seen, self._known, self._state = set(), {}, {}
+        baseline = True
+        if self.persist:
+            try:
+                from src.database import init_db
+                init_db()
+                baseline = not watch_state.is_watched(self.folder_path)
+                self._state = watch_state.load(self.folder_path)
+                if baseline:
+                    watch_state.add_baseline(
+                        self.folder_path, {os.path.abspath(p): sig for p, sig in files.items()})
+                else:
+                    present = {os.path.abspath(p) for p in files}
+                    watch_state.forget(self.folder_path,
+                                       [p for p in self._state if p not in present])
+            except sqlite3.Error:
+                self.persist = False
+        catch_up = []
+        for path, signature in files.items():
+            entry = self._state.get(os.path.abspath(path))
+            if baseline or (entry is not None and entry['signature'] == signature):
+                self._seen.add(path)
+                self._known[path] = signature
+            else:
+                catch_up.append(path)
+        return sorted(catch_up)
+
+    def _record(self, path: str, signature, outputs: list, success: bool):
+        """Guarda o resultado de um ficheiro (em memória e, se activo, em SQLite)."""
+        with self._lock:
+            self._known[path] = signature
+        if not self.persist:
+            return
+        key = os.path.abspath(path)
+        content_hash = batch_journal.file_hash(path) if success else ''
+        status = watch_state.CONVERTED if success else watch_state.FAILED
+        try:
+            watch_state.record(self.folder_path, key, signature, content_hash, outputs, status)
+        except sqlite3.Error:
+            return
+        with self._lock:
+            self._state[key] = {'path': key, 'signature': signature,
+                                'content_hash': content_hash, 'outputs': outputs,
+                                'status': status}
+
+    def _unchanged(self, path: str) -> bool:
+        """Indica se o conteúdo é igual ao da última conversão (só mudou o mtime)
+        e as saídas ainda existem; nesse caso actualiza o registo."""
+        with self._lock:
+            entry = self._state.get(os.path.abspath(path))
+        if (entry is None or entry['status'] != watch_state.CONVERTED
+                or not entry['content_hash']
+                or not all(os.path.exists(out) for out in entry['outputs'])):
+            return False
+        signature = _signature(path)
+        if batch_journal.file_hash(path) != entry['content_hash']:
+            return False
+        self._record(path, signature, entry['outputs'], True)
+        return True
+
+    def _open_events(self):
+        """Abre o observador inotify, ou None se for para usar polling."""
+        if self.requested_backend == 'polling' or not inotify.is_available():
+            return None
+        try:
+            return inotify.Inotify(self.folder_path)
+        except OSError:
+            return None
+
+    def _is_candidate(self, name: str) -> bool:
+        """Indica se um nome de ficheiro deve ser convertido."""
+        if name.startswith('~$'):
+            return False
+        if name.lower().endswith(('.xlsx', '.xls', '.xlsm')):
+            return True
+        return self._archives and zip_input.is_archive(name)
+
     def _scan(self) -> list:
         """Retorna lista de ficheiros Excel na pasta (sem temporários)."""
         if not os.path.isdir(self.folder_path):
             return []
-        files = []
-        for name in os.listdir(self.folder_path):
-            if name.startswith('~$'):
-                continue
-            if name.lower().endswith(('.xlsx', '.xls', '.xlsm')):
-                files.append(os.path.join(self.folder_path, name))
-        return files
+        return [os.path.join(self.folder_path, name)
+                for name in os.listdir(self.folder_path) if self._is_candidate(name)]
+
+    def _changes(self, timeout: float) -> tuple:
+        """Espera por alterações e devolve os ficheiros candidatos (novos ou não).
+
+        Returns:
+            ``(paths, touched)`` — ``touched`` indica que cada ficheiro acabou
+            de ser escrito (evento inotify), e não apenas listado.
+        """
+        if self._events is None:
+            time.sleep(timeout)
+            return set(self._scan()), False
+        names, overflow = self._events.read(timeout)
+        if overflow:
+            return set(self._scan()), False
+        return {os.path.join(self.folder_path, name)
+                for name in names if self._is_candidate(name)}, True
+
+    def _track(self, path: str, touched: bool = False):
+        """Regista um ficheiro visto na pasta, pondo-o a aguardar estabilidade."""
+        with self._lock:
+            self._track_locked(path, touched)
+
+    def _track_locked(self, path: str, touched: bool):
+        if path in self._seen:
+            known = self._known.get(path)
+            if known is None or _signature(path) in (None, known):
+                return  # em conversão, ou inalterado
+            # Alterado depois de tratado: converter de novo
+            self._seen.discard(path)
+            del self._known[path]
+            self._retries.pop(path, None)
+        entry = self._pending.get(path)
+        if entry is None:
+            self._wait_stable(path)
+            self._detected.setdefault(path, time.monotonic())
+            if self.on_new_file and not zip_input.is_archive(path):
+                self.on_new_file(path)
+        elif touched:
+            # Debounce: escrito de novo, recomeçar a contagem
+            entry['stable'] = 1
+            entry['checked'] = time.monotonic()
+
+    def _wait_stable(self, path: str):
+        self._pending[path] = {'signature': _signature(path), 'stable': 1,
+                               'checked': time.monotonic()}
+
+    def _ready(self) -> list:
+        """Ficheiros pendentes que já estão estáveis (retirados de ``_pending``
+        e marcados como vistos)."""
+        with self._lock:
+            ready = self._ready_locked()
+            self._seen.update(ready)
+        return ready
+
+    def _ready_locked(self) -> list:
+        now = time.monotonic()
+        ready = []
+        for path, entry in list(self._pending.items()):
+            if now - entry['checked'] >= self.settle:
+                signature = _signature(path)
+                entry['checked'] = now
+                if signature is None:
+                    del self._pending[path]  # removido antes de ficar estável
+                    continue
+                if signature == entry['signature']:
+                    entry['stable'] += 1
+                else:
+                    entry['signature'], entry['stable'] = signature, 1
+            if entry['stable'] >= self.stable_checks and not _is_locked(path):
+                del self._pending[path]
+                ready.append(path)
+        return sorted(ready)
+
+    def _retry_if_changed(self, path: str, before) -> bool:
+        """Depois de uma falha: se o ficheiro mudou durante a conversão, voltar
+        a aguardar estabilidade. Devolve True se a conversão vai ser repetida."""
+        after = _signature(path)
+        with self._lock:
+            if after is not None and after != before \
+                    and self._retries.get(path, 0) < self.max_retries:
+                self._retries[path] = self._retries.get(path, 0) + 1
+                self._seen.discard(path)
+                self._wait_stable(path)
+                return True
+            self._detected.pop(path, None)
+        self._record(path, after, [], False)
+        return False
 
     def _loop(self):
         """Loop principal de monitorização."""
+        try:
+            while self._running:
+                try:
+                    timeout = min(self.interval, self.settle) if self._pending else self.interval
+                    paths, touched = self._changes(timeout)
+                    for path in self._detect(paths, touched):
+                        self._enqueue(path)
+                except Exception:
+                    pass
+        finally:
+            self._close_events()
+
+    def _close_events(self):
+        if self._events is not None:
+            self._events.close()
+            self._events = None
+
+    def _detect(self, paths, touched: bool = False) -> list:
+        """Regista as alterações vistas e devolve os ficheiros prontos a converter."""
+        for path in sorted(paths):
+            self._track(path, touched)
+        return self._ready()
+
+    def _defer(self, path: str):
+        """Devolve um ficheiro pronto que não coube na fila: volta a ser
+        oferecido na verificação seguinte (se entretanto não mudar)."""
+        with self._lock:
+            self._seen.discard(path)
+            self._pending[path] = {'signature': _signature(path), 'stable': self.stable_checks,
+                                   'checked': time.monotonic()}
+        self._stats.backpressure()
+
+    def _enqueue(self, path: str):
+        """Põe um ficheiro na fila de conversão, esperando se estiver cheia."""
+        waited = False
         while self._running:
             try:
-                current = set(self._scan())
-                new_files = current - self._seen
-                for path in sorted(new_files):
-                    self._seen.add(path)
-                    self._process(path)
-            except Exception:
-                pass
-            time.sleep(self.interval)
-
-    def _process(self, excel_path: str):
-        """Converte um ficheiro Excel detectado."""
-        if self.on_new_file:
-            self.on_new_file(excel_path)
+                self._queue.put(path, timeout=0.2)
+                return
+            except queue.Full:
+                if not waited:
+                    waited = True
+                    self._stats.backpressure()
+
+    def _serve(self):
+        """Thread de conversão: serve a fila até ``stop()``."""
+        while self._running:
+            try:
+                path = self._queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self._handle(path)
+
+    def _handle(self, path: str):
+        """Converte um ficheiro retirado da fila, actualizando as métricas."""
+        self._stats.started()
         try:
-            from src.converter import ExcelToPDFConverter
-            from src.hooks import run_hooks
-            converter = ExcelToPDFConverter(excel_path, None, self.config)
-            mode = self.config.get('automation', {}).get('watch_mode', 'individual')
-            if mode == 'aggregate':
-                output = converter.generate_pdf()
-                outputs = [output]
+            ok = self._process(path)
+        except Exception:
+            ok = False
+        with self._lock:
+            detected = self._detected.pop(path, None) if ok else None
+        self._stats.finished(ok, time.monotonic() - detected if detected else None)
+
+    def _process(self, excel_path: str) -> bool:
+        """Converte um ficheiro Excel detectado. Devolve True se foi convertido."""
+        if zip_input.is_archive(excel_path):
+            return self._process_archive(excel_path)
+        before = _signature(excel_path)
+        try:
+            if self._unchanged(excel_path):
+                return True
+            if isolation.is_enabled(self.config):
+                outputs = self._convert_isolated(excel_path)
+            elif self._executor is None:
+                outputs = self._convert_inline(excel_path)
             else:
-                outputs = converter.generate_individual_pdfs()
-            run_hooks(self.config, excel_path, outputs)
+                outputs = self._convert_pooled(excel_path)
+            with self._lock:
+                self._retries.pop(excel_path, None)
+            self._record(excel_path, before, outputs, True)
             if self.on_converted:
                 self.on_converted(excel_path, outputs)
+            return True
         except Exception as e:
+            if self._retry_if_changed(excel_path, before):
+                return False
             if self.on_error:
                 self.on_error(excel_path, str(e))
+            return False
+
+    def _convert_inline(self, excel_path: str) -> list:
+        """Converte nesta thread (uma só conversão de cada vez), com progresso."""
+        from src.converter import ExcelToPDFConverter
+        from src.hooks import dispatch_hooks
+        converter = ExcelToPDFConverter(excel_path, None, self.config)
+        mode = self.config.get('automation', {}).get('watch_mode', 'individual')
+        on_progress = None
+        if self.on_progress:
+            on_progress = lambda info: self.on_progress(excel_path, info)
+        kwargs = {'progress_callback': on_progress, 'cancel_token': self._cancel}
+        with admitted(excel_path, self.config, self._cancel):
+            if mode == 'aggregate':
+                output = converter.generate_pdf(**kwargs)
+                outputs = [output]
+            elif mode == 'zip':
+                converter.generate_individual_pdfs(zip_output=True, **kwargs)
+                outputs = [converter.output_zip_path] if converter.output_zip_path else []
+            else:
+                outputs = converter.generate_individual_pdfs(**kwargs)
+        with converter.timings.phase('hooks'):
+            dispatch_hooks(self.config, excel_path, outputs)
+        return outputs
+
+    def _convert_pooled(self, excel_path: str) -> list:
+        """Converte num processo do pool e espera pelo resultado."""
+        from src.batch_processor import convert_file
+        from src.hooks import dispatch_hooks
+        mode = self.config.get('automation', {}).get('watch_mode', 'individual')
+        with admitted(excel_path, self.config, self._cancel):
+            result = self._executor.submit(convert_file, excel_path, self.config, mode).result()
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        dispatch_hooks(self.config, excel_path, result['outputs'])
+        return result['outputs']
+
+    def _convert_isolated(self, excel_path: str) -> list:
+        """Converte num processo filho com tempo e memória limitados (ver ``src.isolation``).
+
+        O resultado, incluindo o motivo de uma falha, fica no histórico.
+        """
+        from src import history
+        from src.hooks import dispatch_hooks
+        mode = self.config.get('automation', {}).get('watch_mode', 'individual')
+        on_progress = None
+        if self.on_progress:
+            on_progress = lambda info: self.on_progress(excel_path, info)
+        with admitted(excel_path, self.config, self._cancel):
+            result = isolation.convert_isolated(excel_path, self.config, mode,
+                                                progress_callback=on_progress,
+                                                cancel_token=self._cancel)
+        if not self._cancel.is_cancelled:
+            history.add_entry(excel_path, result['output_path'], f'watch_{mode}',
+                              result['clients_count'], result['success'], result['error'],
+                              cache_hits=result['cache_hits'], timings=result['timings'])
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        dispatch_hooks(self.config, excel_path, result['outputs'])
+        return result['outputs']
+
+    def _process_archive(self, archive_path: str) -> bool:
+        """Converte, em paralelo, os workbooks de um arquivo .zip detectado.
+
+        Devolve True se todos os membros foram convertidos.
+        """
+        from src.batch_processor import process_files
+        from src.hooks import HookRunner
+        before = _signature(archive_path)
+        if self._unchanged(archive_path):
+            return True
+        members = [zip_input.member_path(archive_path, name)
+                   for name, _ in zip_input.iter_members(archive_path)]
+        if not members and not zipfile.is_zipfile(archive_path):
+            if not self._retry_if_changed(archive_path, before) and self.on_error:
+                self.on_error(archive_path, "Arquivo ZIP inválido ou incompleto")
+            return False
+        if self.on_new_file:
+            for path in members:
+                self.on_new_file(path)
+        mode = self.config.get('automation', {}).get('watch_mode', 'individual')
+        hooks = HookRunner(self.config)
+        try:
+            results = process_files(members, self.config, mode, cancel_token=self._cancel,
+                                    hook_runner=hooks)
+        except Exception as e:
+            if self.on_error:
+                for path in members:
+                    self.on_error(path, str(e))
+            return False
+        ok = all(r['success'] for r in results)
+        self._record(archive_path, before,
+                     [out for r in results for out in r['outputs']], ok)
+        hooks.finish(archive_path)
+        for result in results:
+            path = result['file']
+            try:
+                if not result['success']:
+                    raise RuntimeError(result['error'])
+                if self.on_converted:
+                    self.on_converted(path, result['outputs'])
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(path, str(e))
+        return ok
+
+
+class _Metrics:
+    """Contadores da fila de conversão, partilhados pelas threads."""
+
+    # Número de conversões usadas para o tempo até ao PDF
+    WINDOW = 200
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_progress = 0
+        self.converted = 0
+        self.failed = 0
+        self.waits = 0
+        self.latencies = deque(maxlen=self.WINDOW)
+
+    def backpressure(self):
+        with self._lock:
+            self.waits += 1
+
+    def started(self):
+        with self._lock:
+            self.in_progress += 1
+
+    def finished(self, ok: bool, latency: float = None):
+        with self._lock:
+            self.in_progress -= 1
+            if ok:
+                self.converted += 1
+            else:
+                self.failed += 1
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            time_to_pdf = None
+            if latencies:
+                time_to_pdf = {
+                    'avg': sum(latencies) / len(latencies),
+                    'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                    'max': latencies[-1],
+                }
+            return {'in_progress': self.in_progress, 'converted': self.converted,
+                    'failed': self.failed, 'backpressure': self.waits,
+                    'time_to_pdf': time_to_pdf}
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de monitorização de várias pastas (uma por equipa).
+
+O ``WatchManager`` junta vários ``WatchFolder`` — cada um com a sua pasta,
+perfil de configuração e modo — e trata-os com um número fixo de threads:
+
+- uma thread de detecção para todas as pastas (um único ``select`` sobre os
+  descritores inotify; as pastas em polling são listadas no seu intervalo);
+- ``automation.watch_workers`` threads de conversão partilhadas (em
+  processos próprios quando há mais de uma).
+
+Cada pasta tem a sua fila (até ``watch_queue_size`` ficheiros) e as threads
+de conversão servem as filas à vez (round-robin), pelo que uma pasta com
+centenas de ficheiros não atrasa as restantes. Com a fila de uma pasta
+cheia, os ficheiros prontos ficam pendentes nessa pasta e são oferecidos de
+novo na verificação seguinte; as outras pastas continuam a ser servidas.
+"""
+
+import copy
+import os
+import select
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.watch_folder import WatchFolder
+
+
+# Tempo máximo de espera da thread de detecção (resposta a stop())
+_MAX_WAIT = 1.0
+
+
+def folder_config(config: dict, entry: dict) -> dict:
+    """Configuração de uma pasta: a do perfil indicado (ou ``config``) com o modo da pasta.
+
+    Args:
+        config: Configuração da aplicação.
+        entry: ``{'folder', 'profile', 'mode'}`` (ver ``automation.watch_folders``).
+
+    Raises:
+        ValueError: Se o perfil não existir.
+    """
+    result = copy.deepcopy(config)
+    profile = entry.get('profile')
+    if profile:
+        from src.config import load_profile
+        loaded = load_profile(profile)
+        if loaded is None:
+            raise ValueError(f"Perfil não encontrado: {profile}")
+        result.update(copy.deepcopy(loaded))
+        # As opções de monitorização são as da aplicação, não as do perfil
+        result['automation'] = copy.deepcopy(config.get('automation', {}))
+    automation = result.setdefault('automation', {})
+    automation['watch_mode'] = (entry.get('mode') or
+                                config.get('automation', {}).get('watch_mode', 'individual'))
+    return result
+
+
+def configured_folders(config: dict) -> list:
+    """Pastas a monitorizar segundo a configuração.
+
+    ``automation.watch_folder`` (com ``watch_mode``) seguido das entradas
+    activas de ``automation.watch_folders``, sem repetições.
+    """
+    automation = config.get('automation', {})
+    entries = []
+    if automation.get('watch_folder'):
+        entries.append({'folder': automation['watch_folder'], 'profile': '',
+                        'mode': automation.get('watch_mode', 'individual')})
+    entries.extend(e for e in automation.get('watch_folders', [])
+                   if e.get('folder') and e.get('enabled', True))
+    seen, unique = set(), []
+    for entry in entries:
+        key = os.path.abspath(entry['folder'])
+        if key not in seen:
+            seen.add(key)
+            unique.append(entry)
+    return unique
+
+
+class WatchManager:
+    """Monitoriza várias pastas com um pool de conversão partilhado.
+
+    Args:
+        config: Configuração da aplicação (``automation.watch_workers``,
+                ``watch_queue_size`` e as restantes opções de monitorização).
+        on_new_file, on_converted, on_error, on_progress: Callbacks comuns a
+                todas as pastas, com os argumentos de ``WatchFolder``.
+        interval: Intervalo de polling das pastas sem inotify.
+    """
+
+    def __init__(self, config: dict, on_new_file=None, on_converted=None,
+                 on_error=None, on_progress=None, interval: float = None):
+        automation = config.get('automation', {})
+        self.config = config
+        self.on_new_file = on_new_file
+        self.on_converted = on_converted
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.interval = interval if interval is not None else automation.get('watch_interval', 5)
+        self.workers = max(1, int(automation.get('watch_workers', 1)))
+        self.queue_size = max(1, int(automation.get('watch_queue_size', 100)))
+        self.executor = None
+        self.watchers = []
+
+        self._running = False
+        self._thread = None
+        self._threads = []
+        self._queues = {}
+        self._turn = 0
+        self._cond = threading.Condition()
+        self._next_scan = {}
+
+    @classmethod
+    def from_config(cls, config: dict, **kwargs):
+        """Gestor com as pastas de ``configured_folders(config)``."""
+        manager = cls(config, **kwargs)
+        for entry in configured_folders(config):
+            manager.add_folder(entry['folder'], folder_config(config, entry))
+        return manager
+
+    def add_folder(self, folder_path: str, config: dict = None) -> WatchFolder:
+        """Acrescenta uma pasta (antes de ``start()``).
+
+        Args:
+            folder_path: Pasta a monitorizar.
+            config: Configuração da pasta (perfil e ``automation.watch_mode``);
+                    default: a do gestor.
+        """
+        if self._running:
+            raise RuntimeError("Não é possível acrescentar pastas com a monitorização activa")
+        watcher = WatchFolder(folder_path, config if config is not None else self.config,
+                              on_new_file=self.on_new_file, on_converted=self.on_converted,
+                              on_error=self.on_error, on_progress=self.on_progress,
+                              interval=self.interval, manager=self)
+        self.watchers.append(watcher)
+        return watcher
+
+    @property
+    def is_running(self) -> bool:
+        return self._running
+
+    def start(self):
+        """Inicia a monitorização de todas as pastas.
+
+        Raises:
+            ValueError: Se não houver pastas ou alguma não existir.
+        """
+        if self._running:
+            return
+        if not self.watchers:
+            raise ValueError("Nenhuma pasta para monitorizar")
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._queues = {watcher: deque() for watcher in self.watchers}
+        started = []
+        try:
+            for watcher in self.watchers:
+                watcher.start()
+                started.append(watcher)
+        except Exception:
+            for watcher in started:
+                watcher.stop()
+            self._shutdown_executor()
+            raise
+        self._next_scan = {watcher: 0.0 for watcher in self.watchers}
+        self._running = True
+        self._thread = threading.Thread(target=self._detect_loop, daemon=True)
+        self._thread.start()
+        self._threads = [threading.Thread(target=self._serve, daemon=True)
+                         for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        """Para a monitorização de todas as pastas."""
+        self._running = False
+        for watcher in self.watchers:
+            watcher._running = False
+            watcher._cancel.cancel()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=_MAX_WAIT + 1)
+            self._thread = None
+        for thread in self._threads:
+            thread.join(timeout=self.interval + 1)
+        self._threads = []
+        for watcher in self.watchers:
+            watcher.stop()
+        self._shutdown_executor()
+
+    def _shutdown_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def metrics(self) -> dict:
+        """Métricas por pasta e totais.
+
+        Returns:
+            ``{'folders': {pasta: métricas de WatchFolder.metrics()},
+            'queue_depth', 'in_progress', 'converted', 'failed'}``.
+        """
+        folders = {}
+        with self._cond:
+            depths = {w: len(q) for w, q in self._queues.items()}
+        for watcher in self.watchers:
+            folders[watcher.folder_path] = dict(watcher.metrics(),
+                                                queue_depth=depths.get(watcher, 0))
+        totals = {key: sum(m[key] for m in folders.values())
+                  for key in ('queue_depth', 'in_progress', 'converted', 'failed')}
+        return dict(totals, folders=folders)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _timeout(self, now: float) -> float:
+        """Tempo até à próxima verificação de alguma pasta."""
+        timeout = _MAX_WAIT
+        for watcher in self.watchers:
+            if watcher._pending:
+                timeout = min(timeout, watcher.settle)
+            if watcher._events is None:
+                timeout = min(timeout, self._next_scan[watcher] - now)
+        return max(timeout, 0)
+
+    def _detect_loop(self):
+        """Thread de detecção de todas as pastas."""
+        while self._running:
+            try:
+                fds = [w._events.fd for w in self.watchers if w._events is not None]
+                timeout = self._timeout(time.monotonic())
+                if fds:
+                    select.select(fds, [], [], timeout)
+                else:
+                    time.sleep(timeout)
+                now = time.monotonic()
+                for watcher in self.watchers:
+                    if watcher._events is None:
+                        if now < self._next_scan[watcher]:
+                            paths, touched = set(), False
+                        else:
+                            self._next_scan[watcher] = now + self.interval
+                            paths, touched = watcher._changes(0)
+                    else:
+                        paths, touched = watcher._changes(0)
+                    for path in watcher._detect(paths, touched):
+                        if not self._submit(watcher, path):
+                            watcher._defer(path)
+            except Exception:
+                pass
+
+    def _submit(self, watcher: WatchFolder, path: str) -> bool:
+        """Põe um ficheiro na fila da sua pasta. Devolve False se estiver cheia."""
+        with self._cond:
+            pending = self._queues[watcher]
+            if len(pending) >= self.queue_size:
+                return False
+            pending.append(path)
+            self._cond.notify()
+        return True
+
+    def _next(self):
+        """Próximo ficheiro a converter, alternando entre as pastas (round-robin)."""
+        with self._cond:
+            while self._running:
+                count = len(self.watchers)
+                for offset in range(count):
+                    watcher = self.watchers[(self._turn + offset) % count]
+                    pending = self._queues[watcher]
+                    if pending:
+                        self._turn = (self._turn + offset + 1) % count
+                        return watcher, pending.popleft()
+                self._cond.wait(0.2)
+        return None
+
+    def _serve(self):
+        """Thread de conversão partilhada por todas as pastas."""
+        while self._running:
+            item = self._next()
+            if item is None:
+                continue
+            watcher, path = item
+            watcher._handle(path)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de estado persistente da pasta monitorizada.
+
+Guarda em SQLite (tabelas ``watch_folders`` e ``watch_files``) o que o
+WatchFolder já tratou em cada pasta: tamanho, mtime, hash do conteúdo e
+saídas de cada ficheiro.
+Assim, ao reiniciar, o watcher converte os ficheiros que chegaram ou foram
+alterados enquanto estava parado, sem reconverter os restantes.
+
+Estados de um ficheiro:
+- ``baseline`` — já existia na primeira monitorização da pasta (não convertido);
+- ``converted`` — convertido com sucesso;
+- ``failed`` — a conversão falhou (é repetida se o ficheiro mudar).
+"""
+
+import json
+import os
+from datetime import datetime
+
+from src.database import _get_connection
+
+
+BASELINE = 'baseline'
+CONVERTED = 'converted'
+FAILED = 'failed'
+
+
+def _row_to_dict(row) -> dict:
+    return {
+        'path': row['path'],
+        'signature': (row['size'], row['mtime_ns']),
+        'content_hash': row['content_hash'],
+        'outputs': json.loads(row['outputs'] or '[]'),
+        'status': row['status'],
+        'updated_at': row['updated_at'],
+    }
+
+
+def load(folder_path: str) -> dict:
+    """Estado de todos os ficheiros registados de uma pasta.
+
+    Returns:
+        ``{path: {path, signature, content_hash, outputs, status, updated_at}}``
+        com ``signature = (size, mtime_ns)``.
+    """
+    conn = _get_connection()
+    try:
+        rows = conn.execute(
+            "SELECT * FROM watch_files WHERE folder = ?", (os.path.abspath(folder_path),)
+        ).fetchall()
+    finally:
+        conn.close()
+    return {row['path']: _row_to_dict(row) for row in rows}
+
+
+def is_watched(folder_path: str) -> bool:
+    """Indica se a pasta já foi monitorizada (tem linha de base registada)."""
+    conn = _get_connection()
+    try:
+        row = conn.execute("SELECT 1 FROM watch_folders WHERE folder = ?",
+                           (os.path.abspath(folder_path),)).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+
+def add_baseline(folder_path: str, signatures: dict):
+    """Regista a pasta e os ficheiros já existentes na sua primeira monitorização.
+
+    Args:
+        signatures: ``{path: (size, mtime_ns)}``.
+    """
+    now = datetime.now().isoformat()
+    folder = os.path.abspath(folder_path)
+    conn = _get_connection()
+    try:
+        conn.execute("INSERT OR IGNORE INTO watch_folders (folder, started_at) VALUES (?, ?)",
+                     (folder, now))
+        conn.executemany(
+            """INSERT OR IGNORE INTO watch_files
+               (folder, path, size, mtime_ns, status, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(folder, path, sig[0], sig[1], BASELINE, now)
+             for path, sig in signatures.items() if sig is not None],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def record(folder_path: str, path: str, signature, content_hash: str,
+           outputs: list, status: str):
+    """Regista o resultado do tratamento de um ficheiro."""
+    size, mtime_ns = signature or (0, 0)
+    conn = _get_connection()
+    try:
+        conn.execute(
+            """INSERT OR REPLACE INTO watch_files
+               (folder, path, size, mtime_ns, content_hash, outputs, status, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+            (os.path.abspath(folder_path), path, size, mtime_ns, content_hash,
+             json.dumps(outputs, ensure_ascii=False), status, datetime.now().isoformat()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def forget(folder_path: str, paths):
+    """Remove do estado ficheiros que deixaram de existir na pasta."""
+    folder = os.path.abspath(folder_path)
+    conn = _get_connection()
+    try:
+        conn.executemany("DELETE FROM watch_files WHERE folder = ? AND path = ?",
+                         [(folder, path) for path in paths])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def clear(folder_path: str = None) -> int:
+    """Apaga o estado de uma pasta (ou de todas). Devolve o número de registos apagados."""
+    conn = _get_connection()
+    try:
+        if folder_path is None:
+            conn.execute("DELETE FROM watch_folders")
+            cursor = conn.execute("DELETE FROM watch_files")
+        else:
+            folder = os.path.abspath(folder_path)
+            conn.execute("DELETE FROM watch_folders WHERE folder = ?", (folder,))
+            cursor = conn.execute("DELETE FROM watch_files WHERE folder = ?", (folder,))
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
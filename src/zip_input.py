@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Módulo de entrada a partir de arquivos ZIP.
+
+Os clientes enviam os ficheiros do mês em arquivos .zip. Em vez de os
+extrair, cada workbook do arquivo é tratado como uma entrada própria,
+identificada por um caminho de membro::
+
+    /entrada/pacote.zip!Janeiro/contas.xlsx
+
+O membro é descomprimido para memória e entregue ao openpyxl — nada é
+escrito em disco. As saídas ficam numa pasta com o nome do arquivo, ao lado
+dele, e têm o nome do membro (ex: ``/entrada/pacote/Janeiro/contas.pdf``).
+
+Nos lotes e na pasta monitorizada, activado com ``batch.archives = True``.
+"""
+
+import io
+import os
+import zipfile
+
+
+# Separador entre o caminho do arquivo e o nome do membro
+SEPARATOR = '!'
+ARCHIVE_EXTENSIONS = ('.zip',)
+# Formatos lidos pelo openpyxl (os .xls dentro de arquivos são ignorados)
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm')
+
+
+def member_path(archive_path: str, member: str) -> str:
+    """Constrói o caminho de um membro: ``<arquivo>!<membro>``."""
+    return f"{archive_path}{SEPARATOR}{member}"
+
+
+def split_member(path: str):
+    """Separa um caminho de membro em (arquivo, membro).
+
+    Returns:
+        ``(arquivo, membro)``, ou ``(path, None)`` se ``path`` não for um membro.
+    """
+    lower = path.lower()
+    for ext in ARCHIVE_EXTENSIONS:
+        idx = lower.find(ext + SEPARATOR)
+        if idx != -1:
+            cut = idx + len(ext)
+            # Os nomes dos membros usam sempre '/'
+            return path[:cut], path[cut + 1:].replace('\\', '/')
+    return path, None
+
+
+def is_member(path: str) -> bool:
+    """Indica se ``path`` identifica um workbook dentro de um arquivo."""
+    return split_member(path)[1] is not None
+
+
+def is_archive(name: str) -> bool:
+    """Indica se ``name`` tem extensão de arquivo suportado."""
+    return name.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_members(archive_path: str):
+    """Produz ``(membro, ZipInfo)`` dos workbooks de um arquivo, por ordem de nome.
+
+    Ignora pastas, temporários do Excel (``~$``) e metadados do macOS.
+    Arquivos ilegíveis não produzem nada.
+    """
+    try:
+        with zipfile.ZipFile(archive_path) as zf:
+            infos = sorted(zf.infolist(), key=lambda i: i.filename)
+    except (OSError, zipfile.BadZipFile):
+        return
+    for info in infos:
+        name = info.filename
+        base = name.rsplit('/', 1)[-1]
+        if info.is_dir() or name.startswith('__MACOSX/') or base.startswith('~$'):
+            continue
+        if base.lower().endswith(WORKBOOK_EXTENSIONS):
+            yield name, info
+
+
+def open_source(path: str):
+    """Abre a entrada para leitura binária (ficheiro ou membro em memória).
+
+    Raises:
+        OSError: Se o ficheiro (ou o membro) não existir.
+    """
+    archive, member = split_member(path)
+    if member is None:
+        return open(path, 'rb')
+    try:
+        with zipfile.ZipFile(archive) as zf:
+            return io.BytesIO(zf.read(member))
+    except (KeyError, zipfile.BadZipFile) as e:
+        raise FileNotFoundError(f"Membro não encontrado: {path}") from e
+
+
+def workbook_source(path: str):
+    """Argumento para ``load_workbook``: o caminho, ou um buffer para membros."""
+    return path if not is_member(path) else open_source(path)
+
+
+def source_name(path: str) -> str:
+    """Nome do ficheiro de entrada (o do membro, para arquivos)."""
+    archive, member = split_member(path)
+    return os.path.basename(archive) if member is None else member.rsplit('/', 1)[-1]
+
+
+def display_name(path: str) -> str:
+    """Nome a mostrar: o do ficheiro, ou ``<arquivo>!<membro>`` para membros."""
+    archive, member = split_member(path)
+    if member is None:
+        return os.path.basename(path)
+    return member_path(os.path.basename(archive), member)
+
+
+def source_size(path: str) -> int:
+    """Tamanho (descomprimido) da entrada em bytes, ou 0 se não existir."""
+    archive, member = split_member(path)
+    try:
+        if member is None:
+            return os.path.getsize(path)
+        with zipfile.ZipFile(archive) as zf:
+            return zf.getinfo(member).file_size
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return 0
+
+
+def source_stat(path: str) -> os.stat_result:
+    """``os.stat`` do ficheiro em disco que contém a entrada (o arquivo, para membros)."""
+    return os.stat(split_member(path)[0])
+
+
+def output_dir(path: str) -> str:
+    """Pasta onde ficam, por omissão, as saídas de uma entrada.
+
+    Ficheiros: a pasta do ficheiro. Membros: ``<pasta do arquivo>/<nome do
+    arquivo sem extensão>/<subpasta do membro>``.
+    """
+    archive, member = split_member(path)
+    if member is None:
+        return os.path.dirname(path)
+    stem = os.path.splitext(os.path.basename(archive))[0]
+    # Sem componentes '..' — um membro não pode escrever fora da pasta do arquivo
+    parts = [p for p in member.split('/')[:-1] if p not in ('', '.', '..')]
+    return os.path.join(os.path.dirname(archive), stem, *parts)
@@ -0,0 +1,218 @@
+"""
+Testes para o controlo de admissão por memória.
+"""
+
+import copy
+import threading
+import time
+
+import pytest
+from openpyxl import Workbook
+
+from src import admission
+from src import history
+from src.admission import AdmissionController, MB
+from src.batch_processor import process_batch
+from src.config import DEFAULT_CONFIG
+from src.progress import CancelToken, ConversionCancelled
+
+
+@pytest.fixture(autouse=True)
+def fresh_controller(monkeypatch):
+    """Cada teste usa um controlador partilhado novo."""
+    controller = AdmissionController()
+    monkeypatch.setattr(admission, '_controller', controller)
+    return controller
+
+
+@pytest.fixture(autouse=True)
+def _empty_rows_cache(monkeypatch):
+    monkeypatch.setattr(admission, '_rows_cache', {})
+
+
+@pytest.fixture
+def config():
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg['output']['auto_open'] = False
+    return cfg
+
+
+def _write_xlsx(path, rows):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+    for n in range(rows):
+        ws.append([n + 1, f'S{n}', f'Cliente {n}', 100.0, 23.0, 123.0, 'Janeiro'])
+    wb.save(str(path))
+
+
+class TestMemoryBudget:
+    def test_explicit_budget(self):
+        assert admission.memory_budget({'resources': {'memory_budget_mb': 512}}) == 512 * MB
+
+    def test_negative_disables(self):
+        assert admission.memory_budget({'resources': {'memory_budget_mb': -1}}) == 0
+
+    def test_auto_uses_half_of_physical(self, monkeypatch):
+        monkeypatch.setattr(admission, 'physical_memory', lambda: 8192 * MB)
+        assert admission.memory_budget({}) == 4096 * MB
+
+    def test_auto_unknown_memory_unlimited(self, monkeypatch):
+        monkeypatch.setattr(admission, 'physical_memory', lambda: 0)
+        assert admission.memory_budget({'resources': {'memory_budget_mb': 0}}) == 0
+
+
+class TestEstimate:
+    def test_grows_with_rows(self, tmp_path):
+        path = tmp_path / 'a.xlsx'
+        path.write_bytes(b'x' * 1000)
+        small = admission.estimate_peak_memory(str(path), rows=10)
+        large = admission.estimate_peak_memory(str(path), rows=10000)
+        assert small == admission.BASE_MEMORY + 1000 * admission.WORKBOOK_FACTOR + 10 * admission.ROW_MEMORY
+        assert large > small
+
+    def test_rows_from_sheet_dimension(self, tmp_path):
+        path = tmp_path / 'contas.xlsx'
+        _write_xlsx(path, 20)
+        assert admission.estimate_rows(str(path)) == 21
+
+    def test_rows_from_history_preferred(self, tmp_path, isolated_db):
+        path = tmp_path / 'contas.xlsx'
+        _write_xlsx(path, 20)
+        history.add_entry(str(path), '', 'aggregate', 5000, True,
+                          timings={'phases': {}, 'counts': {'rows': 5000}, 'total': 0})
+        assert admission.estimate_rows(str(path)) == 5000
+
+    def test_unreadable_file(self, tmp_path):
+        path = tmp_path / 'corrompido.xlsx'
+        path.write_bytes(b'nao e um excel')
+        assert admission.estimate_rows(str(path)) == 0
+
+
+class TestRowsCache:
+    def test_second_estimate_cached(self, tmp_path, monkeypatch):
+        path = tmp_path / 'contas.xlsx'
+        _write_xlsx(path, 20)
+        calls = []
+        real = admission._sheet_rows
+        monkeypatch.setattr(admission, '_sheet_rows', lambda p: calls.append(p) or real(p))
+        assert admission.estimate_rows(str(path)) == 21
+        assert admission.estimate_rows(str(path)) == 21
+        assert len(calls) == 1
+
+    def test_changed_file_estimated_again(self, tmp_path):
+        path = tmp_path / 'contas.xlsx'
+        _write_xlsx(path, 20)
+        admission.estimate_rows(str(path))
+        _write_xlsx(path, 40)
+        assert admission.estimate_rows(str(path)) == 41
+
+    def test_convert_file_remembers_rows(self, tmp_path, config, monkeypatch):
+        from src.batch_processor import convert_file
+        path = tmp_path / 'contas.xlsx'
+        _write_xlsx(path, 3)
+        result = convert_file(str(path), config, 'aggregate')
+        assert result['success']
+        monkeypatch.setattr(admission, '_sheet_rows', lambda p: pytest.fail('não usa a cache'))
+        monkeypatch.setattr(admission, '_history_rows', lambda p: pytest.fail('não usa a cache'))
+        assert admission.estimate_rows(str(path)) == result['timings']['counts']['rows']
+
+
+class TestAdmitted:
+    def test_alone_skips_row_estimate(self, tmp_path, config, monkeypatch):
+        path = tmp_path / 'contas.xlsx'
+        path.write_bytes(b'x' * 1000)
+        config['resources']['memory_budget_mb'] = 100
+        monkeypatch.setattr(admission, 'estimate_rows', lambda p: pytest.fail('estimou linhas'))
+        with admission.admitted(str(path), config) as cost:
+            assert cost == admission.BASE_MEMORY + 1000 * admission.WORKBOOK_FACTOR
+
+    def test_busy_estimates_rows(self, tmp_path, config, fresh_controller, monkeypatch):
+        path = tmp_path / 'contas.xlsx'
+        path.write_bytes(b'x' * 1000)
+        config['resources']['memory_budget_mb'] = 1000
+        monkeypatch.setattr(admission, 'estimate_rows', lambda p: 10)
+        fresh_controller.acquire(MB)
+        try:
+            with admission.admitted(str(path), config) as cost:
+                assert cost == admission.estimate_peak_memory(str(path), rows=10)
+        finally:
+            fresh_controller.release(MB)
+
+    def test_unlimited_costs_nothing(self, tmp_path, config):
+        config['resources']['memory_budget_mb'] = -1
+        with admission.admitted(str(tmp_path / 'x.xlsx'), config) as cost:
+            assert cost == 0
+
+
+class TestAdmissionController:
+    def test_within_budget(self):
+        controller = AdmissionController(100)
+        assert controller.try_acquire(60)
+        assert not controller.try_acquire(60)
+        assert controller.try_acquire(40)
+        assert controller.snapshot()['in_use'] == 100
+
+    def test_single_job_always_admitted(self):
+        controller = AdmissionController(100)
+        assert controller.try_acquire(500)
+        assert not controller.try_acquire(1)
+
+    def test_unlimited(self):
+        controller = AdmissionController(0)
+        assert controller.try_acquire(10 ** 12)
+        assert controller.try_acquire(10 ** 12)
+
+    def test_acquire_waits_for_release(self):
+        controller = AdmissionController(100)
+        controller.acquire(80)
+        threading.Timer(0.2, controller.release, args=(80,)).start()
+        start = time.monotonic()
+        with controller.admit(80):
+            assert time.monotonic() - start >= 0.15
+        assert controller.snapshot() == {'budget': 100, 'in_use': 0, 'running': 0, 'waiting': 0}
+
+    def test_cancel_while_waiting(self):
+        controller = AdmissionController(100)
+        controller.acquire(80)
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel).start()
+        with pytest.raises(ConversionCancelled):
+            controller.acquire(80, cancel_token=token)
+        assert controller.snapshot()['running'] == 1
+
+    def test_get_controller_updates_budget(self):
+        controller = admission.get_controller({'resources': {'memory_budget_mb': 64}})
+        assert controller.budget == 64 * MB
+
+
+class TestBatchAdmission:
+    def test_parallel_runs_one_at_a_time_over_budget(self, tmp_path, config,
+                                                     fresh_controller, monkeypatch):
+        for name in ('a.xlsx', 'b.xlsx', 'c.xlsx'):
+            _write_xlsx(tmp_path / name, 3)
+        config['resources']['memory_budget_mb'] = 1
+
+        running = []
+        real_try = fresh_controller.try_acquire
+
+        def spy(cost):
+            admitted = real_try(cost)
+            running.append(fresh_controller.running)
+            return admitted
+        monkeypatch.setattr(fresh_controller, 'try_acquire', spy)
+
+        results = process_batch(str(tmp_path), config, mode='aggregate', workers=2)
+        assert all(r['success'] for r in results)
+        assert max(running) == 1
+        assert fresh_controller.snapshot()['running'] == 0
+
+    def test_sequential_cancelled_while_waiting(self, tmp_path, config, fresh_controller):
+        _write_xlsx(tmp_path / 'a.xlsx', 3)
+        config['resources']['memory_budget_mb'] = 1
+        fresh_controller.acquire(10 * MB)  # conversão de outra origem em curso
+        token = CancelToken()
+        threading.Timer(0.2, token.cancel).start()
+        results = process_batch(str(tmp_path), config, mode='aggregate', cancel_token=token)
+        assert results == []
+        assert not (tmp_path / 'a.pdf').exists()
@@ -0,0 +1,139 @@
+"""
+Testes para a deduplicação de entradas idênticas no processamento em lote.
+"""
+
+import copy
+import os
+import shutil
+
+import pytest
+from openpyxl import Workbook
+from unittest.mock import patch
+
+from src.batch_processor import _duplicate_target, process_batch
+from src.config import DEFAULT_CONFIG
+
+
+@pytest.fixture
+def config():
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg['batch']['dedup'] = True
+    return cfg
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    """Pasta com um Excel e duas cópias idênticas, mais um Excel diferente."""
+    folder = tmp_path / 'inbox'
+    folder.mkdir()
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+    ws.append([1, 'ABC', 'Cliente ABC', 100.0, 23.0, 123.0, 'Janeiro'])
+    ws.append([2, 'XYZ', 'Cliente XYZ', 200.0, 46.0, 246.0, 'Janeiro'])
+    wb.save(str(folder / 'contas.xlsx'))
+    shutil.copy(folder / 'contas.xlsx', folder / 'contas_final.xlsx')
+    shutil.copy(folder / 'contas.xlsx', folder / 'contas_final2.xlsx')
+
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+    ws.append([9, 'QWE', 'Cliente QWE', 1.0, 0.23, 1.23, 'Janeiro'])
+    wb.save(str(folder / 'outro.xlsx'))
+    return folder
+
+
+def _count_conversions():
+    """Conta as chamadas a convert_file (conversões reais)."""
+    from src import batch_processor
+    real = batch_processor.convert_file
+    calls = []
+
+    def wrapper(excel_path, *args, **kwargs):
+        calls.append(os.path.basename(excel_path))
+        return real(excel_path, *args, **kwargs)
+    return patch('src.batch_processor.convert_file', side_effect=wrapper), calls
+
+
+class TestDuplicateTarget:
+    def test_same_folder_individual_output_unchanged(self, tmp_path):
+        out = str(tmp_path / 'PDFs_Jan' / '1_A.pdf')
+        target = _duplicate_target(str(tmp_path / 'a.xlsx'), str(tmp_path / 'b.xlsx'), out, False)
+        assert target == out
+
+    def test_other_folder_mirrored(self, tmp_path):
+        out = str(tmp_path / 'x' / 'PDFs_Jan' / '1_A.pdf')
+        target = _duplicate_target(str(tmp_path / 'x' / 'a.xlsx'),
+                                   str(tmp_path / 'y' / 'b.xlsx'), out, False)
+        assert target == str(tmp_path / 'y' / 'PDFs_Jan' / '1_A.pdf')
+
+    def test_aggregate_renamed(self, tmp_path):
+        out = str(tmp_path / 'contas.pdf')
+        target = _duplicate_target(str(tmp_path / 'contas.xlsx'),
+                                   str(tmp_path / 'contas_final.xlsx'), out, True)
+        assert target == str(tmp_path / 'contas_final.pdf')
+
+    def test_configured_output_folder_kept(self, tmp_path):
+        out = str(tmp_path / 'saida' / 'relatorio.pdf')
+        target = _duplicate_target(str(tmp_path / 'in' / 'a.xlsx'),
+                                   str(tmp_path / 'in' / 'b.xlsx'), out, False)
+        assert target == out
+
+
+class TestDedupSequential:
+    def test_aggregate_converted_once_and_copied(self, inbox, config):
+        patcher, calls = _count_conversions()
+        with patcher:
+            results = process_batch(str(inbox), config, mode='aggregate')
+
+        assert sorted(calls) == ['contas.xlsx', 'outro.xlsx']
+        by_name = {r['filename']: r for r in results}
+        dup = by_name['contas_final.xlsx']
+        assert dup['success'] is True
+        assert dup['duplicate_of'] == str(inbox / 'contas.xlsx')
+        assert dup['output_path'] == str(inbox / 'contas_final.pdf')
+        assert (inbox / 'contas_final.pdf').read_bytes() == (inbox / 'contas.pdf').read_bytes()
+        assert by_name['contas_final2.xlsx']['duplicate_of'] == str(inbox / 'contas.xlsx')
+        assert by_name['outro.xlsx']['duplicate_of'] == ''
+
+    def test_hardlink(self, inbox, config):
+        config['batch']['dedup_link'] = 'hardlink'
+        process_batch(str(inbox), config, mode='aggregate')
+        assert os.path.samefile(inbox / 'contas.pdf', inbox / 'contas_final.pdf')
+
+    def test_individual_same_folder_shares_outputs(self, inbox, config):
+        patcher, calls = _count_conversions()
+        with patcher:
+            results = process_batch(str(inbox), config, mode='individual')
+        dup = next(r for r in results if r['filename'] == 'contas_final.xlsx')
+        original = next(r for r in results if r['filename'] == 'contas.xlsx')
+        assert dup['outputs'] == original['outputs']
+        assert 'contas_final.xlsx' not in calls
+
+    def test_disabled_converts_all(self, inbox, config):
+        config['batch']['dedup'] = False
+        patcher, calls = _count_conversions()
+        with patcher:
+            results = process_batch(str(inbox), config, mode='aggregate')
+        assert len(calls) == 4
+        assert all(r['duplicate_of'] == '' for r in results)
+
+    def test_failed_original_propagates(self, inbox, config):
+        with patch('src.batch_processor.convert_file') as mock_convert:
+            from src.batch_processor import _failed_result
+            mock_convert.side_effect = lambda path, *a, **k: _failed_result(path, 'corrompido')
+            results = process_batch(str(inbox), config, mode='aggregate')
+        dup = next(r for r in results if r['filename'] == 'contas_final.xlsx')
+        assert dup['success'] is False
+        assert dup['error'] == 'corrompido'
+        assert mock_convert.call_count == 2
+
+
+class TestDedupParallel:
+    def test_parallel_converts_each_content_once(self, inbox, config):
+        results = process_batch(str(inbox), config, mode='aggregate', workers=2)
+        assert [r['filename'] for r in results] == [
+            'contas.xlsx', 'contas_final.xlsx', 'contas_final2.xlsx', 'outro.xlsx']
+        assert [bool(r['duplicate_of']) for r in results] == [False, True, True, False]
+        assert all(r['success'] for r in results)
+        assert os.path.exists(inbox / 'contas_final2.pdf')
@@ -0,0 +1,181 @@
+"""
+Testes para a estimativa da duração de lotes.
+"""
+
+import copy
+from datetime import datetime, timedelta
+
+import pytest
+from openpyxl import Workbook
+
+from src import batch_estimator, batch_journal
+from src import database as db
+from src import history
+from src.config import DEFAULT_CONFIG
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    """Redireciona a base de dados para um ficheiro temporário por teste."""
+    db_path = str(tmp_path / 'test.db')
+    monkeypatch.setattr('src.database._get_db_path', lambda: db_path)
+    db.init_db()
+    return db_path
+
+
+@pytest.fixture
+def config():
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+
+@pytest.fixture
+def folder(tmp_path):
+    """Pasta com dois Excel: 10 e 30 linhas de dados."""
+    path = tmp_path / 'lote'
+    path.mkdir()
+    for name, rows in (('pequeno.xlsx', 10), ('grande.xlsx', 30)):
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['Nr.', 'SIGLA', 'Cliente', 'TOTAL'])
+        for n in range(rows):
+            ws.append([n + 1, f'S{n}', f'Cliente {n}', 10.0])
+        wb.save(str(path / name))
+    return path
+
+
+def _timings(rows, clients, read=1.0, render=2.0):
+    return {'phases': {'load': read, 'pdf_build': render},
+            'counts': {'rows': rows, 'clients': clients}, 'total': read + render}
+
+
+class TestThroughput:
+    def test_default_without_history(self):
+        rates = batch_estimator.throughput('aggregate')
+        assert rates['source'] == 'default'
+        assert rates['row'] == batch_estimator.DEFAULT_RATES['aggregate']['row']
+
+    def test_from_history(self):
+        history.add_entry('/a.xlsx', '/a.pdf', 'individual', 100, True,
+                          timings=_timings(100, 100, read=1.0, render=4.0))
+        history.add_entry('/b.xlsx', '/b', 'batch_individual', 300, True,
+                          timings=_timings(300, 300, read=3.0, render=8.0))
+        rates = batch_estimator.throughput('individual')
+        assert rates['source'] == 'history'
+        assert rates['samples'] == 2
+        assert rates['row'] == pytest.approx(4.0 / 400)
+        assert rates['client'] == pytest.approx(12.0 / 400)
+
+    def test_other_modes_and_failures_ignored(self):
+        history.add_entry('/a.xlsx', '/a.pdf', 'aggregate', 100, True,
+                          timings=_timings(100, 100))
+        history.add_entry('/b.xlsx', '', 'individual', 0, False, 'erro',
+                          timings=_timings(100, 100))
+        assert batch_estimator.throughput('individual')['source'] == 'default'
+
+    def test_batch_journal_timings_used(self, folder):
+        run_id = batch_journal.start_run(str(folder), 'zip', {})
+        batch_journal.mark_finished(run_id, {
+            'file': str(folder / 'pequeno.xlsx'), 'success': True, 'output_path': 'x.zip',
+            'timings': _timings(50, 50)}, 'hash')
+        assert batch_estimator.throughput('zip')['samples'] == 1
+
+
+    def test_gui_batch_counted_once(self, folder):
+        path = str(folder / 'pequeno.xlsx')
+        run_id = batch_journal.start_run(str(folder), 'zip', {})
+        result = {'file': path, 'success': True, 'output_path': 'x.zip',
+                  'timings': _timings(50, 50)}
+        batch_journal.mark_finished(run_id, result, 'hash')
+        history.add_entry(path, 'x.zip', 'batch_zip', 50, True, timings=result['timings'])
+        assert batch_estimator.throughput('zip')['samples'] == 1
+
+    def test_cache_hits_ignored(self, folder):
+        history.add_entry('/a.xlsx', '/a', 'individual', 100, True, cache_hits=100,
+                          timings=_timings(100, 100, read=0.1, render=0.0))
+        run_id = batch_journal.start_run(str(folder), 'individual', {})
+        batch_journal.mark_finished(run_id, {
+            'file': str(folder / 'pequeno.xlsx'), 'success': True, 'output_path': 'x',
+            'cache_hits': 5, 'timings': _timings(50, 50)}, 'hash')
+        assert batch_estimator.throughput('individual')['source'] == 'default'
+
+class TestEstimateBatch:
+    def test_files_and_totals(self, folder, config):
+        estimate = batch_estimator.estimate_batch(str(folder), config, 'aggregate')
+        names = [f['filename'] for f in estimate['files']]
+        assert names == ['grande.xlsx', 'pequeno.xlsx']
+        assert [f['rows'] for f in estimate['files']] == [31, 11]
+        assert estimate['rows'] == 42
+        assert estimate['seconds'] == pytest.approx(sum(f['seconds'] for f in estimate['files']))
+        assert estimate['wall_seconds'] == pytest.approx(estimate['seconds'])
+
+    def test_scales_with_history_throughput(self, folder, config):
+        slow = _timings(10, 10, read=10.0, render=10.0)
+        history.add_entry('/x.xlsx', '/x.pdf', 'aggregate', 10, True, timings=slow)
+        estimate = batch_estimator.estimate_batch(str(folder), config, 'aggregate')
+        assert estimate['rates']['source'] == 'history'
+        assert estimate['seconds'] == pytest.approx(42 * 2.0)
+
+    def test_workers_divide_wall_time(self, folder, config):
+        estimate = batch_estimator.estimate_batch(str(folder), config, 'aggregate', workers=2)
+        longest = max(f['seconds'] for f in estimate['files'])
+        assert estimate['workers'] == 2
+        assert estimate['wall_seconds'] == pytest.approx(max(estimate['seconds'] / 2, longest))
+
+    def test_does_not_convert(self, folder, config):
+        batch_estimator.estimate_batch(str(folder), config, 'individual')
+        assert not list(folder.glob('**/*.pdf'))
+
+    def test_unreadable_file_uses_size(self, tmp_path, config):
+        (tmp_path / 'velho.xls').write_bytes(b'x' * 600)
+        estimate = batch_estimator.estimate_batch(str(tmp_path), config, 'aggregate')
+        assert estimate['files'][0]['rows'] == 600 // batch_estimator.BYTES_PER_ROW
+
+
+class TestAccuracy:
+    def _finished_run(self, folder, estimated, actual):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        batch_journal.set_estimate(run_id, estimated)
+        started = datetime(2026, 1, 1, 9, 0, 0)
+        conn = db._get_connection()
+        try:
+            conn.execute(
+                "UPDATE batch_runs SET status = ?, started_at = ?, finished_at = ? WHERE id = ?",
+                (batch_journal.RUN_COMPLETED, started.isoformat(),
+                 (started + timedelta(seconds=actual)).isoformat(), run_id))
+            conn.commit()
+        finally:
+            conn.close()
+        return run_id
+
+    def test_no_runs(self):
+        assert batch_estimator.estimate_accuracy() == {'runs': [], 'mean_error': None}
+
+    def test_mean_absolute_error(self, folder):
+        self._finished_run(folder, estimated=120, actual=100)
+        self._finished_run(folder, estimated=60, actual=100)
+        accuracy = batch_estimator.estimate_accuracy()
+        assert sorted(r['error'] for r in accuracy['runs']) == pytest.approx([-0.4, 0.2])
+        assert accuracy['mean_error'] == pytest.approx(0.3)
+
+    def test_runs_without_estimate_ignored(self, folder):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        batch_journal.set_run_status(run_id, batch_journal.RUN_COMPLETED)
+        assert batch_estimator.estimate_accuracy()['runs'] == []
+
+    def test_cli_batch_records_estimate(self, folder, config, capsys):
+        import converter_excel_pdf as entry
+        config['output']['auto_open'] = False
+        entry._run_batch(str(folder), config, 'aggregate', estimate=True)
+        assert 'Duração estimada' in capsys.readouterr().out
+        run = batch_journal.list_runs()[0]
+        assert run['estimated_seconds'] > 0
+        assert len(batch_estimator.estimate_accuracy()['runs']) == 1
+
+    def test_cli_batch_without_flag_skips_estimate(self, folder, config, capsys, monkeypatch):
+        import converter_excel_pdf as entry
+        config['output']['auto_open'] = False
+        monkeypatch.setattr(batch_estimator, 'estimate_batch',
+                            lambda *a, **kw: pytest.fail('estimou o lote'))
+        entry._run_batch(str(folder), config, 'aggregate')
+        assert 'Duração estimada' not in capsys.readouterr().out
+        assert batch_journal.list_runs()[0]['estimated_seconds'] == 0
@@ -0,0 +1,271 @@
+"""
+Testes para o diário de lotes (lotes retomáveis).
+"""
+
+import os
+
+import pytest
+from unittest.mock import patch, MagicMock
+
+from src import batch_journal
+from src import database as db
+from src.batch_processor import process_batch, resume_batch
+from src.progress import CancelToken
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    """Redireciona a base de dados para um ficheiro temporário por teste."""
+    db_path = str(tmp_path / 'test.db')
+    monkeypatch.setattr('src.database._get_db_path', lambda: db_path)
+    db.init_db()
+    return db_path
+
+
+@pytest.fixture
+def folder(tmp_path):
+    """Pasta com três ficheiros Excel (conteúdos distintos)."""
+    path = tmp_path / 'lote'
+    path.mkdir()
+    for name in ('a.xlsx', 'b.xlsx', 'c.xlsx'):
+        (path / name).write_bytes(name.encode())
+    return path
+
+
+def _converter_factory(tmp_path, calls, fail=()):
+    """Cria mocks do conversor que geram um PDF real por ficheiro."""
+    def factory(excel_path, output, config):
+        name = os.path.basename(excel_path)
+        calls.append(name)
+        mock = MagicMock()
+        mock.cache_hits = []
+        if name in fail:
+            mock.read_excel_data.side_effect = Exception(f"Erro em {name}")
+            return mock
+        pdf = tmp_path / (name + '.pdf')
+        mock.read_excel_data.return_value = {'itens': [{'Cliente': 'A'}]}
+
+        def generate_pdf(**kwargs):
+            pdf.write_bytes(b'%PDF')
+            return str(pdf)
+        mock.generate_pdf.side_effect = generate_pdf
+        return mock
+    return factory
+
+
+def _run(folder, tmp_path, run_id, fail=(), resume=False, **kwargs):
+    calls = []
+    with patch('src.batch_processor.ExcelToPDFConverter',
+               side_effect=_converter_factory(tmp_path, calls, fail)):
+        if resume:
+            results = resume_batch(run_id, **kwargs)
+        else:
+            results = process_batch(str(folder), {}, mode='aggregate', run_id=run_id, **kwargs)
+    return results, calls
+
+
+HOOK_CALLS = []
+
+
+def record_hook(source_path, output_paths):
+    HOOK_CALLS.append((os.path.basename(source_path), len(output_paths)))
+
+
+def _hooks_config():
+    hooks = [{'name': 'f', 'callable': 'tests.test_batch_journal:record_hook', 'timeout': 5},
+             {'name': 'b', 'callable': 'tests.test_batch_journal:record_hook', 'timeout': 5,
+              'scope': 'batch'}]
+    return {'automation': {'hooks': hooks, 'hooks_async': False}}
+
+
+class TestFileHash:
+    def test_same_content_same_hash(self, tmp_path):
+        (tmp_path / 'a').write_bytes(b'abc')
+        (tmp_path / 'b').write_bytes(b'abc')
+        assert batch_journal.file_hash(str(tmp_path / 'a')) == batch_journal.file_hash(str(tmp_path / 'b'))
+
+    def test_missing_file_empty(self, tmp_path):
+        assert batch_journal.file_hash(str(tmp_path / 'nao_existe')) == ''
+
+
+class TestRuns:
+    def test_start_and_get(self, folder):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {'batch': {'workers': 1}})
+        run = batch_journal.get_run(run_id)
+        assert run['folder'] == str(folder)
+        assert run['mode'] == 'aggregate'
+        assert run['config'] == {'batch': {'workers': 1}}
+        assert run['status'] == 'running'
+        assert run['total'] == 0
+
+    def test_secrets_not_stored(self, folder):
+        config = {'security': {'pdf_password': 'segredo', 'pdf_owner_password': 'dono'},
+                  'email': {'smtp': {'password': 'smtp-segredo', 'host': 'mail'}}}
+        run_id = batch_journal.start_run(str(folder), 'aggregate', config)
+        conn = db._get_connection()
+        try:
+            stored = conn.execute("SELECT config FROM batch_runs WHERE id = ?",
+                                  (run_id,)).fetchone()['config']
+        finally:
+            conn.close()
+        assert 'segredo' not in stored and 'dono' not in stored
+        assert batch_journal.get_run(run_id)['config'] == {
+            'security': {}, 'email': {'smtp': {'host': 'mail'}}}
+
+    def test_restore_secrets(self):
+        stored = {'security': {}, 'pdf': {'page_size': 'A4'}}
+        live = {'security': {'pdf_password': 'novo'}, 'pdf': {'page_size': 'Letter'}}
+        assert batch_journal.restore_secrets(stored, live) == {
+            'security': {'pdf_password': 'novo'}, 'pdf': {'page_size': 'A4'}}
+
+    def test_unknown_run_is_none(self):
+        assert batch_journal.get_run('nao_existe') is None
+
+    def test_latest_incomplete(self, folder, tmp_path):
+        first = batch_journal.start_run(str(folder), 'aggregate', {})
+        batch_journal.set_run_status(first, batch_journal.RUN_COMPLETED)
+        second = batch_journal.start_run(str(folder), 'aggregate', {})
+        assert batch_journal.latest_incomplete_run()['id'] == second
+        assert batch_journal.latest_incomplete_run(str(tmp_path / 'outra')) is None
+
+    def test_list_runs_with_counts(self, folder, tmp_path):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        _run(folder, tmp_path, run_id, fail=('b.xlsx',))
+        run = batch_journal.list_runs()[0]
+        assert (run['total'], run['done'], run['failed']) == (3, 2, 1)
+        assert run['status'] == 'completed'
+
+    def test_delete_run(self, folder, tmp_path):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        _run(folder, tmp_path, run_id)
+        batch_journal.delete_run(run_id)
+        assert batch_journal.get_run(run_id) is None
+        assert batch_journal.get_jobs(run_id) == []
+
+
+class TestJournaledBatch:
+    def test_jobs_recorded(self, folder, tmp_path):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        _run(folder, tmp_path, run_id, fail=('c.xlsx',))
+        jobs = {os.path.basename(j['file']): j for j in batch_journal.get_jobs(run_id)}
+        assert jobs['a.xlsx']['state'] == 'done'
+        assert jobs['a.xlsx']['outputs'] == [str(tmp_path / 'a.xlsx.pdf')]
+        assert jobs['a.xlsx']['input_hash'] == batch_journal.file_hash(str(folder / 'a.xlsx'))
+        assert jobs['c.xlsx']['state'] == 'failed'
+        assert 'Erro em c.xlsx' in jobs['c.xlsx']['error']
+
+    def test_cancelled_run_leaves_pending(self, folder, tmp_path):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        token = CancelToken()
+        _run(folder, tmp_path, run_id,
+             progress_callback=lambda c, t, f: token.cancel() if c == 1 else None,
+             cancel_token=token)
+        states = [j['state'] for j in batch_journal.get_jobs(run_id)]
+        assert states == ['done', 'pending', 'pending']
+        assert batch_journal.get_run(run_id)['status'] == 'cancelled'
+
+    def test_without_run_id_nothing_recorded(self, folder, tmp_path):
+        _run(folder, tmp_path, None)
+        assert batch_journal.list_runs() == []
+
+
+class TestResume:
+    def test_resume_skips_completed(self, folder, tmp_path):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        token = CancelToken()
+        _run(folder, tmp_path, run_id,
+             progress_callback=lambda c, t, f: token.cancel() if c == 1 else None,
+             cancel_token=token)
+
+        results, calls = _run(folder, tmp_path, run_id, resume=True)
+        assert calls == ['b.xlsx', 'c.xlsx']
+        assert [r['filename'] for r in results] == ['a.xlsx', 'b.xlsx', 'c.xlsx']
+        assert all(r['success'] for r in results)
+        assert batch_journal.get_run(run_id)['status'] == 'completed'
+
+    def test_changed_input_reconverted(self, folder, tmp_path):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        _run(folder, tmp_path, run_id)
+        (folder / 'b.xlsx').write_bytes(b'alterado')
+        _, calls = _run(folder, tmp_path, run_id, resume=True)
+        assert calls == ['b.xlsx']
+
+    def test_missing_output_reconverted(self, folder, tmp_path):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        _run(folder, tmp_path, run_id)
+        os.remove(tmp_path / 'c.xlsx.pdf')
+        _, calls = _run(folder, tmp_path, run_id, resume=True)
+        assert calls == ['c.xlsx']
+
+    def test_failed_files_retried(self, folder, tmp_path):
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        _run(folder, tmp_path, run_id, fail=('a.xlsx',))
+        _, calls = _run(folder, tmp_path, run_id, resume=True)
+        assert calls == ['a.xlsx']
+
+    def test_resume_runs_file_hooks(self, folder, tmp_path):
+        from src.hooks import HookRunner
+        HOOK_CALLS.clear()
+        config = _hooks_config()
+        run_id = batch_journal.start_run(str(folder), 'aggregate', config)
+        _run(folder, tmp_path, run_id, fail=('b.xlsx',))
+        runner = HookRunner(config)
+        _run(folder, tmp_path, run_id, resume=True, hook_runner=runner)
+        runner.finish(str(folder))
+        assert HOOK_CALLS == [('b.xlsx', 1), ('lote', 1)]
+
+    def test_resume_uses_live_secrets(self, folder, tmp_path):
+        config = {'security': {'pdf_password': 'antigo'}}
+        run_id = batch_journal.start_run(str(folder), 'aggregate', config)
+        seen = []
+        factory = _converter_factory(tmp_path, [])
+
+        def capture(excel_path, output, config):
+            seen.append(config['security'].get('pdf_password'))
+            return factory(excel_path, output, config)
+
+        with patch('src.batch_processor.ExcelToPDFConverter', side_effect=capture):
+            resume_batch(run_id, live_config={'security': {'pdf_password': 'actual'}})
+        assert seen == ['actual'] * 3
+
+    def test_resume_unknown_run_raises(self):
+        with pytest.raises(ValueError):
+            resume_batch('nao_existe')
+
+
+class TestCliResume:
+    def test_resume_last_without_runs(self, capsys):
+        import converter_excel_pdf as entry
+        entry._run_resume('last')
+        assert 'Não há lotes por concluir' in capsys.readouterr().out
+
+    def test_resume_unknown_exits(self):
+        import converter_excel_pdf as entry
+        with pytest.raises(SystemExit):
+            entry._run_resume('nao_existe')
+
+    def test_resume_last_completes_run(self, folder, tmp_path, capsys):
+        import converter_excel_pdf as entry
+        run_id = batch_journal.start_run(str(folder), 'aggregate', {})
+        _run(folder, tmp_path, run_id, fail=('a.xlsx',))
+
+        calls = []
+        with patch('src.batch_processor.ExcelToPDFConverter',
+                   side_effect=_converter_factory(tmp_path, calls)):
+            entry._run_resume('last')
+
+        assert calls == ['a.xlsx']
+        assert f"Lote {run_id}: 3 com sucesso" in capsys.readouterr().out
+
+    def test_resume_runs_hooks(self, folder, tmp_path, capsys):
+        import converter_excel_pdf as entry
+        HOOK_CALLS.clear()
+        run_id = batch_journal.start_run(str(folder), 'aggregate', _hooks_config())
+        _run(folder, tmp_path, run_id, fail=('a.xlsx',))
+
+        with patch('src.batch_processor.ExcelToPDFConverter',
+                   side_effect=_converter_factory(tmp_path, [])):
+            entry._run_resume(run_id)
+
+        assert HOOK_CALLS == [('a.xlsx', 1), ('lote', 1)]
+        assert "Hook 'f': OK" in capsys.readouterr().out
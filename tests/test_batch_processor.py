@@ -6,7 +6,12 @@ import os
 import pytest
 from unittest.mock import patch, MagicMock
 
-from src.batch_processor import find_excel_files, process_batch
+from openpyxl import Workbook
+
+from src.batch_processor import (
+    discover_excel_files, find_excel_files, iter_excel_files, largest_first, process_batch,
+    resolve_workers,
+)
 
 
 class TestFindExcelFiles:
@@ -86,6 +91,7 @@ class TestProcessBatch:
         mock.generate_individual_pdfs.return_value = [
             str(tmp_path / f'c{i}.pdf') for i in range(clients)
         ]
+        mock.cache_hits = []
         return mock
 
     def test_empty_folder_returns_empty(self, tmp_path):
@@ -102,7 +108,8 @@ class TestProcessBatch:
 
         assert len(results) == 1
         r = results[0]
-        assert {'file', 'filename', 'success', 'output_path', 'clients_count', 'error'} == set(r.keys())
+        assert {'file', 'filename', 'success', 'output_path', 'outputs', 'clients_count',
+                'cache_hits', 'error', 'duplicate_of', 'timings'} == set(r.keys())
 
     def test_successful_aggregate(self, tmp_path):
         """Modo aggregate regista sucesso e caminho do PDF."""
@@ -196,3 +203,197 @@ class TestProcessBatch:
             results = process_batch(str(tmp_path), {}, mode='aggregate')
 
         assert len(results) == 3
+
+    def test_cache_hits_reported(self, tmp_path):
+        """PDFs não regenerados (cache) são contados no resultado."""
+        (tmp_path / 'jan.xlsx').touch()
+        mock = self._mock_converter(tmp_path, clients=3)
+        mock.cache_hits = [str(tmp_path / 'c0.pdf'), str(tmp_path / 'c1.pdf')]
+        with patch('src.batch_processor.ExcelToPDFConverter', return_value=mock):
+            results = process_batch(str(tmp_path), {}, mode='individual')
+
+        assert results[0]['cache_hits'] == 2
+
+
+def _write_contas(path, n_clients):
+    """Cria um Excel de contabilidade com ``n_clients`` linhas."""
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL'])
+    for i in range(1, n_clients + 1):
+        ws.append([i, f'S{i}', f'Cliente {i}', 100.0, 23.0, 123.0])
+    wb.save(str(path))
+
+
+class TestResolveWorkers:
+    """Testes para resolve_workers."""
+
+    def test_default_sequential(self):
+        assert resolve_workers({}) == 1
+
+    def test_from_config(self):
+        assert resolve_workers({'batch': {'workers': 3}}) == 3
+
+    def test_explicit_overrides_config(self):
+        assert resolve_workers({'batch': {'workers': 3}}, workers=2) == 2
+
+    def test_zero_means_cpu_count(self):
+        with patch('src.batch_processor.os.cpu_count', return_value=6):
+            assert resolve_workers({'batch': {'workers': 0}}) == 6
+
+    def test_invalid_falls_back_to_one(self):
+        assert resolve_workers({'batch': {'workers': 'x'}}) == 1
+
+
+class TestLargestFirst:
+    """Testes para largest_first."""
+
+    def test_orders_by_size_desc(self, tmp_path):
+        sizes = {'a.xlsx': 10, 'b.xlsx': 300, 'c.xlsx': 50}
+        files = []
+        for name, size in sizes.items():
+            (tmp_path / name).write_bytes(b'x' * size)
+            files.append(str(tmp_path / name))
+        assert largest_first(files) == [1, 2, 0]
+
+    def test_missing_file_last(self, tmp_path):
+        (tmp_path / 'a.xlsx').write_bytes(b'xx')
+        files = [str(tmp_path / 'nao_existe.xlsx'), str(tmp_path / 'a.xlsx')]
+        assert largest_first(files) == [1, 0]
+
+
+class TestProcessBatchParallel:
+    """Testes para o processamento em paralelo (pool de processos)."""
+
+    def test_results_in_original_order(self, tmp_path):
+        _write_contas(tmp_path / 'a.xlsx', 1)
+        _write_contas(tmp_path / 'b.xlsx', 40)
+        _write_contas(tmp_path / 'c.xlsx', 5)
+        results = process_batch(str(tmp_path), {}, mode='aggregate', workers=2)
+        assert [r['filename'] for r in results] == ['a.xlsx', 'b.xlsx', 'c.xlsx']
+        assert all(r['success'] for r in results)
+        assert [r['clients_count'] for r in results] == [1, 40, 5]
+
+    def test_progress_contract(self, tmp_path):
+        for name in ('a.xlsx', 'b.xlsx', 'c.xlsx'):
+            _write_contas(tmp_path / name, 2)
+        calls = []
+        process_batch(str(tmp_path), {}, mode='aggregate', workers=2,
+                      progress_callback=lambda c, t, f: calls.append((c, t)))
+        assert calls[0] == (0, 3)
+        assert calls[-1] == (3, 3)
+        assert [c for c, _ in calls] == [0, 1, 2, 3]
+
+    def test_failure_isolated(self, tmp_path):
+        _write_contas(tmp_path / 'a.xlsx', 2)
+        (tmp_path / 'b.xlsx').write_bytes(b'not an excel file')
+        results = process_batch(str(tmp_path), {}, mode='aggregate', workers=2)
+        assert [r['success'] for r in results] == [True, False]
+
+    def test_cancel_before_start_skips_all(self, tmp_path):
+        from src.progress import CancelToken
+        for i in range(12):
+            _write_contas(tmp_path / f'{i:02d}.xlsx', 2)
+        token = CancelToken()
+        token.cancel()
+        results = process_batch(str(tmp_path), {}, mode='aggregate', workers=2,
+                                cancel_token=token)
+        # Apenas os ficheiros já entregues ao pool chegam a ser convertidos
+        assert len(results) < 12
+
+
+@pytest.fixture
+def inbox(tmp_path):
+    """Árvore de pastas por cliente:
+
+    inbox/topo.xlsx
+    inbox/ABC/jan.xlsx, inbox/ABC/fev_old.xlsx
+    inbox/ABC/arquivo/2023.xlsx
+    inbox/XYZ/jan.xlsx, inbox/XYZ/notas.txt
+    """
+    root = tmp_path / 'inbox'
+    for rel in ('topo.xlsx', 'ABC/jan.xlsx', 'ABC/fev_old.xlsx',
+                'ABC/arquivo/2023.xlsx', 'XYZ/jan.xlsx', 'XYZ/notas.txt'):
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * 10)
+    return root
+
+
+def _rel(files, root):
+    return [os.path.relpath(f, str(root)).replace(os.sep, '/') for f in files]
+
+
+class TestIterExcelFiles:
+    """Testes para iter_excel_files (descoberta recursiva)."""
+
+    def test_is_lazy_generator(self, inbox):
+        import types
+        assert isinstance(iter_excel_files(str(inbox), recursive=True), types.GeneratorType)
+
+    def test_invalid_folder_raises_immediately(self):
+        with pytest.raises(ValueError):
+            iter_excel_files('/pasta/nao/existe')
+
+    def test_flat_by_default(self, inbox):
+        assert _rel(iter_excel_files(str(inbox)), inbox) == ['topo.xlsx']
+
+    def test_recursive_files_before_subfolders(self, inbox):
+        assert _rel(iter_excel_files(str(inbox), recursive=True), inbox) == [
+            'topo.xlsx', 'ABC/fev_old.xlsx', 'ABC/jan.xlsx', 'ABC/arquivo/2023.xlsx',
+            'XYZ/jan.xlsx']
+
+    def test_max_depth(self, inbox):
+        files = _rel(iter_excel_files(str(inbox), recursive=True, max_depth=1), inbox)
+        assert 'ABC/arquivo/2023.xlsx' not in files
+        assert 'ABC/jan.xlsx' in files
+
+    def test_include_pattern(self, inbox):
+        files = _rel(iter_excel_files(str(inbox), recursive=True, include=['*/jan.xlsx']), inbox)
+        assert files == ['ABC/jan.xlsx', 'XYZ/jan.xlsx']
+
+    def test_exclude_prunes_folder(self, inbox):
+        files = _rel(iter_excel_files(str(inbox), recursive=True,
+                                      exclude=['arquivo', '*_old.xlsx']), inbox)
+        assert files == ['topo.xlsx', 'ABC/jan.xlsx', 'XYZ/jan.xlsx']
+
+    def test_size_filters(self, inbox):
+        (inbox / 'grande.xlsx').write_bytes(b'x' * 1000)
+        assert _rel(iter_excel_files(str(inbox), min_size=100), inbox) == ['grande.xlsx']
+        assert _rel(iter_excel_files(str(inbox), max_size=100), inbox) == ['topo.xlsx']
+
+    def test_mtime_filters(self, inbox):
+        os.utime(inbox / 'topo.xlsx', (1_000_000, 1_000_000))
+        (inbox / 'novo.xlsx').write_bytes(b'x')
+        assert _rel(iter_excel_files(str(inbox), modified_after=2_000_000), inbox) == ['novo.xlsx']
+        assert _rel(iter_excel_files(str(inbox), modified_before=2_000_000), inbox) == ['topo.xlsx']
+
+    def test_no_stat_without_filters(self, inbox):
+        """Sem filtros de tamanho/data não é feito stat aos ficheiros."""
+        with patch('os.DirEntry.stat', side_effect=AssertionError('stat')):
+            list(iter_excel_files(str(inbox), recursive=True))
+
+
+class TestDiscoverExcelFiles:
+    """Testes para discover_excel_files (opções em config['batch'])."""
+
+    def test_options_from_config(self, inbox):
+        config = {'batch': {'recursive': True, 'exclude': ['arquivo'], 'max_depth': 0}}
+        files = _rel(discover_excel_files(str(inbox), config), inbox)
+        assert 'ABC/arquivo/2023.xlsx' not in files
+        assert 'XYZ/jan.xlsx' in files
+
+    def test_invalid_date_raises(self, inbox):
+        with pytest.raises(ValueError):
+            discover_excel_files(str(inbox), {'batch': {'modified_after': 'ontem'}})
+
+    def test_process_batch_recursive_streams(self, inbox):
+        calls = []
+        with patch('src.batch_processor.ExcelToPDFConverter') as MockConv:
+            MockConv.return_value.read_excel_data.return_value = {'itens': []}
+            MockConv.return_value.cache_hits = []
+            results = process_batch(str(inbox), {'batch': {'recursive': True}}, mode='aggregate',
+                                    progress_callback=lambda c, t, f: calls.append((c, t)))
+        assert len(results) == 5
+        assert calls[-1] == (5, 5)
+
@@ -22,10 +22,15 @@ def _parse(argv):
     parser = argparse.ArgumentParser()
     parser.add_argument('input', nargs='?')
     parser.add_argument('-o', '--output')
-    parser.add_argument('-m', '--mode', choices=['individual', 'aggregate'], default=None)
+    parser.add_argument('-m', '--mode', choices=['individual', 'zip', 'aggregate'], default=None)
     parser.add_argument('-p', '--profile')
     parser.add_argument('-c', '--config')
     parser.add_argument('-w', '--watch', action='store_true')
+    parser.add_argument('--resume', nargs='?', const='last', metavar='RUN_ID')
+    parser.add_argument('--runs', action='store_true')
+    parser.add_argument('--worker', action='store_true')
+    parser.add_argument('--worker-id')
+    parser.add_argument('--lease-ttl', type=float, default=None)
     return parser.parse_args(argv)
 
 
@@ -54,6 +59,10 @@ class TestArgParser:
         args = _parse(['f.xlsx', '-m', 'aggregate'])
         assert args.mode == 'aggregate'
 
+    def test_mode_zip(self):
+        args = _parse(['f.xlsx', '-m', 'zip'])
+        assert args.mode == 'zip'
+
     def test_profile_flag(self):
         args = _parse(['f.xlsx', '-p', 'empresa_x'])
         assert args.profile == 'empresa_x'
@@ -70,6 +79,21 @@ class TestArgParser:
         args = _parse(['f.xlsx'])
         assert args.watch is False
 
+    def test_resume_defaults_to_last(self):
+        args = _parse(['--resume'])
+        assert args.resume == 'last'
+        assert args.input is None
+
+    def test_resume_with_run_id(self):
+        args = _parse(['--resume', 'abc123'])
+        assert args.resume == 'abc123'
+
+    def test_worker_flags(self):
+        args = _parse(['partilha/', '--worker', '--worker-id', 'pc1', '--lease-ttl', '30'])
+        assert args.worker is True
+        assert args.worker_id == 'pc1'
+        assert args.lease_ttl == 30.0
+
     def test_invalid_mode_raises(self):
         with pytest.raises(SystemExit):
             _parse(['f.xlsx', '-m', 'invalido'])
@@ -80,6 +104,10 @@ class TestArgParser:
 # ---------------------------------------------------------------------------
 
 class TestCliConversion:
+    @pytest.fixture(autouse=True)
+    def _db(self, isolated_db):
+        return isolated_db
+
     def test_missing_file_exits(self, tmp_path):
         """Ficheiro inexistente deve causar sys.exit."""
         import converter_excel_pdf as entry
@@ -140,6 +168,32 @@ class TestCliConversion:
 
         mock_converter.generate_pdf.assert_called_once()
 
+    def test_zip_mode_streams_to_archive(self, tmp_path):
+        import converter_excel_pdf as entry
+
+        src = tmp_path / 'test.xlsx'
+        src.write_text('dummy')
+        zip_path = str(tmp_path / 'out.zip')
+
+        mock_converter = MagicMock()
+        mock_converter.generate_individual_pdfs.return_value = ['1_A.pdf', '2_B.pdf']
+        mock_converter.output_zip_path = zip_path
+
+        with patch('converter_excel_pdf.load_config', return_value={'output': {'auto_open': False}}), \
+             patch('src.converter.ExcelToPDFConverter', return_value=mock_converter), \
+             patch('src.hooks.run_hooks', return_value=[]) as mock_hooks:
+            args = MagicMock()
+            args.input = str(src)
+            args.output = zip_path
+            args.mode = 'zip'
+            args.profile = None
+            args.config = None
+            args.watch = False
+            entry._run_cli(args)
+
+        mock_converter.generate_individual_pdfs.assert_called_once_with(zip_output=zip_path)
+        assert mock_hooks.call_args[0][2] == [zip_path]
+
     def test_hooks_called_after_conversion(self, tmp_path):
         import converter_excel_pdf as entry
 
@@ -163,3 +217,37 @@ class TestCliConversion:
             entry._run_cli(args)
 
         mock_hooks.assert_called_once()
+
+    def test_single_file_initialises_database(self, tmp_path, monkeypatch):
+        """A cache de saída precisa das tabelas também sem passar pelos lotes."""
+        import sqlite3
+        import converter_excel_pdf as entry
+
+        db_path = str(tmp_path / 'novo.db')
+        monkeypatch.setattr('src.database._get_db_path', lambda: db_path)
+        src = tmp_path / 'test.xlsx'
+        src.write_text('dummy')
+
+        mock_converter = MagicMock()
+        mock_converter.generate_individual_pdfs.return_value = []
+        mock_converter.cache_hits = []
+
+        with patch('converter_excel_pdf.load_config', return_value={'output': {'auto_open': False}}), \
+             patch('src.converter.ExcelToPDFConverter', return_value=mock_converter), \
+             patch('src.hooks.run_hooks', return_value=[]):
+            args = MagicMock()
+            args.input = str(src)
+            args.output = None
+            args.mode = 'individual'
+            args.profile = None
+            args.config = None
+            args.watch = False
+            entry._run_cli(args)
+
+        conn = sqlite3.connect(db_path)
+        try:
+            tables = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        finally:
+            conn.close()
+        assert 'output_cache' in tables
@@ -0,0 +1,115 @@
+"""
+Testes para as expressões cron dos agendamentos.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from src.cron import CronExpression, last_business_day
+
+
+class TestParse:
+    def test_every_minute(self):
+        cron = CronExpression('* * * * *')
+        assert len(cron.minutes) == 60 and len(cron.hours) == 24
+
+    def test_lists_ranges_steps(self):
+        cron = CronExpression('0,30 8-18/2 * * *')
+        assert cron.minutes == [0, 30]
+        assert cron.hours == [8, 10, 12, 14, 16, 18]
+
+    def test_names(self):
+        cron = CronExpression('0 9 * jan-mar mon-fri')
+        assert cron.months == {1, 2, 3}
+        assert cron.weekdays == {1, 2, 3, 4, 5}
+
+    def test_sunday_as_seven(self):
+        assert CronExpression('0 0 * * 7').weekdays == {0}
+
+    def test_macro(self):
+        assert CronExpression('@daily').next_after(datetime(2026, 3, 4, 10, 0)) == \
+            datetime(2026, 3, 5, 0, 0)
+
+    @pytest.mark.parametrize('expression', [
+        '', '* * * *', '60 * * * *', '* 24 * * *', '* * 0 * *', '* * * 13 *',
+        '*/0 * * * *', '5-1 * * * *', 'x * * * *',
+    ])
+    def test_invalid(self, expression):
+        with pytest.raises(ValueError):
+            CronExpression(expression)
+
+
+class TestNextAfter:
+    def test_same_day(self):
+        cron = CronExpression('30 8 * * *')
+        assert cron.next_after(datetime(2026, 3, 4, 7, 59, 40)) == datetime(2026, 3, 4, 8, 30)
+
+    def test_strictly_after(self):
+        cron = CronExpression('30 8 * * *')
+        assert cron.next_after(datetime(2026, 3, 4, 8, 30)) == datetime(2026, 3, 5, 8, 30)
+
+    def test_weekdays_skip_weekend(self):
+        # 2026-10-17 é sábado
+        cron = CronExpression('*/15 8-18 * * mon-fri')
+        assert cron.next_after(datetime(2026, 10, 17, 12, 0)) == datetime(2026, 10, 19, 8, 0)
+
+    def test_month_rollover(self):
+        cron = CronExpression('0 0 1 * *')
+        assert cron.next_after(datetime(2026, 12, 15)) == datetime(2027, 1, 1)
+
+    def test_last_day_of_month(self):
+        cron = CronExpression('0 23 L * *')
+        assert cron.next_after(datetime(2028, 2, 1)) == datetime(2028, 2, 29, 23, 0)
+
+    def test_last_business_day(self):
+        # 31/10/2026 é sábado: último dia útil é sexta, 30
+        cron = CronExpression('0 18 LW * *')
+        assert cron.next_after(datetime(2026, 10, 19)) == datetime(2026, 10, 30, 18, 0)
+        assert cron.next_after(datetime(2026, 10, 30, 18, 0)) == datetime(2026, 11, 30, 18, 0)
+
+    def test_day_of_month_or_weekday(self):
+        # Dias 1 e 15, ou qualquer segunda-feira
+        cron = CronExpression('0 0 1,15 * mon')
+        assert cron.next_after(datetime(2026, 10, 19, 12)) == datetime(2026, 10, 26)
+
+    def test_impossible(self):
+        with pytest.raises(ValueError):
+            CronExpression('0 0 30 2 *').next_after(datetime(2026, 1, 1))
+
+    def test_matches(self):
+        cron = CronExpression('0 18 LW * *')
+        assert cron.matches(datetime(2026, 10, 30, 18, 0, 42))
+        assert not cron.matches(datetime(2026, 10, 31, 18, 0))
+
+
+class TestLastUntil:
+    def test_inclusive(self):
+        cron = CronExpression('30 8 * * *')
+        assert cron.last_until(datetime(2026, 3, 4, 8, 30, 40)) == datetime(2026, 3, 4, 8, 30)
+
+    def test_previous_day(self):
+        cron = CronExpression('30 8 * * *')
+        assert cron.last_until(datetime(2026, 3, 4, 8, 29)) == datetime(2026, 3, 3, 8, 30)
+
+    def test_weekdays_skip_weekend(self):
+        # 2026-10-19 é segunda-feira
+        cron = CronExpression('*/15 8-18 * * mon-fri')
+        assert cron.last_until(datetime(2026, 10, 19, 7, 0)) == datetime(2026, 10, 16, 18, 45)
+
+    def test_after_bound(self):
+        cron = CronExpression('0 0 1 * *')
+        assert cron.last_until(datetime(2026, 3, 15), after=datetime(2026, 3, 1)) is None
+        assert cron.last_until(datetime(2026, 3, 15), after=datetime(2026, 2, 28)) == \
+            datetime(2026, 3, 1)
+
+    def test_impossible(self):
+        assert CronExpression('0 0 30 2 *').last_until(datetime(2026, 1, 1)) is None
+
+
+class TestLastBusinessDay:
+    def test_weekday_end(self):
+        assert last_business_day(2026, 8) == 31
+
+    def test_weekend_end(self):
+        assert last_business_day(2027, 1) == 29
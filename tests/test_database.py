@@ -46,6 +46,17 @@ class TestInitDb:
         db.init_db()
         # Não deve lançar exceção
 
+    def test_batch_columns_created_with_tables(self, isolated_db):
+        """As tabelas dos lotes já nascem com todas as colunas, sem ALTER TABLE."""
+        conn = db._get_connection()
+        try:
+            jobs = {row['name'] for row in conn.execute("PRAGMA table_info(batch_jobs)")}
+            runs = {row['name'] for row in conn.execute("PRAGMA table_info(batch_runs)")}
+        finally:
+            conn.close()
+        assert {'output_path', 'duplicate_of', 'timings'} <= jobs
+        assert 'estimated_seconds' in runs
+
 
 # ============================================
 # HISTÓRICO
@@ -76,6 +87,15 @@ class TestHistory:
         assert history[0]['success'] is False
         assert history[0]['error'] == 'Erro de leitura'
 
+    def test_hook_entries_do_not_evict_conversions(self):
+        """As entradas dos hooks têm o seu próprio limite de 500."""
+        db.add_history_entry('/p/a.xlsx', '/out/a.pdf', 'aggregate', 1, True)
+        for n in range(510):
+            db.add_history_entry('/p/a.xlsx', '/out/a.pdf', 'hook:upload', 0, True)
+        modes = [entry['mode'] for entry in db.get_history(limit=1000)]
+        assert modes.count('hook:upload') == 500
+        assert 'aggregate' in modes
+
     def test_history_order_most_recent_first(self):
         """Verifica que o histórico é ordenado por mais recente primeiro."""
         db.add_history_entry('a.xlsx', '/out/a.pdf', 'aggregate', 1, True)
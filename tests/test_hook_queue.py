@@ -0,0 +1,288 @@
+"""
+Testes para a fila persistente de hooks em segundo plano.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src import hook_queue, history
+from src.database import _get_connection
+from src.hooks import HookRunner, dispatch_hooks
+
+
+@pytest.fixture(autouse=True)
+def _db(isolated_db):
+    yield isolated_db
+    # A fila partilhada não pode sobreviver à base de dados temporária
+    if hook_queue._queue is not None:
+        hook_queue._queue.stop()
+        hook_queue._queue = None
+
+
+CALLS = []
+RELEASE = threading.Event()
+
+
+def record(source_path, output_paths):
+    CALLS.append((source_path, output_paths))
+
+
+def blocking(source_path, output_paths):
+    RELEASE.wait(5)
+    CALLS.append(('blocking', source_path))
+
+
+@pytest.fixture(autouse=True)
+def _reset_calls():
+    CALLS.clear()
+    RELEASE.clear()
+    yield
+    RELEASE.set()
+
+
+def _config(hooks, **automation):
+    return {'automation': dict({'hooks': hooks, 'hooks_retry_delay': 0}, **automation)}
+
+
+def _hook(name, func='record', **extra):
+    return dict({'name': name, 'callable': f'tests.test_hook_queue:{func}', 'timeout': 5}, **extra)
+
+
+def _ok(returncode=0, error=''):
+    return {'returncode': returncode, 'stdout': '', 'stderr': '', 'error': error}
+
+
+class TestBackoff:
+    def test_exponential(self):
+        assert [hook_queue.backoff_delay(30, n) for n in (1, 2, 3)] == [30, 60, 120]
+
+    def test_capped(self):
+        assert hook_queue.backoff_delay(30, 20) == 3600
+
+    def test_options(self):
+        assert hook_queue.retry_options({}) == (5, 30.0)
+        assert hook_queue.retry_options(
+            {'automation': {'hooks_max_attempts': 0, 'hooks_retry_delay': 'x'}}) == (1, 30.0)
+
+
+class TestQueueStore:
+    def test_enqueue_one_job_per_hook(self):
+        ids = hook_queue.enqueue(_config([_hook('a'), _hook('b'), _hook('c', enabled=False)]),
+                                 '/src.xlsx', ['/a.pdf'])
+        jobs = hook_queue.get_jobs(ids)
+        assert [j['hook_name'] for j in jobs] == ['a', 'b']
+        assert all(j['status'] == hook_queue.PENDING for j in jobs)
+        assert jobs[0]['outputs'] == ['/a.pdf']
+
+    def test_hooks_of_one_conversion_in_order(self):
+        hook_queue.enqueue(_config([_hook('a'), _hook('b')]), '/src.xlsx', [])
+        first = hook_queue.claim()
+        assert first['hook_name'] == 'a' and first['attempts'] == 1
+        assert hook_queue.claim() is None  # 'b' espera por 'a'
+        hook_queue.complete(first, _ok())
+        assert hook_queue.claim()['hook_name'] == 'b'
+
+    def test_order_kept_after_failure(self):
+        hook_queue.enqueue(_config([_hook('a'), _hook('b')], hooks_max_attempts=1),
+                           '/src.xlsx', [])
+        first = hook_queue.claim()
+        assert hook_queue.complete(first, _ok(1)) == hook_queue.FAILED
+        assert hook_queue.claim()['hook_name'] == 'b'
+
+    def test_different_conversions_independent(self):
+        config = _config([_hook('a'), _hook('b')])
+        hook_queue.enqueue(config, '/1.xlsx', [])
+        hook_queue.enqueue(config, '/2.xlsx', [])
+        claimed = [hook_queue.claim(), hook_queue.claim()]
+        assert {j['source'] for j in claimed} == {'/1.xlsx', '/2.xlsx'}
+
+    def test_batch_hook_waits_for_file_hooks(self):
+        config = _config([_hook('f'), _hook('b', scope='batch')])
+        hook_queue.enqueue(config, '/1.xlsx', ['/1.pdf'], 'file', 'lote1')
+        hook_queue.enqueue(config, '/lote', ['/1.pdf'], 'batch', 'lote1')
+        job = hook_queue.claim()
+        assert job['hook_name'] == 'f'
+        assert hook_queue.claim() is None
+        hook_queue.complete(job, _ok())
+        assert hook_queue.claim()['hook_name'] == 'b'
+
+    def test_failure_retried_with_backoff(self):
+        hook_queue.enqueue(_config([_hook('a')], hooks_retry_delay=60), '/src.xlsx', [])
+        job = hook_queue.claim()
+        before = datetime.now()
+        assert hook_queue.complete(job, _ok(2)) == hook_queue.PENDING
+        stored = hook_queue.get_jobs([job['id']])[0]
+        retry_at = datetime.fromisoformat(stored['next_attempt_at'])
+        assert before + timedelta(seconds=59) <= retry_at <= datetime.now() + timedelta(seconds=61)
+        assert stored['error'] == 'Código 2'
+        assert hook_queue.claim() is None  # ainda não está na hora
+
+    def test_attempts_exhausted(self):
+        hook_queue.enqueue(_config([_hook('a')], hooks_max_attempts=2), '/src.xlsx', [])
+        assert hook_queue.complete(hook_queue.claim(), _ok(error='Timeout expirado')) == \
+            hook_queue.PENDING
+        job = hook_queue.claim()
+        assert job['attempts'] == 2
+        assert hook_queue.complete(job, _ok(error='Timeout expirado')) == hook_queue.FAILED
+        assert hook_queue.counts()[hook_queue.FAILED] == 1
+
+    def test_successor_behind_backoff_not_due(self):
+        hook_queue.enqueue(_config([_hook('a'), _hook('b')], hooks_retry_delay=60),
+                           '/src.xlsx', [])
+        hook_queue.complete(hook_queue.claim(), _ok(1))
+        # 'b' já está na hora, mas só pode correr depois da repetição de 'a'
+        assert hook_queue.claim() is None
+        assert hook_queue.next_due_in() > 50
+
+    def test_batch_hook_not_due_while_file_hooks_wait(self):
+        config = _config([_hook('f'), _hook('b', scope='batch')], hooks_retry_delay=60)
+        hook_queue.enqueue(config, '/1.xlsx', [], 'file', 'lote1')
+        hook_queue.enqueue(config, '/lote', [], 'batch', 'lote1')
+        hook_queue.complete(hook_queue.claim(), _ok(1))
+        assert hook_queue.next_due_in() > 50
+
+    def test_outcome_kept_in_queue(self):
+        ids = hook_queue.enqueue(_config([_hook('upload')]), '/src.xlsx', ['/a.pdf'])
+        hook_queue.complete(hook_queue.claim(), _ok(1))
+        hook_queue.complete(hook_queue.claim(), _ok())
+        job = hook_queue.get_jobs(ids)[0]
+        assert job['status'] == hook_queue.DONE
+        assert job['attempts'] == 2 and job['returncode'] == 0
+        assert job['finished_at'] and job['error'] == ''
+
+    def test_final_outcome_in_history(self):
+        hook_queue.enqueue(_config([_hook('upload')], hooks_max_attempts=2), '/src.xlsx',
+                           ['/a.pdf'])
+        hook_queue.complete(hook_queue.claim(), _ok(1))
+        assert history.get_history() == []  # a repetição ainda não é o resultado final
+        hook_queue.complete(hook_queue.claim(), _ok(error='Sem rede'))
+        entry = history.get_history()[0]
+        assert entry['mode'] == 'hook:upload'
+        assert entry['output_path'] == '/a.pdf'
+        assert not entry['success'] and entry['error'] == 'Sem rede'
+
+    def test_success_after_retry_in_history(self):
+        hook_queue.enqueue(_config([_hook('upload')]), '/src.xlsx', [])
+        hook_queue.complete(hook_queue.claim(), _ok(1))
+        hook_queue.complete(hook_queue.claim(), _ok())
+        [entry] = history.get_history()
+        assert entry['success'] and 'tentativa' in entry['error']
+
+    def test_abandoned_job_reclaimed(self):
+        ids = hook_queue.enqueue(_config([_hook('a')]), '/src.xlsx', [])
+        hook_queue.claim()
+        assert hook_queue.claim() is None
+        conn = _get_connection()
+        try:
+            conn.execute("UPDATE hook_jobs SET lease_until = ? WHERE id = ?",
+                         ((datetime.now() - timedelta(seconds=1)).isoformat(), ids[0]))
+            conn.commit()
+        finally:
+            conn.close()
+        job = hook_queue.claim()
+        assert job['id'] == ids[0] and job['attempts'] == 2
+
+    def test_retry_failed_and_clear(self):
+        hook_queue.enqueue(_config([_hook('a'), _hook('b')], hooks_max_attempts=1),
+                           '/src.xlsx', [])
+        hook_queue.complete(hook_queue.claim(), _ok(1))
+        hook_queue.complete(hook_queue.claim(), _ok())
+        assert hook_queue.retry_failed() == 1
+        assert hook_queue.claim()['attempts'] == 1
+        assert hook_queue.clear_finished() == 1
+
+    def test_claim_uses_index(self):
+        conn = _get_connection()
+        try:
+            plan = conn.execute(
+                "EXPLAIN QUERY PLAN SELECT * FROM hook_jobs WHERE status = ? "
+                "AND next_attempt_at <= ?", ('pending', '')).fetchall()
+        finally:
+            conn.close()
+        assert any('idx_hook_jobs_due' in row[-1] for row in plan)
+
+
+class TestHookQueueWorkers:
+    def test_runs_in_background(self):
+        config = _config([_hook('a')])
+        queue = hook_queue.get_queue(config)
+        queue.submit('/src.xlsx', ['/a.pdf'])
+        assert queue.drain(5)
+        assert CALLS == [('/src.xlsx', ['/a.pdf'])]
+        assert hook_queue.counts()[hook_queue.DONE] == 1
+
+    def test_failing_command_retried_until_exhausted(self):
+        hooks = [{'name': 'falha', 'command': 'exit 3', 'timeout': 5}]
+        queue = hook_queue.get_queue(_config(hooks, hooks_max_attempts=3))
+        ids = queue.submit('/src.xlsx', [])
+        assert queue.drain(10)
+        job = hook_queue.get_jobs(ids)[0]
+        assert job['status'] == hook_queue.FAILED
+        assert job['attempts'] == 3 and job['returncode'] == 3
+
+    def test_drain_not_blocked_by_successor_behind_backoff(self):
+        hooks = [{'name': 'falha', 'command': 'exit 1', 'timeout': 5},
+                 {'name': 'ok', 'command': 'true', 'timeout': 5}]
+        queue = hook_queue.get_queue(_config(hooks, hooks_retry_delay=20))
+        queue.submit('/src.xlsx', [])
+        start = time.monotonic()
+        assert queue.drain(8)
+        assert time.monotonic() - start < 5
+        assert hook_queue.counts()[hook_queue.PENDING] == 2
+
+    def test_dispatch_does_not_wait_for_slow_hook(self):
+        config = _config([_hook('lento', 'blocking')])
+        start = time.monotonic()
+        assert dispatch_hooks(config, '/src.xlsx', ['/a.pdf']) == []
+        assert time.monotonic() - start < 1
+        assert CALLS == []
+        RELEASE.set()
+        assert hook_queue.drain(5)
+        assert CALLS == [('blocking', '/src.xlsx')]
+
+    def test_dispatch_sync_when_disabled(self):
+        results = dispatch_hooks(_config([_hook('a')], hooks_async=False), '/src.xlsx', [])
+        assert results[0]['returncode'] == 0
+        assert hook_queue._queue is None
+
+    def test_hook_runner_batch_after_files(self):
+        config = _config([_hook('f'), _hook('b', scope='batch')])
+        runner = HookRunner(config)
+        runner.submit('/1.xlsx', ['/1.pdf'])
+        runner.submit('/2.xlsx', ['/2.pdf'])
+        assert runner.finish('/lote') == []
+        assert hook_queue.drain(5)
+        assert CALLS[-1] == ('/lote', ['/1.pdf', '/2.pdf'])
+        assert sorted(CALLS[:2]) == [('/1.xlsx', ['/1.pdf']), ('/2.xlsx', ['/2.pdf'])]
+
+    def test_resume_only_with_async_hooks(self):
+        hook_queue.resume(_config([]))
+        assert hook_queue._queue is None
+        hook_queue.resume(_config([_hook('a')]))
+        assert hook_queue._queue is not None and hook_queue._queue.running
+
+
+class TestCliHookJobs:
+    def test_lists_jobs(self, capsys):
+        import converter_excel_pdf as entry
+        hook_queue.enqueue(_config([_hook('upload')]), '/src.xlsx', [])
+        hook_queue.complete(hook_queue.claim(), _ok(error='Sem rede'))
+        entry._list_hook_jobs('all')
+        out = capsys.readouterr().out
+        assert 'upload' in out and 'Sem rede' in out and 'Próxima tentativa' in out
+
+    def test_wait_for_hooks_bounded(self, capsys, monkeypatch):
+        import converter_excel_pdf as entry
+        waited = []
+        monkeypatch.setattr(hook_queue, 'drain', lambda timeout=None: waited.append(timeout))
+        entry._wait_for_hooks()
+        assert waited == [entry.HOOKS_WAIT_SECONDS]
+        assert 'ficam na fila' in capsys.readouterr().err
+
+    def test_empty(self, capsys):
+        import converter_excel_pdf as entry
+        entry._list_hook_jobs('failed')
+        assert 'Sem hooks na fila' in capsys.readouterr().out
@@ -4,10 +4,15 @@
 Testes para o módulo de post-conversion hooks.
 """
 
+import os
 import sys
+import threading
+import time
+
 import pytest
 
-from src.hooks import run_hooks
+from src import hooks as hooks_module
+from src.hooks import HookRunner, hooks_concurrency, run_hooks
 
 
 # ---------------------------------------------------------------------------
@@ -15,7 +20,27 @@ from src.hooks import run_hooks
 # ---------------------------------------------------------------------------
 
 def _config(hooks):
-    return {'automation': {'hooks': hooks}}
+    # Execução síncrona; a fila em segundo plano é testada em test_hook_queue.py
+    return {'automation': {'hooks': hooks, 'hooks_async': False}}
+
+
+CALLS = []
+
+
+def record_call(source_path, output_paths):
+    CALLS.append((source_path, output_paths))
+    return f"{len(output_paths)} saída(s)"
+
+
+def failing_hook(source_path, output_paths):
+    raise RuntimeError('falhou')
+
+
+def slow_hook(source_path, output_paths):
+    time.sleep(1)
+
+
+NOT_CALLABLE = 42
 
 
 # ---------------------------------------------------------------------------
@@ -92,3 +117,258 @@ class TestRunHooks:
         hooks = [{'name': 'h', 'command': 'echo {output}', 'enabled': True, 'timeout': 5}]
         results = run_hooks(_config(hooks), '/src.xlsx', [])
         assert results[0]['returncode'] == 0
+
+
+# ---------------------------------------------------------------------------
+# TestHookScope
+# ---------------------------------------------------------------------------
+
+class TestHookScope:
+    HOOKS = [
+        {'name': 'f', 'command': 'echo file', 'timeout': 5},
+        {'name': 'b', 'command': 'echo batch', 'timeout': 5, 'scope': 'batch'},
+    ]
+
+    def test_without_scope_runs_all(self):
+        results = run_hooks(_config(self.HOOKS), '/src.xlsx', ['/out.pdf'])
+        assert [r['hook'] for r in results] == ['f', 'b']
+
+    def test_scope_filter(self):
+        assert [r['hook'] for r in run_hooks(_config(self.HOOKS), '/s', [], scope='file')] == ['f']
+        assert [r['hook'] for r in run_hooks(_config(self.HOOKS), '/s', [], scope='batch')] == ['b']
+
+
+# ---------------------------------------------------------------------------
+# TestHookRunner
+# ---------------------------------------------------------------------------
+
+def _recording_hooks(monkeypatch, delay=0.0):
+    """Substitui _run_hook por uma versão que regista chamadas e concorrência."""
+    lock = threading.Lock()
+    state = {'calls': [], 'running': 0, 'peak': 0}
+
+    def fake(hook, source_path, output_paths):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+            state['calls'].append((hook['name'], source_path, list(output_paths)))
+        time.sleep(delay)
+        with lock:
+            state['running'] -= 1
+        return {'hook': hook['name'], 'source': source_path, 'returncode': 0, 'error': ''}
+
+    monkeypatch.setattr(hooks_module, '_run_hook', fake)
+    return state
+
+
+class TestHookRunner:
+    def test_concurrency_default_and_invalid(self):
+        assert hooks_concurrency({}) == 4
+        assert hooks_concurrency({'automation': {'hooks_concurrency': 0}}) == 1
+        assert hooks_concurrency({'automation': {'hooks_concurrency': 'x'}}) == 1
+
+    def test_files_run_concurrently_up_to_limit(self, monkeypatch):
+        state = _recording_hooks(monkeypatch, delay=0.1)
+        runner = HookRunner(_config([{'name': 'f', 'command': 'x'}]), max_workers=2)
+        for n in range(6):
+            runner.submit(f'/{n}.xlsx', [f'/{n}.pdf'])
+        results = runner.finish('/lote')
+        assert len(results) == 6
+        assert state['peak'] == 2
+
+    def test_order_within_file_preserved(self, monkeypatch):
+        state = _recording_hooks(monkeypatch)
+        hooks = [{'name': 'primeiro', 'command': 'x'}, {'name': 'segundo', 'command': 'x'}]
+        runner = HookRunner(_config(hooks), max_workers=4)
+        for n in range(5):
+            runner.submit(f'/{n}.xlsx', [f'/{n}.pdf'])
+        results = runner.finish('/lote')
+        for n in range(5):
+            names = [c[0] for c in state['calls'] if c[1] == f'/{n}.xlsx']
+            assert names == ['primeiro', 'segundo']
+        # Resultados pela ordem de submit
+        assert [r['source'] for r in results[::2]] == [f'/{n}.xlsx' for n in range(5)]
+
+    def test_batch_hook_runs_once_with_all_outputs(self, monkeypatch):
+        state = _recording_hooks(monkeypatch)
+        hooks = [{'name': 'f', 'command': 'x'},
+                 {'name': 'b', 'command': 'x', 'scope': 'batch'}]
+        runner = HookRunner(_config(hooks))
+        runner.submit('/a.xlsx', ['/a1.pdf', '/a2.pdf'])
+        runner.submit('/b.xlsx', ['/b1.pdf'])
+        results = runner.finish('/lote')
+        batch_calls = [c for c in state['calls'] if c[0] == 'b']
+        assert batch_calls == [('b', '/lote', ['/a1.pdf', '/a2.pdf', '/b1.pdf'])]
+        assert results[-1]['hook'] == 'b'
+
+    def test_batch_hook_skipped_without_outputs(self, monkeypatch):
+        state = _recording_hooks(monkeypatch)
+        runner = HookRunner(_config([{'name': 'b', 'command': 'x', 'scope': 'batch'}]))
+        assert runner.finish('/lote') == []
+        assert state['calls'] == []
+
+    def test_real_commands(self, tmp_path):
+        hooks = [{'name': 'b', 'command': 'echo {outputs}', 'timeout': 5, 'scope': 'batch'}]
+        runner = HookRunner(_config(hooks))
+        runner.submit('/a.xlsx', ['/a.pdf'])
+        runner.submit('/b.xlsx', ['/b.pdf'])
+        results = runner.finish(str(tmp_path))
+        assert results[0]['stdout'] == '/a.pdf,/b.pdf'
+
+
+# ---------------------------------------------------------------------------
+# TestBatchHooks
+# ---------------------------------------------------------------------------
+
+class TestBatchHooks:
+    @pytest.fixture
+    def folder(self, tmp_path, monkeypatch):
+        from src import batch_processor
+        for name in ('a.xlsx', 'b.xlsx', 'falha.xlsx'):
+            (tmp_path / name).write_bytes(b'x')
+
+        def fake_convert(path, config, mode, progress_callback=None, cancel_token=None):
+            result = batch_processor._failed_result(path, 'erro')
+            if 'falha' not in path:
+                pdf = path.replace('.xlsx', '.pdf')
+                result.update(success=True, error='', output_path=pdf, outputs=[pdf])
+            return result
+
+        monkeypatch.setattr(batch_processor, 'convert_file', fake_convert)
+        return tmp_path
+
+    def test_process_batch_submits_successful_files(self, folder, monkeypatch):
+        from src.batch_processor import process_batch
+        state = _recording_hooks(monkeypatch)
+        hooks = [{'name': 'f', 'command': 'x'}, {'name': 'b', 'command': 'x', 'scope': 'batch'}]
+        config = _config(hooks)
+        runner = HookRunner(config)
+        results = process_batch(str(folder), config, hook_runner=runner, workers=1)
+        runner.finish(str(folder))
+        assert len(results) == 3
+        file_sources = sorted(c[1] for c in state['calls'] if c[0] == 'f')
+        assert file_sources == [str(folder / 'a.xlsx'), str(folder / 'b.xlsx')]
+        batch_calls = [c for c in state['calls'] if c[0] == 'b']
+        assert len(batch_calls) == 1
+        assert sorted(batch_calls[0][2]) == [str(folder / 'a.pdf'), str(folder / 'b.pdf')]
+
+
+# ---------------------------------------------------------------------------
+# TestCallableHooks
+# ---------------------------------------------------------------------------
+
+def _callable_hook(spec, **extra):
+    return dict({'name': 'py', 'callable': f'tests.test_hooks:{spec}', 'timeout': 5}, **extra)
+
+
+class TestCallableHooks:
+    @pytest.fixture(autouse=True)
+    def _reset(self):
+        CALLS.clear()
+
+    def test_called_in_process_with_arguments(self):
+        results = run_hooks(_config([_callable_hook('record_call')]), '/src.xlsx',
+                            ['/a.pdf', '/b.pdf'])
+        assert CALLS == [('/src.xlsx', ['/a.pdf', '/b.pdf'])]
+        assert results[0]['returncode'] == 0
+        assert results[0]['stdout'] == '2 saída(s)'
+        assert results[0]['error'] == ''
+
+    def test_exception_isolated(self):
+        hooks = [_callable_hook('failing_hook'), _callable_hook('record_call')]
+        results = run_hooks(_config(hooks), '/src.xlsx', ['/a.pdf'])
+        assert results[0]['returncode'] == 1
+        assert 'RuntimeError: falhou' in results[0]['error']
+        assert results[1]['returncode'] == 0
+        assert len(CALLS) == 1
+
+    def test_timeout(self):
+        start = time.time()
+        results = run_hooks(_config([_callable_hook('slow_hook', timeout=0.05)]), '/s', [])
+        assert time.time() - start < 0.9
+        assert results[0]['error'] == 'Timeout expirado'
+        assert results[0]['returncode'] is None
+
+    @pytest.mark.parametrize('spec', ['sem_dois_pontos', 'modulo_inexistente_xyz:f',
+                                      'tests.test_hooks:nao_existe',
+                                      'tests.test_hooks:NOT_CALLABLE'])
+    def test_invalid_reference(self, spec):
+        hook = {'name': 'py', 'callable': spec, 'timeout': 5}
+        results = run_hooks(_config([hook]), '/s', [])
+        assert results[0]['returncode'] is None
+        assert results[0]['error']
+
+    def test_resolved_once(self):
+        func = hooks_module.resolve_callable('tests.test_hooks:record_call')
+        assert hooks_module.resolve_callable(' tests.test_hooks:record_call ') is func
+
+    def test_batch_scope_callable(self):
+        runner = HookRunner(_config([_callable_hook('record_call', scope='batch')]))
+        runner.submit('/a.xlsx', ['/a.pdf'])
+        runner.submit('/b.xlsx', ['/b.pdf'])
+        runner.finish('/lote')
+        assert CALLS == [('/lote', ['/a.pdf', '/b.pdf'])]
+
+
+# ---------------------------------------------------------------------------
+# TestManifest
+# ---------------------------------------------------------------------------
+
+class TestManifest:
+    @pytest.fixture
+    def outputs(self, tmp_path):
+        paths = []
+        for name in ('1_ABC.pdf', '2_XYZ.pdf'):
+            path = tmp_path / name
+            path.write_bytes(b'%PDF ' + name.encode())
+            paths.append(str(path))
+        return paths
+
+    def test_entry(self, outputs):
+        import hashlib
+        entry = hooks_module.manifest_entry(outputs[0])
+        assert entry['client'] == '1_ABC'
+        assert entry['size'] == len(b'%PDF 1_ABC.pdf')
+        assert entry['hash'] == hashlib.sha256(b'%PDF 1_ABC.pdf').hexdigest()
+
+    def test_missing_file(self, tmp_path):
+        entry = hooks_module.manifest_entry(str(tmp_path / 'nao_existe.pdf'))
+        assert entry['size'] is None and entry['hash'] == ''
+
+    def test_manifest_token(self, outputs):
+        import json
+        hooks = [{'name': 'm', 'command': 'cat {manifest}', 'timeout': 5}]
+        result = run_hooks(_config(hooks), '/src.xlsx', outputs)[0]
+        lines = [json.loads(line) for line in result['stdout'].splitlines()]
+        assert [line['path'] for line in lines] == outputs
+        assert lines[1]['client'] == '2_XYZ'
+
+    def test_manifest_removed_after_hook(self, outputs):
+        hooks = [{'name': 'm', 'command': 'echo {manifest}', 'timeout': 5}]
+        result = run_hooks(_config(hooks), '/src.xlsx', outputs)[0]
+        path = result['stdout']
+        assert path.endswith('.jsonl')
+        assert not os.path.exists(path)
+
+    def test_manifest_on_stdin(self, outputs):
+        hooks = [{'name': 's', 'command': 'wc -l', 'timeout': 5, 'stdin': True}]
+        result = run_hooks(_config(hooks), '/src.xlsx', outputs)[0]
+        assert result['stdout'].strip() == '2'
+
+    def test_stdin_and_token_share_one_manifest(self, outputs, monkeypatch):
+        hashed = []
+        real = hooks_module.manifest_entry
+        monkeypatch.setattr(hooks_module, 'manifest_entry',
+                            lambda path: hashed.append(path) or real(path))
+        hooks = [{'name': 's', 'command': 'cmp - {manifest} && wc -l < {manifest}',
+                  'timeout': 5, 'stdin': True}]
+        result = run_hooks(_config(hooks), '/src.xlsx', outputs)[0]
+        assert result['returncode'] == 0 and result['stdout'].strip() == '2'
+        assert hashed == outputs
+
+    def test_many_outputs(self, tmp_path):
+        outputs = [str(tmp_path / f'{n}_cliente_com_nome_comprido.pdf') for n in range(20000)]
+        hooks = [{'name': 'm', 'command': 'wc -l < {manifest}', 'timeout': 30}]
+        result = run_hooks(_config(hooks), '/src.xlsx', outputs)[0]
+        assert result['returncode'] == 0
+        assert result['stdout'].strip() == '20000'
@@ -0,0 +1,210 @@
+"""
+Testes para a conversão em processo isolado.
+
+Os processos filhos são criados com 'spawn', pelo que as conversões falsas
+têm de ser funções deste módulo (importáveis no filho) e substituem
+``src.isolation._child``.
+"""
+
+import copy
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import pytest
+from openpyxl import Workbook
+
+from src import isolation
+from src.config import DEFAULT_CONFIG
+from src.progress import CancelToken
+
+
+def _hang(conn, excel_path, config, mode, memory_mb, progress):
+    """Conversão que nunca termina (excepto ficheiros 'ok')."""
+    if os.path.basename(excel_path).startswith('ok'):
+        _fake_success(conn, excel_path)
+        return
+    time.sleep(120)
+
+
+def _fake_success(conn, excel_path, *args):
+    from src.batch_processor import _failed_result
+    result = dict(_failed_result(excel_path, ''), success=True,
+                  output_path=excel_path + '.pdf', outputs=[excel_path + '.pdf'],
+                  clients_count=1)
+    conn.send(('result', result))
+
+
+def _progress(conn, excel_path, config, mode, memory_mb, progress):
+    for n in range(1, 4):
+        conn.send(('progress', {'current': n, 'total': 3}))
+    _fake_success(conn, excel_path)
+
+
+def _crash(conn, excel_path, config, mode, memory_mb, progress):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _hog(conn, excel_path, config, mode, memory_mb, progress):
+    """Tenta reservar 4 GB depois de aplicar o limite de memória."""
+    from src.batch_processor import _failed_result
+    isolation._limit_memory(memory_mb)
+    try:
+        block = bytearray(4 * 1024 ** 3)
+        conn.send(('result', dict(_failed_result(excel_path, ''), success=True,
+                                  clients_count=len(block))))
+    except MemoryError:
+        conn.send(('result', _failed_result(excel_path, "Memória esgotada")))
+
+
+def _write_contas(path, n_clients=2):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL'])
+    for i in range(1, n_clients + 1):
+        ws.append([i, f'S{i}', f'Cliente {i}', 100.0, 23.0, 123.0])
+    wb.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def config():
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg['resources'].update({'isolate': True, 'timeout_seconds': 30, 'memory_limit_mb': 0})
+    cfg['output']['auto_open'] = False
+    return cfg
+
+
+class TestIsolationOptions:
+    def test_defaults(self):
+        assert isolation.isolation_options({}) == {
+            'enabled': False, 'timeout': None, 'memory_mb': 0}
+
+    def test_values(self):
+        options = isolation.isolation_options(
+            {'resources': {'isolate': True, 'timeout_seconds': 90, 'memory_limit_mb': 512}})
+        assert options == {'enabled': True, 'timeout': 90.0, 'memory_mb': 512}
+
+    def test_invalid_values_disable_limits(self):
+        options = isolation.isolation_options(
+            {'resources': {'timeout_seconds': 'x', 'memory_limit_mb': -5}})
+        assert options['timeout'] is None
+        assert options['memory_mb'] == 0
+
+
+class TestConvertIsolated:
+    def test_real_conversion(self, tmp_path, config):
+        path = _write_contas(tmp_path / 'contas.xlsx')
+        result = isolation.convert_isolated(path, config, 'aggregate')
+        assert result['success'], result['error']
+        assert os.path.exists(result['outputs'][0])
+        assert result['clients_count'] == 2
+
+    def test_corrupt_file_fails(self, tmp_path, config):
+        path = tmp_path / 'corrompido.xlsx'
+        path.write_bytes(b'isto nao e um zip')
+        result = isolation.convert_isolated(str(path), config, 'aggregate')
+        assert not result['success']
+        assert result['error']
+
+    def test_timeout_kills_child(self, tmp_path, config, monkeypatch):
+        monkeypatch.setattr(isolation, '_child', _hang)
+        start = time.monotonic()
+        result = isolation.convert_isolated(str(tmp_path / 'lento.xlsx'), config, timeout=1)
+        assert time.monotonic() - start < 15
+        assert not result['success']
+        assert 'Tempo limite' in result['error']
+        assert not [p for p in multiprocessing.active_children()
+                    if p.name.startswith('conversao-lento')]
+
+    def test_cancel_kills_child(self, tmp_path, config, monkeypatch):
+        monkeypatch.setattr(isolation, '_child', _hang)
+        token = CancelToken()
+        threading.Timer(0.5, token.cancel).start()
+        result = isolation.convert_isolated(str(tmp_path / 'lento.xlsx'), config,
+                                            cancel_token=token)
+        assert result['error'] == "Conversão cancelada"
+
+    def test_crash_reported(self, tmp_path, config, monkeypatch):
+        monkeypatch.setattr(isolation, '_child', _crash)
+        result = isolation.convert_isolated(str(tmp_path / 'a.xlsx'), config)
+        assert not result['success']
+        assert 'sinal 9' in result['error']
+
+    @pytest.mark.skipif(isolation.resource is None, reason="RLIMIT_AS indisponível")
+    def test_memory_limit(self, tmp_path, config, monkeypatch):
+        monkeypatch.setattr(isolation, '_child', _hog)
+        result = isolation.convert_isolated(str(tmp_path / 'a.xlsx'), config, memory_mb=512)
+        assert result['error'] == "Memória esgotada"
+
+    def test_progress_forwarded(self, tmp_path, config, monkeypatch):
+        monkeypatch.setattr(isolation, '_child', _progress)
+        seen = []
+        result = isolation.convert_isolated(str(tmp_path / 'a.xlsx'), config,
+                                            progress_callback=seen.append)
+        assert result['success']
+        assert [info['current'] for info in seen] == [1, 2, 3]
+
+
+class TestIsolatedPipelines:
+    def test_batch_continues_after_timeout(self, tmp_path, config, monkeypatch):
+        monkeypatch.setattr(isolation, '_child', _hang)
+        config['resources']['timeout_seconds'] = 1
+        for name in ('lento.xlsx', 'ok1.xlsx', 'ok2.xlsx'):
+            (tmp_path / name).write_bytes(b'x')
+        from src.batch_processor import process_batch
+        results = process_batch(str(tmp_path), config, 'aggregate', workers=1)
+        by_name = {r['filename']: r for r in results}
+        assert not by_name['lento.xlsx']['success']
+        assert 'Tempo limite' in by_name['lento.xlsx']['error']
+        assert by_name['ok1.xlsx']['success'] and by_name['ok2.xlsx']['success']
+
+    def test_parallel_batch(self, tmp_path, config, monkeypatch):
+        monkeypatch.setattr(isolation, '_child', _hang)
+        # Dois filhos 'spawn' arrancam ao mesmo tempo: com um só CPU o
+        # arranque pode passar de 1 s
+        config['resources']['timeout_seconds'] = 5
+        for name in ('lento.xlsx', 'ok1.xlsx', 'ok2.xlsx'):
+            (tmp_path / name).write_bytes(b'x')
+        from src.batch_processor import process_batch
+        results = process_batch(str(tmp_path), config, 'aggregate', workers=2)
+        assert sorted(r['success'] for r in results) == [False, True, True]
+
+    def test_watch_failure_in_history(self, tmp_path, config, monkeypatch, isolated_db):
+        from src import history
+        from src.watch_folder import WatchFolder
+        monkeypatch.setattr(isolation, '_child', _hang)
+        config['resources']['timeout_seconds'] = 1
+        config['automation'].update({'watch_stable_checks': 1, 'watch_settle_seconds': 0.05,
+                                     'watch_mode': 'aggregate'})
+        errors = []
+        wf = WatchFolder(str(tmp_path), config, interval=0.1,
+                         on_error=lambda p, e: errors.append(e))
+        wf.start()
+        try:
+            (tmp_path / 'lento.xlsx').write_bytes(b'x')
+            deadline = time.time() + 15
+            while not errors and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            wf.stop()
+        assert errors and 'Tempo limite' in errors[0]
+        entry = history.get_history(limit=1)[0]
+        assert entry['success'] is False
+        assert 'Tempo limite' in entry['error']
+
+    def test_scheduler_failure_in_history(self, tmp_path, config, monkeypatch, isolated_db):
+        from src import history
+        from src.scheduler import Scheduler
+        monkeypatch.setattr(isolation, '_child', _hang)
+        config['resources']['timeout_seconds'] = 1
+        path = tmp_path / 'lento.xlsx'
+        path.write_bytes(b'x')
+        errors = []
+        scheduler = Scheduler(config, on_error=lambda e, msg: errors.append(msg))
+        scheduler._execute({'source': str(path), 'mode': 'aggregate'})
+        assert errors and 'Tempo limite' in errors[0]
+        entry = history.get_history(limit=1)[0]
+        assert 'Tempo limite' in entry['error']
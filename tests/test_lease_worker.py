@@ -0,0 +1,226 @@
+"""
+Testes para o lote distribuído por ficheiros de lease.
+"""
+
+import copy
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from openpyxl import Workbook
+from unittest.mock import patch
+
+from src import lease_worker
+from src.config import DEFAULT_CONFIG
+from src.lease_worker import LeaseWorker, claim, finished_result
+from src.progress import CancelToken
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _config():
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg['output']['auto_open'] = False
+    return cfg
+
+
+@pytest.fixture
+def shared(tmp_path):
+    """Pasta partilhada com seis ficheiros Excel."""
+    folder = tmp_path / 'partilha'
+    folder.mkdir()
+    for n in range(6):
+        wb = Workbook()
+        ws = wb.active
+        ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+        ws.append([n, f'S{n}', f'Cliente {n}', 100.0 + n, 23.0, 123.0 + n, 'Janeiro'])
+        wb.save(str(folder / f'contas_{n}.xlsx'))
+    return folder
+
+
+def _age(path, seconds):
+    """Recua o mtime de um ficheiro (simula um worker que deixou de renovar)."""
+    old = time.time() - seconds
+    os.utime(path, (old, old))
+
+
+def _worker_process(folder, worker_id):
+    LeaseWorker(folder, _config(), 'aggregate', worker_id=worker_id,
+                lease_ttl=30, poll_interval=0.1).run()
+
+
+class TestClaim:
+    def test_exclusive(self, shared):
+        path = str(shared / 'contas_0.xlsx')
+        first = claim(str(shared), path, 'a')
+        assert first is not None
+        assert claim(str(shared), path, 'b') is None
+        assert first.is_owned
+
+    def test_released_can_be_claimed(self, shared):
+        path = str(shared / 'contas_0.xlsx')
+        claim(str(shared), path, 'a').release()
+        assert claim(str(shared), path, 'b') is not None
+
+    def test_stale_lease_reclaimed(self, shared):
+        path = str(shared / 'contas_0.xlsx')
+        dead = claim(str(shared), path, 'morto', lease_ttl=10)
+        _age(dead.path, 60)
+        lease = claim(str(shared), path, 'vivo', lease_ttl=10)
+        assert lease is not None
+        assert not dead.is_owned
+        assert not dead.renew()
+        assert not [n for n in os.listdir(shared / '.leases') if '.stale-' in n]
+
+    def test_renewed_lease_not_reclaimed(self, shared):
+        path = str(shared / 'contas_0.xlsx')
+        lease = claim(str(shared), path, 'a', lease_ttl=10)
+        _age(lease.path, 60)
+        assert lease.renew()
+        assert claim(str(shared), path, 'b', lease_ttl=10) is None
+
+    def test_finished_not_claimed_until_input_changes(self, shared):
+        path = shared / 'contas_0.xlsx'
+        lease = claim(str(shared), str(path), 'a')
+        lease.finish({'file': str(path), 'filename': path.name, 'success': True})
+        assert finished_result(str(shared), str(path))['success'] is True
+        assert claim(str(shared), str(path), 'b') is None
+
+        os.utime(path, ns=(0, 0))
+        assert finished_result(str(shared), str(path)) is None
+        assert claim(str(shared), str(path), 'b') is not None
+
+    def test_input_changed_during_conversion_not_done(self, shared):
+        path = shared / 'contas_0.xlsx'
+        lease = claim(str(shared), str(path), 'a')
+        os.utime(path, ns=(0, 0))  # alterado a meio da conversão
+        lease.finish({'file': str(path), 'filename': path.name, 'success': True})
+        assert finished_result(str(shared), str(path)) is None
+        assert claim(str(shared), str(path), 'b') is not None
+
+    def test_subfolder_names(self, shared):
+        (shared / 'sub').mkdir()
+        path = shared / 'sub' / 'contas_0.xlsx'
+        path.write_bytes(b'x')
+        lease = claim(str(shared), str(path), 'a')
+        assert os.path.dirname(lease.path) == str(shared / '.leases')
+
+
+class TestLeaseWorker:
+    def test_converts_everything(self, shared):
+        results = LeaseWorker(str(shared), _config(), 'aggregate', worker_id='w1').run()
+        assert len(results) == 6
+        assert all(r['success'] for r in results)
+        assert len(list(shared.glob('*.pdf'))) == 6
+        assert sorted(os.listdir(shared / '.leases')) == sorted(
+            f'contas_{n}.xlsx.done' for n in range(6))
+
+    def test_second_run_does_nothing(self, shared):
+        LeaseWorker(str(shared), _config(), 'aggregate', worker_id='w1').run()
+        assert LeaseWorker(str(shared), _config(), 'aggregate', worker_id='w2').run() == []
+
+    def test_failures_recorded_and_not_retried(self, tmp_path):
+        (tmp_path / 'corrompido.xlsx').write_bytes(b'nao e um excel')
+        results = LeaseWorker(str(tmp_path), _config(), 'aggregate').run()
+        assert results[0]['success'] is False
+        assert os.path.exists(tmp_path / '.leases' / 'corrompido.xlsx.failed')
+        assert LeaseWorker(str(tmp_path), _config(), 'aggregate').run() == []
+
+    def test_waits_for_and_reclaims_crashed_worker(self, shared):
+        dead = claim(str(shared), str(shared / 'contas_0.xlsx'), 'morto', lease_ttl=1)
+        _age(dead.path, 0.5)
+        start = time.monotonic()
+        results = LeaseWorker(str(shared), _config(), 'aggregate', worker_id='vivo',
+                              lease_ttl=1, poll_interval=0.1).run()
+        assert len(results) == 6
+        assert time.monotonic() - start >= 0.4
+        data = json.loads((shared / '.leases' / 'contas_0.xlsx.done').read_text())
+        assert data['worker'] == 'vivo'
+
+    def test_heartbeat_renews_during_conversion(self, shared):
+        from src import batch_processor
+        real = batch_processor.convert_file
+        mtimes = []
+
+        def slow_convert(excel_path, *args, **kwargs):
+            lease_path = lease_worker._lease_base(str(shared), excel_path) + '.lease'
+            _age(lease_path, 5)
+            mtimes.append(os.stat(lease_path).st_mtime)
+            time.sleep(0.5)
+            mtimes.append(os.stat(lease_path).st_mtime)
+            return real(excel_path, *args, **kwargs)
+
+        with patch('src.lease_worker.convert_file', side_effect=slow_convert):
+            os.remove(shared / 'contas_1.xlsx')
+            for n in range(2, 6):
+                os.remove(shared / f'contas_{n}.xlsx')
+            LeaseWorker(str(shared), _config(), 'aggregate', lease_ttl=0.6).run()
+        assert mtimes[1] > mtimes[0]
+
+    def test_lost_lease_result_discarded(self, shared):
+        for n in range(1, 6):
+            os.remove(shared / f'contas_{n}.xlsx')
+        path = str(shared / 'contas_0.xlsx')
+        finished = []
+
+        def taken_over(excel_path, *args, **kwargs):
+            # Outro worker recuperou o lease a meio da conversão
+            lease_path = lease_worker._lease_base(str(shared), excel_path) + '.lease'
+            with open(lease_path, 'w', encoding='utf-8') as f:
+                json.dump({'worker': 'outro', 'token': 'outro'}, f)
+            return {'file': excel_path, 'filename': 'contas_0.xlsx', 'success': True}
+
+        worker = LeaseWorker(str(shared), _config(), 'aggregate', on_finished=finished.append)
+        lease = claim(str(shared), path, 'w1')
+        with patch('src.lease_worker.convert_file', side_effect=taken_over):
+            assert worker._convert(lease) is None
+        assert finished == []
+        assert not os.path.exists(lease.base + '.done')
+        assert json.loads(open(lease.path).read())['token'] == 'outro'
+
+    def test_cancel_releases_lease(self, shared):
+        token = CancelToken()
+        worker = LeaseWorker(str(shared), _config(), 'aggregate',
+                             on_finished=lambda r: token.cancel())
+        results = worker.run(token)
+        assert len(results) == 1
+        leases = os.listdir(shared / '.leases')
+        assert not [n for n in leases if n.endswith('.lease')]
+        assert len([n for n in leases if n.endswith('.done')]) == 1
+
+
+class TestSeveralWorkers:
+    def test_processes_share_folder(self, shared):
+        procs = [multiprocessing.Process(target=_worker_process, args=(str(shared), f'w{n}'))
+                 for n in range(3)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(timeout=120)
+            assert p.exitcode == 0
+
+        done = [json.loads((shared / '.leases' / f'contas_{n}.xlsx.done').read_text())
+                for n in range(6)]
+        assert all(d['result']['success'] for d in done)
+        assert len(list(shared.glob('*.pdf'))) == 6
+        assert not [n for n in os.listdir(shared / '.leases') if n.endswith('.lease')]
+
+    def test_cli_workers(self, shared, tmp_path):
+        config_path = tmp_path / 'config.json'
+        config_path.write_text(json.dumps(_config()), encoding='utf-8')
+        env = dict(os.environ, HOME=str(tmp_path), APPDATA=str(tmp_path))
+        cmd = [sys.executable, os.path.join(ROOT, 'converter_excel_pdf.py'), str(shared),
+               '--worker', '-m', 'aggregate', '-c', str(config_path)]
+        procs = [subprocess.Popen(cmd + ['--worker-id', f'cli{n}'], cwd=ROOT, env=env,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                 for n in range(2)]
+        outputs = [p.communicate(timeout=120)[0] for p in procs]
+        assert all(p.returncode == 0 for p in procs)
+        converted = sum(out.count('Convertido:') for out in outputs)
+        assert converted == 6
+        assert len(list(shared.glob('*.pdf'))) == 6
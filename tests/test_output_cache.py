@@ -0,0 +1,211 @@
+"""
+Testes para a cache de saída (saltar PDFs inalterados).
+"""
+
+import copy
+import os
+
+import pytest
+from openpyxl import Workbook
+
+from src import database as db
+from src import output_cache
+from src.config import DEFAULT_CONFIG
+from src.converter import ExcelToPDFConverter
+
+
+@pytest.fixture(autouse=True)
+def isolated_db(tmp_path, monkeypatch):
+    """Redireciona a base de dados para um ficheiro temporário por teste."""
+    db_path = str(tmp_path / 'test.db')
+    monkeypatch.setattr('src.database._get_db_path', lambda: db_path)
+    db.init_db()
+    return db_path
+
+
+@pytest.fixture
+def cache_config():
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config['output']['skip_unchanged'] = True
+    return config
+
+
+@pytest.fixture
+def contas_xlsx(tmp_path):
+    """Excel de contabilidade com dois clientes."""
+    path = str(tmp_path / 'contas.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Contas'
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL'])
+    ws.append([1, 'ABC', 'Cliente ABC', 100.0, 23.0, 123.0])
+    ws.append([2, 'XYZ', 'Cliente XYZ', 200.0, 46.0, 246.0])
+    wb.save(path)
+    return path
+
+
+class TestComputeInputHash:
+    def test_same_inputs_same_hash(self, cache_config):
+        row = {'Nr.': 1, 'Cliente': 'A', 'TOTAL': 10.0}
+        assert (output_cache.compute_input_hash(row, cache_config)
+                == output_cache.compute_input_hash(dict(row), copy.deepcopy(cache_config)))
+
+    def test_row_change_changes_hash(self, cache_config):
+        h1 = output_cache.compute_input_hash({'TOTAL': 10.0}, cache_config)
+        h2 = output_cache.compute_input_hash({'TOTAL': 11.0}, cache_config)
+        assert h1 != h2
+
+    def test_render_config_change_changes_hash(self, cache_config):
+        h1 = output_cache.compute_input_hash({'TOTAL': 10.0}, cache_config)
+        cache_config['colors']['header_bg'] = '#000000'
+        h2 = output_cache.compute_input_hash({'TOTAL': 10.0}, cache_config)
+        assert h1 != h2
+
+    def test_non_render_config_ignored(self, cache_config):
+        h1 = output_cache.compute_input_hash({'TOTAL': 10.0}, cache_config)
+        cache_config['ui']['theme'] = 'dark'
+        h2 = output_cache.compute_input_hash({'TOTAL': 10.0}, cache_config)
+        assert h1 == h2
+
+    def test_logo_mtime_changes_hash(self, cache_config, tmp_path):
+        logo = tmp_path / 'logo.png'
+        logo.write_bytes(b'png')
+        cache_config['header']['logo_path'] = str(logo)
+        h1 = output_cache.compute_input_hash({}, cache_config)
+        os.utime(logo, (1_000_000, 1_000_000))
+        h2 = output_cache.compute_input_hash({}, cache_config)
+        assert h1 != h2
+
+    def test_template_version_changes_hash(self, cache_config, monkeypatch):
+        h1 = output_cache.compute_input_hash({}, cache_config)
+        monkeypatch.setattr(output_cache, 'TEMPLATE_VERSION', output_cache.TEMPLATE_VERSION + 1)
+        assert output_cache.compute_input_hash({}, cache_config) != h1
+
+
+class TestCacheStore:
+    def test_missing_file_not_cached(self, tmp_path):
+        path = str(tmp_path / 'nao_existe.pdf')
+        output_cache.record_output(path, 'abc')
+        assert output_cache.is_cached(path, 'abc') is False
+
+    def test_recorded_hash_matches(self, tmp_path):
+        path = tmp_path / 'out.pdf'
+        path.write_bytes(b'%PDF')
+        output_cache.record_output(str(path), 'abc')
+        assert output_cache.is_cached(str(path), 'abc') is True
+        assert output_cache.is_cached(str(path), 'outro') is False
+
+    def test_record_overwrites(self, tmp_path):
+        path = tmp_path / 'out.pdf'
+        path.write_bytes(b'%PDF')
+        output_cache.record_output(str(path), 'v1')
+        output_cache.record_output(str(path), 'v2')
+        assert output_cache.is_cached(str(path), 'v2') is True
+
+    def test_cached_hashes_single_query(self, tmp_path):
+        paths = [str(tmp_path / f'{n}.pdf') for n in range(3)]
+        output_cache.record_outputs([(paths[0], 'a'), (paths[1], 'b')])
+        known = output_cache.cached_hashes(paths)
+        assert known == {os.path.abspath(paths[0]): 'a', os.path.abspath(paths[1]): 'b'}
+
+    def test_is_cached_uses_known(self, tmp_path, monkeypatch):
+        path = tmp_path / 'out.pdf'
+        path.write_bytes(b'%PDF')
+        known = {os.path.abspath(str(path)): 'abc'}
+        monkeypatch.setattr(output_cache, '_get_connection', lambda: pytest.fail('consultou'))
+        assert output_cache.is_cached(str(path), 'abc', known) is True
+        assert output_cache.is_cached(str(path), 'outro', known) is False
+
+    def test_clear(self, tmp_path):
+        path = tmp_path / 'out.pdf'
+        path.write_bytes(b'%PDF')
+        output_cache.record_output(str(path), 'abc')
+        output_cache.clear_output_cache()
+        assert output_cache.is_cached(str(path), 'abc') is False
+
+
+class TestConverterSkipUnchanged:
+    def test_individual_second_run_all_cached(self, contas_xlsx, cache_config):
+        first = ExcelToPDFConverter(contas_xlsx, None, cache_config)
+        files = first.generate_individual_pdfs()
+        assert len(files) == 2
+        assert first.cache_hits == []
+        mtimes = [os.path.getmtime(f) for f in files]
+
+        second = ExcelToPDFConverter(contas_xlsx, None, cache_config)
+        files2 = second.generate_individual_pdfs()
+        assert files2 == files
+        assert second.cache_hits == files
+        assert [os.path.getmtime(f) for f in files2] == mtimes
+
+    def test_individual_config_change_rerenders(self, contas_xlsx, cache_config):
+        ExcelToPDFConverter(contas_xlsx, None, cache_config).generate_individual_pdfs()
+        cache_config['banking']['title'] = 'Outro título'
+        conv = ExcelToPDFConverter(contas_xlsx, None, cache_config)
+        conv.generate_individual_pdfs()
+        assert conv.cache_hits == []
+
+    def test_deleted_output_rerenders(self, contas_xlsx, cache_config):
+        files = ExcelToPDFConverter(contas_xlsx, None, cache_config).generate_individual_pdfs()
+        os.remove(files[0])
+        conv = ExcelToPDFConverter(contas_xlsx, None, cache_config)
+        conv.generate_individual_pdfs()
+        assert conv.cache_hits == [files[1]]
+        assert os.path.exists(files[0])
+
+    def test_individual_one_connection_per_workbook(self, contas_xlsx, cache_config,
+                                                    monkeypatch):
+        ExcelToPDFConverter(contas_xlsx, None, cache_config).generate_individual_pdfs()
+        opened = []
+        real = output_cache._get_connection
+        monkeypatch.setattr(output_cache, '_get_connection',
+                            lambda: opened.append(1) or real())
+        digests = []
+        real_digest = output_cache.render_digest
+        monkeypatch.setattr(output_cache, 'render_digest',
+                            lambda config: digests.append(1) or real_digest(config))
+        cache_config['banking']['title'] = 'Outro título'
+        ExcelToPDFConverter(contas_xlsx, None, cache_config).generate_individual_pdfs()
+        assert len(opened) == 2  # leitura e escrita, não uma por cliente
+        assert len(digests) == 1
+
+    def test_aggregate_second_run_cached(self, contas_xlsx, cache_config):
+        path = ExcelToPDFConverter(contas_xlsx, None, cache_config).generate_pdf()
+        conv = ExcelToPDFConverter(contas_xlsx, None, cache_config)
+        assert conv.generate_pdf() == path
+        assert conv.cache_hits == [path]
+
+    def test_disabled_never_skips(self, contas_xlsx, cache_config):
+        cache_config['output']['skip_unchanged'] = False
+        ExcelToPDFConverter(contas_xlsx, None, cache_config).generate_individual_pdfs()
+        conv = ExcelToPDFConverter(contas_xlsx, None, cache_config)
+        conv.generate_individual_pdfs()
+        assert conv.cache_hits == []
+
+
+class TestHistoryCacheHits:
+    def test_cache_hits_persisted(self):
+        db.add_history_entry('/p/a.xlsx', '/out', 'individual', 10, True, cache_hits=7)
+        assert db.get_history()[0]['cache_hits'] == 7
+
+    def test_default_zero(self):
+        db.add_history_entry('/p/a.xlsx', '/out', 'individual', 10, True)
+        assert db.get_history()[0]['cache_hits'] == 0
+
+    def test_old_database_migrated(self, tmp_path, monkeypatch):
+        """Bases de dados sem a coluna cache_hits são actualizadas no init."""
+        import sqlite3
+        old_path = str(tmp_path / 'old.db')
+        conn = sqlite3.connect(old_path)
+        conn.execute("""CREATE TABLE history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, timestamp TEXT NOT NULL,
+            source_file TEXT NOT NULL, source_path TEXT NOT NULL,
+            output_path TEXT NOT NULL DEFAULT '', mode TEXT NOT NULL,
+            clients_count INTEGER NOT NULL DEFAULT 0,
+            success INTEGER NOT NULL DEFAULT 1, error TEXT NOT NULL DEFAULT '')""")
+        conn.commit()
+        conn.close()
+        monkeypatch.setattr('src.database._get_db_path', lambda: old_path)
+        db.init_db()
+        db.add_history_entry('/p/a.xlsx', '/out', 'aggregate', 1, True, cache_hits=1)
+        assert db.get_history()[0]['cache_hits'] == 1
@@ -0,0 +1,192 @@
+"""
+Testes para o progresso fino e cancelamento das conversões.
+"""
+
+import copy
+import os
+import time
+
+import pytest
+from openpyxl import Workbook
+from unittest.mock import patch
+
+from src.batch_processor import process_batch
+from src.config import DEFAULT_CONFIG
+from src.converter import ExcelToPDFConverter
+from src.progress import (
+    CancelToken, ConversionCancelled, ProgressTracker, check_cancelled, format_eta,
+)
+from src.watch_folder import WatchFolder
+
+
+@pytest.fixture
+def contas_xlsx(tmp_path):
+    """Excel de contabilidade com três clientes."""
+    path = str(tmp_path / 'contas.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Contas'
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+    ws.append([1, 'ABC', 'Cliente ABC', 100.0, 23.0, 123.0, 'Janeiro'])
+    ws.append([2, 'XYZ', 'Cliente XYZ', 200.0, 46.0, 246.0, 'Janeiro'])
+    ws.append([3, 'QWE', 'Cliente QWE', 300.0, 69.0, 369.0, 'Janeiro'])
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def config():
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+
+class TestProgressTracker:
+    def test_start_reports_zero(self):
+        events = []
+        ProgressTracker(5, events.append).start('início')
+        assert events[0]['current'] == 0
+        assert events[0]['total'] == 5
+        assert events[0]['label'] == 'início'
+        assert events[0]['eta'] is None
+
+    def test_advance_counts_and_clamps(self):
+        events = []
+        tracker = ProgressTracker(2, events.append)
+        tracker.advance('a')
+        tracker.advance('b', step=5)
+        assert [e['current'] for e in events] == [1, 2]
+
+    def test_rate_and_eta(self):
+        tracker = ProgressTracker(10)
+        tracker._start -= 2.0
+        tracker.current = 4
+        info = tracker.snapshot()
+        assert info['rate'] == pytest.approx(2.0, rel=0.05)
+        assert info['eta'] == pytest.approx(3.0, rel=0.05)
+
+    def test_no_callback(self):
+        ProgressTracker(1).advance()  # não deve lançar excepção
+
+
+class TestFormatEta:
+    @pytest.mark.parametrize('seconds, expected', [
+        (None, '—'),
+        (4.6, '5s'),
+        (65, '1m 05s'),
+        (3725, '1h 02m'),
+    ])
+    def test_format(self, seconds, expected):
+        assert format_eta(seconds) == expected
+
+
+class TestCancelToken:
+    def test_initially_not_cancelled(self):
+        token = CancelToken()
+        assert not token.is_cancelled
+        token.raise_if_cancelled()
+
+    def test_cancel_raises(self):
+        token = CancelToken()
+        token.cancel()
+        with pytest.raises(ConversionCancelled):
+            check_cancelled(token)
+
+    def test_none_token_ignored(self):
+        check_cancelled(None)
+
+
+class TestConverterProgress:
+    def test_individual_reports_each_client(self, contas_xlsx, config):
+        events = []
+        files = ExcelToPDFConverter(contas_xlsx, None, config).generate_individual_pdfs(
+            progress_callback=events.append)
+        assert [e['current'] for e in events] == [0, 1, 2, 3]
+        assert events[-1]['label'] == os.path.basename(files[-1])
+
+    def test_zip_reports_each_member(self, contas_xlsx, config, tmp_path):
+        events = []
+        ExcelToPDFConverter(contas_xlsx, None, config).generate_individual_pdfs(
+            zip_output=str(tmp_path / 'out.zip'), progress_callback=events.append)
+        assert [e['current'] for e in events] == [0, 1, 2, 3]
+
+    def test_aggregate_reports_phases(self, contas_xlsx, config):
+        events = []
+        ExcelToPDFConverter(contas_xlsx, None, config).generate_pdf(
+            progress_callback=events.append)
+        assert events[-1]['current'] == events[-1]['total'] == 3
+
+
+class TestConverterCancel:
+    def test_individual_stops_between_clients(self, contas_xlsx, config):
+        token = CancelToken()
+
+        def on_progress(info):
+            if info['current'] == 1:
+                token.cancel()
+
+        conv = ExcelToPDFConverter(contas_xlsx, None, config)
+        with pytest.raises(ConversionCancelled):
+            conv.generate_individual_pdfs(progress_callback=on_progress, cancel_token=token)
+        folder = os.path.join(os.path.dirname(contas_xlsx), 'PDFs_Janeiro')
+        assert os.listdir(folder) == ['1_ABC.pdf']
+
+    def test_zip_cancel_discards_archive(self, contas_xlsx, config, tmp_path):
+        token = CancelToken()
+        token.cancel()
+        zip_path = str(tmp_path / 'out.zip')
+        with pytest.raises(ConversionCancelled):
+            ExcelToPDFConverter(contas_xlsx, None, config).generate_individual_pdfs(
+                zip_output=zip_path, cancel_token=token)
+        assert not os.path.exists(zip_path)
+        assert not os.path.exists(zip_path + '.part')
+
+    def test_aggregate_cancel_writes_nothing(self, contas_xlsx, config):
+        token = CancelToken()
+        token.cancel()
+        conv = ExcelToPDFConverter(contas_xlsx, None, config)
+        with pytest.raises(ConversionCancelled):
+            conv.generate_pdf(cancel_token=token)
+        assert not os.path.exists(conv.output_pdf_path)
+
+
+class TestProcessBatchProgress:
+    def test_client_progress_forwarded(self, contas_xlsx, config):
+        events = []
+        process_batch(os.path.dirname(contas_xlsx), config,
+                      client_progress_callback=lambda f, info: events.append((f, info['current'])))
+        assert events[-1] == ('contas.xlsx', 3)
+
+    def test_cancel_stops_batch(self, tmp_path):
+        for name in ('a.xlsx', 'b.xlsx', 'c.xlsx'):
+            (tmp_path / name).touch()
+        token = CancelToken()
+
+        def fake_generate(**kwargs):
+            token.cancel()
+            kwargs['cancel_token'].raise_if_cancelled()
+
+        with patch('src.batch_processor.ExcelToPDFConverter') as mock_cls:
+            mock = mock_cls.return_value
+            mock.read_excel_data.return_value = {'itens': []}
+            mock.generate_individual_pdfs.side_effect = fake_generate
+            results = process_batch(str(tmp_path), {}, cancel_token=token)
+
+        assert len(results) == 1
+        assert results[0]['success'] is False
+        assert results[0]['error'] == 'Conversão cancelada'
+
+
+class TestWatchFolderCancel:
+    def test_stop_cancels_running_conversion(self, tmp_path, config, isolated_db):
+        wf = WatchFolder(str(tmp_path), config, interval=0.2)
+        wf.start()
+        token = wf._cancel
+        wf.stop()
+        assert token.is_cancelled
+
+    def test_progress_forwarded(self, contas_xlsx, config, isolated_db):
+        events = []
+        wf = WatchFolder(os.path.dirname(contas_xlsx), config,
+                         on_progress=lambda p, info: events.append(info['current']))
+        with patch('src.hooks.run_hooks'):
+            wf._process(contas_xlsx)
+        assert events == [0, 1, 2, 3]
@@ -0,0 +1,159 @@
+"""
+Testes para o histórico de execuções dos agendamentos.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from src import schedule_runs
+from src.database import _get_connection
+from src.scheduler import Scheduler
+
+
+@pytest.fixture(autouse=True)
+def _db(isolated_db):
+    return isolated_db
+
+
+ENTRY = {'id': 'noite', 'source': '/dados/contas', 'mode': 'zip'}
+
+
+def _wait(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+class TestScheduleRunsStore:
+    def test_start_and_finish(self):
+        fired = datetime(2026, 3, 4, 2, 0)
+        run_id = schedule_runs.start_run('noite', ENTRY, fired)
+        run = schedule_runs.recent_runs('noite')[0]
+        assert run['status'] == schedule_runs.RUNNING
+        assert run['fired_at'] == fired.isoformat()
+        schedule_runs.finish_run(run_id, files=3, clients=40, failures=0)
+        run = schedule_runs.recent_runs('noite')[0]
+        assert run['status'] == schedule_runs.SUCCESS
+        assert (run['files'], run['clients'], run['failures']) == (3, 40, 0)
+        assert run['finished_at'] and run['duration'] >= 0
+        assert run['source'] == '/dados/contas' and run['mode'] == 'zip'
+
+    def test_failures_mark_failed(self):
+        run_id = schedule_runs.start_run('noite', ENTRY, datetime.now())
+        schedule_runs.finish_run(run_id, files=3, failures=1)
+        assert schedule_runs.recent_runs()[0]['status'] == schedule_runs.FAILED
+
+    def test_skipped(self):
+        schedule_runs.record_skipped('noite', ENTRY, datetime.now(), 'ocupado')
+        run = schedule_runs.recent_runs()[0]
+        assert run['status'] == schedule_runs.SKIPPED
+        assert run['error'] == 'ocupado'
+
+    def test_recent_first_and_filtered(self):
+        for sid in ('a', 'b', 'a'):
+            schedule_runs.start_run(sid, ENTRY, datetime.now())
+        runs = schedule_runs.recent_runs('a')
+        assert len(runs) == 2
+        assert runs[0]['id'] > runs[1]['id']
+        assert len(schedule_runs.recent_runs(limit=2)) == 2
+
+    def test_duration_stats(self):
+        conn = _get_connection()
+        try:
+            for n, duration in enumerate([10.0, 20.0, 60.0]):
+                conn.execute(
+                    """INSERT INTO schedule_runs (schedule_id, fired_at, started_at,
+                       finished_at, status, duration) VALUES (?, ?, ?, ?, ?, ?)""",
+                    ('noite', '', f'2026-03-0{n + 1}T02:00:00', 'x', 'success', duration))
+            conn.execute("""INSERT INTO schedule_runs (schedule_id, fired_at, started_at, status)
+                            VALUES ('noite', '', '2026-03-09T02:00:00', 'skipped')""")
+            conn.commit()
+        finally:
+            conn.close()
+        stats = schedule_runs.duration_stats('noite')
+        assert stats == {'runs': 3, 'avg': 30.0, 'min': 10.0, 'max': 60.0, 'last': 60.0}
+        assert schedule_runs.duration_stats('outro')['runs'] == 0
+
+    def test_recent_query_uses_index(self):
+        conn = _get_connection()
+        try:
+            plan = conn.execute(
+                """EXPLAIN QUERY PLAN SELECT * FROM schedule_runs WHERE schedule_id = ?
+                   ORDER BY started_at DESC, id DESC LIMIT 50""", ('noite',)).fetchall()
+        finally:
+            conn.close()
+        assert any('idx_schedule_runs_schedule' in row[-1] for row in plan)
+
+    def test_clear(self):
+        schedule_runs.start_run('a', ENTRY, datetime.now())
+        schedule_runs.start_run('b', ENTRY, datetime.now())
+        assert schedule_runs.clear('a') == 1
+        assert schedule_runs.clear() == 1
+
+
+class TestSchedulerRecordsRuns:
+    def test_run_recorded_with_summary(self, monkeypatch):
+        monkeypatch.setattr(Scheduler, '_execute', lambda self, entry: {
+            'files': 2, 'clients': 15, 'failures': 1, 'error': ''})
+        s = Scheduler({})
+        s.start()
+        try:
+            fired = datetime.now().replace(second=0, microsecond=0)
+            s._fire('noite', ENTRY, fired)
+            assert _wait(lambda: schedule_runs.recent_runs('noite') and
+                         schedule_runs.recent_runs('noite')[0]['finished_at'])
+        finally:
+            s.stop()
+        run = schedule_runs.recent_runs('noite')[0]
+        assert (run['files'], run['clients'], run['failures']) == (2, 15, 1)
+        assert run['status'] == schedule_runs.FAILED
+        assert run['fired_at'] == fired.isoformat()
+
+    def test_error_recorded(self, tmp_path):
+        s = Scheduler({})
+        entry = {'id': 'x', 'source': str(tmp_path / 'nao_existe'), 'mode': 'zip'}
+        s.start()
+        try:
+            s._fire('x', entry, datetime.now())
+            assert _wait(lambda: schedule_runs.recent_runs('x') and
+                         schedule_runs.recent_runs('x')[0]['finished_at'])
+        finally:
+            s.stop()
+        run = schedule_runs.recent_runs('x')[0]
+        assert run['status'] == schedule_runs.FAILED
+        assert 'Origem não encontrada' in run['error']
+
+    def test_skipped_recorded(self, monkeypatch):
+        release = threading.Event()
+        monkeypatch.setattr(Scheduler, '_execute', lambda self, entry: release.wait(5) and None)
+        s = Scheduler({})
+        s.start()
+        try:
+            s._fire('noite', ENTRY, datetime.now())
+            assert _wait(lambda: s.status()['noite']['state'] == 'running')
+            s._fire('noite', ENTRY, datetime.now() + timedelta(minutes=1))
+        finally:
+            release.set()
+            s.stop()
+        statuses = [run['status'] for run in schedule_runs.recent_runs('noite')]
+        assert schedule_runs.SKIPPED in statuses
+
+
+class TestCliScheduleRuns:
+    def test_lists_runs(self, capsys):
+        import converter_excel_pdf as entry
+        run_id = schedule_runs.start_run('noite', ENTRY, datetime.now())
+        schedule_runs.finish_run(run_id, files=3, clients=40)
+        entry._list_schedule_runs('noite')
+        out = capsys.readouterr().out
+        assert 'noite' in out and '3 fich., 40 clientes' in out
+        assert 'Duração (últimas 1)' in out
+
+    def test_empty(self, capsys):
+        import converter_excel_pdf as entry
+        entry._list_schedule_runs('all')
+        assert 'Sem execuções' in capsys.readouterr().out
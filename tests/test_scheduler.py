@@ -4,11 +4,21 @@
 Testes para o módulo de agendamento.
 """
 
+import threading
+import time
+
 import pytest
-from datetime import datetime
-from unittest.mock import patch, MagicMock
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src import scheduler as scheduler_module
+from src.scheduler import (Scheduler, validate_schedule_entry, DIAS_SEMANA, next_run,
+                           schedule_id, trigger)
 
-from src.scheduler import Scheduler, validate_schedule_entry, DIAS_SEMANA
+
+@pytest.fixture(autouse=True)
+def _db(isolated_db):
+    return isolated_db
 
 
 # ---------------------------------------------------------------------------
@@ -72,52 +82,42 @@ class TestValidateScheduleEntry:
 
 
 # ---------------------------------------------------------------------------
-# TestSchedulerShouldRun
+# TestTriggerMatches
 # ---------------------------------------------------------------------------
 
-class TestSchedulerShouldRun:
-    def _sched(self):
-        return Scheduler({})
+class TestTriggerMatches:
+    # 2026-03-02 é uma Segunda-feira
+    MONDAY = datetime(2026, 3, 2)
 
-    def _now(self, hour, minute, weekday=0):
-        """Cria um datetime mock com hora/minuto/dia da semana."""
-        dt = MagicMock(spec=datetime)
-        dt.hour = hour
-        dt.minute = minute
-        dt.weekday.return_value = weekday
-        dt.date.return_value = object()
-        return dt
+    def _at(self, hour, minute, weekday=0):
+        return self.MONDAY + timedelta(days=weekday, hours=hour, minutes=minute)
 
     def test_matching_hour_and_day(self):
-        s = self._sched()
         entry = {'hora': '08:30', 'dias': [0], 'source': '/p', 'enabled': True}
-        now = self._now(8, 30, 0)
-        assert s._should_run(entry, now)
+        assert trigger(entry).matches(self._at(8, 30, 0))
 
     def test_wrong_hour(self):
-        s = self._sched()
         entry = {'hora': '08:30', 'dias': [0], 'source': '/p', 'enabled': True}
-        now = self._now(9, 30, 0)
-        assert not s._should_run(entry, now)
+        assert not trigger(entry).matches(self._at(9, 30, 0))
 
     def test_wrong_day(self):
-        s = self._sched()
         entry = {'hora': '08:30', 'dias': [1], 'source': '/p', 'enabled': True}
-        now = self._now(8, 30, 0)  # weekday=Segunda (0), entry exige Terça (1)
-        assert not s._should_run(entry, now)
+        assert not trigger(entry).matches(self._at(8, 30, 0))  # Segunda; exige Terça
 
     def test_empty_hora(self):
-        s = self._sched()
-        entry = {'hora': '', 'dias': [0], 'source': '/p'}
-        now = self._now(8, 30, 0)
-        assert not s._should_run(entry, now)
+        with pytest.raises(ValueError):
+            trigger({'hora': '', 'dias': [0], 'source': '/p'})
 
     def test_all_days_allowed(self):
-        s = self._sched()
         entry = {'hora': '10:00', 'dias': list(range(7)), 'source': '/p', 'enabled': True}
         for day in range(7):
-            now = self._now(10, 0, day)
-            assert s._should_run(entry, now)
+            assert trigger(entry).matches(self._at(10, 0, day))
+
+    def test_rebuild_queues_next_matching_minute(self):
+        entry = {'id': 'a', 'hora': '08:30', 'dias': [1], 'source': '/p'}
+        s = Scheduler({'automation': {'schedules': [entry]}})
+        s._rebuild(self._at(8, 30, 0), catch_up=False)
+        assert [item[4] for item in s._heap] == [self._at(8, 30, 1)]
 
 
 # ---------------------------------------------------------------------------
@@ -143,3 +143,305 @@ class TestSchedulerLifecycle:
     def test_stop_without_start(self):
         s = Scheduler({})
         s.stop()  # não deve lançar excepção
+
+
+# ---------------------------------------------------------------------------
+# TestScheduleDefinitions
+# ---------------------------------------------------------------------------
+
+class TestScheduleDefinitions:
+    def test_id_stable_across_reload(self):
+        entry = {'hora': '08:00', 'dias': [0], 'source': '/p', 'mode': 'zip'}
+        assert schedule_id(entry) == schedule_id(dict(entry))
+        assert schedule_id(entry) != schedule_id(dict(entry, hora='09:00'))
+
+    def test_explicit_id(self):
+        assert schedule_id({'id': 'fecho-mes', 'hora': '08:00'}) == 'fecho-mes'
+
+    def test_hora_dias_as_cron(self):
+        # dias 0=Segunda, 4=Sexta -> cron 1 e 5
+        cron = trigger({'hora': '08:30', 'dias': [0, 4]})
+        assert cron.weekdays == {1, 5}
+        # 2026-10-20 é terça
+        assert cron.next_after(datetime(2026, 10, 20, 9)) == datetime(2026, 10, 23, 8, 30)
+
+    def test_next_run_invalid(self):
+        assert next_run({'hora': 'xx'}, datetime.now()) is None
+
+    def test_validate_cron(self):
+        assert validate_schedule_entry({'cron': '0 18 LW * *', 'source': '/p'}) == []
+        assert validate_schedule_entry({'cron': '0 25 * * *', 'source': '/p'})
+
+    def test_validate_catch_up(self):
+        entry = {'hora': '08:00', 'dias': [0], 'source': '/p', 'catch_up': 'sempre'}
+        assert validate_schedule_entry(entry)
+
+
+# ---------------------------------------------------------------------------
+# TestSchedulerQueue
+# ---------------------------------------------------------------------------
+
+class TestSchedulerQueue:
+    def _config(self, **entry):
+        base = {'id': 'a', 'hora': '08:00', 'dias': list(range(7)), 'source': '/p'}
+        base.update(entry)
+        return {'automation': {'schedules': [base]}}
+
+    def test_heap_ordered_by_next_run(self):
+        config = {'automation': {'schedules': [
+            {'id': 'tarde', 'hora': '18:00', 'dias': list(range(7)), 'source': '/p'},
+            {'id': 'manha', 'hora': '08:00', 'dias': list(range(7)), 'source': '/p'},
+            {'id': 'off', 'hora': '07:00', 'dias': list(range(7)), 'source': '/p',
+             'enabled': False},
+        ]}}
+        s = Scheduler(config)
+        s._rebuild(datetime(2026, 3, 4, 7, 0), catch_up=False)
+        upcoming = s.upcoming()
+        assert [e['id'] for _, e in upcoming] == ['manha', 'tarde']
+        assert upcoming[0][0] == datetime(2026, 3, 4, 8, 0)
+
+    @pytest.mark.parametrize('policy, expected', [('skip', 0), ('once', 1), ('all', 3)])
+    def test_catch_up_policy(self, policy, expected):
+        s = Scheduler(self._config(catch_up=policy))
+        s._last_run['a'] = datetime(2026, 3, 1, 8, 0)
+        s._rebuild(datetime(2026, 3, 4, 12, 0), catch_up=True)
+        missed = [item for item in s._heap if item[3]]
+        assert len(missed) == expected
+        if missed:
+            assert max(item[0] for item in missed) == datetime(2026, 3, 4, 8, 0)
+
+    def test_catch_up_limited(self):
+        s = Scheduler(self._config(cron='* * * * *', catch_up='all'))
+        s._last_run['a'] = datetime(2026, 3, 1)
+        s._rebuild(datetime(2026, 3, 4), catch_up=True)
+        assert sum(1 for item in s._heap if item[3]) == scheduler_module.MAX_CATCH_UP
+
+    def test_long_idle_schedule_bounded(self, monkeypatch):
+        """Um agendamento parado há um ano não percorre todas as execuções perdidas."""
+        from src.cron import CronExpression
+        calls = []
+        real = CronExpression.last_until
+        monkeypatch.setattr(CronExpression, 'last_until',
+                            lambda self, *a, **kw: calls.append(1) or real(self, *a, **kw))
+        for policy, expected in (('all', scheduler_module.MAX_CATCH_UP), ('once', 1)):
+            calls.clear()
+            s = Scheduler(self._config(cron='* * * * *', catch_up=policy))
+            s._last_run['a'] = datetime(2025, 3, 4)
+            s._rebuild(datetime(2026, 3, 4, 12, 0), catch_up=True)
+            missed = sorted(item[4] for item in s._heap if item[3])
+            assert len(missed) == expected
+            assert missed[-1] == datetime(2026, 3, 4, 12, 0)
+            assert len(calls) <= expected + 1
+
+    def test_global_policy(self):
+        config = self._config()
+        config['automation']['schedule_catch_up'] = 'skip'
+        s = Scheduler(config)
+        s._last_run['a'] = datetime(2026, 3, 1, 8, 0)
+        s._rebuild(datetime(2026, 3, 4, 12, 0), catch_up=True)
+        assert not [item for item in s._heap if item[3]]
+
+    def test_no_catch_up_without_previous_run(self):
+        s = Scheduler(self._config())
+        s._rebuild(datetime(2026, 3, 4, 12, 0), catch_up=True)
+        assert [item[3] for item in s._heap] == [False]
+
+    def test_wakes_at_next_run(self, monkeypatch):
+        """Dorme até à execução mais próxima em vez de acordar minuto a minuto."""
+        monkeypatch.setattr(scheduler_module, 'next_run',
+                            lambda entry, after: after + timedelta(seconds=0.3))
+        fired = []
+        monkeypatch.setattr(Scheduler, '_execute', lambda self, entry: fired.append(entry['id']))
+        s = Scheduler(self._config())
+        s.start()
+        try:
+            deadline = time.time() + 5
+            while len(fired) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            s.stop()
+        assert fired[:2] == ['a', 'a']
+
+    def test_missed_run_after_restart(self, monkeypatch):
+        """A última execução fica na base de dados: o arranque seguinte recupera as perdidas."""
+        fired = threading.Event()
+        monkeypatch.setattr(Scheduler, '_execute', lambda self, entry: fired.set())
+        scheduler_module._save_last_run('a', datetime.now() - timedelta(days=3))
+        s = Scheduler(self._config(catch_up='once'))
+        s.start()
+        try:
+            assert fired.wait(5)
+        finally:
+            s.stop()
+        assert s._last_run['a'] > datetime.now() - timedelta(days=1)
+        assert scheduler_module._load_last_runs()['a'] == s._last_run['a']
+
+    def test_reload_picks_up_new_entries(self):
+        config = self._config()
+        s = Scheduler(config)
+        s.start()
+        try:
+            config['automation']['schedules'].append(
+                {'id': 'b', 'hora': '09:00', 'dias': list(range(7)), 'source': '/p'})
+            s.reload()
+            deadline = time.time() + 5
+            while len(s.upcoming()) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            s.stop()
+        assert {e['id'] for _, e in s.upcoming()} == {'a', 'b'}
+
+
+# ---------------------------------------------------------------------------
+# TestSchedulerConcurrency
+# ---------------------------------------------------------------------------
+
+class TestSchedulerConcurrency:
+    def _entry(self, sid, source='/p'):
+        return {'id': sid, 'hora': '08:00', 'dias': list(range(7)), 'source': source}
+
+    def _blocking(self, monkeypatch):
+        """Substitui a execução por uma que espera por ``release``."""
+        state = {'running': 0, 'max': 0, 'done': [], 'release': threading.Event()}
+        lock = threading.Lock()
+
+        def execute(self, entry):
+            with lock:
+                state['running'] += 1
+                state['max'] = max(state['max'], state['running'])
+            state['release'].wait(5)
+            with lock:
+                state['running'] -= 1
+                state['done'].append(entry['id'])
+
+        monkeypatch.setattr(Scheduler, '_execute', execute)
+        return state
+
+    def _wait(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.02)
+        return condition()
+
+    def test_bounded_pool(self, monkeypatch):
+        state = self._blocking(monkeypatch)
+        s = Scheduler({'automation': {'schedule_workers': 2}})
+        s.start()
+        try:
+            now = datetime.now()
+            for n in range(10):
+                s._fire(f's{n}', self._entry(f's{n}', f'/pasta{n}'), now)
+            assert self._wait(lambda: state['running'] == 2)
+            time.sleep(0.2)
+            assert state['running'] == 2
+            queued = [v for v in s.status().values() if v['state'] == 'queued']
+            assert len(queued) == 8
+            state['release'].set()
+            assert self._wait(lambda: len(state['done']) == 10)
+        finally:
+            state['release'].set()
+            s.stop()
+        assert state['max'] == 2
+
+    def test_same_schedule_does_not_overlap(self, monkeypatch):
+        state = self._blocking(monkeypatch)
+        skipped = []
+        s = Scheduler({}, on_skip=lambda entry, reason: skipped.append(reason))
+        s.start()
+        try:
+            entry = self._entry('a')
+            s._fire('a', entry, datetime.now())
+            assert self._wait(lambda: state['running'] == 1)
+            s._fire('a', entry, datetime.now())
+            status = s.status()['a']
+            assert status['state'] == 'running'
+            assert status['skipped'] == 1 and status['last_skipped'] is not None
+            assert 'anterior' in skipped[0]
+            state['release'].set()
+            assert self._wait(lambda: s.status()['a']['state'] == 'idle')
+            # Terminada a execução, a seguinte volta a correr
+            s._fire('a', entry, datetime.now())
+            assert self._wait(lambda: len(state['done']) == 2)
+        finally:
+            state['release'].set()
+            s.stop()
+
+    def test_same_source_does_not_overlap(self, monkeypatch):
+        state = self._blocking(monkeypatch)
+        s = Scheduler({'automation': {'schedule_workers': 4}})
+        s.start()
+        try:
+            s._fire('a', self._entry('a', '/partilhada'), datetime.now())
+            s._fire('b', self._entry('b', '/partilhada/'), datetime.now())
+            s._fire('c', self._entry('c', '/outra'), datetime.now())
+            assert self._wait(lambda: state['running'] == 2)
+            assert s.status()['b']['skipped'] == 1
+        finally:
+            state['release'].set()
+            s.stop()
+
+    def test_stop_discards_queue(self, monkeypatch):
+        state = self._blocking(monkeypatch)
+        s = Scheduler({'automation': {'schedule_workers': 1}})
+        s.start()
+        s._fire('a', self._entry('a', '/a'), datetime.now())
+        s._fire('b', self._entry('b', '/b'), datetime.now())
+        assert self._wait(lambda: state['running'] == 1)
+        state['release'].set()
+        s.stop()
+        assert s._queue.empty()
+        assert not s._busy or set(s._busy.values()) <= {'a'}
+
+
+# ---------------------------------------------------------------------------
+# TestSchedulerJitter
+# ---------------------------------------------------------------------------
+
+class TestSchedulerJitter:
+    def test_offset_stable_and_bounded(self):
+        entry = {'id': 'fecho', 'hora': '08:00'}
+        offset = scheduler_module.jitter_offset(entry, 300)
+        assert 0 <= offset <= 300
+        assert scheduler_module.jitter_offset(dict(entry), 300) == offset
+        assert scheduler_module.jitter_offset(entry, 0) == 0
+
+    def test_spreads_same_minute(self):
+        schedules = [{'id': f's{n}', 'hora': '08:00', 'dias': list(range(7)), 'source': f'/p{n}'}
+                     for n in range(10)]
+        s = Scheduler({'automation': {'schedules': schedules, 'schedule_jitter': 120}})
+        s._rebuild(datetime(2026, 3, 4, 7, 0), catch_up=False)
+        fire_times = [when for when, _ in s.upcoming()]
+        assert len(set(fire_times)) == 10
+        nominal = datetime(2026, 3, 4, 8, 0)
+        assert all(nominal <= t <= nominal + timedelta(seconds=120) for t in fire_times)
+        # A execução registada é a hora nominal
+        assert {item[4] for item in s._heap} == {nominal}
+
+    def test_entry_jitter_overrides(self):
+        entry = {'id': 'a', 'hora': '08:00', 'dias': list(range(7)), 'source': '/p', 'jitter': 0}
+        s = Scheduler({'automation': {'schedules': [entry], 'schedule_jitter': 600}})
+        s._rebuild(datetime(2026, 3, 4, 7, 0), catch_up=False)
+        assert s.upcoming()[0][0] == datetime(2026, 3, 4, 8, 0)
+
+    def test_reload_keeps_pending_jittered_run(self):
+        entry = {'id': 'a', 'hora': '08:00', 'dias': list(range(7)), 'source': '/p',
+                 'jitter': 600}
+        other = {'id': 'b', 'hora': '09:00', 'dias': list(range(7)), 'source': '/q'}
+        config = {'automation': {'schedules': [entry]}}
+        s = Scheduler(config)
+        s._rebuild(datetime(2026, 3, 4, 7, 0), catch_up=False)
+        pending = list(s._heap)
+        # Já passou a hora nominal, mas o disparo com jitter ainda não chegou
+        config['automation']['schedules'] = [entry, other]
+        s._rebuild(datetime(2026, 3, 4, 8, 0, 1), catch_up=False)
+        assert pending[0] in s._heap
+        assert {item[2] for item in s._heap} == {'a', 'b'}
+
+    def test_reload_reschedules_changed_entry(self):
+        entry = {'id': 'a', 'hora': '08:00', 'dias': list(range(7)), 'source': '/p'}
+        config = {'automation': {'schedules': [entry]}}
+        s = Scheduler(config)
+        s._rebuild(datetime(2026, 3, 4, 7, 0), catch_up=False)
+        config['automation']['schedules'] = [dict(entry, hora='10:00')]
+        s._rebuild(datetime(2026, 3, 4, 7, 30), catch_up=False)
+        assert [item[4] for item in s._heap] == [datetime(2026, 3, 4, 10, 0)]
@@ -0,0 +1,146 @@
+"""
+Testes para a medição de tempos por fase das conversões.
+"""
+
+import copy
+import time
+
+import pytest
+from openpyxl import Workbook
+from unittest.mock import MagicMock
+
+from src import batch_journal
+from src import history
+from src.batch_processor import process_batch
+from src.config import DEFAULT_CONFIG
+from src.converter import ExcelToPDFConverter
+from src.timing import PhaseTimer, format_timings, timings_of
+
+
+@pytest.fixture
+def contas_xlsx(tmp_path):
+    """Excel de contabilidade com dois clientes."""
+    path = str(tmp_path / 'contas.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+    ws.append([1, 'ABC', 'Cliente ABC', 100.0, 23.0, 123.0, 'Janeiro'])
+    ws.append([2, 'XYZ', 'Cliente XYZ', 200.0, 46.0, 246.0, 'Janeiro'])
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def config():
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg['output']['auto_open'] = False
+    return cfg
+
+
+class TestPhaseTimer:
+    def test_phase_accumulates(self):
+        timer = PhaseTimer()
+        with timer.phase('load'):
+            time.sleep(0.01)
+        with timer.phase('load'):
+            time.sleep(0.01)
+        assert timer.as_dict()['phases']['load'] >= 0.02
+
+    def test_phase_recorded_on_exception(self):
+        timer = PhaseTimer()
+        with pytest.raises(RuntimeError):
+            with timer.phase('pdf_build'):
+                raise RuntimeError('falha')
+        assert 'pdf_build' in timer.as_dict()['phases']
+
+    def test_counts_and_total(self):
+        timer = PhaseTimer()
+        timer.add('load', 0.5)
+        timer.add('pdf_build', 1.25)
+        timer.count('pages')
+        timer.count('pages', 2)
+        assert timer.as_dict() == {
+            'phases': {'load': 0.5, 'pdf_build': 1.25},
+            'counts': {'pages': 3},
+            'total': 1.75,
+        }
+
+    def test_timings_of_without_timer(self):
+        assert timings_of(MagicMock()) == {}
+        assert timings_of(None) == {}
+
+
+class TestFormatTimings:
+    def test_ordered_by_phase(self):
+        line = format_timings({'phases': {'pdf_build': 2.0, 'load': 0.5}, 'total': 2.5})
+        assert line == 'Leitura 0.50s · Geração PDF 2.00s (total 2.50s)'
+
+    def test_empty(self):
+        assert format_timings({}) == ''
+        assert format_timings(None) == ''
+
+
+class TestConverterTimings:
+    def test_aggregate_phases_and_counts(self, contas_xlsx, config):
+        converter = ExcelToPDFConverter(contas_xlsx, None, config)
+        converter.generate_pdf()
+        timings = converter.timings.as_dict()
+
+        for phase in ('load', 'header_detection', 'row_normalization', 'flowables', 'pdf_build'):
+            assert phase in timings['phases']
+        assert 'encryption' not in timings['phases']
+        assert timings['counts']['rows'] == 2
+        assert timings['counts']['clients'] == 2
+        assert timings['counts']['pages'] >= 1
+        assert timings['counts']['pdfs'] == 1
+        assert timings['counts']['bytes'] > 0
+
+    def test_individual_sums_over_clients(self, contas_xlsx, config):
+        converter = ExcelToPDFConverter(contas_xlsx, None, config)
+        files = converter.generate_individual_pdfs()
+        counts = converter.timings.as_dict()['counts']
+        assert counts['pdfs'] == len(files) == 2
+        assert counts['pages'] >= 2
+
+    def test_zip_records_archive(self, contas_xlsx, config):
+        converter = ExcelToPDFConverter(contas_xlsx, None, config)
+        converter.generate_individual_pdfs(zip_output=True)
+        timings = converter.timings.as_dict()
+        assert 'archive' in timings['phases']
+        assert timings['counts']['bytes'] > 0
+
+    def test_encryption_phase(self, contas_xlsx, config):
+        pytest.importorskip('PyPDF2')
+        config['security']['pdf_password'] = 'segredo'
+        converter = ExcelToPDFConverter(contas_xlsx, None, config)
+        converter.generate_pdf()
+        assert 'encryption' in converter.timings.as_dict()['phases']
+
+    def test_reset_between_generations(self, contas_xlsx, config):
+        converter = ExcelToPDFConverter(contas_xlsx, None, config)
+        converter.generate_pdf()
+        converter.generate_pdf()
+        assert converter.timings.as_dict()['counts']['pdfs'] == 1
+
+
+class TestPersistedTimings:
+    def test_batch_results_include_timings(self, contas_xlsx, config, tmp_path):
+        results = process_batch(str(tmp_path), config, mode='aggregate')
+        assert results[0]['timings']['counts']['clients'] == 2
+        assert results[0]['timings']['total'] > 0
+
+    def test_history_roundtrip(self, isolated_db):
+        timings = {'phases': {'load': 0.1}, 'counts': {'rows': 3}, 'total': 0.1}
+        history.add_entry('/a/contas.xlsx', '/a/contas.pdf', 'aggregate', 3, True,
+                          timings=timings)
+        assert history.get_history()[0]['timings'] == timings
+
+    def test_history_without_timings(self, isolated_db):
+        history.add_entry('/a/contas.xlsx', '', 'aggregate', 0, False, 'erro')
+        assert history.get_history()[0]['timings'] == {}
+
+    def test_journal_stores_timings(self, isolated_db, contas_xlsx, config, tmp_path):
+        run_id = batch_journal.start_run(str(tmp_path), 'aggregate', config)
+        process_batch(str(tmp_path), config, mode='aggregate', run_id=run_id)
+        job = batch_journal.get_jobs(run_id)[0]
+        assert job['timings']['counts']['rows'] == 2
@@ -5,10 +5,12 @@ Testes para o módulo de watch folder.
 """
 
 import os
+import threading
 import time
 import tempfile
 import pytest
 
+from src import inotify
 from src.watch_folder import WatchFolder
 
 
@@ -16,6 +18,12 @@ from src.watch_folder import WatchFolder
 # Fixtures
 # ---------------------------------------------------------------------------
 
+@pytest.fixture(autouse=True)
+def _db(isolated_db):
+    """O estado da monitorização (src.watch_state) vai para uma base de dados temporária."""
+    return isolated_db
+
+
 @pytest.fixture
 def tmp_folder():
     with tempfile.TemporaryDirectory() as d:
@@ -114,3 +122,387 @@ class TestWatchFolderLifecycle:
         time.sleep(3.0)
         wf.stop()
         assert new_path in seen
+
+
+# ---------------------------------------------------------------------------
+# TestWatchFolderBackends
+# ---------------------------------------------------------------------------
+
+needs_inotify = pytest.mark.skipif(not inotify.is_available(), reason="inotify indisponível")
+
+
+def _detection_latency(folder, config, interval, backend):
+    """Segundos entre criar um ficheiro e o callback on_new_file."""
+    detected = threading.Event()
+    wf = WatchFolder(folder, config, on_new_file=lambda p: detected.set(),
+                     interval=interval, backend=backend)
+    wf.start()
+    try:
+        start = time.monotonic()
+        open(os.path.join(folder, 'novo.xlsx'), 'w').close()
+        assert detected.wait(interval + 5)
+        return time.monotonic() - start
+    finally:
+        wf.stop()
+
+
+class TestWatchFolderBackends:
+    def test_default_from_config(self, tmp_folder, basic_config):
+        basic_config['automation']['watch_backend'] = 'polling'
+        wf = WatchFolder(tmp_folder, basic_config, interval=1)
+        wf.start()
+        wf.stop()
+        assert wf.backend == 'polling'
+
+    def test_fallback_to_polling(self, tmp_folder, basic_config, monkeypatch):
+        monkeypatch.setattr('src.inotify.is_available', lambda: False)
+        wf = WatchFolder(tmp_folder, basic_config, interval=1, backend='inotify')
+        wf.start()
+        wf.stop()
+        assert wf.backend == 'polling'
+
+    def test_fallback_when_watch_fails(self, tmp_folder, basic_config, monkeypatch):
+        def fail(*args):
+            raise OSError(28, 'No space left on device')
+        monkeypatch.setattr('src.inotify.Inotify', fail)
+        wf = WatchFolder(tmp_folder, basic_config, interval=1)
+        wf.start()
+        wf.stop()
+        assert wf.backend == 'polling'
+
+    @needs_inotify
+    def test_inotify_detects_without_waiting_interval(self, tmp_folder, basic_config):
+        """Com inotify a detecção não espera pelo intervalo (aqui 5 s)."""
+        latency = _detection_latency(tmp_folder, basic_config, 5, 'inotify')
+        assert latency < 1.0
+
+    def test_polling_latency_bounded_by_interval(self, tmp_folder, basic_config):
+        latency = _detection_latency(tmp_folder, basic_config, 0.5, 'polling')
+        assert latency < 2.0
+
+    @needs_inotify
+    def test_rename_into_folder_detected(self, tmp_folder, basic_config):
+        seen = []
+        wf = WatchFolder(tmp_folder, basic_config, on_new_file=seen.append,
+                         interval=1, backend='inotify')
+        wf.start()
+        try:
+            with tempfile.TemporaryDirectory() as other:
+                src_path = os.path.join(other, 'movido.xlsx')
+                open(src_path, 'w').close()
+                os.rename(src_path, os.path.join(tmp_folder, 'movido.xlsx'))
+                open(os.path.join(tmp_folder, 'ignorado.txt'), 'w').close()
+                deadline = time.time() + 3
+                while not seen and time.time() < deadline:
+                    time.sleep(0.05)
+        finally:
+            wf.stop()
+        assert seen == [os.path.join(tmp_folder, 'movido.xlsx')]
+
+    def test_overflow_rescans_folder(self, tmp_folder, basic_config):
+        class Overflowed:
+            def read(self, timeout):
+                return [], True
+
+        path = os.path.join(tmp_folder, 'perdido.xlsx')
+        open(path, 'w').close()
+        wf = WatchFolder(tmp_folder, basic_config)
+        wf._events = Overflowed()
+        assert wf._changes(0) == ({path}, False)
+
+
+class TestInotify:
+    @needs_inotify
+    def test_reports_completed_files_only(self, tmp_folder):
+        with inotify.Inotify(tmp_folder) as events:
+            os.mkdir(os.path.join(tmp_folder, 'sub'))
+            with open(os.path.join(tmp_folder, 'a.xlsx'), 'w') as f:
+                f.write('x')
+            names, overflow = events.read(1)
+        assert names == ['a.xlsx']
+        assert not overflow
+
+    @needs_inotify
+    def test_timeout_without_events(self, tmp_folder):
+        with inotify.Inotify(tmp_folder) as events:
+            assert events.read(0.05) == ([], False)
+
+    @needs_inotify
+    def test_missing_folder(self):
+        with pytest.raises(OSError):
+            inotify.Inotify('/pasta/nao/existe')
+
+
+# ---------------------------------------------------------------------------
+# TestWatchFolderStability
+# ---------------------------------------------------------------------------
+
+def _workbook_bytes():
+    import io
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+    ws.append([1, 'S1', 'Cliente 1', 100.0, 23.0, 123.0, 'Janeiro'])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _expire(wf, path):
+    """Simula a passagem do intervalo de estabilização."""
+    wf._pending[path]['checked'] -= wf.settle + 1
+
+
+class TestWatchFolderStability:
+    @pytest.fixture
+    def stable_config(self, basic_config):
+        basic_config['automation'].update(
+            {'watch_settle_seconds': 0.1, 'watch_stable_checks': 2, 'watch_max_retries': 3})
+        return basic_config
+
+    def _write(self, path, data):
+        with open(path, 'ab') as f:
+            f.write(data)
+
+    def test_waits_until_unchanged(self, tmp_folder, stable_config):
+        path = os.path.join(tmp_folder, 'copia.xlsx')
+        self._write(path, b'parte1')
+        wf = WatchFolder(tmp_folder, stable_config)
+        wf._track(path)
+        assert wf._ready() == []
+        self._write(path, b'parte2')
+        _expire(wf, path)
+        assert wf._ready() == []
+        _expire(wf, path)
+        assert wf._ready() == [path]
+        assert path not in wf._pending
+
+    def test_single_check_is_immediate(self, tmp_folder, stable_config):
+        stable_config['automation']['watch_stable_checks'] = 1
+        path = os.path.join(tmp_folder, 'a.xlsx')
+        self._write(path, b'x')
+        wf = WatchFolder(tmp_folder, stable_config)
+        wf._track(path)
+        assert wf._ready() == [path]
+
+    def test_excel_lock_file_blocks(self, tmp_folder, stable_config):
+        path = os.path.join(tmp_folder, 'contas.xlsx')
+        lock = os.path.join(tmp_folder, '~$contas.xlsx')
+        self._write(path, b'x')
+        self._write(lock, b'x')
+        wf = WatchFolder(tmp_folder, stable_config)
+        wf._track(path)
+        for _ in range(3):
+            _expire(wf, path)
+            assert wf._ready() == []
+        os.remove(lock)
+        assert wf._ready() == [path]
+
+    def test_long_name_lock_file(self, tmp_folder):
+        path = os.path.join(tmp_folder, 'contas_janeiro.xlsx')
+        self._write(os.path.join(tmp_folder, '~$ntas_janeiro.xlsx'), b'x')
+        from src.watch_folder import _is_locked
+        assert _is_locked(path)
+
+    def test_events_debounce(self, tmp_folder, stable_config):
+        path = os.path.join(tmp_folder, 'a.xlsx')
+        self._write(path, b'x')
+        seen = []
+        wf = WatchFolder(tmp_folder, stable_config, on_new_file=seen.append)
+        wf._track(path, touched=True)
+        _expire(wf, path)
+        wf._track(path, touched=True)
+        wf._track(path, touched=True)
+        assert wf._pending[path]['stable'] == 1
+        assert wf._ready() == []
+        assert seen == [path]
+
+    def test_removed_while_pending(self, tmp_folder, stable_config):
+        path = os.path.join(tmp_folder, 'a.xlsx')
+        self._write(path, b'x')
+        wf = WatchFolder(tmp_folder, stable_config)
+        wf._track(path)
+        os.remove(path)
+        _expire(wf, path)
+        assert wf._ready() == []
+        assert wf._pending == {}
+
+    def test_failure_while_changing_is_retried(self, tmp_folder, stable_config, monkeypatch):
+        path = os.path.join(tmp_folder, 'a.xlsx')
+        self._write(path, b'metade')
+        errors = []
+
+        def half_written(excel_path, *args, **kwargs):
+            self._write(excel_path, b'resto')
+            raise ValueError('ficheiro truncado')
+
+        monkeypatch.setattr('src.converter.ExcelToPDFConverter', half_written)
+        wf = WatchFolder(tmp_folder, stable_config, on_error=lambda p, e: errors.append(e))
+        wf._seen.add(path)
+        wf._process(path)
+        assert errors == []
+        assert path in wf._pending and path not in wf._seen
+        assert wf._retries[path] == 1
+
+    def test_retries_are_bounded(self, tmp_folder, stable_config, monkeypatch):
+        path = os.path.join(tmp_folder, 'a.xlsx')
+        self._write(path, b'x')
+        errors = []
+
+        def always_changing(excel_path, *args, **kwargs):
+            self._write(excel_path, b'x')
+            raise ValueError('truncado')
+
+        monkeypatch.setattr('src.converter.ExcelToPDFConverter', always_changing)
+        wf = WatchFolder(tmp_folder, stable_config, on_error=lambda p, e: errors.append(e))
+        for _ in range(4):
+            wf._seen.add(path)
+            wf._pending.pop(path, None)
+            wf._process(path)
+        assert errors == ['truncado']
+
+    def test_failed_file_retried_when_modified(self, tmp_folder, stable_config):
+        path = os.path.join(tmp_folder, 'corrompido.xlsx')
+        self._write(path, b'nao e um excel')
+        errors = []
+        wf = WatchFolder(tmp_folder, stable_config, on_error=lambda p, e: errors.append(p))
+        wf._seen.add(path)
+        wf._process(path)
+        assert errors == [path]
+        wf._track(path)
+        assert path not in wf._pending
+        self._write(path, b'!')
+        wf._track(path)
+        assert path in wf._pending and path not in wf._seen
+
+    def test_slow_copy_converted_once(self, tmp_folder, stable_config):
+        """Um ficheiro copiado aos poucos só é convertido quando completo."""
+        import copy
+        from src.config import DEFAULT_CONFIG
+        config = copy.deepcopy(DEFAULT_CONFIG)
+        config['output']['auto_open'] = False
+        config['automation'].update(stable_config['automation'])
+        config['automation'].update({'watch_mode': 'aggregate', 'watch_settle_seconds': 0.3})
+        data = _workbook_bytes()
+        converted, errors = [], []
+        wf = WatchFolder(tmp_folder, config, interval=0.1,
+                         on_converted=lambda p, outs: converted.append(p),
+                         on_error=lambda p, e: errors.append(e))
+        wf.start()
+        try:
+            path = os.path.join(tmp_folder, 'lento.xlsx')
+            step = len(data) // 5 + 1
+            for offset in range(0, len(data), step):
+                self._write(path, data[offset:offset + step])
+                time.sleep(0.15)
+            deadline = time.time() + 10
+            while not converted and time.time() < deadline:
+                time.sleep(0.1)
+        finally:
+            wf.stop()
+        assert errors == []
+        assert converted == [path]
+
+
+# ---------------------------------------------------------------------------
+# TestWatchFolderQueue
+# ---------------------------------------------------------------------------
+
+def _wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+class TestWatchFolderQueue:
+    @pytest.fixture
+    def queue_config(self, basic_config):
+        basic_config['automation'].update({'watch_stable_checks': 1, 'watch_workers': 1,
+                                           'watch_queue_size': 10})
+        return basic_config
+
+    def _blocking(self, monkeypatch, release):
+        converted = []
+
+        def slow(self_, excel_path):
+            release.wait(10)
+            converted.append(excel_path)
+            return []
+
+        monkeypatch.setattr(WatchFolder, '_convert_inline', slow)
+        return converted
+
+    def test_slow_conversion_does_not_block_detection(self, tmp_folder, queue_config,
+                                                      monkeypatch):
+        release = threading.Event()
+        converted = self._blocking(monkeypatch, release)
+        detected = []
+        wf = WatchFolder(tmp_folder, queue_config, interval=0.1,
+                         on_new_file=detected.append)
+        wf.start()
+        try:
+            for name in ('a.xlsx', 'b.xlsx'):
+                open(os.path.join(tmp_folder, name), 'w').close()
+                time.sleep(0.3)
+            assert _wait_until(lambda: len(detected) == 2)
+            metrics = wf.metrics()
+            assert metrics['in_progress'] == 1
+            assert metrics['queue_depth'] == 1
+            release.set()
+            assert _wait_until(lambda: len(converted) == 2)
+        finally:
+            release.set()
+            wf.stop()
+
+    def test_backpressure_when_queue_full(self, tmp_folder, queue_config, monkeypatch):
+        queue_config['automation']['watch_queue_size'] = 1
+        release = threading.Event()
+        converted = self._blocking(monkeypatch, release)
+        wf = WatchFolder(tmp_folder, queue_config, interval=0.1)
+        wf.start()
+        try:
+            for n in range(4):
+                open(os.path.join(tmp_folder, f'{n}.xlsx'), 'w').close()
+            assert _wait_until(lambda: wf.metrics()['backpressure'] >= 1)
+            assert wf.metrics()['queue_depth'] == 1
+            release.set()
+            assert _wait_until(lambda: len(converted) == 4)
+        finally:
+            release.set()
+            wf.stop()
+        metrics = wf.metrics()
+        assert metrics['converted'] == 4
+        assert metrics['time_to_pdf']['max'] >= metrics['time_to_pdf']['avg'] > 0
+
+    def test_process_pool(self, tmp_folder, queue_config):
+        import copy
+        from src.config import DEFAULT_CONFIG
+        config = copy.deepcopy(DEFAULT_CONFIG)
+        config['output']['auto_open'] = False
+        config['automation'].update(queue_config['automation'])
+        config['automation'].update({'watch_mode': 'aggregate', 'watch_workers': 2})
+        converted, errors = [], []
+        wf = WatchFolder(tmp_folder, config, interval=0.1,
+                         on_converted=lambda p, outs: converted.append(outs),
+                         on_error=lambda p, e: errors.append(e))
+        wf.start()
+        try:
+            data = _workbook_bytes()
+            for n in range(3):
+                with open(os.path.join(tmp_folder, f'pool_{n}.xlsx'), 'wb') as f:
+                    f.write(data)
+            assert _wait_until(lambda: len(converted) + len(errors) == 3, timeout=60)
+        finally:
+            wf.stop()
+        assert errors == []
+        assert all(os.path.exists(outs[0]) for outs in converted)
+        metrics = wf.metrics()
+        assert metrics['converted'] == 3 and metrics['in_progress'] == 0
+
+    def test_metrics_before_start(self, tmp_folder, basic_config):
+        metrics = WatchFolder(tmp_folder, basic_config).metrics()
+        assert metrics['queue_depth'] == 0
+        assert metrics['queue_size'] == 100
+        assert metrics['time_to_pdf'] is None
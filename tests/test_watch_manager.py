@@ -0,0 +1,235 @@
+"""
+Testes para a monitorização de várias pastas com pool partilhado.
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import deque
+
+import pytest
+
+from src.config import DEFAULT_CONFIG, save_profile
+from src.watch_folder import WatchFolder
+from src.watch_manager import WatchManager, configured_folders, folder_config
+
+
+@pytest.fixture(autouse=True)
+def _db(isolated_db):
+    return isolated_db
+
+
+@pytest.fixture
+def config():
+    return {'automation': {'watch_mode': 'individual', 'watch_stable_checks': 1,
+                           'watch_settle_seconds': 0.05, 'watch_workers': 1,
+                           'watch_queue_size': 10, 'watch_interval': 0.1},
+            'hooks': []}
+
+
+@pytest.fixture
+def teams(tmp_path):
+    folders = []
+    for name in ('contabilidade', 'salarios'):
+        path = tmp_path / name
+        path.mkdir()
+        folders.append(str(path))
+    return folders
+
+
+@pytest.fixture
+def converted(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def fake(self, excel_path):
+        with lock:
+            calls.append((excel_path, self.config['automation']['watch_mode']))
+        return []
+
+    monkeypatch.setattr(WatchFolder, '_convert_inline', fake)
+    return calls
+
+
+def _wait_until(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+class TestConfiguredFolders:
+    def test_legacy_and_list(self, config):
+        config['automation'].update({
+            'watch_folder': '/a',
+            'watch_folders': [{'folder': '/b', 'profile': 'p', 'mode': 'zip'},
+                              {'folder': '/c', 'enabled': False},
+                              {'folder': '/a', 'mode': 'zip'}],
+        })
+        entries = configured_folders(config)
+        assert [e['folder'] for e in entries] == ['/a', '/b']
+        assert entries[0]['mode'] == 'individual'
+
+    def test_empty(self, config):
+        assert configured_folders(config) == []
+
+
+class TestFolderConfig:
+    def test_mode_override(self, config):
+        result = folder_config(config, {'folder': '/x', 'mode': 'aggregate'})
+        assert result['automation']['watch_mode'] == 'aggregate'
+        assert config['automation']['watch_mode'] == 'individual'
+
+    def test_profile_loaded(self, config):
+        profile = copy.deepcopy(DEFAULT_CONFIG)
+        profile['pdf']['title'] = 'Equipa Salários'
+        save_profile('salarios', profile)
+        result = folder_config(config, {'folder': '/x', 'profile': 'salarios', 'mode': 'zip'})
+        assert result['pdf']['title'] == 'Equipa Salários'
+        # As opções de monitorização continuam a ser as da aplicação
+        assert result['automation']['watch_stable_checks'] == 1
+        assert result['automation']['watch_mode'] == 'zip'
+
+    def test_missing_profile(self, config):
+        with pytest.raises(ValueError):
+            folder_config(config, {'folder': '/x', 'profile': 'nao_existe'})
+
+
+class TestWatchManager:
+    def test_each_folder_uses_its_mode(self, teams, config, converted):
+        manager = WatchManager(config)
+        manager.add_folder(teams[0], folder_config(config, {'mode': 'aggregate'}))
+        manager.add_folder(teams[1], folder_config(config, {'mode': 'zip'}))
+        manager.start()
+        try:
+            for folder in teams:
+                open(os.path.join(folder, 'mes.xlsx'), 'w').close()
+            assert _wait_until(lambda: len(converted) == 2)
+        finally:
+            manager.stop()
+        assert sorted(converted) == [
+            (os.path.join(teams[0], 'mes.xlsx'), 'aggregate'),
+            (os.path.join(teams[1], 'mes.xlsx'), 'zip'),
+        ]
+
+    def test_threads_do_not_grow_with_folders(self, tmp_path, config, converted):
+        config['automation']['watch_workers'] = 2
+        manager = WatchManager(config)
+        for n in range(8):
+            folder = tmp_path / f'equipa{n}'
+            folder.mkdir()
+            manager.add_folder(str(folder))
+        before = threading.active_count()
+        manager.start()
+        try:
+            # Uma thread de detecção e duas de conversão (mais as do pool de processos)
+            assert len(manager._threads) == 2
+            assert all(w._thread is None and not w._workers for w in manager.watchers)
+            assert threading.active_count() - before <= 3 + 2
+        finally:
+            manager.stop()
+
+    def test_round_robin_between_folders(self, teams, config):
+        manager = WatchManager(config)
+        a = manager.add_folder(teams[0])
+        b = manager.add_folder(teams[1])
+        manager._queues = {a: deque(), b: deque()}
+        manager._running = True
+        for n in range(3):
+            assert manager._submit(a, f'a{n}')
+        assert manager._submit(b, 'b0')
+        order = [manager._next()[1] for _ in range(4)]
+        manager._running = False
+        assert order == ['a0', 'b0', 'a1', 'a2']
+
+    def test_full_folder_queue_does_not_block_others(self, teams, config):
+        config['automation']['watch_queue_size'] = 1
+        manager = WatchManager(config)
+        a = manager.add_folder(teams[0])
+        b = manager.add_folder(teams[1])
+        manager._queues = {a: deque(), b: deque()}
+        assert manager._submit(a, 'a0')
+        assert not manager._submit(a, 'a1')
+        assert manager._submit(b, 'b0')
+
+    def test_deferred_file_converted_later(self, teams, config, monkeypatch):
+        """Com a fila cheia o ficheiro fica pendente e entra quando houver lugar."""
+        config['automation']['watch_queue_size'] = 1
+        release = threading.Event()
+        done = []
+
+        def slow(self, excel_path):
+            release.wait(10)
+            done.append(excel_path)
+            return []
+
+        monkeypatch.setattr(WatchFolder, '_convert_inline', slow)
+        manager = WatchManager(config)
+        manager.add_folder(teams[0])
+        manager.start()
+        try:
+            for n in range(3):
+                open(os.path.join(teams[0], f'{n}.xlsx'), 'w').close()
+            assert _wait_until(lambda: manager.watchers[0].metrics()['backpressure'] > 0)
+            release.set()
+            assert _wait_until(lambda: len(done) == 3)
+        finally:
+            release.set()
+            manager.stop()
+        assert sorted(os.path.basename(p) for p in done) == ['0.xlsx', '1.xlsx', '2.xlsx']
+
+    def test_metrics(self, teams, config, converted):
+        manager = WatchManager(config)
+        for folder in teams:
+            manager.add_folder(folder)
+        manager.start()
+        try:
+            open(os.path.join(teams[1], 'a.xlsx'), 'w').close()
+            assert _wait_until(lambda: manager.metrics()['converted'] == 1)
+        finally:
+            manager.stop()
+        metrics = manager.metrics()
+        assert metrics['folders'][teams[1]]['converted'] == 1
+        assert metrics['folders'][teams[0]]['converted'] == 0
+
+    def test_missing_folder(self, teams, config):
+        manager = WatchManager(config)
+        manager.add_folder(teams[0])
+        manager.add_folder('/pasta/nao/existe')
+        with pytest.raises(ValueError):
+            manager.start()
+        assert not manager.is_running
+        assert not manager.watchers[0].is_running
+
+    def test_no_folders(self, config):
+        with pytest.raises(ValueError):
+            WatchManager(config).start()
+
+    def test_from_config(self, teams, config):
+        config['automation']['watch_folder'] = teams[0]
+        config['automation']['watch_folders'] = [{'folder': teams[1], 'mode': 'zip'}]
+        manager = WatchManager.from_config(config)
+        assert [w.folder_path for w in manager.watchers] == teams
+        assert manager.watchers[1].config['automation']['watch_mode'] == 'zip'
+
+    def test_polling_folders(self, teams, config, converted):
+        config['automation']['watch_backend'] = 'polling'
+        manager = WatchManager(config)
+        for folder in teams:
+            manager.add_folder(folder)
+        manager.start()
+        try:
+            assert all(w.backend == 'polling' for w in manager.watchers)
+            for folder in teams:
+                open(os.path.join(folder, 'x.xlsx'), 'w').close()
+            assert _wait_until(lambda: len(converted) == 2)
+        finally:
+            manager.stop()
+
+
+class TestCliWatch:
+    def test_no_configured_folders(self, config):
+        import converter_excel_pdf as entry
+        with pytest.raises(SystemExit):
+            entry._run_watch(None, config)
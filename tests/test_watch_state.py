@@ -0,0 +1,199 @@
+"""
+Testes para o estado persistente da pasta monitorizada.
+"""
+
+import os
+import time
+
+import pytest
+
+from src import watch_state
+from src.watch_folder import WatchFolder
+
+
+@pytest.fixture(autouse=True)
+def _db(isolated_db):
+    return isolated_db
+
+
+@pytest.fixture
+def folder(tmp_path):
+    path = tmp_path / 'entrada'
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def config():
+    return {'automation': {'watch_mode': 'aggregate', 'watch_stable_checks': 1,
+                           'watch_settle_seconds': 0.05}, 'hooks': []}
+
+
+@pytest.fixture
+def converted(monkeypatch):
+    """Substitui a conversão: escreve um PDF falso e regista o ficheiro."""
+    calls = []
+
+    def fake(self, excel_path):
+        calls.append(excel_path)
+        output = os.path.splitext(excel_path)[0] + '.pdf'
+        with open(output, 'w') as f:
+            f.write('pdf')
+        return [output]
+
+    monkeypatch.setattr(WatchFolder, '_convert_inline', fake)
+    return calls
+
+
+def _write(path, content):
+    path.write_text(content)
+    return str(path)
+
+
+def _run(folder, config, until, timeout=5):
+    """Arranca o watcher, espera por ``until()`` e pára-o."""
+    wf = WatchFolder(str(folder), config, interval=0.1)
+    wf.start()
+    try:
+        deadline = time.time() + timeout
+        while not until() and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        wf.stop()
+    return wf
+
+
+class TestWatchStateStore:
+    def test_record_and_load(self, folder):
+        path = str(folder / 'a.xlsx')
+        watch_state.record(str(folder), path, (10, 20), 'abc', ['/a.pdf'], watch_state.CONVERTED)
+        state = watch_state.load(str(folder))
+        assert state[path]['signature'] == (10, 20)
+        assert state[path]['outputs'] == ['/a.pdf']
+        assert state[path]['status'] == watch_state.CONVERTED
+
+    def test_baseline_does_not_overwrite(self, folder):
+        path = str(folder / 'a.xlsx')
+        watch_state.record(str(folder), path, (10, 20), 'abc', [], watch_state.CONVERTED)
+        watch_state.add_baseline(str(folder), {path: (1, 1), str(folder / 'b.xlsx'): (2, 2)})
+        state = watch_state.load(str(folder))
+        assert state[path]['status'] == watch_state.CONVERTED
+        assert state[str(folder / 'b.xlsx')]['status'] == watch_state.BASELINE
+
+    def test_folders_are_separate(self, folder, tmp_path):
+        watch_state.record(str(folder), 'x', (1, 1), '', [], watch_state.FAILED)
+        assert watch_state.load(str(tmp_path)) == {}
+        assert watch_state.clear(str(folder)) == 1
+        assert watch_state.load(str(folder)) == {}
+
+    def test_forget(self, folder):
+        watch_state.add_baseline(str(folder), {'a': (1, 1), 'b': (2, 2)})
+        watch_state.forget(str(folder), ['a'])
+        assert list(watch_state.load(str(folder))) == ['b']
+
+
+class TestCatchUp:
+    def test_first_start_records_baseline(self, folder, config, converted):
+        _write(folder / 'antigo.xlsx', 'v1')
+        _run(folder, config, lambda: False, timeout=0.3)
+        assert converted == []
+        state = watch_state.load(str(folder))
+        assert state[str(folder / 'antigo.xlsx')]['status'] == watch_state.BASELINE
+
+    def test_new_file_during_downtime(self, folder, config, converted):
+        _write(folder / 'antigo.xlsx', 'v1')
+        _run(folder, config, lambda: False, timeout=0.3)
+        novo = _write(folder / 'novo.xlsx', 'v1')
+        _run(folder, config, lambda: converted)
+        assert converted == [novo]
+        assert watch_state.load(str(folder))[novo]['status'] == watch_state.CONVERTED
+
+    def test_modified_during_downtime(self, folder, config, converted):
+        path = _write(folder / 'contas.xlsx', 'v1')
+        _run(folder, config, lambda: False, timeout=0.3)
+        _write(folder / 'contas.xlsx', 'v2 corrigido')
+        _run(folder, config, lambda: converted)
+        assert converted == [path]
+
+    def test_touched_but_identical_not_reconverted(self, folder, config, converted):
+        _run(folder, config, lambda: False, timeout=0.3)
+        path = _write(folder / 'contas.xlsx', 'v1')
+        _run(folder, config, lambda: converted)
+        assert converted == [path]
+        os.utime(path, ns=(0, 0))
+        wf = _run(folder, config, lambda: False, timeout=1)
+        assert converted == [path]
+        # O registo passou a ter o novo mtime: o arranque seguinte nem calcula o hash
+        assert watch_state.load(str(folder))[path]['signature'][1] == 0
+        assert wf.metrics()['converted'] == 1
+
+    def test_deleted_files_forgotten(self, folder, config, converted):
+        path = _write(folder / 'contas.xlsx', 'v1')
+        _run(folder, config, lambda: False, timeout=0.3)
+        os.remove(path)
+        _run(folder, config, lambda: False, timeout=0.3)
+        assert watch_state.load(str(folder)) == {}
+
+    def test_failed_file_retried_only_when_changed(self, folder, config, monkeypatch):
+        _run(folder, config, lambda: False, timeout=0.3)
+        attempts = []
+
+        def broken(self, excel_path):
+            attempts.append(excel_path)
+            raise ValueError('corrompido')
+
+        monkeypatch.setattr(WatchFolder, '_convert_inline', broken)
+        path = _write(folder / 'contas.xlsx', 'v1')
+        _run(folder, config, lambda: attempts)
+        assert watch_state.load(str(folder))[path]['status'] == watch_state.FAILED
+        _run(folder, config, lambda: False, timeout=0.5)
+        assert len(attempts) == 1
+        _write(folder / 'contas.xlsx', 'v2')
+        _run(folder, config, lambda: len(attempts) == 2)
+        assert len(attempts) == 2
+
+    def test_persist_disabled(self, folder, config, converted):
+        config['automation']['watch_persist'] = False
+        _write(folder / 'a.xlsx', 'v1')
+        _run(folder, config, lambda: False, timeout=0.3)
+        assert watch_state.load(str(folder)) == {}
+
+    def test_startup_does_not_hash(self, folder, config, converted, monkeypatch):
+        """Arranque com milhares de ficheiros: sem hashes nem conversões."""
+        for n in range(2000):
+            (folder / f'f{n:04d}.xlsx').write_bytes(b'x')
+        _run(folder, config, lambda: False, timeout=0.1)
+
+        def no_hash(path):
+            raise AssertionError('hash calculado no arranque')
+
+        monkeypatch.setattr('src.batch_journal.file_hash', no_hash)
+        start = time.monotonic()
+        wf = WatchFolder(str(folder), config, interval=0.1)
+        wf.start()
+        elapsed = time.monotonic() - start
+        wf.stop()
+        assert converted == []
+        assert len(wf._seen) == 2000
+        assert elapsed < 5
+
+
+class TestReconversion:
+    def test_modified_while_running(self, folder, config, converted):
+        path = _write(folder / 'contas.xlsx', 'v1')
+        wf = WatchFolder(str(folder), config, interval=0.1)
+        wf.start()
+        try:
+            time.sleep(0.2)
+            _write(folder / 'contas.xlsx', 'v2 corrigido')
+            deadline = time.time() + 5
+            while not converted and time.time() < deadline:
+                time.sleep(0.05)
+            # Nova alteração depois de convertido: converte outra vez
+            time.sleep(0.1)
+            _write(folder / 'contas.xlsx', 'v3')
+            while len(converted) < 2 and time.time() < deadline:
+                time.sleep(0.05)
+        finally:
+            wf.stop()
+        assert converted == [path, path]
@@ -0,0 +1,185 @@
+"""
+Testes para a entrada a partir de arquivos ZIP.
+"""
+
+import copy
+import io
+import os
+import time
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+
+from src import batch_journal, zip_input
+from src.batch_processor import discover_excel_files, iter_excel_files, process_batch
+from src.config import DEFAULT_CONFIG
+from src.converter import ExcelToPDFConverter
+from src.watch_folder import WatchFolder
+
+
+def _workbook_bytes(n: int) -> bytes:
+    wb = Workbook()
+    ws = wb.active
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+    ws.append([n, f'S{n}', f'Cliente {n}', 100.0 + n, 23.0, 123.0 + n, 'Janeiro'])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _config():
+    cfg = copy.deepcopy(DEFAULT_CONFIG)
+    cfg['output']['auto_open'] = False
+    cfg['batch']['archives'] = True
+    return cfg
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """Arquivo com dois workbooks (um numa subpasta) e entradas a ignorar."""
+    path = tmp_path / 'pacote.zip'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('contas_1.xlsx', _workbook_bytes(1))
+        zf.writestr('Fevereiro/contas_2.xlsx', _workbook_bytes(2))
+        zf.writestr('Fevereiro/~$contas_2.xlsx', b'lock')
+        zf.writestr('__MACOSX/._contas_1.xlsx', b'meta')
+        zf.writestr('leia-me.txt', b'texto')
+    return path
+
+
+class TestPaths:
+    def test_member_roundtrip(self):
+        path = zip_input.member_path('/in/pacote.zip', 'Jan/a.xlsx')
+        assert path == '/in/pacote.zip!Jan/a.xlsx'
+        assert zip_input.split_member(path) == ('/in/pacote.zip', 'Jan/a.xlsx')
+        assert zip_input.is_member(path)
+
+    def test_plain_file(self):
+        assert zip_input.split_member('/in/a!b.xlsx') == ('/in/a!b.xlsx', None)
+        assert not zip_input.is_member('/in/pacote.zip')
+
+    def test_names(self):
+        path = zip_input.member_path('/in/pacote.zip', 'Jan/a.xlsx')
+        assert zip_input.source_name(path) == 'a.xlsx'
+        assert zip_input.display_name(path) == 'pacote.zip!Jan/a.xlsx'
+        assert zip_input.display_name('/in/a.xlsx') == 'a.xlsx'
+
+    def test_output_dir(self):
+        base = os.path.join('in')
+        assert zip_input.output_dir(os.path.join(base, 'a.xlsx')) == base
+        assert zip_input.output_dir(os.path.join(base, 'pacote.zip') + '!a.xlsx') == \
+            os.path.join(base, 'pacote')
+        assert zip_input.output_dir(os.path.join(base, 'pacote.zip') + '!Jan/a.xlsx') == \
+            os.path.join(base, 'pacote', 'Jan')
+
+    def test_output_dir_stays_inside(self):
+        path = os.path.join('in', 'pacote.zip') + '!../../etc/a.xlsx'
+        assert zip_input.output_dir(path) == os.path.join('in', 'pacote', 'etc')
+
+
+class TestMembers:
+    def test_iter_members(self, archive):
+        names = [name for name, _ in zip_input.iter_members(str(archive))]
+        assert names == ['Fevereiro/contas_2.xlsx', 'contas_1.xlsx']
+
+    def test_corrupt_archive_yields_nothing(self, tmp_path):
+        path = tmp_path / 'partido.zip'
+        path.write_bytes(b'nao e um zip')
+        assert list(zip_input.iter_members(str(path))) == []
+
+    def test_open_and_size(self, archive):
+        path = zip_input.member_path(str(archive), 'contas_1.xlsx')
+        data = zip_input.open_source(path).read()
+        assert data[:2] == b'PK'
+        assert zip_input.source_size(path) == len(data)
+
+    def test_missing_member(self, archive):
+        path = zip_input.member_path(str(archive), 'nao_existe.xlsx')
+        with pytest.raises(FileNotFoundError):
+            zip_input.open_source(path)
+        assert zip_input.source_size(path) == 0
+
+
+class TestDiscovery:
+    def test_members_discovered(self, archive, tmp_path):
+        (tmp_path / 'solto.xlsx').write_bytes(_workbook_bytes(0))
+        files = list(iter_excel_files(str(tmp_path), archives=True))
+        assert files == [
+            zip_input.member_path(str(archive), 'Fevereiro/contas_2.xlsx'),
+            zip_input.member_path(str(archive), 'contas_1.xlsx'),
+            str(tmp_path / 'solto.xlsx'),
+        ]
+
+    def test_archives_off(self, archive, tmp_path):
+        assert list(iter_excel_files(str(tmp_path))) == []
+
+    def test_patterns_match_members(self, archive, tmp_path):
+        files = list(iter_excel_files(str(tmp_path), archives=True, include=['*contas_2*']))
+        assert [zip_input.split_member(f)[1] for f in files] == ['Fevereiro/contas_2.xlsx']
+        files = list(iter_excel_files(str(tmp_path), archives=True,
+                                      exclude=['pacote.zip!Fevereiro/*']))
+        assert [zip_input.split_member(f)[1] for f in files] == ['contas_1.xlsx']
+
+    def test_size_filter_uses_member_size(self, archive, tmp_path):
+        size = zip_input.source_size(zip_input.member_path(str(archive), 'contas_1.xlsx'))
+        assert list(iter_excel_files(str(tmp_path), archives=True, min_size=size * 10)) == []
+
+    def test_config_option(self, archive, tmp_path):
+        config = _config()
+        assert len(list(discover_excel_files(str(tmp_path), config))) == 2
+        config['batch']['archives'] = False
+        assert list(discover_excel_files(str(tmp_path), config)) == []
+
+    def test_off_by_default(self, archive, tmp_path):
+        assert list(discover_excel_files(str(tmp_path), copy.deepcopy(DEFAULT_CONFIG))) == []
+        assert list(discover_excel_files(str(tmp_path), {})) == []
+
+
+class TestConversion:
+    def test_convert_member(self, archive, tmp_path):
+        path = zip_input.member_path(str(archive), 'Fevereiro/contas_2.xlsx')
+        converter = ExcelToPDFConverter(path, None, _config())
+        output = converter.generate_pdf()
+        assert output == str(tmp_path / 'pacote' / 'Fevereiro' / 'contas_2.pdf')
+        assert os.path.exists(output)
+
+    def test_process_batch_parallel(self, archive, tmp_path, isolated_db):
+        results = process_batch(str(tmp_path), _config(), 'aggregate', workers=2)
+        assert [r['filename'] for r in results] == [
+            'pacote.zip!Fevereiro/contas_2.xlsx', 'pacote.zip!contas_1.xlsx']
+        assert all(r['success'] for r in results)
+        assert os.path.exists(tmp_path / 'pacote' / 'contas_1.pdf')
+        assert os.path.exists(tmp_path / 'pacote' / 'Fevereiro' / 'contas_2.pdf')
+        # Nada foi extraído para disco
+        assert not list(tmp_path.glob('**/*.xlsx'))
+
+    def test_journal_hashes_member(self, archive):
+        path = zip_input.member_path(str(archive), 'contas_1.xlsx')
+        assert batch_journal.file_hash(path) == batch_journal.file_hash(path)
+        other = zip_input.member_path(str(archive), 'Fevereiro/contas_2.xlsx')
+        assert batch_journal.file_hash(path) != batch_journal.file_hash(other)
+
+
+class TestWatchArchive:
+    def test_archive_members_converted(self, tmp_path, isolated_db):
+        converted = []
+        config = _config()
+        config['automation'] = {'watch_mode': 'aggregate', 'watch_interval': 1}
+        wf = WatchFolder(str(tmp_path), config,
+                         on_converted=lambda path, outputs: converted.append(path))
+        wf.start()
+        try:
+            partial = tmp_path / 'pacote.tmp'
+            with zipfile.ZipFile(partial, 'w') as zf:
+                zf.writestr('a.xlsx', _workbook_bytes(1))
+                zf.writestr('b.xlsx', _workbook_bytes(2))
+            os.rename(partial, tmp_path / 'pacote.zip')
+            deadline = time.time() + 30
+            while len(converted) < 2 and time.time() < deadline:
+                time.sleep(0.2)
+        finally:
+            wf.stop()
+        assert sorted(zip_input.display_name(p) for p in converted) == [
+            'pacote.zip!a.xlsx', 'pacote.zip!b.xlsx']
+        assert os.path.exists(tmp_path / 'pacote' / 'a.pdf')
@@ -0,0 +1,117 @@
+"""
+Testes para a saída em arquivo ZIP dos PDFs individuais.
+"""
+
+import copy
+import io
+import os
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+from unittest.mock import patch, MagicMock
+
+from src.batch_processor import process_batch
+from src.config import DEFAULT_CONFIG
+from src.converter import ExcelToPDFConverter, _unique_member_name
+
+
+@pytest.fixture
+def contas_xlsx(tmp_path):
+    """Excel de contabilidade com três clientes (dois com a mesma sigla)."""
+    path = str(tmp_path / 'contas.xlsx')
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Contas'
+    ws.append(['Nr.', 'SIGLA', 'Cliente', 'CONTAB', 'Iva', 'TOTAL', 'Mês'])
+    ws.append([1, 'ABC', 'Cliente ABC', 100.0, 23.0, 123.0, 'Janeiro'])
+    ws.append([2, 'XYZ', 'Cliente XYZ', 200.0, 46.0, 246.0, 'Janeiro'])
+    ws.append([2, 'XYZ', 'Cliente XYZ Bis', 10.0, 2.3, 12.3, 'Janeiro'])
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def config():
+    return copy.deepcopy(DEFAULT_CONFIG)
+
+
+class TestUniqueMemberName:
+    def test_unused_name_unchanged(self):
+        assert _unique_member_name('1_A.pdf', set()) == '1_A.pdf'
+
+    def test_duplicate_gets_suffix(self):
+        assert _unique_member_name('1_A.pdf', {'1_A.pdf'}) == '1_A_2.pdf'
+
+    def test_suffix_increments(self):
+        assert _unique_member_name('1_A.pdf', {'1_A.pdf', '1_A_2.pdf'}) == '1_A_3.pdf'
+
+
+class TestGenerateIndividualZip:
+    def test_explicit_zip_path(self, contas_xlsx, config, tmp_path):
+        zip_path = str(tmp_path / 'saida' / 'bundle.zip')
+        conv = ExcelToPDFConverter(contas_xlsx, None, config)
+        members = conv.generate_individual_pdfs(zip_output=zip_path)
+
+        assert conv.output_zip_path == zip_path
+        with zipfile.ZipFile(zip_path) as zf:
+            assert zf.namelist() == members
+            for name in members:
+                assert zf.read(name).startswith(b'%PDF')
+
+    def test_duplicate_names_kept_apart(self, contas_xlsx, config, tmp_path):
+        zip_path = str(tmp_path / 'bundle.zip')
+        members = ExcelToPDFConverter(contas_xlsx, None, config).generate_individual_pdfs(
+            zip_output=zip_path)
+        assert members == ['1_ABC.pdf', '2_XYZ.pdf', '2_XYZ_2.pdf']
+
+    def test_default_zip_path_no_intermediate_files(self, contas_xlsx, config, tmp_path):
+        conv = ExcelToPDFConverter(contas_xlsx, None, config)
+        conv.generate_individual_pdfs(zip_output=True)
+
+        assert conv.output_zip_path == str(tmp_path / 'PDFs_Janeiro.zip')
+        assert os.path.exists(conv.output_zip_path)
+        assert not os.path.exists(str(tmp_path / 'PDFs_Janeiro'))
+        assert not os.path.exists(conv.output_zip_path + '.part')
+
+    def test_client_filter_applies(self, contas_xlsx, config, tmp_path):
+        zip_path = str(tmp_path / 'bundle.zip')
+        members = ExcelToPDFConverter(contas_xlsx, None, config).generate_individual_pdfs(
+            client_filter={'Cliente ABC'}, zip_output=zip_path)
+        assert members == ['1_ABC.pdf']
+
+    def test_encrypted_members(self, contas_xlsx, config, tmp_path):
+        from PyPDF2 import PdfReader
+        config['security']['pdf_password'] = 'segredo'
+        zip_path = str(tmp_path / 'bundle.zip')
+        ExcelToPDFConverter(contas_xlsx, None, config).generate_individual_pdfs(
+            zip_output=zip_path)
+
+        with zipfile.ZipFile(zip_path) as zf:
+            reader = PdfReader(io.BytesIO(zf.read('1_ABC.pdf')))
+        assert reader.is_encrypted
+
+    def test_failure_leaves_no_partial_archive(self, contas_xlsx, config, tmp_path):
+        zip_path = str(tmp_path / 'bundle.zip')
+        conv = ExcelToPDFConverter(contas_xlsx, None, config)
+        with patch.object(conv, '_create_client_pdf', side_effect=RuntimeError('falhou')):
+            with pytest.raises(RuntimeError):
+                conv.generate_individual_pdfs(zip_output=zip_path)
+        assert not os.path.exists(zip_path)
+        assert not os.path.exists(zip_path + '.part')
+
+
+class TestProcessBatchZip:
+    def test_zip_mode_reports_archive(self, tmp_path):
+        (tmp_path / 'jan.xlsx').touch()
+        mock = MagicMock()
+        mock.read_excel_data.return_value = {'itens': [{'Cliente': 'A'}]}
+        mock.generate_individual_pdfs.return_value = ['1_A.pdf']
+        mock.output_zip_path = str(tmp_path / 'PDFs_Jan.zip')
+        mock.cache_hits = []
+        with patch('src.batch_processor.ExcelToPDFConverter', return_value=mock):
+            results = process_batch(str(tmp_path), {}, mode='zip')
+
+        assert mock.generate_individual_pdfs.call_args.kwargs['zip_output'] is True
+        assert results[0]['success'] is True
+        assert results[0]['output_path'] == str(tmp_path / 'PDFs_Jan.zip')